@@ -6,10 +6,11 @@ Updated: Mar 2, 2026 — Unified smart upload (CSV, PDF, image auto-detection).
 import csv
 import io
 import os
-import json
-import base64
 
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
+from .metrics import stage, record_payload, record_usage
+from .vendor_registry import get_vendor_registry
+from .vision_client import create_message, get_media_type, build_vision_params, parse_vision_json
 
 
 def handle_csv_upload(contents, purchase_orders):
@@ -17,6 +18,7 @@ def handle_csv_upload(contents, purchase_orders):
     try:
         text = contents.decode("utf-8")
         reader = csv.DictReader(io.StringIO(text))
+        vendors = get_vendor_registry()
         count = 0
         for row in reader:
             po_num = row.get("PO Number", row.get("po_number", row.get("PO#", "")))
@@ -25,13 +27,16 @@ def handle_csv_upload(contents, purchase_orders):
             po_num = po_num.strip()
 
             if po_num not in purchase_orders:
+                vendor = row.get("Vendor", row.get("vendor", ""))
                 purchase_orders[po_num] = {
                     "po_number": po_num,
-                    "vendor": row.get("Vendor", row.get("vendor", "")),
+                    "vendor": vendor,
+                    "vendor_id": vendors.register(vendor),
                     "items": [],
                 }
 
             purchase_orders[po_num]["items"].append({
+                "item_number": row.get("Item ID", row.get("item_number", row.get("NDC", ""))),
                 "description": row.get("Item Description", row.get("description", row.get("Item", ""))),
                 "quantity": row.get("Quantity", row.get("quantity", row.get("Qty", "0"))),
                 "unit_price": row.get("Unit Price", row.get("unit_price", row.get("Price", "0"))),
@@ -49,6 +54,7 @@ def handle_tsv_upload(contents, purchase_orders):
     try:
         text = contents.decode("utf-8")
         reader = csv.DictReader(io.StringIO(text), delimiter="\t")
+        vendors = get_vendor_registry()
         count = 0
         for row in reader:
             po_num = row.get("PO Number", row.get("po_number", row.get("PO#", "")))
@@ -57,13 +63,16 @@ def handle_tsv_upload(contents, purchase_orders):
             po_num = po_num.strip()
 
             if po_num not in purchase_orders:
+                vendor = row.get("Vendor", row.get("vendor", ""))
                 purchase_orders[po_num] = {
                     "po_number": po_num,
-                    "vendor": row.get("Vendor", row.get("vendor", "")),
+                    "vendor": vendor,
+                    "vendor_id": vendors.register(vendor),
                     "items": [],
                 }
 
             purchase_orders[po_num]["items"].append({
+                "item_number": row.get("Item ID", row.get("item_number", row.get("NDC", ""))),
                 "description": row.get("Item Description", row.get("description", row.get("Item", ""))),
                 "quantity": row.get("Quantity", row.get("quantity", row.get("Qty", "0"))),
                 "unit_price": row.get("Unit Price", row.get("unit_price", row.get("Price", "0"))),
@@ -76,111 +85,141 @@ def handle_tsv_upload(contents, purchase_orders):
         return {"success": False, "error": str(e)}
 
 
-async def handle_po_pdf_upload(contents, filename, purchase_orders):
-    """Process a PO PDF/image via Claude Vision OCR and load into memory."""
-    try:
-        import anthropic
-        from .po_vision_prompt import get_po_vision_prompt
+# v2 record field -> accepted column names, first present wins
+PO_TABLE_COLUMNS = {
+    "po_number": ("PO Number", "po_number", "PO#"),
+    "vendor_name": ("Vendor", "Vendor Name", "vendor"),
+    "order_date": ("PO Date", "date"),
+    "item_number": ("Item ID", "item_number", "NDC"),
+    "description": ("Item Description", "description", "Item"),
+    "quantity": ("Quantity", "Quantity Ordered", "quantity", "Qty"),
+    "unit_price": ("Unit Price", "unit_price", "Price"),
+    "line_total": ("Line Total",),
+}
 
-        b64_data = base64.b64encode(contents).decode("utf-8")
-
-        ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else "pdf"
-        media_map = {
-            "pdf": "application/pdf",
-            "jpg": "image/jpeg",
-            "jpeg": "image/jpeg",
-            "png": "image/png",
-            "heic": "image/heic",
-            "gif": "image/gif",
-            "webp": "image/webp",
-            "tiff": "image/tiff",
-            "tif": "image/tiff",
-            "bmp": "image/bmp",
-        }
-        media_type = media_map.get(ext, "application/pdf")
 
-        # Save file
-        filepath = os.path.join("uploads", filename)
-        with open(filepath, "wb") as f:
-            f.write(contents)
-
-        client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-
-        if media_type == "application/pdf":
-            source_block = {
-                "type": "document",
-                "source": {
-                    "type": "base64",
-                    "media_type": "application/pdf",
-                    "data": b64_data,
-                },
-            }
-        else:
-            source_block = {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": b64_data,
-                },
+def po_records_from_table(contents, delimiter=","):
+    """
+    Parse a PO CSV / TSV (the columns handle_csv_upload reads, or a NetSuite
+    export) into v2 store records with their line_items, for
+    InMemoryStore.save_pos_bulk. Columns are resolved once from the header.
+    """
+    rows = csv.reader(io.StringIO(contents.decode("utf-8")), delimiter=delimiter)
+    header = next(rows, [])
+    position = {}
+    for field, names in PO_TABLE_COLUMNS.items():
+        found = [header.index(n) for n in names if n in header]
+        position[field] = found[0] if found else None
+
+    def cell(row, field):
+        i = position[field]
+        return row[i] if i is not None and i < len(row) else ""
+
+    pos = {}
+    for row in rows:
+        po_num = cell(row, "po_number").strip()
+        if not po_num:
+            continue
+        po = pos.get(po_num)
+        if po is None:
+            po = pos[po_num] = {
+                "po_number": po_num,
+                "vendor_name": cell(row, "vendor_name"),
+                "order_date": cell(row, "order_date"),
+                "total_amount": 0.0,
+                "line_items": [],
             }
+        quantity = _table_number(cell(row, "quantity"))
+        unit_price = _table_number(cell(row, "unit_price"))
+        line_total = _table_number(cell(row, "line_total")) or round(quantity * unit_price, 2)
+        po["line_items"].append({
+            "line_number": len(po["line_items"]) + 1,
+            "item_number": cell(row, "item_number"),
+            "description": cell(row, "description"),
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "line_total": line_total,
+        })
+        po["total_amount"] = round(po["total_amount"] + line_total, 2)
+    return list(pos.values())
+
+
+def _table_number(value):
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return float(value.replace(",", "").replace("$", "").strip())
+        except ValueError:
+            return 0.0
 
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=3000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        source_block,
-                        {"type": "text", "text": get_po_vision_prompt()},
-                    ],
-                }
-            ],
-        )
-
-        response_text = message.content[0].text
-
-        # Extract JSON
-        if "```json" in response_text:
-            json_str = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            json_str = response_text.split("```")[1].split("```")[0].strip()
-        else:
-            json_str = response_text.strip()
 
-        po_data = json.loads(json_str)
+async def handle_po_pdf_upload(contents, filename, purchase_orders, store_fn=None):
+    """Process a PO PDF/image via Claude Vision OCR and load into memory.
 
-        # Handle single PO or list of POs
-        po_list = po_data if isinstance(po_data, list) else [po_data]
+    store_fn(po_data) overrides how the extracted POs are stored (main.py
+    routes it through the shared-state log).
+    """
+    try:
+        from .po_vision_prompt import get_po_vision_prompt
 
-        count = 0
-        total_items = 0
-        for po in po_list:
-            po_num = po.get("po_number", "")
-            if not po_num:
-                continue
-            purchase_orders[po_num] = {
-                "po_number": po_num,
-                "vendor": po.get("vendor", ""),
-                "date": po.get("date", ""),
-                "ship_to": po.get("ship_to", ""),
-                "total": po.get("total", 0),
-                "items": po.get("items", []),
-            }
-            total_items += len(po.get("items", []))
-            count += 1
+        media_type = get_media_type(filename, default="application/pdf")
 
-        return {
-            "success": True,
-            "message": "Extracted " + str(count) + " purchase order(s) with " + str(total_items) + " line items from document.",
-            "data": po_list,
-        }
+        # Save file
+        record_payload("po_document", len(contents))
+        with stage("po_document", "save_file"):
+            filepath = os.path.join("uploads", filename)
+            with open(filepath, "wb") as f:
+                f.write(contents)
+
+        with stage("po_document", "encode"):
+            params = build_vision_params(contents, media_type, get_po_vision_prompt(), max_tokens=3000)
+        with stage("po_document", "vision"):
+            message = await create_message(params)
+        record_usage("po_document", message.usage)
+
+        with stage("po_document", "parse"):
+            po_data = parse_vision_json(message.content[0].text)
+        with stage("po_document", "store"):
+            if store_fn:
+                return store_fn(po_data)
+            return store_extracted_pos(po_data, purchase_orders)
 
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
+def store_extracted_pos(po_data, purchase_orders):
+    """Load vision-extracted PO data (single PO or list) into memory."""
+    po_list = po_data if isinstance(po_data, list) else [po_data]
+
+    count = 0
+    total_items = 0
+    for po in po_list:
+        po_num = po.get("po_number", "")
+        if not po_num:
+            continue
+        purchase_orders[po_num] = {
+            "po_number": po_num,
+            "vendor": po.get("vendor", ""),
+            "vendor_id": get_vendor_registry().register(po.get("vendor", "")),
+            "date": po.get("date", ""),
+            "ship_to": po.get("ship_to", ""),
+            "total": po.get("total", 0),
+            "items": po.get("items", []),
+        }
+        total_items += len(po.get("items", []))
+        count += 1
+
+    return {
+        "success": True,
+        "message": "Extracted " + str(count) + " purchase order(s) with " + str(total_items) + " line items from document.",
+        "data": po_list,
+    }
+
+
 def get_admin_html(purchase_orders):
     """Generate the Purchase Orders admin page with unified smart upload."""
 
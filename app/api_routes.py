@@ -2,26 +2,79 @@
 VerifyAP — API Routes for Dashboard Drill-Downs, Document History & Lifecycle
 
 All endpoints return JSON. Frontend pages consume these via fetch().
+List and detail endpoints accept ?fields= (comma-separated, dotted paths for
+nested values) and are serialized by app/fast_json.py.
 
 Endpoints:
   GET  /api/v2/purchase-orders          — Filtered PO list (with match status)
   GET  /api/v2/purchase-orders/{po_id}  — Single PO with full details + lines
   GET  /api/v2/discrepancies            — All matches with discrepancies
   GET  /api/v2/match/{match_id}         — Full match detail with per-line drill-in
-  GET  /api/v2/document-history         — All document events (timeline)
+  GET  /api/v2/document-history         — Document events, newest first (?event_type, ?since, ?until)
   GET  /api/v2/document-history/{po_id} — Timeline for a specific PO
   GET  /api/v2/dashboard-stats          — Aggregated stats for dashboard cards
+  POST /api/v2/purchase-orders/import   — Bulk PO import from CSV / TSV
   POST /api/v2/verify/{po_id}           — Mark a PO as verified
   POST /api/v2/archive/batch            — Batch archive verified POs
   GET  /api/v2/archive/candidates       — POs eligible for archiving
+  GET  /api/v2/events/stream            — Server-sent change notifications (app/change_feed.py)
 """
 
-from fastapi import APIRouter, HTTPException, Query
+import csv
+
+from starlette.concurrency import run_in_threadpool
+from fastapi import APIRouter, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 from typing import Optional, List
 from .database import get_db
+from .cold_storage import ColdBundleUnavailable
+from .fast_json import FastJSONResponse, parse_fields, project, select_columns
+from .change_feed import get_change_feed
+from .vendor_registry import get_vendor_registry
+from .admin_html import po_records_from_table
+from .metrics import stage
 
 router = APIRouter(prefix="/api/v2", tags=["VerifyAP v2"])
 
+# List-view columns: (output field, source key, default). ?fields= picks a subset.
+PO_LIST_COLUMNS = (
+    ("id", "id", None),
+    ("po_number", "po_number", None),
+    ("vendor_name", "vendor_name", None),
+    ("order_date", "order_date", None),
+    ("total_amount", "total_amount", None),
+    ("status", "status", None),
+    ("match_status", "match_status", "unmatched"),
+    ("total_discrepancies", "total_discrepancies", 0),
+    ("amount_delta", "amount_delta", 0),
+    ("product_line_count", "product_line_count", 0),
+    ("slip_count", "slip_count", 0),
+    ("invoice_count", "invoice_count", 0),
+    ("source_type", "source_type", None),
+    ("uploaded_at", "uploaded_at", None),
+)
+
+DISCREPANCY_COLUMNS = (
+    ("match_id", "id", None),
+    ("po_id", "po_id", None),
+    ("po_number", "po_number", None),
+    ("vendor_name", "vendor_name", None),
+    ("po_total", "po_total", None),
+    ("invoice_number", "invoice_number", None),
+    ("invoice_total", "invoice_total", None),
+    ("amount_delta", "amount_delta", None),
+    ("overall_status", "overall_status", None),
+    ("total_discrepancies", "total_discrepancies", None),
+    ("match_type", "match_type", None),
+    ("summary", "summary", None),
+    ("matched_at", "created_at", None),
+)
+
+DISCREPANCY_LINE_COLUMNS = tuple((name, name, None) for name in (
+    "line_number", "discrepancy_type", "discrepancy_note", "po_description", "po_quantity",
+    "slip_qty_shipped", "inv_quantity", "po_unit_price", "inv_unit_price",
+))
+
 
 # ---------------------------------------------------------------------------
 # Dashboard Stats
@@ -80,46 +133,31 @@ def dashboard_stats():
 def list_purchase_orders(
     status: Optional[str] = Query(None, description="Filter by status: active|matched|verified|archived"),
     match_status: Optional[str] = Query(None, description="Filter by match: approve|review|reject|unmatched"),
-    vendor: Optional[str] = Query(None, description="Filter by vendor name (partial match)"),
+    vendor: Optional[str] = Query(None, description="Filter by vendor name or alias (partial match)"),
+    fields: Optional[str] = None,
+    po_ids: Optional[str] = None,
 ):
-    """List POs with match status summary. Powers the PO list view."""
+    """List POs with match status summary. Powers the PO list view (?po_ids= refreshes just those rows)."""
     db = get_db()
-    pos = db.list_pos(status=status)
+    pos = db.list_pos(status=status, po_ids=_split_ids(po_ids))
 
     if match_status:
         pos = [p for p in pos if p.get("match_status") == match_status]
 
     if vendor:
-        vendor_lower = vendor.lower()
-        pos = [p for p in pos if vendor_lower in (p.get("vendor_name") or "").lower()]
+        matches = get_vendor_registry().matcher(vendor)
+        pos = [p for p in pos if matches(p.get("vendor_name"), p.get("vendor_id"))]
 
     # Shape output for the frontend table
-    return {
+    columns = select_columns(PO_LIST_COLUMNS, parse_fields(fields))
+    return FastJSONResponse({
         "count": len(pos),
-        "purchase_orders": [
-            {
-                "id": p["id"],
-                "po_number": p.get("po_number"),
-                "vendor_name": p.get("vendor_name"),
-                "order_date": p.get("order_date"),
-                "total_amount": p.get("total_amount"),
-                "status": p.get("status"),
-                "match_status": p.get("match_status", "unmatched"),
-                "total_discrepancies": p.get("total_discrepancies", 0),
-                "amount_delta": p.get("amount_delta", 0),
-                "product_line_count": p.get("product_line_count", 0),
-                "slip_count": p.get("slip_count", 0),
-                "invoice_count": p.get("invoice_count", 0),
-                "source_type": p.get("source_type"),
-                "uploaded_at": p.get("uploaded_at"),
-            }
-            for p in pos
-        ],
-    }
+        "purchase_orders": [{out: p.get(src, default) for out, src, default in columns} for p in pos],
+    })
 
 
 @router.get("/purchase-orders/{po_id}")
-def get_purchase_order(po_id: str):
+def get_purchase_order(po_id: str, fields: Optional[str] = None):
     """Full PO detail with line items, linked slips, invoices, and matches."""
     db = get_db()
     po = db.get_po(po_id)
@@ -140,13 +178,13 @@ def get_purchase_order(po_id: str):
 
     timeline = db.get_timeline_for_po(po_id)
 
-    return {
+    return FastJSONResponse(project({
         "purchase_order": po,
         "packing_slips": slips,
         "invoices": invoices,
         "matches": matches,
         "timeline": timeline,
-    }
+    }, parse_fields(fields)))
 
 
 # ---------------------------------------------------------------------------
@@ -157,52 +195,35 @@ def get_purchase_order(po_id: str):
 def list_discrepancies(
     severity: Optional[str] = Query(None, description="Filter: review|reject"),
     vendor: Optional[str] = Query(None),
+    fields: Optional[str] = None,
+    po_ids: Optional[str] = None,
 ):
-    """All matches that have discrepancies. Powers the Discrepancies list view."""
+    """All matches that have discrepancies. Powers the Discrepancies list view (?po_ids= narrows to those POs)."""
     db = get_db()
-    discs = db.list_discrepancies()
+    discs = db.list_discrepancies(po_ids=_split_ids(po_ids))
 
     if severity:
         discs = [d for d in discs if d.get("overall_status") == severity]
 
     if vendor:
-        vendor_lower = vendor.lower()
-        discs = [d for d in discs if vendor_lower in (d.get("vendor_name") or "").lower()]
-
-    return {
+        matches = get_vendor_registry().matcher(vendor)
+        discs = [d for d in discs if matches(d.get("vendor_name"), d.get("vendor_id"))]
+
+    tree = parse_fields(fields)
+    columns = select_columns(DISCREPANCY_COLUMNS, tree)
+    rows = [{out: d.get(src, default) for out, src, default in columns} for d in discs]
+    # Line detail is most of the payload; only built when asked for
+    if tree is None or "discrepancy_lines" in tree:
+        line_columns = select_columns(DISCREPANCY_LINE_COLUMNS, tree and tree["discrepancy_lines"])
+        for row, d in zip(rows, discs):
+            row["discrepancy_lines"] = [
+                {out: dl.get(src, default) for out, src, default in line_columns}
+                for dl in d.get("discrepancy_lines", [])
+            ]
+    return FastJSONResponse({
         "count": len(discs),
-        "discrepancies": [
-            {
-                "match_id": d["id"],
-                "po_number": d.get("po_number"),
-                "vendor_name": d.get("vendor_name"),
-                "po_total": d.get("po_total"),
-                "invoice_number": d.get("invoice_number"),
-                "invoice_total": d.get("invoice_total"),
-                "amount_delta": d.get("amount_delta"),
-                "overall_status": d.get("overall_status"),
-                "total_discrepancies": d.get("total_discrepancies"),
-                "match_type": d.get("match_type"),
-                "summary": d.get("summary"),
-                "matched_at": d.get("created_at"),
-                "discrepancy_lines": [
-                    {
-                        "line_number": dl.get("line_number"),
-                        "discrepancy_type": dl.get("discrepancy_type"),
-                        "discrepancy_note": dl.get("discrepancy_note"),
-                        "po_description": dl.get("po_description"),
-                        "po_quantity": dl.get("po_quantity"),
-                        "slip_qty_shipped": dl.get("slip_qty_shipped"),
-                        "inv_quantity": dl.get("inv_quantity"),
-                        "po_unit_price": dl.get("po_unit_price"),
-                        "inv_unit_price": dl.get("inv_unit_price"),
-                    }
-                    for dl in d.get("discrepancy_lines", [])
-                ],
-            }
-            for d in discs
-        ],
-    }
+        "discrepancies": rows,
+    })
 
 
 # ---------------------------------------------------------------------------
@@ -210,7 +231,7 @@ def list_discrepancies(
 # ---------------------------------------------------------------------------
 
 @router.get("/match/{match_id}")
-def get_match_detail(match_id: str):
+def get_match_detail(match_id: str, fields: Optional[str] = None):
     """Full match detail with every line comparison. This is the drill-in view."""
     db = get_db()
     match = db.get_match(match_id)
@@ -222,7 +243,7 @@ def get_match_detail(match_id: str):
     slip = db.get_slip(match.get("slip_id", "")) if match.get("slip_id") else None
     inv = db.get_invoice(match.get("invoice_id", "")) if match.get("invoice_id") else None
 
-    return {
+    return FastJSONResponse(project({
         "match": match,
         "purchase_order": {
             "po_number": po.get("po_number") if po else None,
@@ -242,7 +263,7 @@ def get_match_detail(match_id: str):
             "payment_terms": inv.get("payment_terms") if inv else None,
             "source_filename": inv.get("source_filename") if inv else None,
         } if inv else None,
-    }
+    }, parse_fields(fields)))
 
 
 # ---------------------------------------------------------------------------
@@ -252,18 +273,25 @@ def get_match_detail(match_id: str):
 @router.get("/document-history")
 def list_document_history(
     limit: int = Query(50, ge=1, le=200),
+    event_type: Optional[str] = None,
+    since: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    until: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    fields: Optional[str] = None,
 ):
-    """Global document event timeline."""
+    """Global document event timeline, newest first."""
     db = get_db()
-    events = db.get_all_events()
-    return {
-        "count": len(events[:limit]),
-        "events": events[:limit],
-    }
+    if since or until:
+        events = db.get_events_between(since, until, event_type=event_type)[-limit:][::-1]
+    else:
+        events = db.get_recent_events(limit, event_type=event_type)
+    return FastJSONResponse({
+        "count": len(events),
+        "events": project(events, parse_fields(fields)),
+    })
 
 
 @router.get("/document-history/{po_id}")
-def get_po_timeline(po_id: str):
+def get_po_timeline(po_id: str, fields: Optional[str] = None):
     """Timeline for a specific PO — shows when each document was uploaded and matched."""
     db = get_db()
     po = db.get_po(po_id)
@@ -272,11 +300,46 @@ def get_po_timeline(po_id: str):
 
     timeline = db.get_timeline_for_po(po_id)
 
-    return {
+    return FastJSONResponse(project({
         "po_number": po.get("po_number"),
         "vendor_name": po.get("vendor_name"),
         "current_status": po.get("status"),
         "timeline": timeline,
+    }, parse_fields(fields)))
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+
+@router.post("/purchase-orders/import")
+async def import_purchase_orders(file: UploadFile = File(...)):
+    """
+    Load a PO CSV / TSV into the store as one batch (InMemoryStore.save_pos_bulk):
+    one logged write and one "bulk_import" event however many POs it holds.
+    Parsing and the store write run in the threadpool: a 50k-row file takes
+    seconds, including JSON-encoding the batch for the shared-state log.
+    """
+    contents = await file.read()
+    delimiter = "\t" if (file.filename or "").lower().endswith(".tsv") else ","
+    try:
+        with stage("po_import", "parse"):
+            pos = await run_in_threadpool(po_records_from_table, contents, delimiter)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail="Could not read the file: " + str(e))
+    line_count = sum(len(po["line_items"]) for po in pos)
+    with stage("po_import", "store"):
+        result = await run_in_threadpool(get_db().save_pos_bulk, pos)
+    imported = len(pos) - len(result["rejected"]) - len(result["updated"]) - len(result["unchanged"])
+    return {
+        "batch_id": result["batch_id"],
+        "imported": imported,
+        "updated": len(result["updated"]),
+        "unchanged": len(result["unchanged"]),
+        "line_items": line_count,
+        "rejected": [dict(r, po_number=pos[r["index"]].get("po_number")) for r in result["rejected"]],
+        "message": str(imported) + " purchase order(s) imported, " + str(len(result["updated"])) + " updated, "
+                   + str(len(result["unchanged"])) + " unchanged.",
     }
 
 
@@ -292,7 +355,16 @@ def verify_po(po_id: str):
     if not po:
         raise HTTPException(status_code=404, detail="Purchase order not found")
 
-    db.update_status("po", po_id, "verified")
+    held = [m for m in db.get_matches_for_po(po_id)
+            if m.get("overall_status") == "reject" and any(d["kind"] == "invoice" and d.get("duplicate_of")
+                                                           for d in m.get("duplicates", []))]
+    if held:
+        raise HTTPException(status_code=409, detail="PO has a match rejected for a duplicate invoice. Resolve it before verifying.")
+
+    try:
+        db.update_status("po", po_id, "verified")
+    except ColdBundleUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e) + ". The PO stays archived; try again later.")
     return {
         "status": "verified",
         "po_number": po.get("po_number"),
@@ -331,3 +403,24 @@ def batch_archive(po_ids: List[str]):
         "archived_count": archived,
         "message": str(archived) + " purchase order(s) archived.",
     }
+
+
+# ---------------------------------------------------------------------------
+# Live Updates
+# ---------------------------------------------------------------------------
+
+@router.get("/events/stream")
+async def stream_changes(request: Request, last_event_id: Optional[str] = None):
+    """Server-sent events: coalesced 'these POs changed' notifications for open pages."""
+    last_event_id = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        get_change_feed().stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _split_ids(value: Optional[str]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    return [i for i in value.split(",") if i]
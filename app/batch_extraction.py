@@ -0,0 +1,205 @@
+"""
+VerifyAP - Batch Extraction Backend
+Purpose: Queue documents for overnight/backfill OCR through the Message Batches
+API instead of one interactive messages.create() call per upload.
+
+Flow:
+  enqueue()  — document is saved and its vision request is staged
+  submit()   — every staged request goes out as one message batch
+  poll()     — checks batch status; once ended, results are parsed and fed
+               through the same matching + store path as interactive uploads
+
+The queue and the batch ids live in this process only. A restart loses both:
+queued documents must be enqueued again, and a submitted batch's results are
+not applied (its documents stay in the Anthropic console until they expire).
+Submit and let the batch finish before a deploy.
+"""
+
+import os
+import uuid
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+from .vision_client import get_client, get_media_type, build_vision_params, parse_vision_json
+
+
+DOCUMENT_KINDS = {
+    # kind: (default media type, max_tokens)
+    "packing_slip": ("image/jpeg", 2000),
+    "invoice": ("image/jpeg", 2000),
+    "po": ("application/pdf", 3000),
+}
+
+BATCH_POLL_INTERVAL = float(os.environ.get("BATCH_POLL_INTERVAL", "60"))
+
+
+def _get_prompt(kind):
+    if kind == "packing_slip":
+        from .vision_prompt import get_vision_prompt
+        return get_vision_prompt()
+    if kind == "invoice":
+        from .invoice_vision_prompt import get_invoice_vision_prompt
+        return get_invoice_vision_prompt()
+    from .po_vision_prompt import get_po_vision_prompt
+    return get_po_vision_prompt()
+
+
+class BatchExtractionQueue:
+    """Stages vision requests, submits them as message batches, and applies results."""
+
+    def __init__(self, appliers, client_factory=get_client):
+        """
+        Args:
+            appliers: Dict of document kind -> callable(extracted_data) returning
+                      the same {"success": ...} dict the interactive upload returns
+            client_factory: Returns an Anthropic client (swap for tests)
+        """
+        self.appliers = appliers
+        self.client_factory = client_factory
+        self.pending = []
+        self.batches = {}
+        self.lock = threading.Lock()
+        # Guards pending / batches only; self.lock is held across a poll's API calls
+        self.pending_lock = threading.Lock()
+
+    # -- Queue -------------------------------------------------------------
+
+    def enqueue(self, kind, contents, filename, fingerprints=None):
+        """
+        Stage one document for the next batch. Returns its custom_id.
+
+        fingerprints (content / photo hashes) are added to the extracted data
+        when the result is applied, so the upload is indexed like an interactive one.
+        """
+        if kind not in DOCUMENT_KINDS:
+            raise ValueError("Unknown document kind: " + str(kind))
+
+        default_media, max_tokens = DOCUMENT_KINDS[kind]
+        media_type = get_media_type(filename, default=default_media)
+        custom_id = kind + "-" + uuid.uuid4().hex[:16]
+
+        staged = {
+            "custom_id": custom_id,
+            "kind": kind,
+            "filename": filename,
+            "fingerprints": fingerprints,
+            "params": build_vision_params(contents, media_type, _get_prompt(kind), max_tokens=max_tokens),
+        }
+        with self.pending_lock:
+            self.pending.append(staged)
+        return custom_id
+
+    def submit(self):
+        """Send every staged document as one message batch. Returns the batch id. Blocking."""
+        with self.pending_lock:
+            staged, self.pending = self.pending, []
+        if not staged:
+            return None
+
+        try:
+            client = self.client_factory()
+            batch = client.beta.messages.batches.create(
+                requests=[{"custom_id": d["custom_id"], "params": d["params"]} for d in staged]
+            )
+        except Exception:
+            # Not sent: back at the front of the queue, ahead of anything enqueued meanwhile
+            with self.pending_lock:
+                self.pending[:0] = staged
+            raise
+
+        entry = {
+            "batch_id": batch.id,
+            "processing_status": batch.processing_status,
+            "submitted_at": datetime.now(timezone.utc).isoformat(),
+            "ended_at": None,
+            "documents": {
+                d["custom_id"]: {"kind": d["kind"], "filename": d["filename"], "result": None,
+                                 "fingerprints": d.get("fingerprints")}
+                for d in staged
+            },
+            "applied": False,
+        }
+        with self.pending_lock:
+            self.batches[batch.id] = entry
+        return batch.id
+
+    # -- Polling -----------------------------------------------------------
+
+    def poll(self, batch_id):
+        """Refresh a batch's status and apply its results once it has ended."""
+        with self.lock:
+            entry = self.batches.get(batch_id)
+            if entry is None:
+                return None
+            if entry["applied"]:
+                return self.describe(batch_id)
+
+            client = self.client_factory()
+            batch = client.beta.messages.batches.retrieve(batch_id)
+            entry["processing_status"] = batch.processing_status
+
+            if batch.processing_status == "ended":
+                for item in client.beta.messages.batches.results(batch_id):
+                    self._apply_result(entry, item)
+                entry["ended_at"] = datetime.now(timezone.utc).isoformat()
+                entry["applied"] = True
+                print("[VerifyAP] Batch " + batch_id + " applied (" + str(len(entry["documents"])) + " documents).")
+
+            return self.describe(batch_id)
+
+    async def watch(self, batch_id, interval=None):
+        """Poll in the background until the batch has ended and been applied."""
+        interval = BATCH_POLL_INTERVAL if interval is None else interval
+        while True:
+            status = await asyncio.to_thread(self.poll, batch_id)
+            if status is None or status["applied"]:
+                return status
+            await asyncio.sleep(interval)
+
+    def _apply_result(self, entry, item):
+        doc = entry["documents"].get(item.custom_id)
+        if doc is None:
+            return
+
+        if item.result.type != "succeeded":
+            doc["result"] = {"success": False, "error": "Batch request " + item.result.type}
+            return
+
+        try:
+            data = parse_vision_json(item.result.message.content[0].text)
+            if doc.get("fingerprints") and isinstance(data, dict):
+                data.update(doc["fingerprints"])
+            doc["result"] = self.appliers[doc["kind"]](data)
+        except Exception as e:
+            doc["result"] = {"success": False, "error": str(e)}
+
+    # -- Reporting ---------------------------------------------------------
+
+    def describe(self, batch_id):
+        entry = self.batches.get(batch_id)
+        if entry is None:
+            return None
+        docs = entry["documents"].values()
+        return {
+            "batch_id": batch_id,
+            "processing_status": entry["processing_status"],
+            "submitted_at": entry["submitted_at"],
+            "ended_at": entry["ended_at"],
+            "applied": entry["applied"],
+            "document_count": len(entry["documents"]),
+            "succeeded": sum(1 for d in docs if d["result"] and d["result"].get("success")),
+            "failed": sum(1 for d in docs if d["result"] and not d["result"].get("success")),
+            "documents": [
+                {"custom_id": cid, "kind": d["kind"], "filename": d["filename"], "result": d["result"]}
+                for cid, d in entry["documents"].items()
+            ],
+        }
+
+    def list_batches(self):
+        with self.pending_lock:
+            pending, batch_ids = list(self.pending), list(self.batches)
+        return {
+            "pending": [{"custom_id": d["custom_id"], "kind": d["kind"], "filename": d["filename"]} for d in pending],
+            "batches": [self.describe(bid) for bid in batch_ids],
+        }
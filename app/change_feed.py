@@ -0,0 +1,174 @@
+"""
+VerifyAP - Live Change Feed (Server-Sent Events)
+Purpose: Push small "these POs changed" notifications to open dashboard and
+list pages so they update the affected rows instead of re-fetching (and
+re-scanning) whole lists on every refresh.
+
+InMemoryStore calls ChangeFeed.on_change(po_id, event) after each write. The
+feed coalesces writes per PO and every CHANGE_FEED_FLUSH_MS (default 250)
+sends one message to each subscriber:
+
+    id: 3f9c0a1b-42
+    event: changes
+    data: {"seq": 42, "po_ids": ["..."], "events": [{...document event...}]}
+
+A save_po followed by save_po_lines therefore arrives as one notification,
+after the lines are in. Pages re-fetch just those POs (?po_ids= on the list
+endpoints) and prepend the events. A page that reconnects with Last-Event-ID
+gets the messages it missed from a short history. If too much changed
+(a bulk import, a replayed log, a slow client) it gets {"reload": true}
+instead and re-fetches the full list once. So does a page whose id comes
+from another process: the id starts with the feed's epoch, which is new on
+every start, and each worker counts seq on its own.
+
+With several workers, each worker feeds its own subscribers from its replica.
+`before_flush` (shared_state.sync) pulls in the other workers' writes first.
+"""
+
+import os
+import json
+import uuid
+import asyncio
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Per-subscriber backlog before it is told to reload instead
+SUBSCRIBER_QUEUE_SIZE = 32
+# Events carried per message; the rest are summarized by po_ids
+MAX_EVENTS_PER_MESSAGE = 100
+
+
+class ChangeFeed:
+    """Coalesces store writes per PO and fans them out to SSE subscribers."""
+
+    def __init__(self, flush_ms: float = 250.0, max_pending: int = 500, history: int = 256):
+        self.flush_s = flush_ms / 1000.0
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.pending_po_ids: Dict[str, None] = {}
+        self.pending_events: List[Dict] = []
+        self.overflowed = False
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.history = deque(maxlen=history)
+        self.subscribers = set()
+        self.before_flush: Optional[Callable[[], None]] = None
+        self.sent = 0
+
+    # -- Producer side (any thread) ------------------------------------------
+
+    def on_change(self, po_id: Optional[str], event: Optional[Dict] = None):
+        with self.lock:
+            if self.overflowed:
+                return
+            if po_id:
+                self.pending_po_ids[po_id] = None
+            if event is not None:
+                self.pending_events.append(event)
+            if len(self.pending_po_ids) > self.max_pending or len(self.pending_events) > self.max_pending:
+                self.overflowed = True
+                self.pending_po_ids.clear()
+                self.pending_events.clear()
+
+    # -- Consumer side (event loop) ------------------------------------------
+
+    def subscribe(self, last_seq: Optional[int] = None, epoch: Optional[str] = None) -> asyncio.Queue:
+        """
+        Queue of messages for one client, preloaded with what it missed since
+        last_seq. A last_seq from another feed (epoch differs, or it is ahead
+        of ours) can't be resumed: the client is told to reload.
+        """
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        if last_seq is not None and ((epoch is not None and epoch != self.epoch) or last_seq > self.seq):
+            queue.put_nowait({"seq": self.seq, "reload": True})
+        elif last_seq is not None and last_seq < self.seq:
+            missed = [message for message in self.history if message["seq"] > last_seq]
+            if not missed or missed[0]["seq"] != last_seq + 1 or len(missed) >= SUBSCRIBER_QUEUE_SIZE:
+                queue.put_nowait({"seq": self.seq, "reload": True})
+            else:
+                for message in missed:
+                    queue.put_nowait(message)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def flush(self) -> Optional[Dict]:
+        """Turn pending changes into one message and hand it to every subscriber."""
+        with self.lock:
+            if not self.pending_po_ids and not self.pending_events and not self.overflowed:
+                return None
+            po_ids, events, overflowed = list(self.pending_po_ids), self.pending_events, self.overflowed
+            self.pending_po_ids, self.pending_events, self.overflowed = {}, [], False
+        self.seq += 1
+        if overflowed:
+            message = {"seq": self.seq, "reload": True}
+        else:
+            message = {"seq": self.seq, "po_ids": po_ids, "events": events[-MAX_EVENTS_PER_MESSAGE:]}
+        self.history.append(message)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Too far behind to catch up row by row: drop its backlog, ask for a reload
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"seq": self.seq, "reload": True})
+        self.sent += len(self.subscribers)
+        return message
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_s)
+            try:
+                if self.subscribers and self.before_flush:
+                    await asyncio.to_thread(self.before_flush)
+                self.flush()
+            except Exception as e:
+                print("[VerifyAP] Change feed flush failed: " + str(e))
+
+    async def stream(self, last_event_id: Optional[str] = None, keepalive_s: float = 15.0):
+        """SSE body for one client. Comment lines keep proxies from closing an idle stream."""
+        queue = self.subscribe(*parse_event_id(last_event_id))
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=keepalive_s)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(message, self.epoch)
+        finally:
+            self.unsubscribe(queue)
+
+    def stats(self) -> Dict:
+        return {"subscribers": len(self.subscribers), "seq": self.seq, "messages_delivered": self.sent}
+
+
+def format_sse(message: Dict, epoch: str = "") -> str:
+    event_id = (epoch + "-" if epoch else "") + str(message["seq"])
+    return "id: " + event_id + "\nevent: changes\ndata: " + json.dumps(message, default=str) + "\n\n"
+
+
+def parse_event_id(value: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """(seq, epoch) from a Last-Event-ID of "<epoch>-<seq>" or a bare "<seq>"; (None, None) if unreadable."""
+    if not value:
+        return None, None
+    epoch, _, seq = str(value).rpartition("-")
+    if not seq.isdigit():
+        return None, None
+    return int(seq), epoch or None
+
+
+_feed = None
+
+
+def get_change_feed() -> ChangeFeed:
+    """Return the process-wide change feed. Creates it on first call."""
+    global _feed
+    if _feed is None:
+        _feed = ChangeFeed(flush_ms=float(os.environ.get("CHANGE_FEED_FLUSH_MS", "250")))
+    return _feed
@@ -0,0 +1,124 @@
+"""
+VerifyAP - Cold Storage for Archived POs
+Purpose: Keep archived purchase orders out of the hot in-memory dicts.
+
+When a PO is archived, InMemoryStore moves its whole bundle (PO + line
+items, packing slips, invoices, match results + line details, document
+events) into one gzipped JSON file here and keeps only a small list_pos-style
+summary in memory. Reading an archived PO, slip, invoice or match by id loads
+the bundle back through a small LRU cache, so archived documents are still
+one click away but no longer walked by list_pos / list_discrepancies.
+
+COLD_STORAGE_DIR (default PERSIST_DIR/cold_storage; without either, archived
+POs stay in memory) and COLD_CACHE_SIZE (bundles kept decoded, default 32).
+With several workers or hosts, the directory must be shared between them.
+Un-archiving a PO leaves its file in place: every replica applies the op on
+its own schedule, and a restart may replay it on top of an older snapshot.
+If the file can't be read, un-archiving raises ColdBundleUnavailable and the
+PO stays archived (the op is not logged).
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import threading
+import contextlib
+from collections import OrderedDict
+from typing import Optional, Dict
+
+from .metrics import record_cache
+
+
+class ColdBundleUnavailable(OSError):
+    """An archived PO's bundle can't be read, so it can't be un-archived."""
+
+
+class ColdStorage:
+    """One compressed file per archived PO bundle, plus an LRU of decoded bundles (bundle, last read)."""
+
+    def __init__(self, directory: str, cache_size: int = 32):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ColdStorage"]:
+        persist_dir = os.environ.get("PERSIST_DIR", "")
+        directory = os.environ.get("COLD_STORAGE_DIR", os.path.join(persist_dir, "cold_storage") if persist_dir else "")
+        if not directory:
+            return None
+        return cls(directory, cache_size=int(os.environ.get("COLD_CACHE_SIZE", "32")))
+
+    def path(self, po_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.-]", "_", po_id)
+        return os.path.join(self.directory, safe[:2], safe + ".json.gz")
+
+    def write(self, po_id: str, bundle: Dict):
+        """Atomically write a bundle. mtime=0 keeps the bytes identical on every replica."""
+        path = self.path(po_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = gzip.compress(json.dumps(bundle, default=str).encode("utf-8"), compresslevel=6, mtime=0)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            self.cache.pop(po_id, None)
+        return len(data)
+
+    def read(self, po_id: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.cache.get(po_id)
+            bundle = entry[0] if entry else None
+            if entry:
+                self.cache[po_id] = (bundle, time.monotonic())
+                self.cache.move_to_end(po_id)
+        record_cache("cold_storage", bundle is not None)
+        if bundle is not None:
+            return bundle
+        try:
+            with open(self.path(po_id), "rb") as f:
+                bundle = json.loads(gzip.decompress(f.read()))
+        except (OSError, ValueError) as e:
+            print("[VerifyAP] Cold storage: cannot read bundle for PO " + po_id + ": " + str(e))
+            return None
+        with self.lock:
+            self.cache[po_id] = (bundle, time.monotonic())
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return bundle
+
+    def forget(self, po_id: str):
+        """Drop a decoded bundle from the cache; the file stays."""
+        with self.lock:
+            self.cache.pop(po_id, None)
+
+    def delete(self, po_id: str):
+        self.forget(po_id)
+        with contextlib.suppress(OSError):
+            os.remove(self.path(po_id))
+
+    def evict(self, keep: int = 0) -> int:
+        """Drop decoded bundles from the cache, keeping the `keep` most recent."""
+        with self.lock:
+            dropped = 0
+            while len(self.cache) > keep:
+                self.cache.popitem(last=False)
+                dropped += 1
+        return dropped
+
+    def evict_idle(self, idle_seconds: float) -> int:
+        """Drop decoded bundles nobody has read for idle_seconds."""
+        cutoff = time.monotonic() - idle_seconds
+        with self.lock:
+            idle = [po_id for po_id, (_, last_read) in self.cache.items() if last_read < cutoff]
+            for po_id in idle:
+                del self.cache[po_id]
+        return len(idle)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {"directory": self.directory, "cached_bundles": len(self.cache), "cache_size": self.cache_size}
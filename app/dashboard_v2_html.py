@@ -8,6 +8,7 @@ Uses string concatenation (not f-strings) per project convention.
 """
 
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
+from .live_updates import get_live_updates_script
 
 
 def get_dashboard_v2_html():
@@ -401,7 +402,7 @@ def get_dashboard_v2_html():
             </table>
         </div>
     </div>
-
+    """ + get_live_updates_script() + """
     <script>
         // --- Load Dashboard Stats ---
         async function loadStats() {
@@ -440,7 +441,7 @@ def get_dashboard_v2_html():
         // --- Load Recent POs ---
         async function loadRecentPOs() {
             try {
-                const resp = await fetch('/api/v2/purchase-orders');
+                const resp = await fetch('/api/v2/purchase-orders?fields=id,po_number,vendor_name,order_date,total_amount,match_status,total_discrepancies');
                 const data = await resp.json();
                 var tbody = document.getElementById('recent-po-body');
                 var pos = data.purchase_orders.slice(0, 5);
@@ -473,7 +474,7 @@ def get_dashboard_v2_html():
         // --- Load Recent Discrepancies ---
         async function loadRecentDiscrepancies() {
             try {
-                const resp = await fetch('/api/v2/discrepancies');
+                const resp = await fetch('/api/v2/discrepancies?fields=match_id,po_number,vendor_name,overall_status,total_discrepancies,amount_delta,summary');
                 const data = await resp.json();
                 var tbody = document.getElementById('recent-disc-body');
                 var discs = data.discrepancies.slice(0, 5);
@@ -504,10 +505,23 @@ def get_dashboard_v2_html():
             }
         }
 
+        // --- Live updates: refresh the cards at most every 5s while documents arrive ---
+        var refreshTimer = null;
+        function scheduleRefresh() {
+            if (refreshTimer) return;
+            refreshTimer = setTimeout(function() {
+                refreshTimer = null;
+                loadStats();
+                loadRecentPOs();
+                loadRecentDiscrepancies();
+            }, 5000);
+        }
+
         // --- Init ---
         loadStats();
         loadRecentPOs();
         loadRecentDiscrepancies();
+        subscribeChanges(scheduleRefresh, scheduleRefresh);
     </script>
 </body>
 </html>"""
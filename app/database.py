@@ -7,8 +7,18 @@ Falls back to in-memory storage when DATABASE_URL is not set.
 import os
 import json
 import uuid
+import bisect
+import contextlib
 from datetime import datetime, timezone
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable
+
+from .event_log import EventLog
+from .cold_storage import ColdBundleUnavailable, ColdStorage
+from .vendor_registry import get_vendor_registry
+from .match_memory import get_match_memory
+from .duplicate_index import DuplicateIndex
+from .rematch import new_match_lines, rematch
+from .discrepancy_engine import flag_duplicates
 
 # ---------------------------------------------------------------------------
 # In-Memory Fallback Store (used when no DATABASE_URL is configured)
@@ -27,147 +37,314 @@ class InMemoryStore:
         self.invoice_line_items: Dict[str, List[Dict]] = {}
         self.match_results: Dict[str, Dict] = {}
         self.match_line_details: Dict[str, List[Dict]] = {}
-        self.document_events: List[Dict] = []
+        self.document_events = EventLog.from_env()
+        # Archived POs moved to cold storage: po_id -> list_pos-style summary
+        # (plus the ids of its slips / invoices / matches), and entity -> po_id
+        self.cold_index: Dict[str, Dict] = {}
+        self._cold_owner: Dict[str, str] = {}
+        self.cold_storage = ColdStorage.from_env()
+        # po_number -> id of the first PO with that number. Rebuilt lazily when
+        # POs were written around save_po (seeding, load_state).
+        self._po_number_index: Dict[str, str] = {}
+        self._po_index_size = 0
+        # (verified_at epoch, po_id, verified_at) sorted oldest first, built on
+        # first use. Entries go stale when a PO leaves 'verified'; readers skip them.
+        self._verified_index: Optional[List[tuple]] = None
+        # po_id -> ids of its matches. Rebuilt lazily when matches were written
+        # or dropped around save_match (seeding, cold storage, load_state).
+        self._match_index: Dict[str, List[str]] = {}
+        self._match_index_size = 0
+        # Invoice / slip keys -> ids of the records saved with them, to flag
+        # duplicates on save (app/duplicate_index.py). Rebuilt by load_state.
+        self.duplicates = DuplicateIndex()
+        # po_id -> {"queued_at", "last_at", "documents": {slip / invoice id: kind}}:
+        # POs whose match needs updating for documents that arrived since
+        # (app/rematch.py), applied by rematch_pending. po_id -> id of the
+        # re-matched result it updates; rebuilt by load_state.
+        self.pending_rematch: Dict[str, Dict] = {}
+        self._rematch_ids: Dict[str, str] = {}
+        # Called as fn(po_id, event_or_None) after every write touching a PO
+        # (app/change_feed.py pushes these to open pages)
+        self.change_listeners: List[Callable[[Optional[str], Optional[Dict]], None]] = []
+        # Bumped on every write, globally and for the PO it touched; ETags for
+        # /api/v2 reads (app/http_cache.py). `epoch` keeps versions from two
+        # processes (or before/after a restart) from ever comparing equal.
+        self.epoch = uuid.uuid4().hex[:12]
+        self.version = 0
+        self.po_versions: Dict[str, int] = {}
+        self._version_floor = 0
+        self._id_factory = lambda: str(uuid.uuid4())
+        self._clock = lambda: datetime.now(timezone.utc).isoformat()
+
+    # -- Ids / timestamps --------------------------------------------------
+    # Every generated id and timestamp goes through these two hooks so a
+    # replica replaying the shared op log (app/shared_state.py) produces the
+    # same ids and timestamps as the worker that originally wrote them.
+
+    def _new_id(self) -> str:
+        return self._id_factory()
+
+    def _now_iso(self) -> str:
+        return self._clock()
+
+    @contextlib.contextmanager
+    def deterministic(self, op_uid: str, now_iso: str):
+        """Derive ids from op_uid and pin "now" while applying one logged operation."""
+        counter = iter(range(1 << 30))
+        namespace = uuid.UUID(op_uid)
+        saved = (self._id_factory, self._clock)
+        self._id_factory = lambda: str(uuid.uuid5(namespace, str(next(counter))))
+        self._clock = lambda: now_iso
+        try:
+            yield
+        finally:
+            self._id_factory, self._clock = saved
 
     # -- Purchase Orders ---------------------------------------------------
 
     def save_po(self, po_data: Dict) -> str:
-        po_id = po_data.get("id", str(uuid.uuid4()))
+        po_id = po_data.get("id") or self._new_id()
         po_data["id"] = po_id
-        po_data.setdefault("uploaded_at", datetime.now(timezone.utc).isoformat())
+        po_data.setdefault("uploaded_at", self._now_iso())
         po_data.setdefault("status", "active")
+        if po_data.get("vendor_name"):
+            po_data["vendor_id"] = get_vendor_registry().register(po_data["vendor_name"])
+        is_new = po_id not in self.purchase_orders
         self.purchase_orders[po_id] = po_data
-        self._log_event(po_data.get("po_number"), "po_uploaded", "po", po_id)
+        if is_new and self._po_index_size == len(self.purchase_orders) - 1:
+            self._po_number_index.setdefault(po_data.get("po_number"), po_id)
+            self._po_index_size += 1
+        self._log_event(po_data.get("po_number"), "po_uploaded", "po", po_id, po_id=po_id)
         return po_id
 
     def save_po_lines(self, po_id: str, lines: List[Dict]):
         self.po_line_items[po_id] = lines
+        self._changed(po_id)
 
     def get_po(self, po_id: str) -> Optional[Dict]:
         po = self.purchase_orders.get(po_id)
         if po:
             po["line_items"] = self.po_line_items.get(po_id, [])
+        elif po_id in self.cold_index:
+            bundle = self._cold_bundle(po_id)
+            if bundle:
+                po = dict(bundle["po"], line_items=bundle["po_lines"])
         return po
 
     def get_po_by_number(self, po_number: str) -> Optional[Dict]:
-        for po in self.purchase_orders.values():
-            if po.get("po_number") == po_number:
-                po["line_items"] = self.po_line_items.get(po["id"], [])
-                return po
+        po_id = self._po_id_for_number(po_number)
+        if po_id is None:
+            return None
+        po = self.purchase_orders[po_id]
+        po["line_items"] = self.po_line_items.get(po_id, [])
+        return po
+
+    def _po_id_for_number(self, po_number: str) -> Optional[str]:
+        po_id = self._po_number_index.get(po_number)
+        if po_id is not None and self.purchase_orders.get(po_id, {}).get("po_number") == po_number:
+            return po_id
+        if po_id is not None or self._po_index_size != len(self.purchase_orders):
+            self._po_number_index = {}
+            for pid, po in self.purchase_orders.items():
+                self._po_number_index.setdefault(po.get("po_number"), pid)
+            self._po_index_size = len(self.purchase_orders)
+            return self._po_number_index.get(po_number)
         return None
 
-    def list_pos(self, status: Optional[str] = None) -> List[Dict]:
+    def list_pos(self, status: Optional[str] = None, po_ids: Optional[List[str]] = None) -> List[Dict]:
+        """PO summaries, newest upload first. `po_ids` limits the scan to those POs."""
         results = []
-        for po_id, po in self.purchase_orders.items():
+        if po_ids is None:
+            hot, cold = self.purchase_orders.items(), self.cold_index.values()
+        else:
+            hot = [(i, self.purchase_orders[i]) for i in po_ids if i in self.purchase_orders]
+            cold = [self.cold_index[i] for i in po_ids if i in self.cold_index]
+        for po_id, po in hot:
             if status and po.get("status") != status:
                 continue
-            po_copy = dict(po)
-            po_copy["line_items"] = self.po_line_items.get(po_id, [])
-            po_copy["slip_count"] = sum(
-                1 for s in self.packing_slips.values() if s.get("po_id") == po_id
-            )
-            po_copy["invoice_count"] = sum(
-                1 for i in self.invoices.values() if i.get("po_id") == po_id
-            )
-            # Find latest match
-            latest_match = None
-            for m in self.match_results.values():
-                if m.get("po_id") == po_id:
-                    if not latest_match or m.get("created_at", "") > latest_match.get("created_at", ""):
-                        latest_match = m
-            po_copy["match_status"] = latest_match.get("overall_status", "unmatched") if latest_match else "unmatched"
-            po_copy["total_discrepancies"] = latest_match.get("total_discrepancies", 0) if latest_match else 0
-            po_copy["amount_delta"] = latest_match.get("amount_delta", 0) if latest_match else 0
-            po_copy["product_line_count"] = len([
-                l for l in po_copy["line_items"] if not l.get("is_tax_line")
-            ])
-            results.append(po_copy)
+            results.append(self._po_summary(po_id, po))
+        # Archived POs in cold storage contribute their precomputed summaries
+        for summary in cold:
+            if status and summary.get("status") != status:
+                continue
+            results.append(dict(summary, line_items=[]))
         return sorted(results, key=lambda x: x.get("uploaded_at", ""), reverse=True)
 
+    def _po_summary(self, po_id: str, po: Dict) -> Dict:
+        po_copy = dict(po)
+        po_copy["line_items"] = self.po_line_items.get(po_id, [])
+        po_copy["slip_count"] = sum(
+            1 for s in self.packing_slips.values() if s.get("po_id") == po_id
+        )
+        po_copy["invoice_count"] = sum(
+            1 for i in self.invoices.values() if i.get("po_id") == po_id
+        )
+        # Find latest match
+        latest_match = None
+        for match_id in self._match_ids_for_po(po_id):
+            m = self.match_results[match_id]
+            if not latest_match or m.get("created_at", "") > latest_match.get("created_at", ""):
+                latest_match = m
+        po_copy["match_status"] = latest_match.get("overall_status", "unmatched") if latest_match else "unmatched"
+        po_copy["total_discrepancies"] = latest_match.get("total_discrepancies", 0) if latest_match else 0
+        po_copy["amount_delta"] = latest_match.get("amount_delta", 0) if latest_match else 0
+        po_copy["product_line_count"] = len([
+            l for l in po_copy["line_items"] if not l.get("is_tax_line")
+        ])
+        return po_copy
+
     # -- Packing Slips -----------------------------------------------------
 
     def save_slip(self, slip_data: Dict) -> str:
-        slip_id = slip_data.get("id", str(uuid.uuid4()))
+        slip_id = slip_data.get("id") or self._new_id()
         slip_data["id"] = slip_id
-        slip_data.setdefault("uploaded_at", datetime.now(timezone.utc).isoformat())
+        slip_data.setdefault("uploaded_at", self._now_iso())
         slip_data.setdefault("status", "pending")
+        if slip_id not in self.packing_slips:
+            self._flag_duplicates("packing_slip", slip_data)
         self.packing_slips[slip_id] = slip_data
         po_number = slip_data.get("po_number_ocr", "")
-        self._log_event(po_number, "slip_uploaded", "slip", slip_id)
+        self._log_event(po_number, "slip_uploaded", "slip", slip_id, po_id=slip_data.get("po_id"))
         return slip_id
 
     def save_slip_lines(self, slip_id: str, lines: List[Dict]):
         self.slip_line_items[slip_id] = lines
+        po_id = self.packing_slips.get(slip_id, {}).get("po_id")
+        self._queue_rematch(po_id, "slip", slip_id)
+        self._changed(po_id)
 
     def get_slip(self, slip_id: str) -> Optional[Dict]:
         slip = self.packing_slips.get(slip_id)
         if slip:
             slip["line_items"] = self.slip_line_items.get(slip_id, [])
+        elif slip_id in self._cold_owner:
+            slip = self._cold_entity("slips", slip_id, "line_items")
         return slip
 
     def get_slips_for_po(self, po_id: str) -> List[Dict]:
-        return [s for s in self.packing_slips.values() if s.get("po_id") == po_id]
+        slips = [s for s in self.packing_slips.values() if s.get("po_id") == po_id]
+        return slips + self._cold_entities(po_id, "slips", "line_items")
 
     # -- Invoices ----------------------------------------------------------
 
     def save_invoice(self, inv_data: Dict) -> str:
-        inv_id = inv_data.get("id", str(uuid.uuid4()))
+        inv_id = inv_data.get("id") or self._new_id()
         inv_data["id"] = inv_id
-        inv_data.setdefault("uploaded_at", datetime.now(timezone.utc).isoformat())
+        inv_data.setdefault("uploaded_at", self._now_iso())
         inv_data.setdefault("status", "pending")
+        if inv_id not in self.invoices:
+            self._flag_duplicates("invoice", inv_data)
         self.invoices[inv_id] = inv_data
         po_number = inv_data.get("po_number_ocr", "")
-        self._log_event(po_number, "invoice_uploaded", "invoice", inv_id)
+        self._log_event(po_number, "invoice_uploaded", "invoice", inv_id, po_id=inv_data.get("po_id"))
         return inv_id
 
     def save_invoice_lines(self, inv_id: str, lines: List[Dict]):
         self.invoice_line_items[inv_id] = lines
+        po_id = self.invoices.get(inv_id, {}).get("po_id")
+        self._queue_rematch(po_id, "invoice", inv_id)
+        self._changed(po_id)
 
     def get_invoice(self, inv_id: str) -> Optional[Dict]:
         inv = self.invoices.get(inv_id)
         if inv:
             inv["line_items"] = self.invoice_line_items.get(inv_id, [])
+        elif inv_id in self._cold_owner:
+            inv = self._cold_entity("invoices", inv_id, "line_items")
         return inv
 
+    def _index_duplicates(self, po_id: str, add: bool):
+        """Add a PO's slips and invoices to the duplicate index, or remove them."""
+        for kind, records in (("packing_slip", self.packing_slips), ("invoice", self.invoices)):
+            for record_id, record in records.items():
+                if record.get("po_id") == po_id:
+                    if add:
+                        self.duplicates.add(kind, record, record_id)
+                    else:
+                        self.duplicates.remove(kind, record, record_id)
+
+    def _flag_duplicates(self, kind: str, record: Dict):
+        """Mark a new slip / invoice that repeats one already saved, then index it."""
+        check = self.duplicates.check(kind, record)
+        if check["duplicate_of"] is not None:
+            record["duplicate_of"] = check["duplicate_of"]
+        if check["near_duplicates"]:
+            record["near_duplicates"] = check["near_duplicates"]
+        self.duplicates.add(kind, record, record["id"])
+
     # -- Match Results -----------------------------------------------------
 
     def save_match(self, match_data: Dict) -> str:
-        match_id = match_data.get("id", str(uuid.uuid4()))
+        match_id = match_data.get("id") or self._new_id()
         match_data["id"] = match_id
-        match_data.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        match_data.setdefault("created_at", self._now_iso())
         self.match_results[match_id] = match_data
+        self._index_match(match_id, match_data.get("po_id"))
         po_number = ""
         po = self.purchase_orders.get(match_data.get("po_id", ""))
         if po:
             po_number = po.get("po_number", "")
         event_type = "match_3way" if match_data.get("match_type") == "3way" else "match_2way"
-        self._log_event(po_number, event_type, "match", match_id)
+        self._log_event(po_number, event_type, "match", match_id, po_id=match_data.get("po_id"))
         return match_id
 
     def save_match_lines(self, match_id: str, lines: List[Dict]):
         self.match_line_details[match_id] = lines
+        match = self.match_results.get(match_id, {})
+        if match.get("overall_status") == "approve":
+            po = self.purchase_orders.get(match.get("po_id", ""))
+            if po:
+                get_match_memory().learn_from_lines(po.get("vendor_name"), lines)
+        self._changed(match.get("po_id"))
 
     def get_match(self, match_id: str) -> Optional[Dict]:
         match = self.match_results.get(match_id)
         if match:
             match["line_details"] = self.match_line_details.get(match_id, [])
+        elif match_id in self._cold_owner:
+            match = self._cold_entity("matches", match_id, "line_details")
         return match
 
+    def match_po_id(self, match_id: str) -> Optional[str]:
+        match = self.match_results.get(match_id)
+        return match.get("po_id") if match else self._cold_owner.get(match_id)
+
+    def _index_match(self, match_id: str, po_id: Optional[str]):
+        match_ids = self._match_index.setdefault(po_id, [])
+        if match_id not in match_ids:
+            match_ids.append(match_id)
+            self._match_index_size += 1
+
+    def _match_ids_for_po(self, po_id: str) -> List[str]:
+        """Ids of the PO's hot matches, without scanning every match."""
+        if self._match_index_size != len(self.match_results):
+            self._match_index = {}
+            for match_id, match in self.match_results.items():
+                self._match_index.setdefault(match.get("po_id"), []).append(match_id)
+            self._match_index_size = len(self.match_results)
+        return [k for k in self._match_index.get(po_id, [])
+                if self.match_results.get(k, {}).get("po_id") == po_id]
+
     def get_matches_for_po(self, po_id: str) -> List[Dict]:
-        matches = [m for m in self.match_results.values() if m.get("po_id") == po_id]
+        matches = [self.match_results[k] for k in self._match_ids_for_po(po_id)]
         for m in matches:
             m["line_details"] = self.match_line_details.get(m["id"], [])
+        matches += self._cold_entities(po_id, "matches", "line_details")
         return sorted(matches, key=lambda x: x.get("created_at", ""), reverse=True)
 
-    def list_discrepancies(self) -> List[Dict]:
+    def list_discrepancies(self, po_ids: Optional[List[str]] = None) -> List[Dict]:
         results = []
+        wanted = set(po_ids) if po_ids is not None else None
         for match in self.match_results.values():
+            if wanted is not None and match.get("po_id") not in wanted:
+                continue
             if match.get("total_discrepancies", 0) > 0 or match.get("overall_status") in ("review", "reject"):
                 entry = dict(match)
                 po = self.purchase_orders.get(match.get("po_id", ""))
                 inv = self.invoices.get(match.get("invoice_id", ""))
                 entry["po_number"] = po.get("po_number", "") if po else ""
                 entry["vendor_name"] = po.get("vendor_name", "") if po else ""
+                entry["vendor_id"] = po.get("vendor_id") if po else None
                 entry["po_total"] = po.get("total_amount", 0) if po else 0
                 entry["invoice_number"] = inv.get("invoice_number", "") if inv else ""
                 entry["invoice_total"] = inv.get("total_amount", 0) if inv else 0
@@ -178,33 +355,389 @@ class InMemoryStore:
                 results.append(entry)
         return sorted(results, key=lambda x: x.get("created_at", ""), reverse=True)
 
-    # -- Document Events ---------------------------------------------------
+    # -- Bulk writes -------------------------------------------------------
+    # For importers: a whole batch is checked, inserted and recorded as one
+    # "bulk_import" event instead of one event (id, timestamp, PO lookup,
+    # notification) per record. Records may carry their lines under the key
+    # the get_* readers attach them as. Invalid records are skipped and
+    # reported rather than raised: these are logged writes, applied the same
+    # way on every replica.
 
-    def _log_event(self, po_number: str, event_type: str, entity_type: str, entity_id: str):
-        po_id = None
-        if po_number:
-            for pid, po in self.purchase_orders.items():
-                if po.get("po_number") == po_number:
-                    po_id = pid
-                    break
-        self.document_events.append({
-            "id": str(uuid.uuid4()),
+    # kind -> (record collection, line collection, line key, timestamp field, initial status)
+    BULK_KINDS = {
+        "po": ("purchase_orders", "po_line_items", "line_items", "uploaded_at", "active"),
+        "slip": ("packing_slips", "slip_line_items", "line_items", "uploaded_at", "pending"),
+        "invoice": ("invoices", "invoice_line_items", "line_items", "uploaded_at", "pending"),
+        "match": ("match_results", "match_line_details", "line_details", "created_at", None),
+    }
+
+    def save_pos_bulk(self, pos: List[Dict]) -> Dict:
+        """
+        Save many POs. Re-importing a cumulative export is expected: a PO
+        whose number is already saved is left alone when nothing in it
+        changed ("unchanged") and updated in place when its fields or lines
+        did ("updated"); an archived PO is left alone. A number repeated in
+        the batch is rejected. Returns {"batch_id", "ids" (None where
+        rejected), "rejected": [{"index", "error"}], "updated": [{"index", "id"}],
+        "unchanged": [{"index", "id"}]}.
+        """
+        return self._save_bulk("po", pos)
+
+    def save_slips_bulk(self, slips: List[Dict]) -> Dict:
+        return self._save_bulk("slip", slips)
+
+    def save_invoices_bulk(self, invoices: List[Dict]) -> Dict:
+        return self._save_bulk("invoice", invoices)
+
+    def save_matches_bulk(self, matches: List[Dict]) -> Dict:
+        return self._save_bulk("match", matches)
+
+    def save_lines_bulk(self, kind: str, lines_by_id: Dict[str, List[Dict]]) -> int:
+        """save_*_lines for many records of one kind; ids not saved are skipped. Returns the number saved."""
+        records, line_field = getattr(self, self.BULK_KINDS[kind][0]), self.BULK_KINDS[kind][1]
+        po_ids = {}
+        saved = 0
+        for record_id, lines in lines_by_id.items():
+            record = records.get(record_id)
+            if record is None or not isinstance(lines, list):
+                continue
+            self._store_lines(kind, record, lines)
+            po_ids[record.get("po_id")] = None
+            saved += 1
+        self._changed_batch(list(po_ids))
+        return saved
+
+    def _save_bulk(self, kind: str, records: List[Dict]) -> Dict:
+        collection_field, _, line_key, time_field, status = self.BULK_KINDS[kind]
+        collection = getattr(self, collection_field)
+        batch_id = self._new_id()
+        now = self._now_iso()
+        cold_numbers = {}
+        if kind == "po":
+            self._po_id_for_number("")  # bring the number index up to date once
+            cold_numbers = {summary.get("po_number"): po_id for po_id, summary in self.cold_index.items()}
+        ids, rejected, po_ids, seen = [], [], {}, set()
+        updated, unchanged, record_events = [], [], []
+        for index, record in enumerate(records):
+            error = self._bulk_error(kind, record, seen)
+            if error:
+                ids.append(None)
+                rejected.append({"index": index, "error": error})
+                continue
+            if kind == "po":
+                existing = self._po_number_index.get(record["po_number"])
+                if existing not in self.purchase_orders:
+                    existing = cold_numbers.get(record["po_number"])
+                if existing is not None:
+                    seen.add(("po_number", record["po_number"]))
+                    ids.append(existing)
+                    if self._reimport_po(existing, record):
+                        updated.append({"index": index, "id": existing})
+                        po_ids[existing] = None
+                        record_events.append(self._bulk_record_event("po_updated", kind, self.purchase_orders[existing],
+                                                                     batch_id, now))
+                    else:
+                        unchanged.append({"index": index, "id": existing})
+                    continue
+            record_id = record.get("id") or self._new_id()
+            seen.add(record_id)
+            record["id"] = record_id
+            record["batch_id"] = batch_id
+            record.setdefault(time_field, now)
+            if status:
+                record.setdefault("status", status)
+            lines = record.pop(line_key, None)
+            is_new = record_id not in collection
+            if kind == "po":
+                seen.add(("po_number", record.get("po_number")))
+                if record.get("vendor_name"):
+                    record["vendor_id"] = get_vendor_registry().register(record["vendor_name"])
+                if record.get("status") == "verified":
+                    self._verified_index = None
+                po_ids[record_id] = None
+            else:
+                if is_new and kind in ("slip", "invoice"):
+                    self._flag_duplicates("packing_slip" if kind == "slip" else "invoice", record)
+                po_ids[record.get("po_id")] = None
+            collection[record_id] = record
+            if kind == "match":
+                self._index_match(record_id, record.get("po_id"))
+            if kind == "po" and is_new and self._po_index_size == len(self.purchase_orders) - 1:
+                self._po_number_index.setdefault(record.get("po_number"), record_id)
+                self._po_index_size += 1
+            if lines is not None:
+                self._store_lines(kind, record, lines)
+            ids.append(record_id)
+            if is_new:
+                record_events.append(self._bulk_record_event(self.BULK_EVENT_TYPES[kind], kind, record, batch_id, now))
+
+        saved = len(ids) - len(rejected) - len(updated) - len(unchanged)
+        # Each record gets its own timeline entry; pages are notified once, by the batch event
+        for record_event in record_events:
+            self.document_events.append(record_event)
+        event = {
+            "id": self._new_id(),
+            "po_id": None,
+            "po_number": "",
+            "event_type": "bulk_import",
+            "event_source": "user",
+            "actor": "system",
+            "entity_type": kind,
+            "entity_id": batch_id,
+            "created_at": now,
+            "batch": {"saved": saved, "rejected": len(rejected), "po_count": len([p for p in po_ids if p])},
+        }
+        if kind == "po":
+            event["batch"].update({"updated": len(updated), "unchanged": len(unchanged)})
+        self.document_events.append(event)
+        self._changed_batch(list(po_ids), [event])
+        result = {"batch_id": batch_id, "ids": ids, "rejected": rejected}
+        if kind == "po":
+            result.update({"updated": updated, "unchanged": unchanged})
+        return result
+
+    # Per-record timeline entries of a bulk save, named like the single saves'
+    BULK_EVENT_TYPES = {"po": "po_uploaded", "slip": "slip_uploaded", "invoice": "invoice_uploaded", "match": "match_2way"}
+
+    def _bulk_record_event(self, event_type: str, kind: str, record: Dict, batch_id: str, now: str) -> Dict:
+        if kind == "match" and record.get("match_type") == "3way":
+            event_type = "match_3way"
+        po_id = record["id"] if kind == "po" else record.get("po_id")
+        po_number = record.get("po_number") if kind == "po" else record.get("po_number_ocr")
+        if not po_number and po_id in self.purchase_orders:
+            po_number = self.purchase_orders[po_id].get("po_number")
+        return {
+            "id": self._new_id(),
             "po_id": po_id,
+            "po_number": po_number or "",
+            "event_type": event_type,
+            "event_source": "user",
+            "actor": "system",
+            "entity_type": kind,
+            "entity_id": record["id"],
+            "created_at": now,
+            "batch_id": batch_id,
+        }
+
+    def _reimport_po(self, po_id: str, record: Dict) -> bool:
+        """Apply a re-imported PO to the saved one. False when nothing changed (or it is archived)."""
+        stored = self.purchase_orders.get(po_id)
+        if stored is None:
+            return False
+        lines = record.get("line_items")
+        fields = {k: v for k, v in record.items() if k not in ("id", "batch_id", "uploaded_at", "status", "line_items")}
+        lines_changed = lines is not None and lines != self.po_line_items.get(po_id, [])
+        if not lines_changed and all(stored.get(k) == v for k, v in fields.items()):
+            return False
+        record.pop("line_items", None)
+        record["id"] = po_id
+        stored.update(fields)
+        if fields.get("vendor_name"):
+            stored["vendor_id"] = get_vendor_registry().register(fields["vendor_name"])
+        if lines_changed:
+            self.po_line_items[po_id] = lines
+            self._rematch_from_scratch(po_id)
+        return True
+
+    def _rematch_from_scratch(self, po_id: str):
+        """The PO's lines were replaced: drop its re-matched result and queue a fresh one."""
+        match_id = self._rematch_ids.pop(po_id, None)
+        if match_id:
+            self.match_results.pop(match_id, None)
+            self.match_line_details.pop(match_id, None)
+        for kind, records in (("slip", self.packing_slips), ("invoice", self.invoices)):
+            for doc_id, doc in records.items():
+                if doc.get("po_id") == po_id:
+                    # With no re-matched result, the next re-match starts over from every document
+                    self._queue_rematch(po_id, kind, doc_id)
+                    return
+
+    def _bulk_error(self, kind: str, record: Any, seen: set) -> Optional[str]:
+        if not isinstance(record, dict):
+            return "not an object"
+        if record.get("id") and record["id"] in seen:
+            return "id repeated in batch"
+        if kind == "po":
+            po_number = record.get("po_number")
+            if not po_number:
+                return "missing po_number"
+            if ("po_number", po_number) in seen:
+                return "po_number repeated in batch"
+        elif record.get("po_id") and record["po_id"] not in self.purchase_orders and record["po_id"] not in self.cold_index:
+            return "unknown po_id"
+        line_key = self.BULK_KINDS[kind][2]
+        if line_key in record and not isinstance(record[line_key], list):
+            return line_key + " is not a list"
+        return None
+
+    def _store_lines(self, kind: str, record: Dict, lines: List[Dict]):
+        """The save_*_lines bookkeeping, minus the change notification."""
+        getattr(self, self.BULK_KINDS[kind][1])[record["id"]] = lines
+        if kind in ("slip", "invoice"):
+            self._queue_rematch(record.get("po_id"), kind, record["id"])
+        elif kind == "match" and record.get("overall_status") == "approve":
+            po = self.purchase_orders.get(record.get("po_id", ""))
+            if po:
+                get_match_memory().learn_from_lines(po.get("vendor_name"), lines)
+
+    # -- Incremental re-match (app/rematch.py) -----------------------------
+
+    def _queue_rematch(self, po_id: Optional[str], kind: str, doc_id: str):
+        if not po_id or po_id not in self.purchase_orders:
+            return
+        now = self._now_iso()
+        entry = self.pending_rematch.setdefault(po_id, {"queued_at": now, "documents": {}})
+        entry["last_at"] = now
+        # Replaced, not mutated, so a snapshot being written never sees it
+        # change. A document saved again moves to the end: applied once, last.
+        documents = {k: v for k, v in entry["documents"].items() if k != doc_id}
+        documents[doc_id] = kind
+        entry["documents"] = documents
+
+    def rematch_due(self, quiet_before: str) -> List[str]:
+        """Queued POs whose last document arrived before quiet_before (ISO timestamp)."""
+        return [po_id for po_id, entry in self.pending_rematch.items() if entry["last_at"] < quiet_before]
+
+    def rematch_pending(self, po_ids: List[str]) -> int:
+        """
+        Apply the documents queued for these POs to their match results. A
+        logged write (app/shared_state.py): every replica applies it in log
+        order, and a PO already applied by another worker is skipped.
+        """
+        events = []
+        for po_id in po_ids:
+            entry = self.pending_rematch.pop(po_id, None)
+            if entry is None or po_id not in self.purchase_orders:
+                continue
+            events.append(self._rematch_po(po_id, entry["documents"]))
+        # One "rematch" event per PO, but one notification round for the batch
+        for event in events:
+            self.document_events.append(event)
+        if events:
+            self._changed_batch([e["po_id"] for e in events], events)
+        return len(events)
+
+    def _rematch_po(self, po_id: str, queued: Dict[str, str]) -> Dict:
+        """Update one PO's re-matched result; returns its "rematch" event for the caller to log."""
+        po = self.get_po(po_id)
+        match_id = self._rematch_ids.get(po_id)
+        match = self.match_results.get(match_id) if match_id else None
+        if match is None:
+            # First re-match for this PO: start from its PO lines and apply
+            # every slip (partial deliveries) and the newest invoice
+            match = {"id": self._new_id(), "po_id": po_id, "created_at": self._now_iso(), "slip_ids": []}
+            lines = new_match_lines(po)
+            slips = sorted(self.get_slips_for_po(po_id), key=lambda x: x.get("uploaded_at", ""))
+            invoices = sorted((i for i in self.invoices.values() if i.get("po_id") == po_id),
+                              key=lambda x: x.get("uploaded_at", ""))
+            documents = [("slip", self.get_slip(s["id"])) for s in slips]
+            documents += [("invoice", self.get_invoice(invoices[-1]["id"]))] if invoices else []
+        else:
+            # Updated on copies, for the same reason
+            match = dict(match, slip_ids=list(match.get("slip_ids", [])))
+            match.pop("line_details", None)
+            lines = [dict(d, slip_shipments=dict(d["slip_shipments"])) if "slip_shipments" in d else dict(d)
+                     for d in self.match_line_details.get(match["id"], [])]
+            documents = []
+            for doc_id, kind in queued.items():
+                doc = self.get_slip(doc_id) if kind == "slip" else self.get_invoice(doc_id)
+                if doc and doc.get("po_id") == po_id:
+                    documents.append((kind, doc))
+
+        diff = rematch(po, match, lines, documents, memory=get_match_memory().for_vendor(po.get("vendor_name")))
+        flag_duplicates(match, [("packing_slip", self.packing_slips.get(slip_id)) for slip_id in match["slip_ids"]]
+                        + [("invoice", self.invoices.get(match.get("invoice_id") or ""))])
+        diff["overall_status"][1] = match["overall_status"]
+        match["rematched_at"] = self._now_iso()
+        self.match_results[match["id"]] = match
+        self._index_match(match["id"], po_id)
+        self.match_line_details[match["id"]] = lines
+        self._rematch_ids[po_id] = match["id"]
+        if match["overall_status"] == "approve":
+            get_match_memory().learn_from_lines(po.get("vendor_name"), lines)
+        return {
+            "id": self._new_id(),
+            "po_id": po_id,
+            "po_number": po.get("po_number", ""),
+            "event_type": "rematch",
+            "event_source": "user",
+            "actor": "system",
+            "entity_type": "match",
+            "entity_id": match["id"],
+            "created_at": self._now_iso(),
+            "rematch": diff,
+        }
+
+    # -- Document Events ---------------------------------------------------
+
+    def _log_event(self, po_number: str, event_type: str, entity_type: str, entity_id: str,
+                   po_id: Optional[str] = None, details: Optional[Dict] = None):
+        """
+        Record a document event. `po_id` is the document's linked PO, used for
+        change notifications; `details` are extra fields kept on the event.
+        """
+        event_po_id = self._po_id_for_number(po_number) if po_number else None
+        event = {
+            "id": self._new_id(),
+            "po_id": event_po_id,
             "po_number": po_number,
             "event_type": event_type,
             "event_source": "user",
             "actor": "system",
             "entity_type": entity_type,
             "entity_id": entity_id,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-        })
+            "created_at": self._now_iso(),
+        }
+        if details:
+            event.update(details)
+        self.document_events.append(event)
+        self._changed(po_id or event_po_id, event)
+        if po_id and event_po_id and event_po_id != po_id:
+            # The event also lands on the timeline of the PO its number matched
+            self._changed(event_po_id)
+
+    def _changed(self, po_id: Optional[str], event: Optional[Dict] = None):
+        self.version += 1
+        if po_id:
+            self.po_versions[po_id] = self.version
+        for listener in self.change_listeners:
+            listener(po_id, event)
+
+    def _changed_batch(self, po_ids: List[Optional[str]], events: List[Dict] = ()):
+        """_changed for a bulk write: one version for the batch; listeners still hear every PO and event."""
+        self.version += 1
+        for po_id in po_ids:
+            if po_id:
+                self.po_versions[po_id] = self.version
+        for listener in self.change_listeners:
+            for po_id in po_ids:
+                if po_id:
+                    listener(po_id, None)
+            for event in events:
+                listener(None, event)
+
+    def po_version(self, po_id: str) -> int:
+        """Version of the last write to this PO or anything linked to it."""
+        return max(self.po_versions.get(po_id, 0), self._version_floor)
 
     def get_timeline_for_po(self, po_id: str) -> List[Dict]:
-        events = [e for e in self.document_events if e.get("po_id") == po_id]
-        return sorted(events, key=lambda x: x.get("created_at", ""))
+        events = self.document_events.timeline(po_id)
+        if po_id in self.cold_index:
+            bundle = self._cold_bundle(po_id)
+            events = sorted((bundle["events"] if bundle else []) + events, key=lambda x: x.get("created_at", ""))
+        return events
 
     def get_all_events(self) -> List[Dict]:
-        return sorted(self.document_events, key=lambda x: x.get("created_at", ""), reverse=True)
+        return self.document_events.recent()
+
+    def get_recent_events(self, limit: int = 50, event_type: Optional[str] = None) -> List[Dict]:
+        """Newest events first, without materializing the whole log."""
+        return self.document_events.recent(limit, event_type=event_type)
+
+    def get_events_between(self, since: Optional[str], until: Optional[str],
+                           event_type: Optional[str] = None, po_id: Optional[str] = None) -> List[Dict]:
+        """Events with since <= created_at < until (ISO timestamps), oldest first."""
+        return self.document_events.between(since, until, event_type=event_type, po_id=po_id)
 
     # -- Lifecycle / Archive -----------------------------------------------
 
@@ -219,34 +752,252 @@ class InMemoryStore:
             old_status = store[entity_id].get("status")
             store[entity_id]["status"] = new_status
             if new_status == "verified":
-                store[entity_id]["verified_at"] = datetime.now(timezone.utc).isoformat()
+                store[entity_id]["verified_at"] = self._now_iso()
+                if entity_type == "po" and self._verified_index is not None:
+                    entry = _verified_entry(entity_id, store[entity_id]["verified_at"])
+                    if entry:
+                        bisect.insort(self._verified_index, entry)
+            if entity_type == "po" and (new_status == "archived") != (old_status == "archived"):
+                # An archived PO's documents are not something a new upload can repeat
+                self._index_duplicates(entity_id, new_status != "archived")
             if new_status == "archived":
-                store[entity_id]["archived_at"] = datetime.now(timezone.utc).isoformat()
+                store[entity_id]["archived_at"] = self._now_iso()
+                if entity_type == "po" and self.cold_storage:
+                    self._move_to_cold(entity_id)
+            if entity_type == "po":
+                if new_status == "verified":
+                    self._learn_from_verified(entity_id, store[entity_id])
+                self._changed(entity_id)
+            else:
+                for po_id in self._linked_po_ids(entity_type, entity_id, store[entity_id]):
+                    self._changed(po_id)
+        elif entity_type == "po" and entity_id in self.cold_index and new_status != "archived":
+            # Un-archiving: bring the bundle back into the hot dicts first.
+            # Raises ColdBundleUnavailable, leaving the PO archived, if it can't
+            self._restore_from_cold(entity_id)
+            self.update_status(entity_type, entity_id, new_status)
+
+    def _learn_from_verified(self, po_id: str, po: Dict):
+        """AP verified the PO: remember its vendor's other names and its line pairings."""
+        self._learn_vendor_aliases(po_id, po)
+        memory = get_match_memory()
+        for match_id in self._match_ids_for_po(po_id):
+            # A match held for a duplicate document teaches nothing
+            if not self.match_results[match_id].get("duplicates"):
+                memory.learn_from_lines(po.get("vendor_name"), self.match_line_details.get(match_id, []),
+                                        matched_only=False)
+
+    def _learn_vendor_aliases(self, po_id: str, po: Dict):
+        """Its slips' and invoices' vendor names are names of the PO's vendor."""
+        vendor_id = po.get("vendor_id")
+        if not vendor_id:
+            return
+        vendors = get_vendor_registry()
+        for records in (self.packing_slips, self.invoices):
+            for record in records.values():
+                if record.get("po_id") == po_id and record.get("vendor_name"):
+                    vendors.learn(record["vendor_name"], vendor_id)
 
-    def get_archive_candidates(self, days: int = 30) -> List[Dict]:
-        """Return POs in 'verified' status older than `days` days."""
+    def _linked_po_ids(self, entity_type: str, entity_id: str, record: Dict) -> List[Optional[str]]:
+        """The slip / invoice's own po_id plus any PO that reaches it through a match."""
+        key = "slip_id" if entity_type == "slip" else "invoice_id"
+        po_ids = [record.get("po_id")]
+        for match in self.match_results.values():
+            if match.get(key) == entity_id and match.get("po_id") not in po_ids:
+                po_ids.append(match.get("po_id"))
+        return po_ids
+
+    def get_archive_candidates(self, days: int = 30, limit: Optional[int] = None) -> List[Dict]:
+        """Return POs in 'verified' status older than `days` days, oldest verification first."""
         cutoff = datetime.now(timezone.utc).timestamp() - (days * 86400)
-        candidates = []
-        for po in self.purchase_orders.values():
-            if po.get("status") == "verified":
-                verified = po.get("verified_at", "")
-                if verified:
-                    try:
-                        vt = datetime.fromisoformat(verified.replace("Z", "+00:00")).timestamp()
-                        if vt < cutoff:
-                            candidates.append(po)
-                    except (ValueError, TypeError):
-                        pass
+        if self._verified_index is None:
+            self._rebuild_verified_index()
+        index = self._verified_index
+        end = bisect.bisect_left(index, (cutoff,))
+        candidates, stale = [], []
+        for position in range(end):
+            _, po_id, verified = index[position]
+            po = self.purchase_orders.get(po_id)
+            if not po or po.get("status") != "verified" or po.get("verified_at") != verified:
+                stale.append(position)
+                continue
+            candidates.append(po)
+            if limit is not None and len(candidates) >= limit:
+                break
+        for position in reversed(stale):
+            del index[position]
         return candidates
 
+    def _rebuild_verified_index(self):
+        entries = []
+        for po_id, po in self.purchase_orders.items():
+            if po.get("status") == "verified" and po.get("verified_at"):
+                entry = _verified_entry(po_id, po["verified_at"])
+                if entry:
+                    entries.append(entry)
+        self._verified_index = sorted(entries)
+
     def batch_archive(self, po_ids: List[str]) -> int:
         count = 0
         for po_id in po_ids:
-            if po_id in self.purchase_orders:
+            # Already-archived POs are skipped so a repeated request (or two
+            # workers' maintenance runs) doesn't re-stamp archived_at
+            if po_id in self.purchase_orders and self.purchase_orders[po_id].get("status") != "archived":
                 self.update_status("po", po_id, "archived")
                 count += 1
         return count
 
+    # -- Cold storage (app/cold_storage.py) --------------------------------
+
+    def _move_to_cold(self, po_id: str):
+        """Write an archived PO's whole bundle to cold storage and drop it from the hot dicts."""
+        summary = self._po_summary(po_id, self.purchase_orders[po_id])
+        summary.pop("line_items", None)
+        slip_ids = [k for k, s in self.packing_slips.items() if s.get("po_id") == po_id]
+        inv_ids = [k for k, i in self.invoices.items() if i.get("po_id") == po_id]
+        match_ids = self._match_ids_for_po(po_id)
+
+        def strip(record, attached):
+            return {k: v for k, v in record.items() if k != attached}
+
+        bundle = {
+            "po": strip(self.purchase_orders[po_id], "line_items"),
+            "po_lines": self.po_line_items.get(po_id, []),
+            "slips": [{"record": strip(self.packing_slips[k], "line_items"), "lines": self.slip_line_items.get(k, [])} for k in slip_ids],
+            "invoices": [{"record": strip(self.invoices[k], "line_items"), "lines": self.invoice_line_items.get(k, [])} for k in inv_ids],
+            "matches": [{"record": strip(self.match_results[k], "line_details"), "lines": self.match_line_details.get(k, [])} for k in match_ids],
+            "events": self.document_events.extract(po_id),
+        }
+        try:
+            self.cold_storage.write(po_id, bundle)
+        except OSError as e:
+            # Leave the PO hot (and archived) rather than lose it
+            print("[VerifyAP] Cold storage: keeping PO " + po_id + " in memory: " + str(e))
+            for event in bundle["events"]:
+                self.document_events.append(event)
+            return
+
+        del self.purchase_orders[po_id]
+        self.po_line_items.pop(po_id, None)
+        for ids, records, lines in ((slip_ids, self.packing_slips, self.slip_line_items),
+                                    (inv_ids, self.invoices, self.invoice_line_items),
+                                    (match_ids, self.match_results, self.match_line_details)):
+            for k in ids:
+                del records[k]
+                lines.pop(k, None)
+                self._cold_owner[k] = po_id
+        summary.update({"cold": True, "slip_ids": slip_ids, "invoice_ids": inv_ids, "match_ids": match_ids})
+        self.cold_index[po_id] = summary
+
+    def _restore_from_cold(self, po_id: str):
+        bundle = self._cold_bundle(po_id)
+        if not bundle:
+            # Leave the PO archived rather than drop it and its documents
+            raise ColdBundleUnavailable("cannot read the archived bundle for PO " + po_id)
+        summary = self.cold_index.pop(po_id)
+        for k in summary["slip_ids"] + summary["invoice_ids"] + summary["match_ids"]:
+            self._cold_owner.pop(k, None)
+        self.purchase_orders[po_id] = bundle["po"]
+        self.po_line_items[po_id] = bundle["po_lines"]
+        for key, records, lines in (("slips", self.packing_slips, self.slip_line_items),
+                                    ("invoices", self.invoices, self.invoice_line_items),
+                                    ("matches", self.match_results, self.match_line_details)):
+            for item in bundle[key]:
+                records[item["record"]["id"]] = item["record"]
+                lines[item["record"]["id"]] = item["lines"]
+                if key == "matches":
+                    self._index_match(item["record"]["id"], po_id)
+        for event in bundle["events"]:
+            self.document_events.append(event)
+        # The file stays: other workers may apply this op later, and a WAL
+        # replay on top of an older snapshot reads it again. Archiving the PO
+        # again overwrites it with the same path.
+        self.cold_storage.forget(po_id)
+
+    def _cold_bundle(self, po_id: str) -> Optional[Dict]:
+        return self.cold_storage.read(po_id) if self.cold_storage else None
+
+    def _cold_entity(self, key: str, entity_id: str, attach: str) -> Optional[Dict]:
+        bundle = self._cold_bundle(self._cold_owner[entity_id])
+        for item in (bundle or {}).get(key, []):
+            if item["record"]["id"] == entity_id:
+                return dict(item["record"], **{attach: item["lines"]})
+        return None
+
+    def _cold_entities(self, po_id: str, key: str, attach: str) -> List[Dict]:
+        if po_id not in self.cold_index:
+            return []
+        bundle = self._cold_bundle(po_id)
+        return [dict(item["record"], **{attach: item["lines"]}) for item in (bundle or {}).get(key, [])]
+
+    # -- Snapshots (app/persistence.py) ------------------------------------
+
+    STATE_FIELDS = (
+        "purchase_orders", "po_line_items", "packing_slips", "slip_line_items",
+        "invoices", "invoice_line_items", "match_results", "match_line_details",
+        "cold_index", "pending_rematch",
+    )
+
+    def dump_state(self) -> Dict[str, Any]:
+        """
+        JSON-able copy of every collection. Records are shallow-copied (dict()
+        is atomic under the GIL) without the line_items / line_details that
+        the get_* readers attach, so a reader thread can't resize a dict while
+        it is being serialized.
+        """
+        state = {}
+        for field in self.STATE_FIELDS:
+            records = getattr(self, field)
+            if field.endswith("line_items") or field == "match_line_details":
+                state[field] = dict(records)
+            else:
+                state[field] = {}
+                for key, record in list(records.items()):
+                    record = dict(record)
+                    record.pop("line_items", None)
+                    record.pop("line_details", None)
+                    state[field][key] = record
+        state["document_events"] = self.document_events.dump()
+        return state
+
+    def load_state(self, state: Dict[str, Any]):
+        for field in self.STATE_FIELDS:
+            setattr(self, field, state.get(field, {}))
+        self.document_events.load(state.get("document_events", []))
+        self._cold_owner = {}
+        for po_id, summary in self.cold_index.items():
+            for k in summary.get("slip_ids", []) + summary.get("invoice_ids", []) + summary.get("match_ids", []):
+                self._cold_owner[k] = po_id
+        self._po_number_index = {}
+        self._po_index_size = -1
+        self._verified_index = None
+        self._match_index_size = -1
+        self.duplicates.clear()
+        archived = {po_id for po_id, po in self.purchase_orders.items() if po.get("status") == "archived"}
+        for slip_id, slip in self.packing_slips.items():
+            if slip.get("po_id") not in archived:
+                self.duplicates.add("packing_slip", slip, slip_id)
+        for inv_id, inv in self.invoices.items():
+            if inv.get("po_id") not in archived:
+                self.duplicates.add("invoice", inv, inv_id)
+        self._rematch_ids = {}
+        for match_id, match in sorted(self.match_results.items(), key=lambda x: x[1].get("created_at", "")):
+            if match.get("incremental"):
+                self._rematch_ids[match["po_id"]] = match_id
+        # Everything may have changed: no version handed out before is valid
+        self.version += 1
+        self._version_floor = self.version
+
+
+def _verified_entry(po_id: str, verified_at: str) -> Optional[tuple]:
+    try:
+        ts = datetime.fromisoformat(verified_at.replace("Z", "+00:00"))
+    except (ValueError, TypeError, AttributeError):
+        return None
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts.timestamp(), po_id, verified_at)
+
 
 # ---------------------------------------------------------------------------
 # Global store instance
@@ -254,6 +1005,12 @@ class InMemoryStore:
 
 _db: Optional[InMemoryStore] = None
 
+def set_db(store) -> None:
+    """Replace the process-wide store (e.g. with a replicated wrapper)."""
+    global _db
+    _db = store
+
+
 def get_db() -> InMemoryStore:
     """Return the database store. Creates it on first call."""
     global _db
@@ -316,9 +316,11 @@ def get_deliveries_html():
             fileInput.value = '';
         });
 
-        uploadBtn.addEventListener('click', function() {
-            if (!selectedFileData) return;
+        uploadBtn.addEventListener('click', function() { uploadSelected(null); });
 
+        // similar: null, or 'reuse' / 'extract' after a similar_photo prompt
+        function uploadSelected(similar) {
+            if (!selectedFileData) return;
             uploadBtn.disabled = true;
             loadingSpinner.classList.add('show');
             errorMsg.classList.remove('show');
@@ -327,28 +329,109 @@ def get_deliveries_html():
             var formData = new FormData();
             formData.append('file', selectedFileData);
 
-            fetch('/api/upload-packing-slip', {
-                method: 'POST',
-                body: formData
-            })
-            .then(function(res) { return res.json(); })
-            .then(function(data) {
-                loadingSpinner.classList.remove('show');
-                if (data.success) {
-                    displayResults(data);
-                } else {
-                    errorMsg.textContent = 'Error: ' + (data.error || 'Unknown error');
+            liveFields = {};
+            livePo = null;
+            liveItems = [];
+
+            var url = '/api/upload-packing-slip/stream' + (similar ? '?similar=' + similar : '');
+            fetch(url, { method: 'POST', body: formData })
+                .then(function(res) { return readEventStream(res, handleStreamEvent); })
+                .then(function() { uploadBtn.disabled = false; })
+                .catch(function(err) {
+                    loadingSpinner.classList.remove('show');
+                    errorMsg.textContent = 'Network error: ' + err.message;
                     errorMsg.classList.add('show');
-                }
-                uploadBtn.disabled = false;
-            })
-            .catch(function(err) {
+                    uploadBtn.disabled = false;
+                });
+        }
+
+        var liveFields = {};
+        var livePo = null;
+        var liveItems = [];
+
+        function readEventStream(res, onEvent) {
+            var reader = res.body.getReader();
+            var decoder = new TextDecoder();
+            var buffer = '';
+            function pump() {
+                return reader.read().then(function(chunk) {
+                    if (chunk.done) {
+                        if (buffer.trim()) onEvent(JSON.parse(buffer));
+                        return;
+                    }
+                    buffer += decoder.decode(chunk.value, { stream: true });
+                    var lines = buffer.split('\\n');
+                    buffer = lines.pop();
+                    for (var i = 0; i < lines.length; i++) {
+                        if (lines[i].trim()) onEvent(JSON.parse(lines[i]));
+                    }
+                    return pump();
+                });
+            }
+            return pump();
+        }
+
+        function handleStreamEvent(evt) {
+            if (evt.event === 'field') {
+                liveFields[evt.name] = evt.value;
+                renderLive();
+            } else if (evt.event === 'po_lookup') {
+                livePo = evt;
+                renderLive();
+            } else if (evt.event === 'item') {
+                liveItems.push(evt.item);
+                renderLive();
+            } else if (evt.event === 'complete') {
+                loadingSpinner.classList.remove('show');
+                displayResults(evt);
+            } else if (evt.event === 'similar_photo') {
                 loadingSpinner.classList.remove('show');
-                errorMsg.textContent = 'Network error: ' + err.message;
+                askSimilarPhoto(evt);
+            } else if (evt.event === 'error') {
+                loadingSpinner.classList.remove('show');
+                errorMsg.textContent = 'Error: ' + (evt.error || 'Unknown error');
                 errorMsg.classList.add('show');
-                uploadBtn.disabled = false;
-            });
-        });
+            }
+        }
+
+        function askSimilarPhoto(evt) {
+            var html = '<div class="result-card">';
+            html += '<h3>Already uploaded? <span class="result-badge badge-review">SIMILAR PHOTO</span></h3>';
+            html += '<p style="margin:12px 0;">' + (evt.message || '') + ' (' + evt.similar_photo.distance + ' of 64 bits differ)</p>';
+            html += '<button class="upload-btn" onclick="uploadSelected(\\'reuse\\')">Use earlier result</button> ';
+            html += '<button class="upload-btn" onclick="uploadSelected(\\'extract\\')">Extract anyway</button>';
+            html += '</div>';
+            resultsArea.innerHTML = html;
+            resultsArea.classList.add('show');
+        }
+
+        function renderLive() {
+            var html = '<div class="result-card">';
+            html += '<h3>Extracting&hellip; <span class="result-badge badge-review">LIVE</span></h3>';
+            html += '<table class="result-table">';
+            html += '<tr><th>Field</th><th>Value</th></tr>';
+            html += '<tr><td>PO Number</td><td>' + (liveFields.po_number || '&hellip;') + '</td></tr>';
+            html += '<tr><td>Vendor</td><td>' + (liveFields.vendor || '&hellip;') + '</td></tr>';
+            if (livePo) {
+                html += '<tr><td>PO on File</td><td>' + (livePo.found ? 'Yes &mdash; ' + (livePo.vendor || '') + ' (' + livePo.items.length + ' lines)' : 'Not found') + '</td></tr>';
+            }
+            html += '</table>';
+
+            if (liveItems.length > 0) {
+                html += '<h3 style="margin-top:20px;">Line Items (' + liveItems.length + ' so far)</h3>';
+                html += '<table class="result-table">';
+                html += '<tr><th>Description</th><th>Qty</th></tr>';
+                for (var i = 0; i < liveItems.length; i++) {
+                    var item = liveItems[i];
+                    html += '<tr><td>' + (item.description || item.item || 'N/A') + '</td><td>' + (item.quantity || 'N/A') + '</td></tr>';
+                }
+                html += '</table>';
+            }
+
+            html += '</div>';
+            resultsArea.innerHTML = html;
+            resultsArea.classList.add('show');
+        }
 
         function displayResults(data) {
             var d = data.data || {};
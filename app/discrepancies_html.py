@@ -6,6 +6,7 @@ Rows click through to the full match detail / line comparison view.
 """
 
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
+from .live_updates import get_live_updates_script
 
 
 def get_discrepancy_list_html():
@@ -103,23 +104,51 @@ def get_discrepancy_list_html():
             </table>
         </div>
     </div>
-
+    """ + get_live_updates_script() + """
     <script>
+        // Only the columns the table renders
+        var DISC_FIELDS = 'match_id,po_number,vendor_name,invoice_number,overall_status,total_discrepancies,amount_delta,po_id,matched_at,discrepancy_lines.discrepancy_type';
         var currentSeverity = '';
+        var allDiscs = [];
 
         async function loadDiscrepancies() {
             try {
-                var url = '/api/v2/discrepancies';
-                if (currentSeverity) url += '?severity=' + currentSeverity;
+                var url = '/api/v2/discrepancies?fields=' + DISC_FIELDS;
+                if (currentSeverity) url += '&severity=' + currentSeverity;
                 var resp = await fetch(url);
                 var data = await resp.json();
-                document.getElementById('result-count').textContent = data.count + ' discrepanc' + (data.count !== 1 ? 'ies' : 'y');
-                renderTable(data.discrepancies);
+                allDiscs = data.discrepancies;
+                showDiscrepancies();
             } catch (e) {
                 console.error('Failed to load:', e);
             }
         }
 
+        function showDiscrepancies() {
+            document.getElementById('result-count').textContent = allDiscs.length + ' discrepanc' + (allDiscs.length !== 1 ? 'ies' : 'y');
+            renderTable(allDiscs);
+        }
+
+        // Live updates: re-fetch only the changed POs' matches
+        async function applyChanges(msg) {
+            var ids = changedIds(msg);
+            if (ids === null) return loadDiscrepancies();
+            if (ids.length === 0) return;
+            var url = '/api/v2/discrepancies?fields=' + DISC_FIELDS + '&po_ids=' + ids.join(',');
+            if (currentSeverity) url += '&severity=' + currentSeverity;
+            try {
+                var resp = await fetch(url);
+                var data = await resp.json();
+                var changed = {};
+                for (var i = 0; i < ids.length; i++) changed[ids[i]] = true;
+                allDiscs = allDiscs.filter(function(d) { return !changed[d.po_id]; }).concat(data.discrepancies);
+                allDiscs.sort(function(a, b) { return (b.matched_at || '').localeCompare(a.matched_at || ''); });
+                showDiscrepancies();
+            } catch (e) {
+                console.error('Failed to apply changes:', e);
+            }
+        }
+
         function renderTable(discs) {
             var tbody = document.getElementById('disc-tbody');
             if (discs.length === 0) {
@@ -171,6 +200,7 @@ def get_discrepancy_list_html():
         }
 
         loadDiscrepancies();
+        subscribeChanges(applyChanges, loadDiscrepancies);
     </script>
 </body>
 </html>"""
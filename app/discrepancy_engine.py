@@ -4,7 +4,8 @@ VerifyAP — Discrepancy Engine v2.0
 Performs 3-way matching (PO vs Packing Slip vs Invoice) with real-world
 awareness of pharmaceutical document quirks:
 
-  1. Fuzzy description matching (product names vary across documents)
+  1. Item number / NDC join first, then fuzzy description matching for the
+     rest (product names vary across documents)
   2. Tax lines appear on PO + Invoice but NOT on packing slips
   3. Zero-cost bundled items (e.g. sterile diluent syringes shipped with
      Proquad) appear on slip + invoice but NOT on PO
@@ -23,6 +24,12 @@ import uuid
 from datetime import datetime, timezone
 from typing import List, Dict, Optional, Tuple
 from difflib import SequenceMatcher
+from functools import lru_cache
+
+from .metrics import record_cache
+from .item_join import join_by_item
+from .duplicate_index import duplicate_discrepancies, duplicate_severity
+from .match_memory import get_match_memory
 
 
 # ---------------------------------------------------------------------------
@@ -55,6 +62,7 @@ BUNDLED_PATTERNS = [
 ]
 
 
+@lru_cache(maxsize=4096)
 def normalize_description(desc: str) -> str:
     """Lowercase, strip whitespace, collapse spaces, remove special chars."""
     if not desc:
@@ -99,9 +107,26 @@ def fuzzy_match_score(desc_a: str, desc_b: str) -> float:
     return SequenceMatcher(None, norm_a, norm_b).ratio()
 
 
-def find_best_match(target: Dict, candidates: List[Dict], threshold: float = 0.5) -> Optional[Tuple[Dict, float]]:
-    """Find the best-matching line item from candidates for a target line."""
+def find_best_match(target: Dict, candidates: List[Dict], threshold: float = 0.5,
+                    memory: Optional[Dict[str, str]] = None) -> Optional[Tuple[Dict, float]]:
+    """Find the best-matching line item from candidates for a target line.
+
+    `memory` maps normalized candidate text to the normalized target
+    description it was paired with before (app/match_memory.py). An
+    identical description or a remembered pairing wins without fuzzy scoring.
+    """
     target_desc = target.get("description", "")
+    target_norm = normalize_description(target_desc)
+    if target_norm:
+        for cand in candidates:
+            cand_norm = normalize_description(cand.get("description", ""))
+            if cand_norm == target_norm:
+                return (cand, 1.0)
+            if memory and memory.get(cand_norm) == target_norm:
+                record_cache("match_memory", True)
+                return (cand, 1.0)
+        if memory:
+            record_cache("match_memory", False)
     best = None
     best_score = 0.0
     for cand in candidates:
@@ -122,6 +147,7 @@ def run_3way_match(
     po: Dict,
     slip: Optional[Dict],
     invoice: Optional[Dict],
+    memory: Optional[Dict[str, str]] = None,
 ) -> Dict:
     """
     Run a full 3-way match and return structured results with
@@ -131,6 +157,8 @@ def run_3way_match(
         po: Purchase order dict with "line_items" list
         slip: Packing slip dict with "line_items" list (or None for 2-way)
         invoice: Invoice dict with "line_items" list (or None for 2-way)
+        memory: Learned pairings for the PO's vendor (defaults to the
+            process-wide match memory, app/match_memory.py)
 
     Returns:
         Dict with keys:
@@ -181,11 +209,18 @@ def run_3way_match(
     discrepancies = 0
     line_num = 0
 
-    # --- Phase 1: Match product lines (PO → slip → invoice) ---
-    used_slip = set()
-    used_inv = set()
+    if memory is None:
+        memory = get_match_memory().for_vendor(po.get("vendor_name"))
 
-    for po_line in po_products:
+    # --- Phase 1: Match product lines (PO → slip → invoice) ---
+    # Lines with the same item number / NDC pair up by hash join
+    # (app/item_join.py); find_best_match only sees the lines left over
+    slip_joined = join_by_item(po_products, slip_products) if has_slip else {}
+    inv_joined = join_by_item(po_products, inv_products) if has_invoice else {}
+    used_slip = set(slip_joined.values())
+    used_inv = set(inv_joined.values())
+
+    for po_index, po_line in enumerate(po_products):
         line_num += 1
         detail = {
             "line_number": line_num,
@@ -198,8 +233,11 @@ def run_3way_match(
         # Find matching slip line
         slip_match = None
         if has_slip:
-            available_slip = [s for i, s in enumerate(slip_products) if i not in used_slip]
-            result = find_best_match(po_line, available_slip)
+            if po_index in slip_joined:
+                result = (slip_products[slip_joined[po_index]], 1.0)
+            else:
+                available_slip = [s for i, s in enumerate(slip_products) if i not in used_slip]
+                result = find_best_match(po_line, available_slip, memory=memory)
             if result:
                 slip_match, score = result
                 used_slip.add(slip_products.index(slip_match))
@@ -210,8 +248,11 @@ def run_3way_match(
         # Find matching invoice line
         inv_match = None
         if has_invoice:
-            available_inv = [iv for i, iv in enumerate(inv_products) if i not in used_inv]
-            result = find_best_match(po_line, available_inv)
+            if po_index in inv_joined:
+                result = (inv_products[inv_joined[po_index]], 1.0)
+            else:
+                available_inv = [iv for i, iv in enumerate(inv_products) if i not in used_inv]
+                result = find_best_match(po_line, available_inv, memory=memory)
             if result:
                 inv_match, score = result
                 used_inv.add(inv_products.index(inv_match))
@@ -220,67 +261,8 @@ def run_3way_match(
                 detail["inv_unit_price"] = _to_float(inv_match.get("unit_price"))
                 detail["inv_extension"] = _to_float(inv_match.get("extension"))
 
-        # Compare quantities
-        po_qty = detail.get("po_quantity", 0)
-        slip_qty = detail.get("slip_qty_shipped")
-        inv_qty = detail.get("inv_quantity")
-
-        qty_ok = True
-        if slip_qty is not None and slip_qty != po_qty:
-            qty_ok = False
-        if inv_qty is not None and inv_qty != po_qty:
-            qty_ok = False
-
-        # Compare prices
-        po_price = detail.get("po_unit_price", 0)
-        inv_price = detail.get("inv_unit_price")
-        price_ok = True
-        if inv_price is not None and abs(po_price - inv_price) > 0.01:
-            price_ok = False
-
-        # Compare totals
-        po_total = detail.get("po_line_total", 0)
-        inv_ext = detail.get("inv_extension")
-        total_ok = True
-        if inv_ext is not None and abs(po_total - inv_ext) > 0.01:
-            total_ok = False
-
-        detail["qty_match"] = qty_ok
-        detail["price_match"] = price_ok
-        detail["total_match"] = total_ok
-
-        if not qty_ok:
-            detail["line_status"] = "discrepancy"
-            detail["discrepancy_type"] = "qty_mismatch"
-            parts = []
-            if slip_qty is not None and slip_qty != po_qty:
-                parts.append("Slip shipped " + str(int(slip_qty)) + " vs PO ordered " + str(int(po_qty)))
-            if inv_qty is not None and inv_qty != po_qty:
-                parts.append("Invoice billed " + str(int(inv_qty)) + " vs PO ordered " + str(int(po_qty)))
-            detail["discrepancy_note"] = "; ".join(parts)
-            discrepancies += 1
-        elif not price_ok:
-            detail["line_status"] = "discrepancy"
-            detail["discrepancy_type"] = "price_mismatch"
-            detail["discrepancy_note"] = "Invoice unit price $" + str(inv_price) + " vs PO $" + str(po_price)
+        if score_product_line(detail, has_slip, has_invoice):
             discrepancies += 1
-        elif not total_ok:
-            detail["line_status"] = "discrepancy"
-            detail["discrepancy_type"] = "total_mismatch"
-            detail["discrepancy_note"] = "Invoice extension $" + str(inv_ext) + " vs PO line total $" + str(po_total)
-            discrepancies += 1
-        elif not slip_match and has_slip:
-            detail["line_status"] = "discrepancy"
-            detail["discrepancy_type"] = "missing_on_slip"
-            detail["discrepancy_note"] = "Product on PO but not found on packing slip"
-            discrepancies += 1
-        elif not inv_match and has_invoice:
-            detail["line_status"] = "discrepancy"
-            detail["discrepancy_type"] = "missing_on_invoice"
-            detail["discrepancy_note"] = "Product on PO but not found on invoice"
-            discrepancies += 1
-        else:
-            detail["line_status"] = "match"
 
         line_details.append(detail)
 
@@ -381,9 +363,131 @@ def run_3way_match(
     # --- Overall Assessment ---
     po_total = _to_float(po.get("total_amount", 0))
     inv_total = _to_float(invoice.get("total_amount", 0)) if invoice else 0
-    amount_delta = round(inv_total - po_total, 2) if invoice else 0
+    overall_status, confidence, summary, amount_delta = assess_match(line_details, po_total, inv_total, invoice is not None)
+
+    result = {
+        "id": match_id,
+        "match_type": match_type,
+        "overall_status": overall_status,
+        "confidence": confidence,
+        "total_discrepancies": discrepancies,
+        "amount_delta": amount_delta,
+        "summary": summary,
+        "line_details": line_details,
+        "details_json": {
+            "po_total": po_total,
+            "invoice_total": inv_total,
+            "po_product_lines": len(po_products),
+            "slip_product_lines": len(slip_products),
+            "inv_product_lines": len(inv_products),
+            "lines_joined_by_item": len(slip_joined) + len(inv_joined),
+            "tax_lines_compared": len(po_taxes),
+            "bundled_items_found": len(seen_bundled),
+        },
+        "created_at": now,
+    }
+    flag_duplicates(result, [("packing_slip", slip), ("invoice", invoice)])
+    return result
+
+
+STATUS_RANK = {"approve": 0, "review": 1, "reject": 2}
+
 
-    # Determine overall status
+def flag_duplicates(match: Dict, documents: List[Tuple[str, Optional[Dict]]]):
+    """
+    Hold a match whose slip or invoice repeats one already received: a
+    duplicate invoice is rejected, any other duplicate goes to review
+    (duplicate_severity). The flags are listed under match["duplicates"].
+    """
+    flags = []
+    for kind, doc in documents:
+        severity = duplicate_severity(kind, doc) if doc else None
+        if severity is None:
+            continue
+        flags.append({"kind": kind, "document_id": doc.get("id"), "duplicate_of": doc.get("duplicate_of"),
+                      "near_duplicates": doc.get("near_duplicates", [])})
+        if STATUS_RANK[severity] > STATUS_RANK.get(match.get("overall_status"), 0):
+            match["overall_status"] = severity
+        message = duplicate_discrepancies(kind, doc)[0]["message"]
+        match["summary"] = message + " " + match.get("summary", "")
+    match["duplicates"] = flags
+
+
+# ---------------------------------------------------------------------------
+# Scoring (shared with the incremental re-match, app/rematch.py)
+# ---------------------------------------------------------------------------
+
+def score_product_line(detail: Dict, has_slip: bool, has_invoice: bool) -> bool:
+    """
+    Set the match flags and line_status of a PO product line from the slip /
+    invoice values already on it. Returns True when it is a discrepancy.
+    """
+    detail.pop("discrepancy_type", None)
+    detail.pop("discrepancy_note", None)
+
+    # Compare quantities
+    po_qty = detail.get("po_quantity", 0)
+    slip_qty = detail.get("slip_qty_shipped")
+    inv_qty = detail.get("inv_quantity")
+
+    qty_ok = True
+    if slip_qty is not None and slip_qty != po_qty:
+        qty_ok = False
+    if inv_qty is not None and inv_qty != po_qty:
+        qty_ok = False
+
+    # Compare prices
+    po_price = detail.get("po_unit_price", 0)
+    inv_price = detail.get("inv_unit_price")
+    price_ok = True
+    if inv_price is not None and abs(po_price - inv_price) > 0.01:
+        price_ok = False
+
+    # Compare totals
+    po_total = detail.get("po_line_total", 0)
+    inv_ext = detail.get("inv_extension")
+    total_ok = True
+    if inv_ext is not None and abs(po_total - inv_ext) > 0.01:
+        total_ok = False
+
+    detail["qty_match"] = qty_ok
+    detail["price_match"] = price_ok
+    detail["total_match"] = total_ok
+
+    if not qty_ok:
+        detail["line_status"] = "discrepancy"
+        detail["discrepancy_type"] = "qty_mismatch"
+        parts = []
+        if slip_qty is not None and slip_qty != po_qty:
+            parts.append("Slip shipped " + str(int(slip_qty)) + " vs PO ordered " + str(int(po_qty)))
+        if inv_qty is not None and inv_qty != po_qty:
+            parts.append("Invoice billed " + str(int(inv_qty)) + " vs PO ordered " + str(int(po_qty)))
+        detail["discrepancy_note"] = "; ".join(parts)
+    elif not price_ok:
+        detail["line_status"] = "discrepancy"
+        detail["discrepancy_type"] = "price_mismatch"
+        detail["discrepancy_note"] = "Invoice unit price $" + str(inv_price) + " vs PO $" + str(po_price)
+    elif not total_ok:
+        detail["line_status"] = "discrepancy"
+        detail["discrepancy_type"] = "total_mismatch"
+        detail["discrepancy_note"] = "Invoice extension $" + str(inv_ext) + " vs PO line total $" + str(po_total)
+    elif "slip_description" not in detail and has_slip:
+        detail["line_status"] = "discrepancy"
+        detail["discrepancy_type"] = "missing_on_slip"
+        detail["discrepancy_note"] = "Product on PO but not found on packing slip"
+    elif "inv_description" not in detail and has_invoice:
+        detail["line_status"] = "discrepancy"
+        detail["discrepancy_type"] = "missing_on_invoice"
+        detail["discrepancy_note"] = "Product on PO but not found on invoice"
+    else:
+        detail["line_status"] = "match"
+    return detail["line_status"] == "discrepancy"
+
+
+def assess_match(line_details: List[Dict], po_total: float, inv_total: float,
+                 has_invoice: bool) -> Tuple[str, float, str, float]:
+    """(overall_status, confidence, summary, amount_delta) for a set of scored lines."""
+    amount_delta = round(inv_total - po_total, 2) if has_invoice else 0
     material_discrepancies = [
         d for d in line_details
         if d.get("line_status") == "discrepancy"
@@ -406,27 +510,7 @@ def run_3way_match(
         overall_status = "reject"
         confidence = 40.0
         summary = str(len(material_discrepancies)) + " material discrepancies. Delta: $" + str(abs(amount_delta)) + ". Do not approve without investigation."
-
-    return {
-        "id": match_id,
-        "match_type": match_type,
-        "overall_status": overall_status,
-        "confidence": confidence,
-        "total_discrepancies": discrepancies,
-        "amount_delta": amount_delta,
-        "summary": summary,
-        "line_details": line_details,
-        "details_json": {
-            "po_total": po_total,
-            "invoice_total": inv_total,
-            "po_product_lines": len(po_products),
-            "slip_product_lines": len(slip_products),
-            "inv_product_lines": len(inv_products),
-            "tax_lines_compared": len(po_taxes),
-            "bundled_items_found": len(seen_bundled),
-        },
-        "created_at": now,
-    }
+    return overall_status, confidence, summary, amount_delta
 
 
 # ---------------------------------------------------------------------------
@@ -6,6 +6,7 @@ shows the full lifecycle: upload → match → verify → archive.
 """
 
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
+from .live_updates import get_live_updates_script
 
 
 def get_document_history_html():
@@ -151,34 +152,44 @@ def get_document_history_html():
             </div>
         </div>
     </div>
-
+    """ + get_live_updates_script() + """
     <script>
+        var allEvents = [];
         var eventIcons = {
             po_uploaded: {cls: 'event-icon--po', label: 'PO'},
+            po_updated: {cls: 'event-icon--po', label: 'PO'},
             slip_uploaded: {cls: 'event-icon--slip', label: 'PS'},
             invoice_uploaded: {cls: 'event-icon--invoice', label: 'INV'},
             match_2way: {cls: 'event-icon--match', label: '2W'},
             match_3way: {cls: 'event-icon--match', label: '3W'},
+            rematch: {cls: 'event-icon--match', label: 'RM'},
+            bulk_import: {cls: 'event-icon--po', label: 'IMP'},
             verified: {cls: 'event-icon--verify', label: 'VER'},
             archived: {cls: 'event-icon--archive', label: 'ARC'},
         };
 
         var tlDotClasses = {
             po_uploaded: 'tl-dot--po',
+            po_updated: 'tl-dot--po',
             slip_uploaded: 'tl-dot--slip',
             invoice_uploaded: 'tl-dot--invoice',
             match_2way: 'tl-dot--match',
             match_3way: 'tl-dot--match',
+            rematch: 'tl-dot--match',
+            bulk_import: 'tl-dot--po',
             verified: 'tl-dot--verify',
             archived: 'tl-dot--archive',
         };
 
         var eventLabels = {
             po_uploaded: 'Purchase Order Uploaded',
+            po_updated: 'Purchase Order Updated by Import',
             slip_uploaded: 'Packing Slip Uploaded',
             invoice_uploaded: 'Invoice Uploaded',
             match_2way: '2-Way Match Performed',
             match_3way: '3-Way Match Performed',
+            rematch: 'Match Updated',
+            bulk_import: 'Bulk Import',
             verified: 'PO Verified',
             archived: 'Documents Archived',
         };
@@ -187,40 +198,43 @@ def get_document_history_html():
             try {
                 var resp = await fetch('/api/v2/document-history?limit=100');
                 var data = await resp.json();
-                var container = document.getElementById('event-list-body');
-
-                if (data.events.length === 0) {
-                    container.innerHTML = '<div class="empty-state"><p>No document events yet.</p></div>';
-                    return;
-                }
+                allEvents = data.events;
+                renderEvents();
+            } catch (e) {
+                console.error('Failed to load events:', e);
+            }
+        }
 
-                // Group by PO
-                var poGroups = {};
-                for (var i = 0; i < data.events.length; i++) {
-                    var ev = data.events[i];
-                    var key = ev.po_id || ev.po_number || 'unknown';
-                    if (!poGroups[key]) poGroups[key] = [];
-                    poGroups[key].push(ev);
-                }
+        // Live updates: new events arrive with the notification, no fetch needed
+        function applyChanges(msg) {
+            if (!msg.events || msg.events.length === 0) return;
+            allEvents = msg.events.slice().reverse().concat(allEvents).slice(0, 100);
+            renderEvents();
+        }
 
-                var html = '';
-                for (var i = 0; i < data.events.length; i++) {
-                    var ev = data.events[i];
-                    var iconInfo = eventIcons[ev.event_type] || {cls: 'event-icon--po', label: '?'};
-                    var label = eventLabels[ev.event_type] || ev.event_type;
-                    var time = ev.created_at ? new Date(ev.created_at).toLocaleString() : '';
-                    var poLabel = ev.po_number ? 'PO ' + ev.po_number : '';
+        function renderEvents() {
+            var container = document.getElementById('event-list-body');
+            if (allEvents.length === 0) {
+                container.innerHTML = '<div class="empty-state"><p>No document events yet.</p></div>';
+                return;
+            }
 
-                    html += '<div class="event-item" onclick="loadTimeline(\\'' + (ev.po_id || '') + '\\')" data-po="' + (ev.po_id || '') + '">';
-                    html += '<span class="event-icon ' + iconInfo.cls + '">' + iconInfo.label + '</span>';
-                    html += '<span class="event-title">' + label + '</span>';
-                    html += '<div class="event-meta">' + poLabel + ' &middot; ' + time + '</div>';
-                    html += '</div>';
-                }
-                container.innerHTML = html;
-            } catch (e) {
-                console.error('Failed to load events:', e);
+            var html = '';
+            for (var i = 0; i < allEvents.length; i++) {
+                var ev = allEvents[i];
+                var iconInfo = eventIcons[ev.event_type] || {cls: 'event-icon--po', label: '?'};
+                var label = eventLabels[ev.event_type] || ev.event_type;
+                var time = ev.created_at ? new Date(ev.created_at).toLocaleString() : '';
+                var poLabel = ev.po_number ? 'PO ' + ev.po_number : '';
+                if (ev.batch) poLabel = ev.batch.saved + ' ' + ev.entity_type + ' record(s)' + (ev.batch.rejected ? ', ' + ev.batch.rejected + ' rejected' : '');
+
+                html += '<div class="event-item" onclick="loadTimeline(\\'' + (ev.po_id || '') + '\\')" data-po="' + (ev.po_id || '') + '">';
+                html += '<span class="event-icon ' + iconInfo.cls + '">' + iconInfo.label + '</span>';
+                html += '<span class="event-title">' + label + '</span>';
+                html += '<div class="event-meta">' + poLabel + ' &middot; ' + time + '</div>';
+                html += '</div>';
             }
+            container.innerHTML = html;
         }
 
         async function loadTimeline(poId) {
@@ -261,6 +275,11 @@ def get_document_history_html():
                     if (ev.entity_type) {
                         html += '<div class="tl-desc">' + ev.entity_type + ' &middot; ' + (ev.event_source || 'user') + '</div>';
                     }
+                    if (ev.rematch) {
+                        var st = ev.rematch.overall_status;
+                        html += '<div class="tl-desc">' + (st[0] ? st[0].toUpperCase() + ' &rarr; ' : '') + st[1].toUpperCase();
+                        html += ' &middot; ' + ev.rematch.lines.length + ' line(s) changed</div>';
+                    }
                     html += '</div>';
                 }
                 html += '</div>';
@@ -305,6 +324,7 @@ def get_document_history_html():
         }
 
         loadEvents();
+        subscribeChanges(applyChanges, loadEvents);
     </script>
 </body>
 </html>"""
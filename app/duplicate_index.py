@@ -0,0 +1,180 @@
+"""
+VerifyAP - Duplicate Document Index
+Purpose: Catch an invoice or packing slip that has already been received
+before it is matched (and approved) a second time.
+
+Every saved document is indexed under a few keys, each a dict lookup:
+
+    invoice        vendor | invoice number | total | date   duplicate
+                   vendor | invoice number                 near-duplicate (rebill, corrected total)
+                   vendor | total | date                   near-duplicate (re-numbered copy)
+    packing_slip   PO | tracking / delivery number         duplicate
+                   PO | line items and quantities          near-duplicate (same shipment, no tracking no.)
+
+Vendors are compared by vendor id or canonical name (app/vendor_registry.py),
+and PO and invoice numbers by their OCR-folded key (app/po_index.py), so a
+re-scan of the same paper still hits.
+
+The SHA-256 of the uploaded file is indexed too: re-uploading a file that was
+already processed returns the earlier result without another vision call.
+
+The index holds references only (a list position for the v1 globals, a
+record id in InMemoryStore); callers rebuild it when they reload their state.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .item_join import item_key
+from .po_index import CONFUSABLES, po_number_key
+from .vendor_registry import canonical_vendor_key, get_vendor_registry
+
+INVOICE_PREFIXES = ("INVOICENO", "INVOICE", "INVNO", "INV")
+
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+def _vendor(record: Dict) -> str:
+    name = record.get("vendor") or record.get("vendor_name")
+    return get_vendor_registry().resolve(name) or canonical_vendor_key(name)
+
+
+def _invoice_number(text) -> str:
+    key = po_number_key(text)
+    for prefix in INVOICE_PREFIXES:
+        folded = prefix.translate(CONFUSABLES)
+        if key.startswith(folded) and len(key) > len(folded):
+            key = key[len(folded):]
+            break
+    return key.lstrip("0")
+
+
+def _cents(value) -> Optional[int]:
+    try:
+        return int(round(float(value) * 100))
+    except (TypeError, ValueError):
+        return None
+
+
+def _lines_signature(items: List[Dict]) -> str:
+    lines = []
+    for item in items or []:
+        name = item_key(item) or " ".join((item.get("description") or item.get("item") or "").lower().split())
+        qty = item.get("quantity", item.get("quantity_shipped"))
+        lines.append(name + "=" + str(qty))
+    return ";".join(sorted(lines))
+
+
+def document_keys(kind: str, record: Dict) -> Tuple[Optional[str], List[str]]:
+    """(duplicate key or None, near-duplicate keys) for a v1 or v2 invoice / slip."""
+    if kind == "invoice":
+        vendor = _vendor(record)
+        number = _invoice_number(record.get("invoice_number"))
+        total = _cents(record.get("total", record.get("total_amount")))
+        date = str(record.get("invoice_date") or record.get("date") or "")[:10]
+        if not vendor:
+            return None, []
+        exact = "inv|" + vendor + "|" + number + "|" + str(total) + "|" + date if number else None
+        near = []
+        if number:
+            near.append("inv-number|" + vendor + "|" + number)
+        if total and date:
+            near.append("inv-amount|" + vendor + "|" + str(total) + "|" + date)
+        return exact, near
+
+    po = po_number_key(record.get("po_number") or record.get("po_number_ocr"))
+    if not po:
+        return None, []
+    tracking = po_number_key(record.get("tracking_number") or record.get("delivery_number"))
+    exact = "slip|" + po + "|" + tracking if tracking else None
+    lines = _lines_signature(record.get("items") or record.get("line_items"))
+    return exact, ["slip-lines|" + po + "|" + lines] if lines else []
+
+
+class DuplicateIndex:
+    """Document keys and upload hashes -> references of the documents seen with them."""
+
+    def __init__(self):
+        self.keys: Dict[str, List[Any]] = {}
+        self.hashes: Dict[str, Any] = {}
+        self.duplicates_found = 0
+        self.near_duplicates_found = 0
+
+    def check(self, kind: str, record: Dict) -> Dict:
+        """Earlier documents this one duplicates: {"duplicate_of": ref or None, "near_duplicates": [refs]}."""
+        exact, near = document_keys(kind, record)
+        duplicate_of = self.keys[exact][0] if exact in self.keys else None
+        near_refs = []
+        for key in near:
+            for ref in self.keys.get(key, ()):
+                if ref != duplicate_of and ref not in near_refs:
+                    near_refs.append(ref)
+        if duplicate_of is not None:
+            self.duplicates_found += 1
+        elif near_refs:
+            self.near_duplicates_found += 1
+        return {"duplicate_of": duplicate_of, "near_duplicates": near_refs}
+
+    def add(self, kind: str, record: Dict, ref: Any):
+        exact, near = document_keys(kind, record)
+        for key in ([exact] if exact else []) + near:
+            self.keys.setdefault(key, []).append(ref)
+        if record.get("content_sha256"):
+            self.hashes.setdefault(kind + ":" + record["content_sha256"], ref)
+
+    def remove(self, kind: str, record: Dict, ref: Any):
+        """Forget a document (archived, so no longer something a new upload can repeat)."""
+        exact, near = document_keys(kind, record)
+        for key in ([exact] if exact else []) + near:
+            refs = self.keys.get(key)
+            if refs and ref in refs:
+                refs.remove(ref)
+                if not refs:
+                    del self.keys[key]
+        if record.get("content_sha256") and self.hashes.get(kind + ":" + record["content_sha256"]) == ref:
+            del self.hashes[kind + ":" + record["content_sha256"]]
+
+    def seen(self, kind: str, digest: str) -> Optional[Any]:
+        """Reference of the document already extracted from an upload with this SHA-256."""
+        return self.hashes.get(kind + ":" + digest)
+
+    def clear(self):
+        self.keys = {}
+        self.hashes = {}
+
+    def stats(self) -> Dict:
+        return {"keys": len(self.keys), "uploads": len(self.hashes),
+                "duplicates_found": self.duplicates_found, "near_duplicates_found": self.near_duplicates_found}
+
+
+def duplicate_discrepancies(kind: str, check: Dict) -> List[Dict]:
+    """Discrepancies (v1 match_result shape) for a check() result."""
+    label = "Invoice" if kind == "invoice" else "Packing Slip"
+    if check.get("duplicate_of") is not None:
+        what = "vendor, invoice number, total and date" if kind == "invoice" else "PO and tracking number"
+        return [{
+            "type": "Duplicate " + label,
+            "message": "Same " + what + " as a " + label.lower() + " already received.",
+        }]
+    if check.get("near_duplicates"):
+        return [{
+            "type": "Possible Duplicate " + label,
+            "message": str(len(check["near_duplicates"])) + " earlier " + label.lower()
+                       + "(s) look like this one. Check it isn't a copy before approving.",
+        }]
+    return []
+
+
+def duplicate_severity(kind: str, record: Dict) -> Optional[str]:
+    """
+    What a v2 record's duplicate flags (set by InMemoryStore on save) do to a
+    match it is in, as the v1 _flag_duplicates does: "reject" for a
+    duplicate invoice, "review" for any other duplicate or near-duplicate.
+    """
+    if record.get("duplicate_of") is not None:
+        return "reject" if kind == "invoice" else "review"
+    if record.get("near_duplicates"):
+        return "review"
+    return None
@@ -0,0 +1,395 @@
+"""
+VerifyAP - Segmented Document Event Log
+Purpose: Append-only storage for InMemoryStore.document_events that stays
+ordered by construction and doesn't grow memory without bound.
+
+Events are bucketed into time-bounded segments (EVENT_SEGMENT_HOURS, default
+one day). Each segment keeps its events as compact tuples sorted by
+created_at, plus per-PO and per-event-type position indexes, so:
+    - the newest N events are read straight off the end (no global sort)
+    - a PO's timeline touches only that PO's entries in each segment
+    - time ranges are two binary searches per overlapping segment
+
+Segments older than the newest EVENT_HOT_SEGMENTS are offloaded to
+EVENT_ARCHIVE_DIR as gzipped JSON when it is set. Only a stub stays in memory
+(time bounds, counts, the PO ids it mentions) and the rows are read back for
+the rare query that reaches that far back.
+"""
+
+import os
+import gzip
+import json
+import bisect
+import contextlib
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any
+
+FIELDS = (
+    "id", "po_id", "po_number", "event_type", "event_source",
+    "actor", "entity_type", "entity_id", "created_at",
+)
+_KEY = FIELDS.index("created_at")
+_PO = FIELDS.index("po_id")
+_TYPE = FIELDS.index("event_type")
+
+
+def _to_row(event: Dict) -> tuple:
+    extra = {k: v for k, v in event.items() if k not in FIELDS}
+    return tuple(event.get(f) for f in FIELDS) + ((extra or None),)
+
+
+def _to_event(row) -> Dict:
+    event = dict(zip(FIELDS, row))
+    if row[-1]:
+        event.update(row[-1])
+    return event
+
+
+class _Segment:
+    """Events whose created_at falls in [start, start + span)."""
+
+    __slots__ = ("start", "rows", "keys", "by_po", "by_type", "dirty", "path", "count", "po_ids", "type_counts", "min_key", "max_key")
+
+    def __init__(self, start, rows=None):
+        self.start = start
+        self.rows = rows if rows is not None else []
+        self.keys = [r[_KEY] or "" for r in self.rows]
+        self.path = None
+        self.dirty = True
+        self.by_po = {}
+        self.by_type = {}
+        self.count = len(self.rows)
+        self.po_ids = None
+        self.type_counts = None
+        self.min_key = self.max_key = None
+
+    @property
+    def cold(self):
+        return self.rows is None
+
+    def append(self, row):
+        key = row[_KEY] or ""
+        if not self.keys or key >= self.keys[-1]:
+            position = len(self.rows)
+            self.rows.append(row)
+            self.keys.append(key)
+            if not self.dirty:
+                self.by_po.setdefault(row[_PO], []).append(position)
+                self.by_type.setdefault(row[_TYPE], []).append(position)
+        else:
+            # Late event: keep the segment sorted, rebuild the indexes on next read
+            position = bisect.bisect_right(self.keys, key)
+            self.rows.insert(position, row)
+            self.keys.insert(position, key)
+            self.dirty = True
+        self.count = len(self.rows)
+
+    def indexes(self):
+        if self.dirty:
+            self.by_po, self.by_type = {}, {}
+            for position, row in enumerate(self.rows):
+                self.by_po.setdefault(row[_PO], []).append(position)
+                self.by_type.setdefault(row[_TYPE], []).append(position)
+            self.dirty = False
+        return self.by_po, self.by_type
+
+    def positions(self, po_id=None, event_type=None):
+        """Ascending row positions matching the filters (None = all)."""
+        by_po, by_type = self.indexes()
+        if po_id is not None and event_type is not None:
+            return [p for p in by_po.get(po_id, ()) if self.rows[p][_TYPE] == event_type]
+        if po_id is not None:
+            return by_po.get(po_id, [])
+        if event_type is not None:
+            return by_type.get(event_type, [])
+        return range(len(self.rows))
+
+    def stub(self):
+        by_po, by_type = self.indexes()
+        return {
+            "start": self.start, "path": self.path, "count": self.count,
+            "po_ids": sorted(p for p in by_po if p is not None),
+            "type_counts": {t: len(v) for t, v in by_type.items()},
+            "min_key": self.keys[0] if self.keys else "", "max_key": self.keys[-1] if self.keys else "",
+        }
+
+
+class EventLog:
+    """List-like, append-only document event log (see module docstring)."""
+
+    def __init__(self, segment_hours: float = 24, hot_segments: int = 31, archive_dir: Optional[str] = None):
+        self.span = int(segment_hours * 3600)
+        self.hot_segments = hot_segments
+        self.archive_dir = archive_dir
+        self.segments: List[_Segment] = []
+        self.starts: List[int] = []
+        self.po_segments: Dict[str, List[_Segment]] = {}
+        self._cold_cache = (None, None)
+
+    @classmethod
+    def from_env(cls) -> "EventLog":
+        return cls(
+            segment_hours=float(os.environ.get("EVENT_SEGMENT_HOURS", "24")),
+            hot_segments=int(os.environ.get("EVENT_HOT_SEGMENTS", "31")),
+            archive_dir=os.environ.get("EVENT_ARCHIVE_DIR") or None,
+        )
+
+    # -- Writes -------------------------------------------------------------
+
+    def _start_for(self, created_at: str) -> int:
+        try:
+            ts = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+        except (AttributeError, ValueError):
+            return 0
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=timezone.utc)
+        epoch = int(ts.timestamp())
+        return epoch - epoch % self.span
+
+    def append(self, event: Dict):
+        start = self._start_for(event.get("created_at") or "")
+        i = bisect.bisect_left(self.starts, start)
+        created = not (i < len(self.starts) and self.starts[i] == start)
+        if created:
+            segment = _Segment(start)
+            self.segments.insert(i, segment)
+            self.starts.insert(i, start)
+        else:
+            segment = self.segments[i]
+            if segment.cold:
+                self._rehydrate(segment)
+        segment.append(_to_row(event))
+        self._index_po(event.get("po_id"), segment)
+        if created and self.archive_dir and len(self.segments) > self.hot_segments:
+            self.compact()
+
+    def _index_po(self, po_id, segment):
+        """po_id -> the segments holding its events, oldest first."""
+        if po_id is None:
+            return
+        segments = self.po_segments.setdefault(po_id, [])
+        if not segments or segments[-1] is not segment:
+            if segment not in segments:
+                segments.append(segment)
+                if len(segments) > 1 and segments[-2].start > segment.start:
+                    segments.sort(key=lambda seg: seg.start)
+
+    # -- Reads --------------------------------------------------------------
+
+    def __len__(self):
+        return sum(s.count for s in self.segments)
+
+    def __iter__(self):
+        """All events, oldest first."""
+        for segment in self.segments:
+            for row in self._readable(segment).rows:
+                yield _to_event(row)
+
+    def _readable(self, segment):
+        """The segment itself, or for an offloaded one a temporary copy read back from disk."""
+        if not segment.cold:
+            return segment
+        if self._cold_cache[0] is not segment:
+            with gzip.open(segment.path, "rt", encoding="utf-8") as f:
+                rows = [tuple(r) for r in json.load(f)]
+            self._cold_cache = (segment, _Segment(segment.start, rows))
+        return self._cold_cache[1]
+
+    def _might_match(self, segment, po_id, event_type):
+        if not segment.cold:
+            return True
+        if po_id is not None and po_id not in segment.po_ids:
+            return False
+        if event_type is not None and event_type not in segment.type_counts:
+            return False
+        return True
+
+    def timeline(self, po_id: str) -> List[Dict]:
+        """Events for one PO, oldest first."""
+        events = []
+        for segment in self.po_segments.get(po_id, ()):
+            seg = self._readable(segment)
+            events.extend(_to_event(seg.rows[p]) for p in seg.positions(po_id))
+        return events
+
+    def recent(self, limit: Optional[int] = None, event_type: Optional[str] = None, po_id: Optional[str] = None) -> List[Dict]:
+        """Newest events first, stopping after `limit` (None = everything)."""
+        events = []
+        for segment in reversed(self.segments):
+            if not self._might_match(segment, po_id, event_type):
+                continue
+            seg = self._readable(segment)
+            positions = seg.positions(po_id, event_type)
+            for p in reversed(positions):
+                if limit is not None and len(events) >= limit:
+                    return events
+                events.append(_to_event(seg.rows[p]))
+        return events
+
+    def between(self, since: Optional[str], until: Optional[str], event_type: Optional[str] = None,
+                po_id: Optional[str] = None) -> List[Dict]:
+        """Events with since <= created_at < until (ISO strings; None = open), oldest first."""
+        lo = bisect.bisect_right(self.starts, self._start_for(since)) - 1 if since else 0
+        hi = bisect.bisect_right(self.starts, self._start_for(until)) if until else len(self.segments)
+        events = []
+        for segment in self.segments[max(lo, 0):hi]:
+            if not self._might_match(segment, po_id, event_type):
+                continue
+            seg = self._readable(segment)
+            first = bisect.bisect_left(seg.keys, since) if since else 0
+            last = bisect.bisect_left(seg.keys, until) if until else len(seg.keys)
+            if po_id is None and event_type is None:
+                positions = range(first, last)
+            else:
+                positions = seg.positions(po_id, event_type)
+                positions = positions[bisect.bisect_left(positions, first):bisect.bisect_left(positions, last)]
+            events.extend(_to_event(seg.rows[p]) for p in positions)
+        return events
+
+    # -- Memory management --------------------------------------------------
+
+    def compact(self, hot_segments: Optional[int] = None, deadline: Optional[float] = None,
+                limit: Optional[int] = None) -> tuple:
+        """
+        Offload all but the newest `hot_segments` to archive_dir, oldest first,
+        stopping after `limit` segments or once time.perf_counter() passes
+        deadline. Returns (offloaded, remaining).
+        """
+        import time
+        if not self.archive_dir:
+            return 0, 0
+        keep = self.hot_segments if hot_segments is None else hot_segments
+        os.makedirs(self.archive_dir, exist_ok=True)
+        offloaded = 0
+        eligible = [s for s in self.segments[:max(0, len(self.segments) - keep)] if not s.cold]
+        for segment in eligible:
+            if limit is not None and offloaded >= limit:
+                break
+            if deadline is not None and offloaded and time.perf_counter() >= deadline:
+                break
+            stub = segment.stub()
+            path = os.path.join(self.archive_dir, "events-" + str(segment.start) + ".json.gz")
+            tmp = path + ".tmp"
+            with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump(segment.rows, f)
+            os.replace(tmp, path)
+            segment.path = path
+            segment.po_ids = set(stub["po_ids"])
+            segment.type_counts = stub["type_counts"]
+            segment.min_key, segment.max_key = stub["min_key"], stub["max_key"]
+            segment.rows = segment.keys = None
+            segment.by_po, segment.by_type = {}, {}
+            offloaded += 1
+        if offloaded:
+            self._cold_cache = (None, None)
+            print("[VerifyAP] Event log: offloaded " + str(offloaded) + " segment(s) to " + self.archive_dir)
+        return offloaded, len(eligible) - offloaded
+
+    def rebuild_indexes(self, deadline: Optional[float] = None) -> tuple:
+        """
+        Rebuild indexes that late events left dirty, newest segments first,
+        until time.perf_counter() passes deadline. Returns (rebuilt, remaining).
+        """
+        import time
+        rebuilt = 0
+        dirty = [s for s in reversed(self.segments) if not s.cold and s.dirty]
+        for segment in dirty:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            segment.indexes()
+            rebuilt += 1
+        return rebuilt, len(dirty) - rebuilt
+
+    def release_cache(self) -> int:
+        """Forget the last offloaded segment read back from disk."""
+        released = 1 if self._cold_cache[0] is not None else 0
+        self._cold_cache = (None, None)
+        return released
+
+    def extract(self, po_id: str) -> List[Dict]:
+        """
+        Remove and return a PO's events from in-memory segments (cold storage
+        archiving). Events already offloaded to archive_dir stay there.
+        """
+        events = []
+        segments = self.po_segments.pop(po_id, [])
+        offloaded = [segment for segment in segments if segment.cold]
+        if offloaded:
+            self.po_segments[po_id] = offloaded
+        for segment in segments:
+            if segment.cold:
+                continue
+            keep = [row for row in segment.rows if row[_PO] != po_id]
+            events.extend(_to_event(row) for row in segment.rows if row[_PO] == po_id)
+            segment.rows = keep
+            segment.keys = [r[_KEY] or "" for r in keep]
+            segment.count = len(keep)
+            segment.dirty = True
+        return events
+
+    def _rehydrate(self, segment):
+        """A late event landed in an offloaded window: bring its rows back."""
+        segment.rows = list(self._readable(segment).rows)
+        segment.keys = [r[_KEY] or "" for r in segment.rows]
+        segment.dirty = True
+        segment.path = segment.po_ids = segment.type_counts = None
+        self._cold_cache = (None, None)
+
+    def stats(self) -> Dict[str, Any]:
+        cold = [s for s in self.segments if s.cold]
+        return {
+            "segments": len(self.segments),
+            "hot_segments": len(self.segments) - len(cold),
+            "cold_segments": len(cold),
+            "events": len(self),
+            "hot_events": sum(s.count for s in self.segments if not s.cold),
+            "segment_hours": self.span / 3600,
+        }
+
+    # -- Snapshots ----------------------------------------------------------
+
+    def dump(self) -> Dict[str, Any]:
+        """Copy for InMemoryStore.dump_state: rows of hot segments, stubs of offloaded ones."""
+        segments = []
+        for segment in self.segments:
+            if segment.cold:
+                segments.append({
+                    "start": segment.start, "path": segment.path, "count": segment.count,
+                    "po_ids": sorted(segment.po_ids), "type_counts": dict(segment.type_counts),
+                    "min_key": segment.min_key, "max_key": segment.max_key,
+                })
+            else:
+                segments.append({"start": segment.start, "rows": list(segment.rows)})
+        return {"segment_seconds": self.span, "segments": segments}
+
+    def load(self, state):
+        """Replace the contents from dump() output (or a plain list of event dicts)."""
+        self.segments, self.starts, self.po_segments = [], [], {}
+        self._cold_cache = (None, None)
+        if isinstance(state, list) or state.get("segment_seconds") != self.span:
+            events = state if isinstance(state, list) else list(_events_from_dump(state))
+            for event in events:
+                self.append(event)
+            return
+        for item in state["segments"]:
+            segment = _Segment(item["start"], [tuple(r) for r in item["rows"]] if "rows" in item else None)
+            if "rows" not in item:
+                segment.rows = segment.keys = None
+                segment.path, segment.count = item["path"], item["count"]
+                segment.po_ids, segment.type_counts = set(item["po_ids"]), item["type_counts"]
+                segment.min_key, segment.max_key = item["min_key"], item["max_key"]
+            self.segments.append(segment)
+            self.starts.append(segment.start)
+            for po_id in (segment.po_ids if segment.cold else {r[_PO] for r in segment.rows}):
+                self._index_po(po_id, segment)
+
+
+def _events_from_dump(state):
+    for item in state.get("segments", []):
+        rows = item.get("rows")
+        if rows is None:
+            with contextlib.suppress(OSError, ValueError):
+                with gzip.open(item["path"], "rt", encoding="utf-8") as f:
+                    rows = json.load(f)
+        for row in rows or []:
+            yield _to_event(row)
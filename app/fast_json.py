@@ -0,0 +1,99 @@
+"""
+VerifyAP - Fast JSON Responses + Field Projection
+Purpose: Serialize /api/v2 payloads without FastAPI's per-value
+jsonable_encoder walk, and let list/detail pages ask for only the fields they
+render.
+
+Returning a FastJSONResponse skips FastAPI's response encoding entirely; the
+body is written by orjson when it is installed (`pip install orjson`) and by
+the stdlib json module otherwise.
+
+?fields= takes a comma-separated list of field paths. Dots reach into nested
+dicts, and lists are projected item by item:
+
+    /api/v2/discrepancies?fields=match_id,po_number,discrepancy_lines.discrepancy_type
+    /api/v2/purchase-orders/{id}?fields=purchase_order.po_number,matches.overall_status
+
+List endpoints build only the requested columns (select_columns); detail
+endpoints build the full payload and project() it.
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact UTF-8 JSON. Values orjson/json can't encode natively fall back to str()."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, default=str, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict]:
+    """'a,b.c,b.d' -> {'a': {}, 'b': {'c': {}, 'd': {}}}; None/empty means everything."""
+    if not fields:
+        return None
+    tree: Dict = {}
+    for path in fields.split(","):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if part in node and not node[part] and i < len(parts) - 1:
+                # "b" already asked for the whole value; "b.c" can't narrow it
+                break
+            last = i == len(parts) - 1
+            if last:
+                node[part] = {}
+            else:
+                node = node.setdefault(part, {})
+    return tree or None
+
+
+def project(value: Any, tree: Optional[Dict]) -> Any:
+    """Keep only the fields in `tree` (from parse_fields). An empty subtree keeps the whole value."""
+    if not tree:
+        return value
+    return _projector(tree)(value)
+
+
+def _projector(tree: Dict):
+    """Compile a field tree once so projecting a long list doesn't re-walk it per row."""
+    leaves = [key for key, sub in tree.items() if not sub]
+    branches = [(key, _projector(sub)) for key, sub in tree.items() if sub]
+
+    def one(value):
+        if isinstance(value, list):
+            return [one(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+        out = {key: value[key] for key in leaves if key in value}
+        for key, sub in branches:
+            if key in value:
+                out[key] = sub(value[key])
+        return out
+
+    return one
+
+
+def select_columns(columns, tree: Optional[Dict]):
+    """The (field, ...) column specs a projection asks for; all of them when tree is None."""
+    if not tree:
+        return columns
+    return [column for column in columns if column[0] in tree]
@@ -0,0 +1,128 @@
+"""
+VerifyAP - Conditional GET + Response Cache for /api/v2
+Purpose: Stop polling dashboards from recomputing list_pos / list_discrepancies
+when nothing has changed.
+
+InMemoryStore bumps a version counter on every write, globally and for the
+PO the write touched (store.version, store.po_version()). Each /api/v2 GET is
+keyed to one of them:
+
+    /api/v2/purchase-orders/{po_id}     that PO's version
+    /api/v2/document-history/{po_id}    that PO's version
+    /api/v2/match/{match_id}            the version of the match's PO
+    everything else                     the global version and the vendor
+                                        registry's (a vendor= filter resolves
+                                        aliases the registry may learn later)
+
+The ETag is W/"<store epoch>.<version>" (plus ".v<registry version>"). A request whose If-None-Match still
+matches gets 304 without reaching the route. Otherwise the response body is
+served from an LRU keyed by (path, query) that is valid while the version is
+unchanged, so polling a list while nothing changes costs a dict lookup.
+
+API_CACHE_SIZE caps the number of cached responses (default 256; 0 keeps
+ETags/304 and disables the body cache) and API_CACHE_MAX_MB their total size
+(default 64).
+"""
+
+import os
+import re
+from collections import OrderedDict
+from typing import Callable, Optional
+
+from .metrics import record_cache
+from .vendor_registry import get_vendor_registry
+
+PREFIX = "/api/v2/"
+# Streams, and reads whose answer depends on the clock rather than the store
+UNCACHED = ("/api/v2/events/stream", "/api/v2/archive/candidates")
+
+PO_ROUTES = (re.compile(r"^/api/v2/purchase-orders/([^/]+)$"), re.compile(r"^/api/v2/document-history/([^/]+)$"))
+MATCH_ROUTE = re.compile(r"^/api/v2/match/([^/]+)$")
+
+
+def version_for(db, path: str) -> str:
+    """ETag for the current state of whatever `path` reads."""
+    for route in PO_ROUTES:
+        m = route.match(path)
+        if m:
+            return 'W/"' + db.epoch + ".p" + str(db.po_version(m.group(1))) + '"'
+    m = MATCH_ROUTE.match(path)
+    if m:
+        po_id = db.match_po_id(m.group(1))
+        if po_id:
+            return 'W/"' + db.epoch + ".p" + str(db.po_version(po_id)) + '"'
+    return 'W/"' + db.epoch + "." + str(db.version) + ".v" + str(get_vendor_registry().version) + '"'
+
+
+class ConditionalGetMiddleware:
+    """Pure ASGI middleware: 304s and cached bodies for /api/v2 GETs, keyed by store version."""
+
+    def __init__(self, app, get_db: Callable, size: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.app = app
+        self.get_db = get_db
+        self.size = int(os.environ.get("API_CACHE_SIZE", "256")) if size is None else size
+        if max_bytes is None:
+            max_bytes = int(float(os.environ.get("API_CACHE_MAX_MB", "64")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self.cache = OrderedDict()
+        self.bytes = 0
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or scope["method"] != "GET" or not path.startswith(PREFIX) or path in UNCACHED:
+            await self.app(scope, receive, send)
+            return
+
+        etag = version_for(self.get_db(), path)
+        etag_bytes = etag.encode("latin-1")
+        request_headers = dict(scope["headers"])
+        if_none_match = request_headers.get(b"if-none-match", b"")
+        not_modified = etag_bytes in [tag.strip() for tag in if_none_match.split(b",")]
+        record_cache("api_etag", not_modified)
+        if not_modified:
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(b"etag", etag_bytes), (b"cache-control", b"no-cache")]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        key = (path, scope.get("query_string", b""))
+        if self.size:
+            cached = self.cache.get(key)
+            hit = cached is not None and cached[0] == etag
+            record_cache("api_response", hit)
+            if hit:
+                self.cache.move_to_end(key)
+                await send({"type": "http.response.start", "status": 200, "headers": cached[1]})
+                await send({"type": "http.response.body", "body": cached[2]})
+                return
+
+        started = {}
+        chunks = []
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+                if message["status"] == 200:
+                    headers = [(k, v) for k, v in message.get("headers", []) if k.lower() not in (b"etag", b"cache-control")]
+                    headers += [(b"etag", etag_bytes), (b"cache-control", b"no-cache")]
+                    message = dict(message, headers=headers)
+                    started["headers"] = headers
+            elif message["type"] == "http.response.body" and started.get("status") == 200:
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body") and self.size:
+                    self._store(key, etag, started["headers"], b"".join(chunks))
+            await send(message)
+
+        await self.app(scope, receive, send_with_etag)
+
+    def _store(self, key, etag, headers, body):
+        if len(body) > self.max_bytes:
+            return
+        old = self.cache.pop(key, None)
+        if old:
+            self.bytes -= len(old[2])
+        self.cache[key] = (etag, headers, body)
+        self.bytes += len(body)
+        while len(self.cache) > self.size or self.bytes > self.max_bytes:
+            _, evicted = self.cache.popitem(last=False)
+            self.bytes -= len(evicted[2])
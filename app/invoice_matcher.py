@@ -3,39 +3,56 @@ VerifyAP - 3-Way Match Engine
 Purpose: Compare Invoice vs PO vs Packing Slip for approval/review/rejection.
 """
 
+from .item_join import compact_lines, join_keys
+from .po_index import describe_candidates
+from .po_inference import lookup_discrepancy, resolve_po
+from .po_matcher import line_match_basis
 
-def match_invoice(invoice_data, purchase_orders, packing_slips):
+SEVERITY_RANK = {"APPROVE": 0, "REVIEW": 1, "REJECT": 2}
+
+
+def match_invoice(invoice_data, purchase_orders, packing_slips, compared=None):
     """
     Perform 3-way match: Invoice vs Purchase Order vs Packing Slip.
+
+    compared is a compare_invoice_lines result computed ahead of time
+    ({"basis", "discrepancies", "severity"}), used when the PO and packing
+    slip are still the ones it was computed against.
     
     Returns:
         Dict with status (APPROVE/REVIEW/REJECT), discrepancies, and details.
     """
-    po_number = invoice_data.get("po_number", "")
+    po_number_read = invoice_data.get("po_number", "")
     discrepancies = []
     severity = "APPROVE"  # Start optimistic
 
     # --- Step 1: Find the PO ---
-    if not po_number or po_number not in purchase_orders:
+    # By number, tolerating OCR misreads (app/po_index.py), else inferred
+    # from vendor / date / line items (app/po_inference.py)
+    po_number, po_lookup, candidates, inference = resolve_po(invoice_data, purchase_orders)
+    if po_number is None:
         return {
             "status": "REJECT",
             "has_discrepancy": True,
             "discrepancies": [
                 {
                     "type": "PO Not Found",
-                    "message": "Invoice references PO '" + str(po_number) + "' which is not in the system.",
+                    "message": "Invoice references PO '" + str(po_number_read) + "' which is not in the system." + describe_candidates(candidates),
                 }
             ],
+            "po_lookup": po_lookup,
+            "po_inference": inference,
         }
 
+    corrected = lookup_discrepancy(po_number_read, po_number, po_lookup)
+    if corrected:
+        discrepancies.append(corrected)
+        severity = "REVIEW"
+
     po = purchase_orders[po_number]
 
     # --- Step 2: Find matching packing slip ---
-    matching_slip = None
-    for slip in packing_slips:
-        if slip.get("po_number") == po_number:
-            matching_slip = slip
-            break
+    slip_index, matching_slip = find_matching_slip(po_number, packing_slips)
 
     if not matching_slip:
         discrepancies.append({
@@ -44,92 +61,18 @@ def match_invoice(invoice_data, purchase_orders, packing_slips):
         })
         severity = "REVIEW"
 
-    # --- Step 3: Compare invoice items to PO ---
-    invoice_items = invoice_data.get("items", [])
+    # --- Steps 3 and 4: Compare invoice items to PO and packing slip ---
+    # (in the match pool for a large invoice, app/match_pool.py)
     po_items = po.get("items", [])
-
-    for inv_item in invoice_items:
-        inv_desc = (inv_item.get("description") or "").lower()
-        inv_qty = inv_item.get("quantity", 0)
-        inv_price = inv_item.get("unit_price", 0)
-        try:
-            inv_qty = float(inv_qty)
-        except (ValueError, TypeError):
-            inv_qty = 0
-        try:
-            inv_price = float(inv_price)
-        except (ValueError, TypeError):
-            inv_price = 0
-
-        po_matched = False
-        for po_item in po_items:
-            po_desc = (po_item.get("description") or "").lower()
-            po_qty = po_item.get("quantity", 0)
-            po_price = po_item.get("unit_price", 0)
-            try:
-                po_qty = float(po_qty)
-            except (ValueError, TypeError):
-                po_qty = 0
-            try:
-                po_price = float(po_price)
-            except (ValueError, TypeError):
-                po_price = 0
-
-            if po_desc and inv_desc and (po_desc in inv_desc or inv_desc in po_desc):
-                po_matched = True
-
-                if inv_qty > po_qty:
-                    discrepancies.append({
-                        "type": "Over-Billed Quantity",
-                        "message": "'" + inv_item.get("description", "") + "': invoiced " + str(inv_qty) + " but ordered " + str(po_qty),
-                    })
-                    severity = "REJECT"
-
-                if inv_price > 0 and po_price > 0 and inv_price > po_price * 1.05:
-                    discrepancies.append({
-                        "type": "Price Variance",
-                        "message": "'" + inv_item.get("description", "") + "': invoiced at $" + str(inv_price) + " vs PO price $" + str(po_price),
-                    })
-                    if severity != "REJECT":
-                        severity = "REVIEW"
-                break
-
-        if not po_matched and inv_desc:
-            discrepancies.append({
-                "type": "Item Not on PO",
-                "message": "'" + inv_item.get("description", "") + "' billed but not found on PO " + po_number,
-            })
-            severity = "REJECT"
-
-    # --- Step 4: Compare invoice to packing slip (if available) ---
-    if matching_slip:
-        slip_items = matching_slip.get("items", [])
-        for inv_item in invoice_items:
-            inv_desc = (inv_item.get("description") or "").lower()
-            inv_qty = inv_item.get("quantity", 0)
-            try:
-                inv_qty = float(inv_qty)
-            except (ValueError, TypeError):
-                inv_qty = 0
-
-            slip_matched = False
-            for slip_item in slip_items:
-                slip_desc = (slip_item.get("description") or slip_item.get("item") or "").lower()
-                slip_qty = slip_item.get("quantity", 0)
-                try:
-                    slip_qty = float(slip_qty)
-                except (ValueError, TypeError):
-                    slip_qty = 0
-
-                if slip_desc and inv_desc and (slip_desc in inv_desc or inv_desc in slip_desc):
-                    slip_matched = True
-                    if inv_qty > slip_qty:
-                        discrepancies.append({
-                            "type": "Billed > Received",
-                            "message": "'" + inv_item.get("description", "") + "': invoiced " + str(inv_qty) + " but only received " + str(slip_qty),
-                        })
-                        severity = "REJECT"
-                    break
+    basis = line_match_basis(po_number, po_items, slip_index)
+    if compared is None or compared.get("basis") != basis:
+        compared = {"basis": basis}
+        compared["discrepancies"], compared["severity"] = compare_invoice_lines(
+            compact_lines(invoice_data.get("items", []), ("description",)), compact_lines(po_items, ("description",)),
+            compact_lines(matching_slip.get("items", [])) if matching_slip else None, po_number)
+    discrepancies.extend(compared["discrepancies"])
+    if SEVERITY_RANK[compared["severity"]] > SEVERITY_RANK[severity]:
+        severity = compared["severity"]
 
     has_discrepancy = len(discrepancies) > 0
     if not has_discrepancy:
@@ -140,5 +83,93 @@ def match_invoice(invoice_data, purchase_orders, packing_slips):
         "has_discrepancy": has_discrepancy,
         "discrepancies": discrepancies,
         "po_number": po_number,
+        "po_number_read": po_number_read,
+        "po_lookup": po_lookup,
+        "po_inference": inference,
         "has_packing_slip": matching_slip is not None,
     }
+
+
+def find_matching_slip(po_number, packing_slips):
+    """(list position, slip) of the first packing slip received for this PO, else (None, None)."""
+    for i, slip in enumerate(packing_slips):
+        # The slip's own match resolved its (possibly misread) PO number
+        if (slip.get("match_result") or {}).get("po_number", slip.get("po_number")) == po_number:
+            return i, slip
+    return None, None
+
+
+def compare_invoice_lines(invoice_lines, po_lines, slip_lines, po_number):
+    """
+    Line discrepancies of an invoice against its PO and (when there is one)
+    its packing slip, all as compact_lines tuples. Returns (discrepancies,
+    severity). Pure, so it can run in the match pool. Lines are paired by
+    item number / NDC first (app/item_join.py); description matching only
+    sees the lines left over.
+    """
+    discrepancies = []
+    severity = "APPROVE"
+
+    # --- Step 3: Compare invoice items to PO ---
+    invoice_keys = [line[0] for line in invoice_lines]
+    joined = join_keys(invoice_keys, [line[0] for line in po_lines])
+    joined_po = set(joined.values())
+    leftover_po = [po_line for j, po_line in enumerate(po_lines) if j not in joined_po]
+
+    for i, (_, description, inv_desc, inv_qty, inv_price) in enumerate(invoice_lines):
+        po_line = po_lines[joined[i]] if i in joined else None
+        if po_line is None and inv_desc:
+            for candidate in leftover_po:
+                po_desc = candidate[2]
+                if po_desc and (po_desc in inv_desc or inv_desc in po_desc):
+                    po_line = candidate
+                    break
+
+        if po_line is not None:
+            po_qty, po_price = po_line[3], po_line[4]
+
+            if inv_qty > po_qty:
+                discrepancies.append({
+                    "type": "Over-Billed Quantity",
+                    "message": "'" + description + "': invoiced " + str(inv_qty) + " but ordered " + str(po_qty),
+                })
+                severity = "REJECT"
+
+            if inv_price > 0 and po_price > 0 and inv_price > po_price * 1.05:
+                discrepancies.append({
+                    "type": "Price Variance",
+                    "message": "'" + description + "': invoiced at $" + str(inv_price) + " vs PO price $" + str(po_price),
+                })
+                if severity != "REJECT":
+                    severity = "REVIEW"
+
+        elif inv_desc:
+            discrepancies.append({
+                "type": "Item Not on PO",
+                "message": "'" + description + "' billed but not found on PO " + po_number,
+            })
+            severity = "REJECT"
+
+    # --- Step 4: Compare invoice to packing slip (if available) ---
+    if slip_lines is not None:
+        joined = join_keys(invoice_keys, [line[0] for line in slip_lines])
+        joined_slip = set(joined.values())
+        leftover_slip = [slip_line for j, slip_line in enumerate(slip_lines) if j not in joined_slip]
+        for i, (_, description, inv_desc, inv_qty, _) in enumerate(invoice_lines):
+            slip_line = slip_lines[joined[i]] if i in joined else None
+            if slip_line is None and inv_desc:
+                for candidate in leftover_slip:
+                    slip_desc = candidate[2]
+                    if slip_desc and (slip_desc in inv_desc or inv_desc in slip_desc):
+                        slip_line = candidate
+                        break
+
+            if slip_line is not None:
+                slip_qty = slip_line[3]
+                if inv_qty > slip_qty:
+                    discrepancies.append({
+                        "type": "Billed > Received",
+                        "message": "'" + description + "': invoiced " + str(inv_qty) + " but only received " + str(slip_qty),
+                    })
+                    severity = "REJECT"
+    return discrepancies, severity
@@ -19,6 +19,7 @@ Extract the following:
 6. **due_date** — Payment due date if shown
 7. **items** — Array of line items, each with:
    - **description** — Item description
+   - **item_number** — Item/SKU number or NDC if shown
    - **quantity** — Quantity billed (as a number)
    - **unit_price** — Unit price (as a number)
    - **total** — Line total (as a number)
@@ -43,6 +44,7 @@ Example:
     "items": [
         {
             "description": "Exam Gloves, Nitrile, Medium",
+            "item_number": "GLV-NIT-M",
             "quantity": 100,
             "unit_price": 0.12,
             "total": 12.00
@@ -0,0 +1,104 @@
+"""
+VerifyAP - Item Number Join
+Purpose: Pair PO, packing slip and invoice lines by item number (vendor /
+manufacturer SKU, NDC for pharma) before any description matching.
+
+Slip and invoice lines carry the item number the vision prompt extracts,
+and PO lines carry the NetSuite "Item ID". When a number appears on both
+sides, it identifies the product far more reliably than the description does
+("MMR II Measles Mumps Rubella Live 10 Vials" vs "M-M-R II Vaccine 10x1
+Dose SDV"). The matchers hash-join on item_key first and leave only the
+lines without a usable number to description matching.
+
+NDCs are printed in 10-digit 4-4-2 / 5-3-2 / 5-4-1 layouts and in the
+11-digit 5-4-2 billing layout. Hyphenated forms are zero-padded to 5-4-2,
+so "0006-4681-00" and "00006-4681-00" give the same key.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+_SEGMENTS = re.compile(r"^\d+(-\d+){2}$")
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_NDC_LAYOUTS = {(4, 4, 2): (5, 4, 2), (5, 3, 2): (5, 4, 2), (5, 4, 1): (5, 4, 2), (5, 4, 2): (5, 4, 2)}
+
+
+@lru_cache(maxsize=4096)
+def _normalize(text: str) -> str:
+    if text.startswith("NDC"):
+        text = text[3:].lstrip(" :#")
+    dashed = re.sub(r"[\s\-]+", "-", text)
+    if _SEGMENTS.match(dashed):
+        parts = dashed.split("-")
+        layout = _NDC_LAYOUTS.get(tuple(len(p) for p in parts))
+        if layout:
+            return "".join(p.zfill(width) for p, width in zip(parts, layout))
+    return _NON_ALNUM.sub("", text)
+
+
+def normalize_item_number(value) -> str:
+    """Join key for an item number: NDCs as 11 digits, anything else upper-case alphanumerics."""
+    return _normalize(str(value).strip().upper()) if value else ""
+
+
+def item_key(line: Dict) -> str:
+    """Normalized item number of a PO / slip / invoice line ("" when it has none)."""
+    return normalize_item_number(line.get("item_number") or line.get("ndc") or line.get("item_id"))
+
+
+def join_by_item(left: List[Dict], right: List[Dict]) -> Dict[int, int]:
+    """
+    Hash join two line lists on item_key. Returns {left index: right index}
+    for the lines paired; each right line is used at most once, in order,
+    so a number repeated on several lines pairs them up one for one.
+    """
+    right_keys = [item_key(line) for line in right]
+    if not any(right_keys):
+        return {}
+    return join_keys([item_key(line) for line in left], right_keys)
+
+
+def join_keys(left: List[str], right: List[str]) -> Dict[int, int]:
+    """join_by_item on item keys already computed ("" for a line without one)."""
+    by_key: Dict[str, List[int]] = {}
+    for j, key in enumerate(right):
+        if key:
+            by_key.setdefault(key, []).append(j)
+    pairs = {}
+    if not by_key:
+        return pairs
+    for i, key in enumerate(left):
+        waiting = by_key.get(key)
+        if waiting:
+            pairs[i] = waiting.pop(0)
+    return pairs
+
+
+def compact_lines(items: List[Dict], name_keys=("description", "item")) -> List[Tuple]:
+    """
+    Lines reduced to the tuples the v1 matchers compare:
+
+        (item key, description, lower-cased name, quantity, unit price)
+
+    The name is the first of name_keys present; quantity and price are floats
+    (0 when unreadable). Plain tuples of str / float pickle in a fraction of
+    the time of the extracted dicts, for the match pool (app/match_pool.py).
+    """
+    lines = []
+    for item in items or []:
+        name = ""
+        for key in name_keys:
+            name = item.get(key) or ""
+            if name:
+                break
+        lines.append((item_key(item), item.get("description", ""), name.lower(),
+                      _number(item.get("quantity", 0)), _number(item.get("unit_price", 0))))
+    return lines
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0
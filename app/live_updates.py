@@ -0,0 +1,34 @@
+"""
+VerifyAP - Live Update Client Snippet
+Purpose: Shared <script> for pages that follow /api/v2/events/stream
+(see app/change_feed.py) instead of polling or waiting for a refresh.
+"""
+
+
+def get_live_updates_script():
+    """Return a <script> defining subscribeChanges(onChanges, onReload)."""
+    return """
+    <script>
+        // onChanges({seq, po_ids, events}) for small batches; onReload() when the
+        // server says too much changed (or we missed messages) to patch rows.
+        // EventSource reconnects on its own and resumes from Last-Event-ID.
+        function subscribeChanges(onChanges, onReload) {
+            if (!window.EventSource) return null;
+            var source = new EventSource('/api/v2/events/stream');
+            source.addEventListener('changes', function(e) {
+                var msg = JSON.parse(e.data);
+                if (msg.reload) {
+                    onReload();
+                } else {
+                    onChanges(msg);
+                }
+            });
+            return source;
+        }
+
+        // Row ids a batch touched, or null when a full reload is cheaper
+        function changedIds(msg, max) {
+            if (!msg.po_ids || msg.po_ids.length === 0) return [];
+            return msg.po_ids.length > (max || 100) ? null : msg.po_ids;
+        }
+    </script>"""
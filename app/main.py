@@ -5,10 +5,13 @@ Updated: Mar 2, 2026 — Unified PO upload endpoint (auto-detects CSV/TSV/PDF/im
 
 import os
 import json
-import base64
+import time
+import asyncio
+from typing import Optional
 from fastapi import FastAPI, UploadFile, File, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 # --- App Setup ---
 app = FastAPI(title="VerifyAP", description="AI-Powered 3-Way Match for Accounts Payable")
@@ -28,19 +31,95 @@ match_results = []
 
 
 # --- Import Page Modules ---
-from .admin_html import get_admin_html, handle_csv_upload, handle_tsv_upload, handle_po_pdf_upload
+from .admin_html import get_admin_html, handle_csv_upload, handle_tsv_upload, handle_po_pdf_upload, store_extracted_pos
 from .invoice_html import get_invoice_html
 from .deliveries_html import get_deliveries_html
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
 from .po_matcher import match_packing_slip
+from .po_index import find_po_number, reset_po_index
+from .po_inference import reset_content_index
 from .invoice_matcher import match_invoice
 from .api_routes import router as api_v2_router
+from .vision_client import create_message, get_media_type, build_vision_params, parse_vision_json
+from .vision_stream import stream_vision_events
+from .vision_limiter import get_vision_limiter
+from .metrics import registry, stage, record_payload, record_usage, record_cache, cache_hit_rates, monitor_event_loop, event_loop_lag_summary
+from .metrics_html import get_metrics_html
+from .profiling import ProfilerMiddleware, get_profile_store, verify_profile_token, folded, top_functions, PROFILE_HEADER
+from .batch_extraction import BatchExtractionQueue
+from .database import get_db, set_db
+from .shared_state import configure_shared_state, ReplicatedStore, SharedStateMiddleware
+from .maintenance import configure_maintenance, maintenance_enabled
+from .change_feed import get_change_feed
+from .vendor_registry import get_vendor_registry
+from .match_memory import get_match_memory
+from .duplicate_index import DuplicateIndex, content_hash, duplicate_discrepancies
+from .photo_index import PhotoIndex, photo_hash
+from .match_pool import MatchPoolUnavailable, get_match_pool
+from .http_cache import ConditionalGetMiddleware
 from .dashboard_v2_html import get_dashboard_v2_html
 from .po_list_html import get_po_list_html
 from .discrepancies_html import get_discrepancy_list_html
 from .match_detail_html import get_match_detail_html
 from .document_history_html import get_document_history_html
 app.include_router(api_v2_router)
+registry.register_gauges(lambda: get_vision_limiter().gauges())
+app.add_middleware(ProfilerMiddleware)
+
+# --- Shared state across workers (SHARED_STATE_URL; direct when unset) ---
+shared_state = configure_shared_state(get_db())
+if shared_state.replicated:
+    set_db(ReplicatedStore(shared_state, get_db()))
+# Added before SharedStateMiddleware so it runs inside it, after the sync:
+# ETags must reflect other workers' writes
+app.add_middleware(ConditionalGetMiddleware, get_db=get_db)
+app.add_middleware(SharedStateMiddleware, shared=shared_state)
+
+# --- Background maintenance (auto-archive, compaction, cache eviction) ---
+maintenance = configure_maintenance(get_db, shared_state)
+
+_background_tasks = set()
+
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    task = asyncio.create_task(monitor_event_loop())
+    _background_tasks.add(task)
+
+
+@app.on_event("startup")
+async def start_change_feed():
+    """Push store writes to open pages (/api/v2/events/stream). Registered after restore() so a replayed log isn't pushed."""
+    feed = get_change_feed()
+    feed.before_flush = shared_state.sync
+    if feed.on_change not in get_db().change_listeners:
+        get_db().change_listeners.append(feed.on_change)
+    task = asyncio.create_task(feed.run())
+    _background_tasks.add(task)
+
+
+@app.on_event("startup")
+async def start_maintenance():
+    if maintenance_enabled():
+        task = asyncio.create_task(maintenance.run_forever())
+        _background_tasks.add(task)
+
+
+@app.on_event("startup")
+async def start_match_pool():
+    get_match_pool().start()
+
+
+@app.on_event("shutdown")
+def stop_match_pool():
+    get_match_pool().shutdown()
+
+
+@app.on_event("shutdown")
+def snapshot_on_shutdown():
+    """With PERSIST_DIR set, leave a fresh snapshot so the next start has no log tail to replay."""
+    if shared_state.snapshots and shared_state.snapshots.writes_since:
+        shared_state.snapshots.snapshot()
 
 # --- Dashboard HTML ---
 def get_dashboard_html():
@@ -362,6 +441,10 @@ async def document_history():
 async def invoices_page():
     return get_invoice_html()
 
+@app.get("/pipeline-metrics", response_class=HTMLResponse)
+async def pipeline_metrics_page():
+    return get_metrics_html()
+
 
 # =====================
 # API ENDPOINTS
@@ -384,6 +467,95 @@ async def po_stats():
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus text exposition of pipeline stage latency, payloads, tokens and caches."""
+    return PlainTextResponse(registry.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/metrics/summary")
+def metrics_summary():
+    """p50/p95/p99 per pipeline stage plus token usage, cache hit rates and event loop lag."""
+    return {
+        "stages": registry.stage_summary(),
+        "tokens": registry.counter_summary("verifyap_vision_tokens_total"),
+        "caches": cache_hit_rates(),
+        "vision_limiter": get_vision_limiter().snapshot(),
+        "event_loop_lag": event_loop_lag_summary(),
+        "shared_state": shared_state.status(),
+        "event_log": get_db().document_events.stats(),
+        "cold_storage": dict(get_db().cold_storage.stats(), archived_pos=len(get_db().cold_index)) if get_db().cold_storage else None,
+        "change_feed": get_change_feed().stats(),
+        "vendors": get_vendor_registry().stats(),
+        "match_memory": get_match_memory().stats(),
+        "duplicates": dict(duplicate_index.stats(), store=get_db().duplicates.stats()),
+        "photos": photo_index.stats(),
+        "match_pool": get_match_pool().stats(),
+    }
+
+
+# --- Background Maintenance (see app/maintenance.py) ---
+@app.get("/api/admin/maintenance")
+def maintenance_status():
+    """Maintenance tasks with their schedule, last result and recent run history."""
+    return dict(maintenance.status(), enabled=maintenance_enabled())
+
+
+@app.post("/api/admin/maintenance/{task_name}/run")
+async def run_maintenance_task(task_name: str):
+    """Run one maintenance task now instead of waiting for its interval."""
+    task = maintenance.tasks.get(task_name)
+    if task is None:
+        return JSONResponse({"error": "Unknown maintenance task: " + task_name}, status_code=404)
+    if task["running"]:
+        return JSONResponse({"error": task_name + " is already running"}, status_code=409)
+    return await maintenance.run_task(task_name)
+
+
+# --- Request Profiles (opt-in, see app/profiling.py) ---
+def _profile_access_denied(request: Request):
+    secret = os.environ.get("PROFILE_SECRET")
+    if not secret:
+        # Stacks show code paths and arguments: never served without a signed header
+        return JSONResponse({"error": "Not found"}, status_code=404)
+    if not verify_profile_token(secret, request.headers.get(PROFILE_HEADER)):
+        return JSONResponse({"error": "Valid " + PROFILE_HEADER + " header required"}, status_code=403)
+    return None
+
+
+@app.get("/api/admin/profiles")
+def list_profiles(request: Request):
+    """Slowest profiled requests, newest-slowest first (stacks omitted)."""
+    denied = _profile_access_denied(request)
+    if denied:
+        return denied
+    store = get_profile_store()
+    return {"profiled_requests": store.profiled, "keep": store.keep, "profiles": store.list()}
+
+
+@app.get("/api/admin/profiles/{profile_id}")
+def download_profile(profile_id: str, request: Request, format: str = "folded"):
+    """Download one profile as folded stacks, or ?format=json for a top-functions summary."""
+    denied = _profile_access_denied(request)
+    if denied:
+        return denied
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        return JSONResponse({"error": "Profile not found"}, status_code=404)
+    if format == "json":
+        summary = {k: v for k, v in profile.items() if k != "stacks"}
+        summary["top_functions"] = top_functions(profile)
+        return summary
+    filename = "profile-" + profile["route"].strip("/").replace("/", "_").replace("{", "").replace("}", "") + "-" + profile_id + ".folded"
+    return PlainTextResponse(folded(profile), headers={"Content-Disposition": 'attachment; filename="' + filename + '"'})
+
+
+@app.get("/api/vision/limiter")
+async def vision_limiter_stats():
+    """Rate limiter / circuit breaker state for the vision API."""
+    return get_vision_limiter().snapshot()
+
+
 @app.post("/api/upload-po")
 async def upload_po(file: UploadFile = File(...)):
     """Unified PO upload — auto-detects file type and routes accordingly."""
@@ -394,25 +566,27 @@ async def upload_po(file: UploadFile = File(...)):
 
     # Route based on file extension
     if ext == "csv":
-        result = handle_csv_upload(contents, purchase_orders)
+        with stage("po_csv", "import"):
+            result = import_po_table(contents, "csv")
         return JSONResponse(content=result)
 
     elif ext == "tsv":
-        result = handle_tsv_upload(contents, purchase_orders)
+        with stage("po_tsv", "import"):
+            result = import_po_table(contents, "tsv")
         return JSONResponse(content=result)
 
     elif ext in ("pdf", "jpg", "jpeg", "png", "heic", "gif", "webp", "tiff", "tif", "bmp"):
-        result = await handle_po_pdf_upload(contents, filename, purchase_orders)
+        result = await handle_po_pdf_upload(contents, filename, purchase_orders, store_po_document)
         return JSONResponse(content=result)
 
     else:
         # Try to detect from content type
         content_type = file.content_type or ""
         if "csv" in content_type or "text" in content_type:
-            result = handle_csv_upload(contents, purchase_orders)
+            result = import_po_table(contents, "csv")
             return JSONResponse(content=result)
         elif "pdf" in content_type or "image" in content_type:
-            result = await handle_po_pdf_upload(contents, filename, purchase_orders)
+            result = await handle_po_pdf_upload(contents, filename, purchase_orders, store_po_document)
             return JSONResponse(content=result)
         else:
             return JSONResponse(content={
@@ -426,7 +600,7 @@ async def upload_po(file: UploadFile = File(...)):
 async def upload_csv(file: UploadFile = File(...)):
     """Handle CSV upload for purchase orders (legacy endpoint)."""
     contents = await file.read()
-    result = handle_csv_upload(contents, purchase_orders)
+    result = import_po_table(contents, "csv")
     return JSONResponse(content=result)
 
 
@@ -435,179 +609,410 @@ async def upload_po_pdf(file: UploadFile = File(...)):
     """Handle PDF upload for purchase orders (legacy endpoint)."""
     contents = await file.read()
     filename = file.filename or "po_upload.pdf"
-    result = await handle_po_pdf_upload(contents, filename, purchase_orders)
+    result = await handle_po_pdf_upload(contents, filename, purchase_orders, store_po_document)
     return JSONResponse(content=result)
 
 
 @app.post("/api/upload-packing-slip")
-async def upload_packing_slip(file: UploadFile = File(...)):
+async def upload_packing_slip(file: UploadFile = File(...), similar: Optional[str] = None):
     """Handle packing slip upload — OCR via Claude Vision + PO matching."""
-    import anthropic
     from .vision_prompt import get_vision_prompt
 
-    contents = await file.read()
-    filename = file.filename or "packing_slip.jpg"
-
-    # Determine media type
-    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else "jpg"
-    media_map = {
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "png": "image/png",
-        "heic": "image/heic",
-        "pdf": "application/pdf",
-    }
-    media_type = media_map.get(ext, "image/jpeg")
+    return await _vision_upload("packing_slip", file, "packing_slip.jpg", get_vision_prompt(), store_packing_slip, similar)
 
-    # Save file
-    filepath = os.path.join("uploads", filename)
-    with open(filepath, "wb") as f:
-        f.write(contents)
 
-    # Encode to base64
-    b64_data = base64.b64encode(contents).decode("utf-8")
+@app.post("/api/upload-invoice")
+async def upload_invoice(file: UploadFile = File(...), similar: Optional[str] = None):
+    """Handle invoice upload — OCR via Claude Vision + 3-way matching."""
+    from .invoice_vision_prompt import get_invoice_vision_prompt
 
-    # Call Claude Vision
-    try:
-        client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-
-        # Build content block based on file type
-        if media_type == "application/pdf":
-            source_block = {
-                "type": "document",
-                "source": {
-                    "type": "base64",
-                    "media_type": "application/pdf",
-                    "data": b64_data,
-                },
-            }
-        else:
-            source_block = {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": b64_data,
-                },
-            }
-
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        source_block,
-                        {"type": "text", "text": get_vision_prompt()},
-                    ],
-                }
-            ],
-        )
-
-        response_text = message.content[0].text
-
-        # Extract JSON (handle markdown fencing)
-        if "```json" in response_text:
-            json_str = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            json_str = response_text.split("```")[1].split("```")[0].strip()
-        else:
-            json_str = response_text.strip()
+    return await _vision_upload("invoice", file, "invoice.pdf", get_invoice_vision_prompt(), store_invoice, similar)
 
-        slip_data = json.loads(json_str)
 
-        # Match against POs
-        match_result = match_packing_slip(slip_data, purchase_orders)
-        slip_data["match_result"] = match_result
-        slip_data["has_discrepancy"] = match_result.get("has_discrepancy", False)
+async def _vision_upload(pipeline, file, default_filename, prompt, store_fn, similar=None):
+    """Shared body of the interactive upload endpoints, timed stage by stage."""
+    with stage(pipeline, "read"):
+        contents = await file.read()
+    record_payload(pipeline, len(contents))
+    filename = file.filename or default_filename
+    media_type = get_media_type(filename)
+    known, fingerprints = _known_upload(pipeline, contents, media_type, similar)
+    if known:
+        return known
 
-        packing_slips.append(slip_data)
+    # Save file
+    with stage(pipeline, "save_file"):
+        filepath = os.path.join("uploads", filename)
+        with open(filepath, "wb") as f:
+            f.write(contents)
 
-        return {"success": True, "data": slip_data, "match": match_result}
+    # Call Claude Vision
+    try:
+        with stage(pipeline, "encode"):
+            params = build_vision_params(contents, media_type, prompt, max_tokens=2000)
+        with stage(pipeline, "vision"):
+            message = await create_message(params)
+        record_usage(pipeline, message.usage)
+        with stage(pipeline, "parse"):
+            data = parse_vision_json(message.content[0].text)
+        data.update(fingerprints)
+        return await _match_and_store(pipeline, data, store_fn)
 
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 
-@app.post("/api/upload-invoice")
-async def upload_invoice(file: UploadFile = File(...)):
-    """Handle invoice upload — OCR via Claude Vision + 3-way matching."""
-    import anthropic
+@app.post("/api/upload-packing-slip/stream")
+async def upload_packing_slip_stream(file: UploadFile = File(...), similar: Optional[str] = None):
+    """Streaming packing slip upload — NDJSON events as the extraction arrives."""
+    from .vision_prompt import get_vision_prompt
+
+    contents = await file.read()
+    filename = file.filename or "packing_slip.jpg"
+    return _streaming_upload("packing_slip", contents, filename, get_vision_prompt(), store_packing_slip, similar)
+
+
+@app.post("/api/upload-invoice/stream")
+async def upload_invoice_stream(file: UploadFile = File(...), similar: Optional[str] = None):
+    """Streaming invoice upload — NDJSON events as the extraction arrives."""
     from .invoice_vision_prompt import get_invoice_vision_prompt
 
     contents = await file.read()
     filename = file.filename or "invoice.pdf"
+    return _streaming_upload("invoice", contents, filename, get_invoice_vision_prompt(), store_invoice, similar)
+
+
+def _streaming_upload(pipeline, contents, filename, prompt, store_fn, similar=None):
+    """
+    Shared body of the streaming upload endpoints.
+
+    Events (one JSON object per line):
+      field         — a top-level extracted value (po_number, vendor, date, ...)
+      po_lookup     — sent as soon as po_number is known, with the PO's lines
+      item          — one extracted line item, in document order
+      complete      — same payload as the non-streaming endpoint
+      similar_photo — looks like an earlier photo; re-post with ?similar=reuse or ?similar=extract
+      error         — extraction failed
+    """
+    media_type = get_media_type(filename)
+    record_payload(pipeline, len(contents))
+    known, fingerprints = _known_upload(pipeline, contents, media_type, similar)
+    if known:
+        known["event"] = "similar_photo" if known.get("needs_confirmation") else "complete"
+        return StreamingResponse(iter([_ndjson(known)]), media_type="application/x-ndjson")
+
+    with stage(pipeline, "save_file"):
+        filepath = os.path.join("uploads", filename)
+        with open(filepath, "wb") as f:
+            f.write(contents)
+
+    with stage(pipeline, "encode"):
+        params = build_vision_params(contents, media_type, prompt, max_tokens=2000)
+
+    async def events():
+        started = time.perf_counter()
+        try:
+            looked_up = False
+            async for kind, key, value in stream_vision_events(params):
+                if kind == "field":
+                    if key == "items":
+                        continue
+                    yield _ndjson({"event": "field", "name": key, "value": value})
+                    if key == "po_number" and value and not looked_up:
+                        looked_up = True
+                        registry.observe("verifyap_stage_seconds", {"pipeline": pipeline, "stage": "vision_first_po"},
+                                         time.perf_counter() - started)
+                        yield _ndjson(_early_po_lookup(value))
+                elif kind == "item":
+                    yield _ndjson({"event": "item", "index": key, "item": value})
+                else:
+                    registry.observe("verifyap_stage_seconds", {"pipeline": pipeline, "stage": "vision_stream"},
+                                     time.perf_counter() - started)
+                    with stage(pipeline, "parse"):
+                        data = parse_vision_json(value)
+                    data.update(fingerprints)
+                    result = await _match_and_store(pipeline, data, store_fn)
+                    result["event"] = "complete"
+                    yield _ndjson(result)
+        except Exception as e:
+            yield _ndjson({"event": "error", "success": False, "error": str(e)})
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+async def _prematch(pipeline, data):
+    """
+    Compare a large document's lines in the match pool (app/match_pool.py);
+    the store op reuses the result. Returns True when the pool gave up on it,
+    i.e. the store op will compare a slow document itself.
+    """
+    with stage(pipeline, "match_pool"):
+        try:
+            compared = await get_match_pool().prematch(pipeline, data, purchase_orders, packing_slips)
+        except MatchPoolUnavailable:
+            return True
+    if compared:
+        data["line_match"] = compared
+    return False
+
+
+async def _match_and_store(pipeline, data, store_fn):
+    """Prematch, then run the store op; off the event loop when the pool gave up."""
+    if await _prematch(pipeline, data):
+        return await run_in_threadpool(store_fn, data)
+    return store_fn(data)
+
+
+def _early_po_lookup(po_number):
+    """Resolve the PO while the model is still extracting line items."""
+    resolved, _, _ = find_po_number(po_number, purchase_orders)
+    po = purchase_orders.get(resolved) if resolved else None
+    store_po = get_db().get_po_by_number(po_number)
+    return {
+        "event": "po_lookup",
+        "po_number": po_number,
+        "found": po is not None,
+        "resolved_po_number": resolved,
+        "vendor": po.get("vendor") if po else None,
+        "items": po.get("items", []) if po else [],
+        "store_po_id": store_po.get("id") if store_po else None,
+    }
+
+
+def _ndjson(obj):
+    return json.dumps(obj, default=str) + "\n"
 
-    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else "jpg"
-    media_map = {
-        "jpg": "image/jpeg",
-        "jpeg": "image/jpeg",
-        "png": "image/png",
-        "pdf": "application/pdf",
+
+def _known_upload(kind, contents, media_type, similar=None):
+    """
+    Look an upload up before paying for a vision call. Returns (response,
+    fingerprints): response is the earlier result when this file (by SHA-256)
+    was already extracted, a needs_confirmation answer when a photo of it (by
+    pHash, app/photo_index.py) was, or None. A photo match is never reused
+    without asking: two slips on the same vendor form hash as close as two
+    photos of one slip. fingerprints go on the extracted data so the upload
+    is indexed.
+
+    similar="reuse" accepts the photo match, "extract" ignores it.
+    """
+    digest = content_hash(contents)
+    photo = photo_hash(contents, media_type)
+    fingerprints = {"content_sha256": digest, "photo_hash": photo} if photo else {"content_sha256": digest}
+    records = invoices if kind == "invoice" else packing_slips
+
+    ref = duplicate_index.seen(kind, digest)
+    record_cache("upload_hash", ref is not None)
+    if ref is not None:
+        return {"success": True, "duplicate": True, "data": records[ref], "match": records[ref].get("match_result")}, fingerprints
+
+    if photo is None or similar == "extract":
+        return None, fingerprints
+    found = photo_index.nearest(kind, photo)
+    record_cache("photo_hash", found is not None)
+    if found is None:
+        return None, fingerprints
+    ref, distance = found
+    earlier = {"success": True, "duplicate": True, "similar_photo": {"distance": distance},
+               "data": records[ref], "match": records[ref].get("match_result")}
+    if similar == "reuse":
+        return earlier, fingerprints
+    return dict(earlier, success=False, needs_confirmation=True,
+                message="This looks like another photo of a document already uploaded. Reuse its extraction?"), fingerprints
+
+
+# Duplicate invoices / packing slips among the v1 globals, by list position
+# (app/duplicate_index.py), and the pHashes of their photos (app/photo_index.py).
+# Derived state: rebuilt whenever v1 state is loaded.
+duplicate_index = DuplicateIndex()
+photo_index = PhotoIndex()
+
+
+# --- Writes to the v1 globals ---
+# Each write is a named shared-state operation: with SHARED_STATE_URL set it
+# is logged and replayed on every worker, so handlers must only depend on
+# their payload and the replicated state.
+
+def _apply_po_table(payload):
+    contents = payload["contents"].encode("latin-1")
+    if payload["format"] == "tsv":
+        return handle_tsv_upload(contents, purchase_orders)
+    return handle_csv_upload(contents, purchase_orders)
+
+
+def _apply_po_document(po_data):
+    return store_extracted_pos(po_data, purchase_orders)
+
+
+def _apply_packing_slip(slip_data):
+    duplicates = duplicate_index.check("packing_slip", slip_data)
+    match_result = match_packing_slip(slip_data, purchase_orders, slip_data.pop("line_match", None))
+    _flag_duplicates(match_result, "packing_slip", duplicates)
+    slip_data["match_result"] = match_result
+    slip_data["has_discrepancy"] = match_result.get("has_discrepancy", False)
+    duplicate_index.add("packing_slip", slip_data, len(packing_slips))
+    photo_index.add("packing_slip", slip_data.get("photo_hash"), len(packing_slips))
+    packing_slips.append(slip_data)
+    return {"success": True, "data": slip_data, "match": match_result}
+
+
+def _apply_invoice(invoice_data):
+    duplicates = duplicate_index.check("invoice", invoice_data)
+    result = match_invoice(invoice_data, purchase_orders, packing_slips, invoice_data.pop("line_match", None))
+    _flag_duplicates(result, "invoice", duplicates)
+    invoice_data["match_result"] = result
+    duplicate_index.add("invoice", invoice_data, len(invoices))
+    photo_index.add("invoice", invoice_data.get("photo_hash"), len(invoices))
+    invoices.append(invoice_data)
+    match_results.append(result)
+    return {"success": True, "data": invoice_data, "match": result}
+
+
+def _flag_duplicates(result, kind, duplicates):
+    """Add duplicate discrepancies to a match result: a duplicate invoice is rejected, anything else goes to review."""
+    found = duplicate_discrepancies(kind, duplicates)
+    if not found:
+        return
+    result["discrepancies"].extend(found)
+    result["has_discrepancy"] = True
+    result["duplicate_of"] = duplicates["duplicate_of"]
+    result["near_duplicates"] = duplicates["near_duplicates"]
+    if kind == "invoice" and duplicates["duplicate_of"] is not None:
+        result["status"] = "REJECT"
+    elif result["status"] == "APPROVE":
+        result["status"] = "REVIEW"
+
+
+def _rebuild_duplicate_index():
+    duplicate_index.clear()
+    photo_index.clear()
+    for i, slip in enumerate(packing_slips):
+        duplicate_index.add("packing_slip", slip, i)
+        photo_index.add("packing_slip", slip.get("photo_hash"), i)
+    for i, invoice in enumerate(invoices):
+        duplicate_index.add("invoice", invoice, i)
+        photo_index.add("invoice", invoice.get("photo_hash"), i)
+
+
+shared_state.register("po_table", _apply_po_table)
+shared_state.register("po_document", _apply_po_document)
+shared_state.register("packing_slip", _apply_packing_slip)
+shared_state.register("invoice", _apply_invoice)
+
+
+def _dump_v1_state():
+    # CSV imports append to existing POs' item lists, so those are copied too
+    return {
+        "purchase_orders": {num: dict(po, items=list(po.get("items", []))) for num, po in purchase_orders.items()},
+        "packing_slips": list(packing_slips),
+        "invoices": list(invoices),
+        "match_results": list(match_results),
     }
-    media_type = media_map.get(ext, "image/jpeg")
+
+
+def _load_v1_state(state):
+    # In place: other modules hold references to these containers
+    purchase_orders.clear()
+    purchase_orders.update(state.get("purchase_orders", {}))
+    reset_po_index()
+    reset_content_index()
+    packing_slips[:] = state.get("packing_slips", [])
+    invoices[:] = state.get("invoices", [])
+    match_results[:] = state.get("match_results", [])
+    _rebuild_duplicate_index()
+
+
+shared_state.register_state("v1", _dump_v1_state, _load_v1_state)
+shared_state.register_state("vendors", get_vendor_registry().dump, get_vendor_registry().load)
+shared_state.register_state("match_memory", get_match_memory().dump, get_match_memory().load)
+shared_state.restore()
+
+
+def import_po_table(contents, fmt):
+    """Load a PO CSV/TSV upload (raw bytes carried through the log as latin-1)."""
+    return shared_state.execute("po_table", {"contents": contents.decode("latin-1"), "format": fmt})
+
+
+def store_po_document(po_data):
+    """Load vision-extracted PO data (single PO or list) into memory."""
+    return shared_state.execute("po_document", po_data)
+
+
+def store_packing_slip(slip_data):
+    """Match extracted packing slip data against POs and keep it in memory."""
+    with stage("packing_slip", "match"):
+        return shared_state.execute("packing_slip", slip_data)
+
+
+def store_invoice(invoice_data):
+    """3-way match extracted invoice data and keep it in memory."""
+    with stage("invoice", "match"):
+        return shared_state.execute("invoice", invoice_data)
+
+
+# =====================
+# BATCH EXTRACTION (overnight / backfill)
+# =====================
+
+batch_queue = BatchExtractionQueue(appliers={
+    "packing_slip": store_packing_slip,
+    "invoice": store_invoice,
+    "po": store_po_document,
+})
+
+
+@app.post("/api/batch/enqueue")
+async def batch_enqueue(kind: str, file: UploadFile = File(...)):
+    """Queue a packing slip, invoice or PO document for the next message batch."""
+    contents = await file.read()
+    filename = file.filename or "upload"
+
+    known, fingerprints = None, None
+    if kind in ("packing_slip", "invoice"):
+        # Unattended: an exact re-upload is reused, a similar photo is extracted
+        known, fingerprints = _known_upload(kind, contents, get_media_type(filename))
+    if known and not known.get("needs_confirmation"):
+        return dict(known, custom_id=None, queued=len(batch_queue.pending))
 
     filepath = os.path.join("uploads", filename)
     with open(filepath, "wb") as f:
         f.write(contents)
 
-    b64_data = base64.b64encode(contents).decode("utf-8")
+    try:
+        custom_id = batch_queue.enqueue(kind, contents, filename, fingerprints=fingerprints)
+    except ValueError as e:
+        return {"success": False, "error": str(e)}
+    return {"success": True, "custom_id": custom_id, "queued": len(batch_queue.pending)}
+
 
+@app.post("/api/batch/submit")
+async def batch_submit():
+    """Submit every queued document as one batch and poll it in the background."""
     try:
-        client = anthropic.Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
-
-        if media_type == "application/pdf":
-            source_block = {
-                "type": "document",
-                "source": {
-                    "type": "base64",
-                    "media_type": "application/pdf",
-                    "data": b64_data,
-                },
-            }
-        else:
-            source_block = {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": b64_data,
-                },
-            }
-
-        message = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        source_block,
-                        {"type": "text", "text": get_invoice_vision_prompt()},
-                    ],
-                }
-            ],
-        )
-
-        response_text = message.content[0].text
-
-        if "```json" in response_text:
-            json_str = response_text.split("```json")[1].split("```")[0].strip()
-        elif "```" in response_text:
-            json_str = response_text.split("```")[1].split("```")[0].strip()
-        else:
-            json_str = response_text.strip()
+        batch_id = await run_in_threadpool(batch_queue.submit)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    if batch_id is None:
+        return {"success": False, "error": "No documents queued."}
 
-        invoice_data = json.loads(json_str)
+    task = asyncio.create_task(batch_queue.watch(batch_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return {"success": True, "batch_id": batch_id}
 
-        # 3-way match
-        result = match_invoice(invoice_data, purchase_orders, packing_slips)
-        invoice_data["match_result"] = result
-        invoices.append(invoice_data)
-        match_results.append(result)
 
-        return {"success": True, "data": invoice_data, "match": result}
+@app.get("/api/batch")
+def batch_list():
+    """Queued documents and every submitted batch with its results."""
+    return batch_queue.list_batches()
 
+
+@app.get("/api/batch/{batch_id}")
+def batch_status(batch_id: str):
+    """Poll one batch now (applies results if it has ended)."""
+    try:
+        status = batch_queue.poll(batch_id)
     except Exception as e:
         return {"success": False, "error": str(e)}
+    if status is None:
+        return JSONResponse(status_code=404, content={"success": False, "error": "Batch not found"})
+    return status
@@ -0,0 +1,247 @@
+"""
+VerifyAP - Background Maintenance
+Purpose: Run housekeeping (re-matching POs that received documents,
+auto-archiving verified POs, event log compaction, cache eviction) inside the app process without a user clicking anything and
+without stalling requests.
+
+Each task is a plain function fn(deadline) that does at most one slice of
+work — it stops once time.perf_counter() passes deadline — and returns a dict
+of counts plus "more": True when it stopped early. The scheduler runs due
+tasks one slice at a time (MAINTENANCE_SLICE_MS, default 20 ms), each slice
+in a worker thread: a slice's writes can block on I/O the deadline can't
+bound (the shared-state lock, a WAL fsync, a cold bundle write), and that
+must not stall the event loop. It yields between slices, so a large archive
+backlog is worked off in small steps interleaved with requests instead of
+one long run.
+
+Config:
+    MAINTENANCE_ENABLED            0 disables the loop (default 1)
+    MAINTENANCE_SLICE_MS           work per slice (default 20)
+    REMATCH_QUIET_MS               re-match a PO once no document arrived for it this long (default 2000)
+    REMATCH_INTERVAL               seconds between checks for due re-matches (default 1)
+    AUTO_ARCHIVE_DAYS              archive POs verified this long ago (default 0 = off)
+    AUTO_ARCHIVE_INTERVAL          seconds between runs (default 3600)
+    COMPACTION_INTERVAL            seconds between runs (default 600)
+    COMPACTION_MAX_SEGMENTS        event segments offloaded per slice (default 4)
+    CACHE_EVICTION_INTERVAL        seconds between runs (default 300)
+    CACHE_IDLE_SECONDS             evict cold bundles unread this long (default 900)
+
+Run history and durations are served at /api/admin/maintenance and shown on
+the Pipeline Metrics page.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from .metrics import registry
+
+registry.describe("verifyap_maintenance_seconds", "Time spent in each maintenance task slice")
+
+HISTORY_SIZE = 200
+# A run stops after this many slices even if the task still has work; the
+# next run picks up where it left off
+MAX_SLICES_PER_RUN = 500
+
+
+class MaintenanceScheduler:
+    """Interval scheduler for time-sliced maintenance tasks, with a bounded run history."""
+
+    def __init__(self, slice_ms: float = 20.0, pause_ms: float = 5.0):
+        self.slice_s = slice_ms / 1000.0
+        self.pause_s = pause_ms / 1000.0
+        self.tasks: Dict[str, Dict] = {}
+        self.history = deque(maxlen=HISTORY_SIZE)
+        self.before_run: Optional[Callable[[], None]] = None
+
+    @classmethod
+    def from_env(cls) -> "MaintenanceScheduler":
+        return cls(slice_ms=float(os.environ.get("MAINTENANCE_SLICE_MS", "20")))
+
+    def add(self, name: str, interval_s: float, fn: Callable[[float], Dict], description: str = "",
+            keep_idle_runs: bool = True):
+        """keep_idle_runs=False leaves runs that did nothing out of the history (frequent polling tasks)."""
+        self.tasks[name] = {
+            "name": name, "description": description, "interval_s": interval_s, "fn": fn,
+            "keep_idle_runs": keep_idle_runs,
+            "next_due": time.monotonic() + interval_s, "running": False,
+            "runs": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0, "last": None,
+        }
+
+    def due(self) -> List[str]:
+        now = time.monotonic()
+        return [name for name, task in self.tasks.items() if not task["running"] and task["next_due"] <= now]
+
+    async def run_forever(self, poll_s: float = 1.0):
+        while True:
+            for name in self.due():
+                await self.run_task(name, trigger="schedule")
+            await asyncio.sleep(poll_s)
+
+    async def run_task(self, name: str, trigger: str = "manual") -> Dict:
+        """Run one task to completion (or MAX_SLICES_PER_RUN), yielding to the loop between slices."""
+        task = self.tasks[name]
+        task["running"] = True
+        started_at = datetime.now(timezone.utc).isoformat()
+        started = time.perf_counter()
+        busy = 0.0
+        slices = 0
+        totals: Dict = {}
+        error = None
+        try:
+            if self.before_run:
+                await asyncio.to_thread(self.before_run)
+            while slices < MAX_SLICES_PER_RUN:
+                slice_started = time.perf_counter()
+                result = await asyncio.to_thread(task["fn"], slice_started + self.slice_s) or {}
+                elapsed = time.perf_counter() - slice_started
+                registry.observe("verifyap_maintenance_seconds", {"task": name}, elapsed)
+                busy += elapsed
+                slices += 1
+                for key, value in result.items():
+                    if key != "more" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                        totals[key] = totals.get(key, 0) + value
+                    elif key != "more":
+                        totals[key] = value
+                if not result.get("more"):
+                    break
+                await asyncio.sleep(self.pause_s)
+        except Exception as e:
+            error = str(e)
+            task["errors"] += 1
+            print("[VerifyAP] Maintenance task " + name + " failed: " + error)
+        finally:
+            task["running"] = False
+            task["next_due"] = time.monotonic() + task["interval_s"]
+
+        busy_ms = round(busy * 1000, 3)
+        run = {
+            "task": name, "trigger": trigger, "started_at": started_at,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+            "busy_ms": busy_ms, "slices": slices, "result": totals, "error": error,
+        }
+        task["runs"] += 1
+        task["total_ms"] += busy_ms
+        task["max_ms"] = max(task["max_ms"], busy_ms)
+        task["last"] = run
+        if error or task["keep_idle_runs"] or any(totals.values()):
+            self.history.append(run)
+        return run
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        tasks = []
+        for task in self.tasks.values():
+            tasks.append({
+                "name": task["name"], "description": task["description"], "interval_s": task["interval_s"],
+                "running": task["running"], "runs": task["runs"], "errors": task["errors"],
+                "avg_busy_ms": round(task["total_ms"] / task["runs"], 3) if task["runs"] else None,
+                "max_busy_ms": round(task["max_ms"], 3),
+                "next_run_in_s": round(max(0.0, task["next_due"] - now), 1),
+                "last": task["last"],
+            })
+        return {"slice_ms": round(self.slice_s * 1000, 3), "tasks": tasks, "history": list(reversed(self.history))}
+
+
+# ---------------------------------------------------------------------------
+# Tasks
+# ---------------------------------------------------------------------------
+
+def rematch_task(get_db: Callable, quiet_ms: float, batch: int = 10) -> Callable[[float], Dict]:
+    """Apply queued re-matches (app/rematch.py) for POs with no new document in the last quiet_ms."""
+
+    def run(deadline: float) -> Dict:
+        db = get_db()
+        quiet_before = (datetime.now(timezone.utc) - timedelta(milliseconds=quiet_ms)).isoformat()
+        due = db.rematch_due(quiet_before)
+        rematched = 0
+        per_po = None
+        while due and time.perf_counter() < deadline:
+            # One PO first, then as many as the time left fits (up to `batch`)
+            size = 1 if per_po is None else max(1, min(batch, int((deadline - time.perf_counter()) / per_po)))
+            started = time.perf_counter()
+            rematched += db.rematch_pending(due[:size])
+            per_po = max((time.perf_counter() - started) / size, 1e-6)
+            due = due[size:]
+        return {"rematched": rematched, "more": bool(due)}
+
+    return run
+
+
+def auto_archive_task(get_db: Callable, days: int, batch: int = 10) -> Callable[[float], Dict]:
+    """Archive POs verified more than `days` ago, a few at a time, oldest first."""
+
+    def run(deadline: float) -> Dict:
+        db = get_db()
+        archived = 0
+        while True:
+            candidates = db.get_archive_candidates(days, limit=batch)
+            if not candidates:
+                return {"archived": archived, "more": False}
+            # Each archive writes a gzipped bundle: check the deadline per PO
+            for po in candidates:
+                archived += db.batch_archive([po["id"]])
+                if time.perf_counter() >= deadline:
+                    return {"archived": archived, "more": True}
+
+    return run
+
+
+def compaction_task(get_db: Callable, snapshots=None, max_segments: int = 4) -> Callable[[float], Dict]:
+    """Offload old event segments, rebuild indexes left dirty by late events, and snapshot if due."""
+
+    def run(deadline: float) -> Dict:
+        events = get_db().document_events
+        offloaded, to_offload = events.compact(deadline=deadline, limit=max_segments)
+        reindexed, remaining = events.rebuild_indexes(deadline)
+        remaining += to_offload
+        result = {"segments_offloaded": offloaded, "segments_reindexed": reindexed, "more": remaining > 0}
+        if not remaining and snapshots is not None:
+            # Written on the snapshot thread; the scheduler only starts it
+            result["snapshot_started"] = snapshots.request()
+        return result
+
+    return run
+
+
+def cache_eviction_task(get_db: Callable, idle_seconds: float) -> Callable[[float], Dict]:
+    """Release decoded cold-storage bundles and offloaded event segments nobody is reading."""
+
+    def run(deadline: float) -> Dict:
+        db = get_db()
+        evicted = db.cold_storage.evict_idle(idle_seconds) if db.cold_storage else 0
+        return {"cold_bundles_evicted": evicted, "event_segments_released": db.document_events.release_cache()}
+
+    return run
+
+
+def configure_maintenance(get_db: Callable, shared_state) -> MaintenanceScheduler:
+    """Build the default scheduler from the environment."""
+    scheduler = MaintenanceScheduler.from_env()
+    # Archive decisions are made on this worker's replica; catch up first so
+    # two workers don't both archive the same PO
+    scheduler.before_run = shared_state.sync
+    scheduler.add("rematch", float(os.environ.get("REMATCH_INTERVAL", "1")),
+                  rematch_task(get_db, float(os.environ.get("REMATCH_QUIET_MS", "2000"))),
+                  "Re-score the PO lines touched by newly arrived slips and invoices",
+                  keep_idle_runs=False)
+    days = int(os.environ.get("AUTO_ARCHIVE_DAYS", "0"))
+    if days > 0:
+        scheduler.add("auto_archive", float(os.environ.get("AUTO_ARCHIVE_INTERVAL", "3600")),
+                      auto_archive_task(get_db, days),
+                      "Archive POs verified more than " + str(days) + " days ago")
+    scheduler.add("compact_logs", float(os.environ.get("COMPACTION_INTERVAL", "600")),
+                  compaction_task(get_db, shared_state.snapshots,
+                                  int(os.environ.get("COMPACTION_MAX_SEGMENTS", "4"))),
+                  "Offload old event segments, rebuild dirty indexes, snapshot state")
+    scheduler.add("evict_caches", float(os.environ.get("CACHE_EVICTION_INTERVAL", "300")),
+                  cache_eviction_task(get_db, float(os.environ.get("CACHE_IDLE_SECONDS", "900"))),
+                  "Drop idle cold-storage bundles and offloaded event segments")
+    return scheduler
+
+
+def maintenance_enabled() -> bool:
+    return os.environ.get("MAINTENANCE_ENABLED", "1") not in ("0", "false", "no")
@@ -0,0 +1,118 @@
+"""
+VerifyAP - Learned Match Memory
+Purpose: Remember which slip / invoice wording a vendor uses for which PO
+line, so repeat shipments pair up with a dict lookup instead of being
+re-derived through fuzzy_match_score / SequenceMatcher (and without adding
+every new wording to PRODUCT_KEYWORDS by hand).
+
+Per vendor (vendor id from app/vendor_registry.py) the memory maps the
+normalized document text of a line to the normalized PO description it was
+paired with:
+
+    "merck sharp and dohme": {"m m r ii vial 10 pk": "m m r ii vaccine 10x1 dose sdv"}
+
+Pairings are learned from match lines that were accepted: every line of a
+match the engine approved (InMemoryStore.save_match_lines) and every paired,
+undisputed line of a PO that AP verified (InMemoryStore.update_status): a
+line missing on one side or short / over shipped (UNPAIRED_TYPES) teaches
+nothing, since verifying the PO doesn't confirm that pairing. run_3way_match
+consults the memory before fuzzy scoring (find_best_match(memory=...)).
+
+Learning happens inside the store's replicated writes, so every worker
+remembers the same pairings; main.py includes the memory in snapshots.
+MATCH_MEMORY_MAX_PER_VENDOR (default 5000) bounds each vendor's table.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+from .vendor_registry import canonical_vendor_key, get_vendor_registry
+
+
+# Discrepancies that mean the PO line and the document line may not be the same item
+UNPAIRED_TYPES = ("missing_on_po", "missing_on_slip", "missing_on_invoice", "qty_mismatch")
+
+
+def vendor_key(vendor_name: Optional[str]) -> str:
+    """Vendor id when the registry knows the name, else its canonical key."""
+    return get_vendor_registry().resolve(vendor_name) or canonical_vendor_key(vendor_name)
+
+
+class MatchMemory:
+    """vendor -> {normalized document text -> normalized PO description}."""
+
+    def __init__(self, max_per_vendor: int = 5000):
+        self.max_per_vendor = max_per_vendor
+        self.lock = threading.Lock()
+        self.pairs: Dict[str, Dict[str, str]] = {}
+        self.learned = 0
+
+    @classmethod
+    def from_env(cls) -> "MatchMemory":
+        return cls(max_per_vendor=int(os.environ.get("MATCH_MEMORY_MAX_PER_VENDOR", "5000")))
+
+    def for_vendor(self, vendor_name: Optional[str]) -> Dict[str, str]:
+        """The vendor's pairings (empty when there are none). Read-only for callers."""
+        return self.pairs.get(vendor_key(vendor_name), {})
+
+    def remember(self, vendor_name: Optional[str], document_text: str, po_description: str) -> bool:
+        """Record one accepted pairing. Both texts must already be normalized."""
+        key = vendor_key(vendor_name)
+        if not key or not document_text or not po_description or document_text == po_description:
+            return False
+        with self.lock:
+            table = self.pairs.setdefault(key, {})
+            if table.get(document_text) == po_description:
+                return False
+            if document_text not in table and len(table) >= self.max_per_vendor:
+                return False
+            table[document_text] = po_description
+            self.learned += 1
+        return True
+
+    def learn_from_lines(self, vendor_name: Optional[str], line_details: List[Dict], matched_only: bool = True) -> int:
+        """
+        Remember the slip / invoice wording paired with each PO line of a
+        match: only its "match" lines, or with matched_only=False also lines
+        whose discrepancy doesn't put the pairing in doubt (price, totals).
+        """
+        from .discrepancy_engine import normalize_description
+
+        count = 0
+        for line in line_details:
+            status = line.get("line_status")
+            if matched_only and status != "match":
+                continue
+            if status not in ("match", "discrepancy") or line.get("discrepancy_type") in UNPAIRED_TYPES:
+                continue
+            po_text = normalize_description(line.get("po_description") or "")
+            if not po_text:
+                continue
+            for side in ("slip_description", "inv_description"):
+                if line.get(side) and self.remember(vendor_name, normalize_description(line[side]), po_text):
+                    count += 1
+        return count
+
+    def stats(self) -> Dict:
+        return {"vendors": len(self.pairs), "pairings": sum(len(t) for t in self.pairs.values()),
+                "learned": self.learned}
+
+    def dump(self) -> Dict:
+        with self.lock:
+            return {vendor: dict(table) for vendor, table in self.pairs.items()}
+
+    def load(self, state: Dict):
+        with self.lock:
+            self.pairs = {vendor: dict(table) for vendor, table in state.items()}
+
+
+_memory = None
+
+
+def get_match_memory() -> MatchMemory:
+    """Return the process-wide match memory. Creates it on first call."""
+    global _memory
+    if _memory is None:
+        _memory = MatchMemory.from_env()
+    return _memory
@@ -0,0 +1,164 @@
+"""
+VerifyAP - Match Worker Pool
+Purpose: Keep the line comparison of large packing slips and invoices off the
+event loop, so a 300-line invoice doesn't stall every other request while it
+matches.
+
+The v1 matchers are split in two (app/po_matcher.py, app/invoice_matcher.py):
+resolving the PO and packing slip, which needs the in-process indexes and is
+a few dict lookups, and comparing the lines, which is pure and quadratic in
+the worst case. For a document with at least MATCH_POOL_MIN_LINES lines
+(document + PO + slip, default 100) the upload handler resolves the PO, sends
+the lines as compact tuples (app/item_join.py compact_lines) to a process
+pool and awaits the result. The result rides on the extracted data into the
+store op, which uses it instead of comparing again as long as the PO and slip
+are still the ones it was computed against; otherwise, and for small
+documents, the op compares inline as before. Replicas applying the op from
+the shared log reuse the result too.
+
+Config:
+    MATCH_POOL_WORKERS     worker processes (default 2, 0 = always inline)
+    MATCH_POOL_MIN_LINES   smallest document sent to the pool (default 100)
+    MATCH_POOL_TIMEOUT_S   give up after this, kill the workers and compare
+                           in a thread (default 10)
+
+A document the pool gave up on (timeout, dead worker) is one known to be slow
+to compare, so prematch raises MatchPoolUnavailable and the upload handler
+runs the store op in the threadpool rather than on the event loop. The
+workers are terminated first: shutdown() alone leaves a busy worker running,
+and the next pool would start beside it.
+
+Workers are started with "spawn" (no copy of the app's threads or event
+loop). /api/metrics/summary reports the pool under match_pool.
+"""
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+from .item_join import compact_lines
+from .po_inference import resolve_po
+from .po_matcher import compare_slip_lines, line_match_basis
+from .invoice_matcher import compare_invoice_lines, find_matching_slip
+
+
+class MatchPoolUnavailable(Exception):
+    """The pool gave up on a large document; compare it inline, off the event loop."""
+
+
+def _compare(kind: str, args: tuple):
+    """Runs in a worker process."""
+    if kind == "packing_slip":
+        return compare_slip_lines(*args)
+    return compare_invoice_lines(*args)
+
+
+class MatchPool:
+    """Bounded process pool for compare_slip_lines / compare_invoice_lines."""
+
+    def __init__(self, workers: int = 2, min_lines: int = 100, timeout_s: float = 10.0):
+        self.workers = workers
+        self.min_lines = min_lines
+        self.timeout_s = timeout_s
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.inline = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls) -> "MatchPool":
+        return cls(
+            workers=int(os.environ.get("MATCH_POOL_WORKERS", "2")),
+            min_lines=int(os.environ.get("MATCH_POOL_MIN_LINES", "100")),
+            timeout_s=float(os.environ.get("MATCH_POOL_TIMEOUT_S", "10")),
+        )
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def start(self):
+        """Start the workers now rather than on the first large document."""
+        if self.workers > 0:
+            for _ in range(self.workers):
+                self._executor().submit(_compare, "packing_slip", ([], [], ""))
+
+    async def prematch(self, kind: str, data: Dict, purchase_orders: Dict, packing_slips) -> Optional[Dict]:
+        """
+        Compare a large slip / invoice's lines in the pool. Returns the
+        `compared` argument for match_packing_slip / match_invoice, or None
+        when the document is small or its PO isn't found (the store op then
+        compares inline). Raises MatchPoolUnavailable when the pool timed out
+        or failed.
+        """
+        po_number = resolve_po(data, purchase_orders)[0]
+        if po_number is None:
+            return None
+        po_items = purchase_orders[po_number].get("items", [])
+        slip_index, slip = None, None
+        if kind == "invoice":
+            slip_index, slip = find_matching_slip(po_number, packing_slips)
+        slip_items = slip.get("items", []) if slip else []
+        items = data.get("items", [])
+        if self.workers <= 0 or len(items) + len(po_items) + len(slip_items) < self.min_lines:
+            self.inline += 1
+            return None
+
+        po_lines = compact_lines(po_items, ("description",))
+        if kind == "packing_slip":
+            args = (compact_lines(items), po_lines, po_number)
+        else:
+            args = (compact_lines(items, ("description",)), po_lines, compact_lines(slip_items) if slip else None, po_number)
+        self.submitted += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._executor(), _compare, kind, args)
+            result = await asyncio.wait_for(future, self.timeout_s)
+        except asyncio.TimeoutError:
+            # The worker is still busy with it: kill it rather than queue behind it
+            self.timeouts += 1
+            print("[VerifyAP] Match pool: " + kind + " for PO " + po_number + " timed out, matching in a thread")
+            self.shutdown(terminate=True)
+            raise MatchPoolUnavailable("timed out")
+        except Exception as e:
+            # A worker died (BrokenProcessPool) or couldn't start: start over next time
+            self.failures += 1
+            print("[VerifyAP] Match pool: " + kind + " failed, matching in a thread: " + str(e))
+            self.shutdown(terminate=True)
+            raise MatchPoolUnavailable(str(e))
+
+        compared: Dict[str, Any] = {"basis": line_match_basis(po_number, po_items, slip_index)}
+        if kind == "packing_slip":
+            compared["discrepancies"] = result
+        else:
+            compared["discrepancies"], compared["severity"] = result
+        return compared
+
+    def shutdown(self, terminate: bool = False):
+        """Stop the pool; with terminate=True also kill workers still busy with a comparison."""
+        if self.executor is not None:
+            processes = list((self.executor._processes or {}).values()) if terminate else []
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            self.executor = None
+
+    def stats(self) -> Dict:
+        return {"workers": self.workers, "min_lines": self.min_lines, "running": self.executor is not None,
+                "submitted": self.submitted, "inline": self.inline,
+                "timeouts": self.timeouts, "failures": self.failures}
+
+
+_match_pool: Optional[MatchPool] = None
+
+
+def get_match_pool() -> MatchPool:
+    global _match_pool
+    if _match_pool is None:
+        _match_pool = MatchPool.from_env()
+    return _match_pool
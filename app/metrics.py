@@ -0,0 +1,252 @@
+"""
+VerifyAP - Pipeline Metrics
+Purpose: In-process instrumentation for the upload → vision → match → store
+pipeline, exported in Prometheus text format at /metrics and summarized
+(p50/p95/p99 per stage) for the Pipeline Metrics admin page.
+
+Usage:
+    with stage("packing_slip", "vision"):
+        message = await create_message(params)
+    record_usage("packing_slip", message.usage)
+"""
+
+import time
+import asyncio
+import bisect
+import threading
+import contextlib
+from collections import deque
+
+
+# Seconds — upload stages range from microseconds (store) to tens of seconds (vision)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Seconds — event loop stalls (anything above a few ms means blocking work on the loop)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# Bytes — uploaded photos / PDFs
+SIZE_BUCKETS = (1024, 10240, 102400, 262144, 524288, 1048576, 2097152, 5242880, 10485760, 20971520)
+
+RESERVOIR_SIZE = 2048
+
+
+class Histogram:
+    """Cumulative-bucket histogram plus a bounded window of recent samples for percentiles."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=RESERVOIR_SIZE)
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def percentiles(self, *qs):
+        samples = sorted(self.recent)
+        if not samples:
+            return [None for _ in qs]
+        last = len(samples) - 1
+        return [samples[min(last, int(round(q * last)))] for q in qs]
+
+
+class MetricsRegistry:
+    """Thread-safe store of histograms and counters keyed by (name, labels)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.help = {}
+        self.gauge_callbacks = []
+
+    def observe(self, name, labels, value, buckets=LATENCY_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = Histogram(buckets)
+            hist.observe(value)
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def describe(self, name, text):
+        self.help[name] = text
+
+    def register_gauges(self, callback):
+        """callback() -> list of (name, labels_dict, value), evaluated at scrape time."""
+        self.gauge_callbacks.append(callback)
+
+    # -- Export ------------------------------------------------------------
+
+    def render_prometheus(self):
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+
+        seen = set()
+        for (name, labels), hist in histograms:
+            if name not in seen:
+                seen.add(name)
+                lines.append("# HELP " + name + " " + self.help.get(name, name))
+                lines.append("# TYPE " + name + " histogram")
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.bucket_counts):
+                cumulative += n
+                lines.append(name + "_bucket" + _labels(labels, ("le", _num(bound))) + " " + str(cumulative))
+            lines.append(name + "_bucket" + _labels(labels, ("le", "+Inf")) + " " + str(hist.count))
+            lines.append(name + "_sum" + _labels(labels) + " " + _num(hist.sum))
+            lines.append(name + "_count" + _labels(labels) + " " + str(hist.count))
+
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append("# HELP " + name + " " + self.help.get(name, name))
+                lines.append("# TYPE " + name + " counter")
+            lines.append(name + _labels(labels) + " " + _num(value))
+
+        for callback in self.gauge_callbacks:
+            for name, labels, value in callback():
+                if value is None:
+                    continue
+                if name not in seen:
+                    seen.add(name)
+                    lines.append("# HELP " + name + " " + self.help.get(name, name))
+                    lines.append("# TYPE " + name + " gauge")
+                lines.append(name + _labels(tuple(sorted(labels.items()))) + " " + _num(value))
+
+        return "\n".join(lines) + "\n"
+
+    def stage_summary(self):
+        """p50/p95/p99 per pipeline stage, for the admin page."""
+        rows = []
+        with self.lock:
+            items = [(labels, hist) for (name, labels), hist in self.histograms.items() if name == "verifyap_stage_seconds"]
+            for labels, hist in sorted(items):
+                label_map = dict(labels)
+                p50, p95, p99 = hist.percentiles(0.5, 0.95, 0.99)
+                rows.append({
+                    "pipeline": label_map.get("pipeline"),
+                    "stage": label_map.get("stage"),
+                    "count": hist.count,
+                    "mean_ms": round(hist.sum / hist.count * 1000, 3) if hist.count else None,
+                    "p50_ms": round(p50 * 1000, 3) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 3) if p95 is not None else None,
+                    "p99_ms": round(p99 * 1000, 3) if p99 is not None else None,
+                })
+        return rows
+
+    def counter_summary(self, name):
+        with self.lock:
+            return [
+                dict(labels, value=value)
+                for (n, labels), value in sorted(self.counters.items())
+                if n == name
+            ]
+
+
+def _num(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = [k + '="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in pairs]
+    return "{" + ",".join(escaped) + "}"
+
+
+# ---------------------------------------------------------------------------
+# Global registry + helpers used across the app
+# ---------------------------------------------------------------------------
+
+registry = MetricsRegistry()
+registry.describe("verifyap_stage_seconds", "Latency of each upload pipeline stage")
+registry.describe("verifyap_payload_bytes", "Size of uploaded documents")
+registry.describe("verifyap_vision_tokens_total", "Vision API token usage")
+registry.describe("verifyap_cache_requests_total", "Cache lookups by cache and result")
+registry.describe("verifyap_event_loop_lag_seconds", "How late the event loop woke from a timed sleep")
+
+
+@contextlib.contextmanager
+def stage(pipeline, name):
+    """Time one pipeline stage into verifyap_stage_seconds."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            "verifyap_stage_seconds",
+            {"pipeline": pipeline, "stage": name},
+            time.perf_counter() - started,
+        )
+
+
+def record_payload(pipeline, size_bytes):
+    registry.observe("verifyap_payload_bytes", {"pipeline": pipeline}, size_bytes, buckets=SIZE_BUCKETS)
+
+
+def record_usage(pipeline, usage):
+    """Token usage from a Message.usage object (prompt-cache reads count as cache hits)."""
+    if usage is None:
+        return
+    for kind in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"):
+        value = getattr(usage, kind, None)
+        if value:
+            registry.inc("verifyap_vision_tokens_total", {"pipeline": pipeline, "kind": kind}, value)
+    record_cache("prompt_cache", bool(getattr(usage, "cache_read_input_tokens", None)))
+
+
+def record_cache(cache, hit):
+    registry.inc("verifyap_cache_requests_total", {"cache": cache, "result": "hit" if hit else "miss"})
+
+
+def cache_hit_rates():
+    """Hit rate per cache name from verifyap_cache_requests_total."""
+    totals = {}
+    for row in registry.counter_summary("verifyap_cache_requests_total"):
+        entry = totals.setdefault(row["cache"], {"cache": row["cache"], "hits": 0, "misses": 0})
+        entry["hits" if row["result"] == "hit" else "misses"] += row["value"]
+    for entry in totals.values():
+        lookups = entry["hits"] + entry["misses"]
+        entry["hit_rate"] = round(entry["hits"] / lookups, 4) if lookups else None
+    return list(totals.values())
+
+
+async def monitor_event_loop(interval=0.1):
+    """
+    Sleep `interval` in a loop and record how late each wake-up is. Any
+    overshoot is time the loop spent running something else without
+    yielding (sync file I/O, base64 of a large upload, a slow handler).
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = loop.time() - started - interval
+        registry.observe("verifyap_event_loop_lag_seconds", {}, max(0.0, lag), buckets=LAG_BUCKETS)
+
+
+def event_loop_lag_summary():
+    """p50/p99/max lag over the recent window, in ms."""
+    with registry.lock:
+        hist = registry.histograms.get(("verifyap_event_loop_lag_seconds", ()))
+        if hist is None or not hist.recent:
+            return {"samples": 0, "p50_ms": None, "p99_ms": None, "max_ms": None}
+        p50, p99 = hist.percentiles(0.5, 0.99)
+        worst = max(hist.recent)
+        return {
+            "samples": hist.count,
+            "p50_ms": round(p50 * 1000, 3),
+            "p99_ms": round(p99 * 1000, 3),
+            "max_ms": round(worst * 1000, 3),
+        }
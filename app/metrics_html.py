@@ -0,0 +1,292 @@
+"""
+VerifyAP — Pipeline Metrics View
+
+Per-stage latency (p50/p95/p99) for the upload → vision → match → store
+pipeline, token usage, cache hit rates, vision API limiter state and
+event loop lag.
+Raw Prometheus metrics are served at /metrics.
+
+Uses string concatenation (not f-strings) per project convention.
+"""
+
+from .sidebar_component import get_sidebar_html, get_sidebar_styles
+
+
+def get_metrics_html():
+    """Return full HTML for the pipeline metrics page."""
+
+    sidebar_html = get_sidebar_html("pipeline_metrics")
+    sidebar_styles = get_sidebar_styles()
+
+    return """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>VerifyAP — Pipeline Metrics</title>
+    <link rel="icon" type="image/svg+xml" href="/static/favicon.svg">
+    <link href="https://fonts.googleapis.com/css2?family=DM+Sans:wght@400;500;600;700&display=swap" rel="stylesheet">
+    """ + sidebar_styles + """
+    <style>
+        *, *::before, *::after { box-sizing: border-box; margin: 0; padding: 0; }
+        body { font-family: 'DM Sans', sans-serif; background: #F1F5F9; color: #1E293B; }
+
+        .vap-main { margin-left: 260px; padding: 32px 40px; min-height: 100vh; }
+
+        .page-header { display: flex; justify-content: space-between; align-items: flex-start; margin-bottom: 24px; }
+        .page-header h1 { font-size: 24px; font-weight: 700; }
+        .page-header .breadcrumb { font-size: 13px; color: #64748B; margin-top: 4px; }
+        .page-header .breadcrumb a { color: #4F46E5; text-decoration: none; }
+        .page-header .raw-link { font-size: 13px; color: #4F46E5; text-decoration: none; }
+
+        .section-title { font-size: 15px; font-weight: 700; margin: 28px 0 12px 0; }
+
+        .stat-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(170px, 1fr)); gap: 16px; }
+        .stat-card { background: white; border: 1px solid #E2E8F0; border-radius: 12px; padding: 18px 20px; }
+        .stat-label { font-size: 11px; font-weight: 600; color: #64748B; text-transform: uppercase; letter-spacing: 0.5px; }
+        .stat-value { font-size: 24px; font-weight: 700; margin-top: 6px; }
+
+        .data-table-wrap { background: white; border: 1px solid #E2E8F0; border-radius: 12px; overflow: hidden; }
+        table { width: 100%; border-collapse: collapse; }
+        thead { background: #F8FAFC; }
+        th {
+            text-align: left; padding: 12px 20px; font-size: 12px; font-weight: 600;
+            color: #64748B; text-transform: uppercase; letter-spacing: 0.5px;
+            border-bottom: 1px solid #E2E8F0;
+        }
+        td { padding: 12px 20px; font-size: 14px; border-bottom: 1px solid #F1F5F9; font-variant-numeric: tabular-nums; }
+        tr:last-child td { border-bottom: none; }
+
+        .badge { display: inline-block; padding: 3px 10px; border-radius: 20px; font-size: 11px; font-weight: 600; text-transform: uppercase; letter-spacing: 0.3px; }
+        .badge--closed { background: #D1FAE5; color: #065F46; }
+        .badge--half_open { background: #FEF3C7; color: #92400E; }
+        .badge--open { background: #FEE2E2; color: #991B1B; }
+
+        .badge--ok { background: #D1FAE5; color: #065F46; }
+        .badge--running { background: #FEF3C7; color: #92400E; }
+        .badge--error { background: #FEE2E2; color: #991B1B; }
+        .muted { color: #64748B; font-size: 12px; }
+        .run-btn { border: 1px solid #C7D2FE; background: #EEF2FF; color: #4F46E5; border-radius: 8px; padding: 4px 10px; font-size: 12px; font-weight: 600; cursor: pointer; }
+        .run-btn:disabled { opacity: 0.5; cursor: default; }
+
+        .empty-state { text-align: center; padding: 40px 20px; color: #94A3B8; }
+    </style>
+</head>
+<body>
+    """ + sidebar_html + """
+
+    <div class="vap-main">
+        <div class="page-header">
+            <div>
+                <div class="breadcrumb"><a href="/">Dashboard</a> &rsaquo; Pipeline Metrics</div>
+                <h1>Pipeline Metrics</h1>
+            </div>
+            <a class="raw-link" href="/metrics" target="_blank">Prometheus /metrics &rarr;</a>
+        </div>
+
+        <div class="section-title">Vision API &amp; Event Loop</div>
+        <div class="stat-grid" id="limiter-cards"></div>
+
+        <div class="section-title">Stage Latency</div>
+        <div class="data-table-wrap">
+            <table>
+                <thead>
+                    <tr>
+                        <th>Pipeline</th>
+                        <th>Stage</th>
+                        <th>Count</th>
+                        <th>Mean</th>
+                        <th>p50</th>
+                        <th>p95</th>
+                        <th>p99</th>
+                    </tr>
+                </thead>
+                <tbody id="stage-tbody">
+                    <tr><td colspan="7" class="empty-state">Loading...</td></tr>
+                </tbody>
+            </table>
+        </div>
+
+        <div class="section-title">Token Usage &amp; Caches</div>
+        <div class="data-table-wrap">
+            <table>
+                <thead>
+                    <tr><th>Metric</th><th>Labels</th><th>Value</th></tr>
+                </thead>
+                <tbody id="usage-tbody">
+                    <tr><td colspan="3" class="empty-state">Loading...</td></tr>
+                </tbody>
+            </table>
+        </div>
+
+        <div class="section-title">Background Maintenance</div>
+        <div class="data-table-wrap">
+            <table>
+                <thead>
+                    <tr>
+                        <th>Task</th>
+                        <th>Last Run</th>
+                        <th>Busy</th>
+                        <th>Avg / Max</th>
+                        <th>Result</th>
+                        <th>Next</th>
+                        <th></th>
+                    </tr>
+                </thead>
+                <tbody id="maintenance-tbody">
+                    <tr><td colspan="7" class="empty-state">Loading...</td></tr>
+                </tbody>
+            </table>
+        </div>
+
+        <div class="section-title">Recent Maintenance Runs</div>
+        <div class="data-table-wrap">
+            <table>
+                <thead>
+                    <tr><th>Started</th><th>Task</th><th>Trigger</th><th>Slices</th><th>Busy</th><th>Wall</th><th>Result</th></tr>
+                </thead>
+                <tbody id="maintenance-history-tbody">
+                    <tr><td colspan="7" class="empty-state">Loading...</td></tr>
+                </tbody>
+            </table>
+        </div>
+    </div>
+
+    <script>
+        function fmtMs(v) {
+            if (v === null || v === undefined) return '--';
+            return v >= 1000 ? (v / 1000).toFixed(2) + ' s' : v.toFixed(v < 10 ? 2 : 0) + ' ms';
+        }
+
+        function card(label, value) {
+            return '<div class="stat-card"><div class="stat-label">' + label + '</div><div class="stat-value">' + value + '</div></div>';
+        }
+
+        async function loadMetrics() {
+            try {
+                var resp = await fetch('/api/metrics/summary');
+                var data = await resp.json();
+                renderLimiter(data.vision_limiter, data.event_loop_lag);
+                renderStages(data.stages);
+                renderUsage(data.tokens, data.caches);
+            } catch (e) {
+                console.error('Failed to load metrics:', e);
+            }
+        }
+
+        function renderLimiter(l, lag) {
+            var html = '';
+            html += card('Circuit', '<span class="badge badge--' + l.circuit_state + '">' + l.circuit_state.replace('_', ' ') + '</span>');
+            html += card('In Flight / Limit', l.in_flight + ' / ' + l.concurrency_limit);
+            html += card('Queued', l.waiting);
+            html += card('Retries / Throttled', l.counters.retries + ' / ' + l.counters.throttled);
+            html += card('Event Loop Lag p99', fmtMs(lag.p99_ms));
+            document.getElementById('limiter-cards').innerHTML = html;
+        }
+
+        function renderStages(rows) {
+            var tbody = document.getElementById('stage-tbody');
+            if (rows.length === 0) {
+                tbody.innerHTML = '<tr><td colspan="7" class="empty-state">No uploads recorded since the last restart.</td></tr>';
+                return;
+            }
+            var html = '';
+            for (var i = 0; i < rows.length; i++) {
+                var r = rows[i];
+                html += '<tr>';
+                html += '<td><strong>' + r.pipeline + '</strong></td>';
+                html += '<td>' + r.stage + '</td>';
+                html += '<td>' + r.count + '</td>';
+                html += '<td>' + fmtMs(r.mean_ms) + '</td>';
+                html += '<td>' + fmtMs(r.p50_ms) + '</td>';
+                html += '<td>' + fmtMs(r.p95_ms) + '</td>';
+                html += '<td>' + fmtMs(r.p99_ms) + '</td>';
+                html += '</tr>';
+            }
+            tbody.innerHTML = html;
+        }
+
+        function renderUsage(tokens, caches) {
+            var html = '';
+            for (var i = 0; i < tokens.length; i++) {
+                html += '<tr><td>Tokens</td><td>' + tokens[i].pipeline + ' &middot; ' + tokens[i].kind + '</td><td>' + tokens[i].value.toLocaleString() + '</td></tr>';
+            }
+            for (var j = 0; j < caches.length; j++) {
+                var rate = caches[j].hit_rate === null ? '--' : (caches[j].hit_rate * 100).toFixed(1) + '%';
+                html += '<tr><td>Cache hit rate</td><td>' + caches[j].cache + ' (' + caches[j].hits + ' / ' + (caches[j].hits + caches[j].misses) + ')</td><td>' + rate + '</td></tr>';
+            }
+            document.getElementById('usage-tbody').innerHTML = html || '<tr><td colspan="3" class="empty-state">No vision calls recorded yet.</td></tr>';
+        }
+
+        function fmtResult(run) {
+            if (!run) return '--';
+            if (run.error) return '<span class="badge badge--error">error</span> <span class="muted">' + run.error + '</span>';
+            var parts = [];
+            for (var k in run.result) parts.push(k.replace(/_/g, ' ') + ': ' + run.result[k]);
+            return parts.join(', ') || '<span class="muted">nothing to do</span>';
+        }
+
+        function fmtTime(iso) {
+            return iso ? new Date(iso).toLocaleString() : '--';
+        }
+
+        async function loadMaintenance() {
+            try {
+                var resp = await fetch('/api/admin/maintenance');
+                var data = await resp.json();
+                renderMaintenance(data);
+            } catch (e) {
+                console.error('Failed to load maintenance status:', e);
+            }
+        }
+
+        function renderMaintenance(data) {
+            var html = '';
+            for (var i = 0; i < data.tasks.length; i++) {
+                var t = data.tasks[i];
+                var state = t.running ? 'running' : (t.last && t.last.error ? 'error' : 'ok');
+                html += '<tr>';
+                html += '<td><strong>' + t.name + '</strong> <span class="badge badge--' + state + '">' + state + '</span><div class="muted">' + t.description + '</div></td>';
+                html += '<td>' + (t.last ? fmtTime(t.last.started_at) : '--') + '</td>';
+                html += '<td>' + (t.last ? fmtMs(t.last.busy_ms) : '--') + '</td>';
+                html += '<td>' + fmtMs(t.avg_busy_ms) + ' / ' + fmtMs(t.max_busy_ms) + '</td>';
+                html += '<td>' + fmtResult(t.last) + '</td>';
+                html += '<td>' + (data.enabled ? 'in ' + Math.round(t.next_run_in_s) + ' s' : '<span class="muted">disabled</span>') + '</td>';
+                html += '<td><button class="run-btn" onclick="runTask(this, \\'' + t.name + '\\')"' + (t.running ? ' disabled' : '') + '>Run now</button></td>';
+                html += '</tr>';
+            }
+            document.getElementById('maintenance-tbody').innerHTML = html || '<tr><td colspan="7" class="empty-state">No maintenance tasks configured.</td></tr>';
+
+            var rows = '';
+            for (var j = 0; j < data.history.length; j++) {
+                var r = data.history[j];
+                rows += '<tr>';
+                rows += '<td>' + fmtTime(r.started_at) + '</td>';
+                rows += '<td>' + r.task + '</td>';
+                rows += '<td>' + r.trigger + '</td>';
+                rows += '<td>' + r.slices + '</td>';
+                rows += '<td>' + fmtMs(r.busy_ms) + '</td>';
+                rows += '<td>' + fmtMs(r.duration_ms) + '</td>';
+                rows += '<td>' + fmtResult(r) + '</td>';
+                rows += '</tr>';
+            }
+            document.getElementById('maintenance-history-tbody').innerHTML = rows || '<tr><td colspan="7" class="empty-state">No maintenance runs since the last restart.</td></tr>';
+        }
+
+        async function runTask(btn, name) {
+            btn.disabled = true;
+            try {
+                await fetch('/api/admin/maintenance/' + name + '/run', { method: 'POST' });
+            } catch (e) {
+                console.error('Failed to run ' + name + ':', e);
+            }
+            loadMaintenance();
+        }
+
+        loadMetrics();
+        loadMaintenance();
+        setInterval(loadMetrics, 10000);
+        setInterval(loadMaintenance, 10000);
+    </script>
+</body>
+</html>"""
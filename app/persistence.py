@@ -0,0 +1,272 @@
+"""
+VerifyAP - Snapshot + Write-Ahead Log Persistence
+Purpose: Survive restarts and Render deploys without giving up the read
+latency of the in-memory store.
+
+Every shared-state operation (app/shared_state.py: v1 uploads plus the v2
+store's save_*, update_status and batch_archive) is appended to a write-ahead
+log once it has applied cleanly. Every PERSIST_SNAPSHOT_EVERY operations a compact
+snapshot of the whole state is written next to it and the log segments it
+covers are deleted. Startup loads the newest snapshot and replays the log
+tail written after it; an op that fails to apply is skipped and copied to
+wal/quarantine.log.
+
+Layout under PERSIST_DIR:
+    wal/wal-000000000001.log            append-only segments, one op per line
+    wal/quarantine.log                  logged ops that failed to apply on restore, kept for inspection
+    snapshots/snapshot-<time>.json.gz   full state + the log cursor it reflects
+
+With SHARED_STATE_URL set the shared log (SQLite / Redis) is the WAL and
+PERSIST_DIR only adds snapshots, so a restarted worker doesn't replay the
+whole log.
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+
+FSYNC_MODES = ("always", "interval", "off")
+
+
+class FileLogBackend:
+    """
+    Single-process WAL as a shared-state log backend.
+
+    Lines are "seq<TAB>name<TAB>meta<TAB>payload". json.dumps escapes tabs and
+    newlines inside strings, so the payload needs no second encoding. A torn
+    last line (crash mid-write) is dropped when the log is reopened.
+    """
+
+    initial_cursor = 0
+    # Only this process appends: nothing new to read before a request
+    single_writer = True
+
+    def __init__(self, directory, fsync="always", fsync_interval=1.0):
+        if fsync not in FSYNC_MODES:
+            raise ValueError("PERSIST_FSYNC must be one of " + ", ".join(FSYNC_MODES))
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        self.last_seq = 0
+        self._last_fsync = time.monotonic()
+
+        segments = self.segments()
+        if segments:
+            self.last_seq = self._recover(segments[-1][1], segments[-1][0] - 1)
+            self._file = open(segments[-1][1], "a", encoding="utf-8")
+        else:
+            self._file = self._open_segment(1)
+
+    def exclusive(self):
+        return self.write_lock
+
+    def segments(self):
+        """[(first_seq, path)] in log order."""
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith("wal-") and name.endswith(".log"):
+                found.append((int(name[4:-4]), os.path.join(self.directory, name)))
+        return sorted(found)
+
+    def _open_segment(self, first_seq):
+        path = os.path.join(self.directory, "wal-" + str(first_seq).zfill(12) + ".log")
+        return open(path, "a", encoding="utf-8")
+
+    def _recover(self, path, last_seq):
+        """Find the last complete entry of the newest segment, truncating a torn tail."""
+        good_bytes = 0
+        with open(path, "rb") as f:
+            for raw in f:
+                parts = raw.split(b"\t", 3)
+                if not raw.endswith(b"\n") or len(parts) != 4:
+                    break
+                last_seq = int(parts[0])
+                good_bytes += len(raw)
+        if good_bytes != os.path.getsize(path):
+            print("[VerifyAP] WAL: dropping torn entry at the end of " + os.path.basename(path))
+            with open(path, "r+b") as f:
+                f.truncate(good_bytes)
+        return last_seq
+
+    def append(self, name, payload, meta):
+        with self.lock:
+            seq = self.last_seq + 1
+            self._file.write(str(seq) + "\t" + name + "\t" + meta + "\t" + payload + "\n")
+            self._file.flush()
+            if self.fsync == "always" or (self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval):
+                os.fsync(self._file.fileno())
+                self._last_fsync = time.monotonic()
+            self.last_seq = seq
+            return seq
+
+    def read_since(self, cursor):
+        # This process applies its own ops before appending them, so only
+        # restore() reads entries back
+        with self.lock:
+            if cursor >= self.last_seq:
+                return []
+            self._file.flush()
+        return list(self._scan(cursor))
+
+    def _scan(self, cursor):
+        segments = self.segments()
+        for i, (first_seq, path) in enumerate(segments):
+            if i + 1 < len(segments) and segments[i + 1][0] <= cursor + 1:
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    seq, name, meta, payload = line.rstrip("\n").split("\t", 3)
+                    seq = int(seq)
+                    if seq > cursor:
+                        yield (seq, name, payload, meta)
+
+    def quarantine(self, cursor, name, payload, meta, error):
+        """Keep a copy of an op that failed to apply; restore skips it and carries on."""
+        with open(os.path.join(self.directory, "quarantine.log"), "a", encoding="utf-8") as f:
+            f.write(str(cursor) + "\t" + name + "\t" + meta + "\t" + payload + "\t" + json.dumps(error) + "\n")
+
+    def rotate(self):
+        """Start a new segment at the next sequence number (call while writes are paused)."""
+        with self.lock:
+            self._file.close()
+            self._file = self._open_segment(self.last_seq + 1)
+
+    def drop_through(self, cursor):
+        """Delete segments whose entries are all <= cursor (covered by a snapshot)."""
+        segments = self.segments()
+        dropped = 0
+        for i, (first_seq, path) in enumerate(segments[:-1]):
+            if segments[i + 1][0] <= cursor + 1:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+                    dropped += 1
+        return dropped
+
+    def size_bytes(self):
+        return sum(os.path.getsize(path) for _, path in self.segments())
+
+    def close(self):
+        with self.lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class SnapshotManager:
+    """Writes periodic snapshots of a SharedState and restores from the newest one."""
+
+    def __init__(self, shared, directory, every=5000, keep=2):
+        os.makedirs(directory, exist_ok=True)
+        self.shared = shared
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.writes_since = 0
+        self.running = False
+        self.last = None
+
+    def paths(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("snapshot-") and n.endswith(".json.gz"))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def note_write(self):
+        """Called after each executed op; starts a background snapshot when one is due."""
+        self.writes_since += 1
+        if self.every and self.writes_since >= self.every:
+            self.request()
+
+    def request(self) -> bool:
+        """Start a background snapshot if anything was written since the last one."""
+        if self.running or not self.writes_since:
+            return False
+        self.running = True
+        self.writes_since = 0
+        threading.Thread(target=self._snapshot_in_background, name="verifyap-snapshot", daemon=True).start()
+        return True
+
+    def _snapshot_in_background(self):
+        try:
+            self.snapshot()
+        except Exception as e:
+            print("[VerifyAP] Snapshot failed: " + str(e))
+        finally:
+            self.running = False
+
+    def snapshot(self):
+        """
+        Snapshot the state at the current cursor. Writes are paused only while
+        the state providers copy their containers; encoding, compression and
+        the file write happen after.
+        """
+        started = time.perf_counter()
+        backend = self.shared.backend
+        with self.shared.lock:
+            cursor = self.shared.cursor
+            state = self.shared.dump_state()
+            if hasattr(backend, "rotate"):
+                backend.rotate()
+        paused_ms = (time.perf_counter() - started) * 1000
+
+        body = json.dumps({
+            "version": 1,
+            "cursor": cursor,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "worker": self.shared.worker_id,
+            "state": state,
+        }, default=str).encode("utf-8")
+
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        path = os.path.join(self.directory, "snapshot-" + stamp + "-" + self.shared.worker_id + ".json.gz")
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(body, compresslevel=1))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+        for old in self.paths()[:-self.keep]:
+            with contextlib.suppress(OSError):
+                os.remove(old)
+        dropped = backend.drop_through(cursor) if hasattr(backend, "drop_through") else 0
+
+        self.last = {
+            "path": path,
+            "cursor": cursor,
+            "bytes": os.path.getsize(path),
+            "paused_ms": round(paused_ms, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "wal_segments_dropped": dropped,
+        }
+        print("[VerifyAP] Snapshot at cursor " + str(cursor) + ": " + str(self.last["bytes"]) + " bytes, writes paused "
+              + str(self.last["paused_ms"]) + "ms")
+        return self.last
+
+    def load_latest(self):
+        """Newest readable snapshot as (cursor, state), or None."""
+        for path in reversed(self.paths()):
+            try:
+                with open(path, "rb") as f:
+                    doc = json.loads(gzip.decompress(f.read()))
+                return doc["cursor"], doc["state"]
+            except (OSError, ValueError, KeyError, EOFError) as e:
+                print("[VerifyAP] Skipping unreadable snapshot " + os.path.basename(path) + ": " + str(e))
+        return None
+
+    def status(self):
+        paths = self.paths()
+        return {
+            "snapshots": len(paths),
+            "latest": os.path.basename(paths[-1]) if paths else None,
+            "every_ops": self.every,
+            "writes_since_snapshot": self.writes_since,
+            "last": self.last,
+        }
+
@@ -0,0 +1,140 @@
+"""
+VerifyAP - Near-Duplicate Photo Index
+Purpose: Recognize a second or third phone photo of a packing slip / invoice
+that was already extracted, so its earlier extraction can be reused instead
+of paying for another vision call.
+
+The bytes of two photos of the same paper never match (app/duplicate_index.py
+catches exact re-uploads), so each image is reduced to a 64-bit perceptual
+hash (pHash):
+
+    grayscale, 32x32, 2-D DCT, keep the 8x8 lowest frequencies, and set one
+    bit per coefficient: above or below their median
+
+Small shifts, exposure changes and recompression move only a few bits.
+Unrelated pages differ in many more, but two slips printed on the same
+vendor form share header, logo and table rules, which is most of what the
+low frequencies see: they can be as close as two photos of one slip. So a
+match within PHOTO_HASH_MAX_DISTANCE (Hamming distance, default 10) only
+offers the earlier extraction; the user confirms before it is reused.
+
+Search is multi-index hashing: the hash is split into four 16-bit chunks and
+each chunk is looked up in its own dict. Two hashes within distance d share
+at least one chunk within d // 4 bits, so probing each chunk's neighbours
+within that radius finds every match, at a few hundred dict probes
+regardless of how many photos are indexed.
+
+Decoding images needs Pillow (`pip install Pillow`). Without it, and for
+PDFs, photo_hash() returns None and uploads are extracted as usual.
+"""
+
+import io
+import os
+import math
+from functools import lru_cache
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency
+    Image = None
+
+HASH_SIZE = 32
+LOW_FREQUENCIES = 8
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+
+_COSINES = [[math.cos(math.pi * (2 * x + 1) * u / (2 * HASH_SIZE)) for x in range(HASH_SIZE)]
+            for u in range(LOW_FREQUENCIES)]
+
+
+def phash_pixels(pixels: List[int]) -> int:
+    """64-bit pHash of a 32x32 grayscale image given as 1024 row-major values."""
+    rows = [pixels[y * HASH_SIZE:(y + 1) * HASH_SIZE] for y in range(HASH_SIZE)]
+    # Separable DCT: transform rows, then columns, for the low frequencies only
+    row_dct = [[sum(c * p for c, p in zip(cos, row)) for cos in _COSINES] for row in rows]
+    coefficients = []
+    for v in range(LOW_FREQUENCIES):
+        cos = _COSINES[v]
+        for u in range(LOW_FREQUENCIES):
+            coefficients.append(sum(cos[y] * row_dct[y][u] for y in range(HASH_SIZE)))
+    # The DC term is the overall brightness: leave it out of the median
+    median = sorted(coefficients[1:])[len(coefficients) // 2 - 1]
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def photo_hash(contents: bytes, media_type: str) -> Optional[str]:
+    """pHash of an uploaded image as 16 hex digits, or None (not an image, or Pillow missing)."""
+    if Image is None or not media_type.startswith("image/"):
+        return None
+    try:
+        image = Image.open(io.BytesIO(contents))
+        image.draft("L", (HASH_SIZE * 4, HASH_SIZE * 4))  # JPEG: decode at reduced scale
+        image = ImageOps.exif_transpose(image).convert("L").resize((HASH_SIZE, HASH_SIZE), Image.BILINEAR)
+    except Exception:
+        return None
+    return format(phash_pixels(list(image.getdata())), "016x")
+
+
+@lru_cache(maxsize=None)
+def _chunk_masks(radius: int) -> Tuple[int, ...]:
+    """Every CHUNK_BITS-bit mask with at most `radius` bits set."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), r):
+            masks.append(sum(1 << b for b in bits))
+    return tuple(masks)
+
+
+def _chunks(value: int) -> List[int]:
+    return [(value >> (CHUNK_BITS * i)) & ((1 << CHUNK_BITS) - 1) for i in range(CHUNKS)]
+
+
+class PhotoIndex:
+    """pHashes of extracted uploads, per document kind, searchable by Hamming distance."""
+
+    def __init__(self):
+        self.max_distance = int(os.environ.get("PHOTO_HASH_MAX_DISTANCE", "10"))
+        # (kind, chunk number, chunk value) -> [(full hash, ref)]
+        self.buckets: Dict[Tuple[str, int, int], List[Tuple[int, Any]]] = {}
+        self.size = 0
+        self.lookups = 0
+        self.matches = 0
+
+    def add(self, kind: str, photo: Optional[str], ref: Any):
+        if not photo:
+            return
+        value = int(photo, 16)
+        for i, chunk in enumerate(_chunks(value)):
+            self.buckets.setdefault((kind, i, chunk), []).append((value, ref))
+        self.size += 1
+
+    def nearest(self, kind: str, photo: Optional[str]) -> Optional[Tuple[Any, int]]:
+        """(ref, distance) of the closest earlier photo within max_distance, else None."""
+        if not photo:
+            return None
+        self.lookups += 1
+        value = int(photo, 16)
+        best = None
+        masks = _chunk_masks(self.max_distance // CHUNKS)
+        for i, chunk in enumerate(_chunks(value)):
+            for mask in masks:
+                for other, ref in self.buckets.get((kind, i, chunk ^ mask), ()):
+                    distance = (value ^ other).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (ref, distance)
+        if best is not None:
+            self.matches += 1
+        return best
+
+    def clear(self):
+        self.buckets = {}
+        self.size = 0
+
+    def stats(self) -> Dict:
+        return {"available": Image is not None, "photos": self.size, "lookups": self.lookups,
+                "matches": self.matches, "hit_rate": round(self.matches / self.lookups, 3) if self.lookups else None}
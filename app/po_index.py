@@ -0,0 +1,167 @@
+"""
+VerifyAP - OCR-Tolerant PO Number Index
+Purpose: Find the PO a packing slip or invoice refers to when the number came
+back from OCR slightly wrong ("PO-12345", "P0 12345", "PO# 1234S") instead of
+reporting "PO Not Found".
+
+Each PO number is reduced to a key once, when it is indexed:
+
+    upper-case, drop everything but letters and digits, drop a leading
+    "PO" / "PONO" / "PONUMBER", then fold OCR confusables
+    (O/Q/D -> 0, I/L -> 1, S -> 5, B -> 8, Z -> 2, G -> 6)
+
+so "PO-100123", "po 1OO123" and "P0#100l23" all share the key "100123".
+A lookup tries, in order:
+
+    exact       the text is a PO number as stored
+    normalized  its key belongs to exactly one PO
+    fuzzy       exactly one PO key is one edit away (a dropped, extra,
+                misread or swapped character)
+
+Several POs at the same distance is "ambiguous" and resolves to nothing; the
+candidates are returned for the discrepancy message. A fuzzy hit is linked
+but never approved on its own: PO-1007 may be a misread PO-1001 or a PO that
+isn't imported yet, so the matchers add a "PO Number Corrected" discrepancy
+(app/po_inference.py lookup_discrepancy) and the document goes to review.
+
+Fuzzy search generates the query key's one-edit neighbours (deletions,
+substitutions / insertions over the characters that occur in indexed keys,
+adjacent swaps) and looks each up in the key dict: about a hundred dict
+probes for a numeric PO number, independent of how many POs are indexed.
+"""
+
+import re
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CONFUSABLES = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1",
+                             "S": "5", "B": "8", "Z": "2", "G": "6"})
+PREFIXES = ("PONUMBER", "PONO", "PO", "P0")
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def po_number_key(text: Optional[str]) -> str:
+    """Normalized, confusable-folded key for a PO number ("" if nothing is left)."""
+    if not text:
+        return ""
+    key = _NON_ALNUM.sub("", str(text).upper())
+    for prefix in PREFIXES:
+        if key.startswith(prefix) and len(key) > len(prefix):
+            key = key[len(prefix):]
+            break
+    return key.translate(CONFUSABLES)
+
+
+class POIndex:
+    """PO number -> key dict plus one-edit candidate search over the keys."""
+
+    def __init__(self, po_numbers: Iterable[str] = ()):
+        self.keys: Dict[str, List[str]] = {}
+        self.alphabet = set()
+        self.size = 0
+        self.add_all(po_numbers)
+
+    def add(self, po_number: str):
+        key = po_number_key(po_number)
+        self.size += 1
+        if not key:
+            return
+        numbers = self.keys.setdefault(key, [])
+        if po_number not in numbers:
+            numbers.append(po_number)
+        self.alphabet.update(key)
+
+    def add_all(self, po_numbers: Iterable[str]):
+        for po_number in po_numbers:
+            self.add(po_number)
+
+    def candidates(self, text: Optional[str]) -> Tuple[List[str], str]:
+        """PO numbers `text` may refer to, and how they were found ("normalized", "fuzzy" or "none")."""
+        key = po_number_key(text)
+        if not key:
+            return [], "none"
+        exact = self.keys.get(key)
+        if exact:
+            return list(exact), "normalized"
+        found = []
+        for neighbour in self._neighbours(key):
+            for po_number in self.keys.get(neighbour, ()):
+                if po_number not in found:
+                    found.append(po_number)
+        return found, ("fuzzy" if found else "none")
+
+    def _neighbours(self, key: str):
+        alphabet = self.alphabet
+        seen = set()
+        for i in range(len(key) + 1):
+            head, tail = key[:i], key[i:]
+            if tail:
+                seen.add(head + tail[1:])
+                if len(tail) > 1:
+                    seen.add(head + tail[1] + tail[0] + tail[2:])
+                for ch in alphabet:
+                    seen.add(head + ch + tail[1:])
+            for ch in alphabet:
+                seen.add(head + ch + tail)
+        seen.discard(key)
+        return seen
+
+    def stats(self) -> Dict:
+        return {"po_numbers": self.size, "keys": len(self.keys)}
+
+
+# ---------------------------------------------------------------------------
+# Index over the v1 purchase_orders dict
+# ---------------------------------------------------------------------------
+# Kept in step lazily, like InMemoryStore._po_number_index: imports only ever
+# add POs to the dict, so new numbers are the ones past the indexed count.
+# Anything that replaces the dict's contents calls reset_po_index().
+
+_index: Optional[POIndex] = None
+_index_source = None
+
+
+def get_po_index(purchase_orders: Dict[str, Dict]) -> POIndex:
+    """Index over `purchase_orders`, updated with any POs added since the last call."""
+    global _index, _index_source
+    if _index is None or _index_source is not purchase_orders or _index.size > len(purchase_orders):
+        _index, _index_source = POIndex(purchase_orders), purchase_orders
+    elif _index.size < len(purchase_orders):
+        _index.add_all(islice(purchase_orders, _index.size, None))
+    return _index
+
+
+def reset_po_index():
+    global _index, _index_source
+    _index, _index_source = None, None
+
+
+def find_po_number(text: Optional[str], purchase_orders: Dict[str, Dict]) -> Tuple[Optional[str], str, List[str]]:
+    """
+    Resolve a PO number as read from a document to a key of `purchase_orders`.
+
+    Returns (po_number or None, how, candidates) where how is "exact",
+    "normalized", "fuzzy", "ambiguous" or "none".
+    """
+    if not text:
+        return None, "none", []
+    if text in purchase_orders:
+        return text, "exact", [text]
+    found, how = get_po_index(purchase_orders).candidates(text)
+    found = [po_number for po_number in found if po_number in purchase_orders]
+    if len(found) == 1:
+        return found[0], how, found
+    if found:
+        return None, "ambiguous", found
+    return None, "none", []
+
+
+def describe_candidates(candidates: List[str], limit: int = 5) -> str:
+    """Suffix like ' Closest: A, B.' for a PO Not Found message (empty without candidates)."""
+    if not candidates:
+        return ""
+    shown = ", ".join(candidates[:limit])
+    if len(candidates) > limit:
+        shown += " (+" + str(len(candidates) - limit) + " more)"
+    return " Closest: " + shown + "."
@@ -0,0 +1,280 @@
+"""
+VerifyAP - Content-Based PO Inference
+Purpose: Find the PO a packing slip or invoice belongs to when its PO number
+is missing or unreadable (phone photos often come back with po_number: null),
+from what is on it: vendor, date and line items.
+
+Every PO in the v1 book is indexed by features of its lines:
+
+    i:<item number>            SKU / NDC as joined on (app/item_join.py)
+    t:<token>                  description word (letters, 3+ characters)
+    q:<token or item>=<qty>    the same, bound to the line's quantity
+
+held in an inverted index feature -> PO numbers. A document's features are
+looked up rarest first: the rare ones seed the candidate set (union of their
+postings); when every feature is common, postings are intersected instead
+until few enough POs are left. Candidates from another vendor or outside the
+date window are dropped. The rest are scored by how much of the document
+they explain (IDF-weighted share of its features) times the share of their
+own lines the document mentions, so a PO with lines the slip doesn't have
+scores lower. The top PO is linked when it covers enough of the document
+(PO_INFERENCE_MIN_COVERAGE, default 0.5) and is clearly ahead of the
+runner-up (by PO_INFERENCE_MARGIN, default 0.3 on a 0-1 score). It is
+approved on content alone only when the document had no readable PO number;
+when a number was read but found no PO (or several), the inferred link comes
+with a "PO Inferred" discrepancy and the match goes to review.
+
+The work per lookup is bounded by the seed postings (PO_INFERENCE_MAX_CANDIDATES,
+default 500), not by the size of the book.
+"""
+
+import os
+import re
+import math
+from datetime import date, timedelta
+from itertools import islice
+from typing import Dict, List, Optional, Set, Tuple
+
+from .item_join import item_key
+from .po_index import find_po_number, po_number_key
+from .vendor_registry import get_vendor_registry
+
+STOPWORDS = frozenset(["the", "and", "for", "with", "box", "each", "per", "pack"])
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def _qty_key(value) -> Optional[str]:
+    try:
+        qty = float(value)
+    except (TypeError, ValueError):
+        return None
+    return str(int(qty)) if qty == int(qty) else str(qty)
+
+
+def _parse_date(value) -> Optional[date]:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def line_features(item: Dict) -> Set[str]:
+    """Features of one PO / slip / invoice line."""
+    features = set()
+    qty = _qty_key(item.get("quantity", item.get("quantity_shipped")))
+    keys = []
+    item_number = item_key(item)
+    if item_number:
+        features.add("i:" + item_number)
+        keys.append(item_number)
+    description = (item.get("description") or item.get("item") or "").lower()
+    for token in _TOKEN.findall(description):
+        if len(token) >= 3 and not token.isdigit() and token not in STOPWORDS:
+            features.add("t:" + token)
+            keys.append(token)
+    if qty and qty != "0":
+        features.update("q:" + key + "=" + qty for key in keys)
+    return features
+
+
+def document_features(items: List[Dict]) -> Set[str]:
+    features = set()
+    for item in items or []:
+        features |= line_features(item)
+    return features
+
+
+class ContentIndex:
+    """Inverted index from line features to PO numbers, plus each PO's date."""
+
+    def __init__(self, purchase_orders: Optional[Dict[str, Dict]] = None):
+        self.postings: Dict[str, Set[str]] = {}
+        self.po_features: Dict[str, Set[str]] = {}
+        self.po_lines: Dict[str, List[Set[str]]] = {}
+        # po_number -> (id of its items list, line count) when indexed, to spot re-imports
+        self.po_shape: Dict[str, Tuple[int, int]] = {}
+        self.po_date: Dict[str, Optional[date]] = {}
+        self.size = 0
+        self.max_candidates = int(os.environ.get("PO_INFERENCE_MAX_CANDIDATES", "500"))
+        self.min_coverage = float(os.environ.get("PO_INFERENCE_MIN_COVERAGE", "0.5"))
+        self.margin = float(os.environ.get("PO_INFERENCE_MARGIN", "0.3"))
+        self.window_days = int(os.environ.get("PO_INFERENCE_WINDOW_DAYS", "90"))
+        if purchase_orders:
+            for po_number, po in purchase_orders.items():
+                self.add(po_number, po)
+
+    def add(self, po_number: str, po: Dict):
+        if po_number in self.po_features:
+            self._remove(po_number)
+        else:
+            self.size += 1
+        items = po.get("items", [])
+        lines = [f for f in (line_features(item) for item in items) if f]
+        features = set().union(*lines)
+        self.po_features[po_number] = features
+        self.po_lines[po_number] = lines
+        self.po_shape[po_number] = (id(items), len(items))
+        for feature in features:
+            self.postings.setdefault(feature, set()).add(po_number)
+        self.po_date[po_number] = _parse_date(po.get("date"))
+
+    def _remove(self, po_number: str):
+        self.po_lines.pop(po_number, None)
+        for feature in self.po_features.pop(po_number, ()):
+            posting = self.postings.get(feature)
+            if posting:
+                posting.discard(po_number)
+
+    def refresh(self, po_number: str, po: Dict):
+        """Re-index a PO whose lines were replaced or appended to since it was indexed."""
+        items = po.get("items", [])
+        if self.po_shape.get(po_number) != (id(items), len(items)):
+            self.add(po_number, po)
+
+    def candidates(self, document: Dict, purchase_orders: Dict[str, Dict],
+                   restrict: Optional[List[str]] = None) -> Tuple[List[Tuple[str, float, float]], float]:
+        """(po_number, score, coverage) for candidate POs, best first, and the document's total feature weight."""
+        doc_features = document_features(document.get("items", []))
+        features = [f for f in doc_features if self.postings.get(f)]
+        if not features:
+            return [], 0.0
+        n = max(self.size, 1)
+        weights = {f: math.log(1.0 + n / len(self.postings[f])) for f in features}
+        total = sum(weights.values())
+
+        if restrict is not None:
+            pool = set(restrict)
+        else:
+            pool = self._seed(sorted(features, key=lambda f: len(self.postings[f])))
+            if pool is None:
+                return [], total
+
+        vendors = get_vendor_registry()
+        vendor_text = document.get("vendor") or ""
+        doc_date = _parse_date(document.get("date"))
+        scored = []
+        for po_number in pool:
+            po = purchase_orders.get(po_number)
+            if po is None:
+                continue
+            self.refresh(po_number, po)
+            if vendor_text.strip() and po.get("vendor") and not vendors.same_vendor(vendor_text, po["vendor"]):
+                continue
+            po_date = self.po_date.get(po_number)
+            if doc_date and po_date and not (po_date - timedelta(days=3) <= doc_date <= po_date + timedelta(days=self.window_days)):
+                continue
+            po_features = self.po_features.get(po_number, ())
+            shared = sum(weights[f] for f in features if f in po_features)
+            if shared > 0:
+                # How much of the document the PO explains, times the share of
+                # the PO's lines the document mentions at all
+                lines = self.po_lines.get(po_number) or [()]
+                matched = sum(1 for line in lines if not doc_features.isdisjoint(line))
+                coverage = shared / total
+                scored.append((po_number, coverage * matched / len(lines), coverage))
+        scored.sort(key=lambda c: (-c[1], c[0]))
+        return scored, total
+
+    def _seed(self, features: List[str]) -> Optional[Set[str]]:
+        """Initial candidate POs: union of rare postings, else an intersection of common ones."""
+        pool: Set[str] = set()
+        for feature in features:
+            posting = self.postings[feature]
+            if len(pool) + len(posting) > self.max_candidates:
+                break
+            pool |= posting
+        if pool:
+            return pool
+        # Every feature is common: narrow with intersections, skipping any
+        # feature (a misread word, a short-shipped quantity) that empties it
+        pool = set(self.postings[features[0]])
+        for feature in features[1:]:
+            if len(pool) <= self.max_candidates:
+                break
+            narrowed = pool & self.postings[feature]
+            if narrowed:
+                pool = narrowed
+        return pool if len(pool) <= self.max_candidates else None
+
+    def infer(self, document: Dict, purchase_orders: Dict[str, Dict],
+              restrict: Optional[List[str]] = None) -> Dict:
+        """Best PO for `document` (or None) with its score, coverage and the runners-up."""
+        scored, total = self.candidates(document, purchase_orders, restrict)
+        result = {"po_number": None, "confident": False, "coverage": 0.0,
+                  "candidates": [{"po_number": p, "score": round(s, 3)} for p, s, _ in scored[:5]]}
+        if not scored:
+            return result
+        top_po, top, coverage = scored[0]
+        runner_up = scored[1][1] if len(scored) > 1 else 0.0
+        result["coverage"] = round(coverage, 3)
+        if coverage >= self.min_coverage and top - runner_up >= self.margin:
+            result["po_number"] = top_po
+            result["confident"] = True
+        return result
+
+    def stats(self) -> Dict:
+        return {"pos": self.size, "features": len(self.postings)}
+
+
+# ---------------------------------------------------------------------------
+# Index over the v1 purchase_orders dict (kept in step like app/po_index.py)
+# ---------------------------------------------------------------------------
+
+_index: Optional[ContentIndex] = None
+_index_source = None
+
+
+def get_content_index(purchase_orders: Dict[str, Dict]) -> ContentIndex:
+    """Content index over `purchase_orders`, updated with any POs added since the last call."""
+    global _index, _index_source
+    if _index is None or _index_source is not purchase_orders or _index.size > len(purchase_orders):
+        _index, _index_source = ContentIndex(purchase_orders), purchase_orders
+    elif _index.size < len(purchase_orders):
+        for po_number in islice(purchase_orders, _index.size, None):
+            _index.add(po_number, purchase_orders[po_number])
+    return _index
+
+
+def reset_content_index():
+    global _index, _index_source
+    _index, _index_source = None, None
+
+
+def resolve_po(document: Dict, purchase_orders: Dict[str, Dict]) -> Tuple[Optional[str], str, List[str], Optional[Dict]]:
+    """
+    Find the PO a slip / invoice refers to: by its PO number (app/po_index.py),
+    else by its content. Returns (po_number or None, how, candidates, inference)
+    where how adds "inferred" to find_po_number's outcomes.
+    """
+    po_number, how, candidates = find_po_number(document.get("po_number"), purchase_orders)
+    if po_number is not None:
+        return po_number, how, candidates, None
+    # A number that fits several POs narrows the search to those
+    inference = get_content_index(purchase_orders).infer(
+        document, purchase_orders, restrict=candidates if how == "ambiguous" else None)
+    if inference["confident"]:
+        return inference["po_number"], "inferred", [inference["po_number"]], inference
+    if not candidates:
+        candidates = [c["po_number"] for c in inference["candidates"]]
+    return None, how, candidates, inference
+
+
+def lookup_discrepancy(po_number_read, po_number: str, how: str) -> Optional[Dict]:
+    """
+    A discrepancy for a PO that was linked from a number other than the one
+    on the document, so the match goes to review instead of approval.
+    """
+    if how == "fuzzy":
+        return {
+            "type": "PO Number Corrected",
+            "message": "PO number corrected from '" + str(po_number_read) + "' to '" + po_number + "'. Confirm the PO.",
+        }
+    if how == "inferred" and po_number_key(po_number_read):
+        # A number was read cleanly; content only suggests the PO
+        return {
+            "type": "PO Inferred",
+            "message": "PO number '" + str(po_number_read) + "' not found; linked to PO " + po_number
+                       + " by vendor, date and line items. Confirm the PO.",
+        }
+    return None
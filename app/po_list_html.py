@@ -8,6 +8,7 @@ Uses string concatenation (not f-strings) per project convention.
 """
 
 from .sidebar_component import get_sidebar_html, get_sidebar_styles
+from .live_updates import get_live_updates_script
 
 
 def get_po_list_html():
@@ -148,8 +149,10 @@ def get_po_list_html():
             </table>
         </div>
     </div>
-
+    """ + get_live_updates_script() + """
     <script>
+        // Only the columns the table renders
+        var PO_FIELDS = 'id,po_number,vendor_name,order_date,total_amount,match_status,total_discrepancies,slip_count,invoice_count,uploaded_at';
         var allPOs = [];
         var currentFilter = '';
         var currentVendor = '';
@@ -157,21 +160,46 @@ def get_po_list_html():
         async function loadPOs() {
             try {
                 var url = '/api/v2/purchase-orders';
-                var params = [];
+                var params = ['fields=' + PO_FIELDS];
                 if (currentFilter) params.push('match_status=' + currentFilter);
                 if (currentVendor) params.push('vendor=' + encodeURIComponent(currentVendor));
-                if (params.length > 0) url += '?' + params.join('&');
+                url += '?' + params.join('&');
 
                 var resp = await fetch(url);
                 var data = await resp.json();
                 allPOs = data.purchase_orders;
-                document.getElementById('result-count').textContent = data.count + ' purchase order' + (data.count !== 1 ? 's' : '');
-                renderTable(allPOs);
+                showPOs();
             } catch (e) {
                 console.error('Failed to load POs:', e);
             }
         }
 
+        function showPOs() {
+            document.getElementById('result-count').textContent = allPOs.length + ' purchase order' + (allPOs.length !== 1 ? 's' : '');
+            renderTable(allPOs);
+        }
+
+        // Live updates: re-fetch only the rows that changed
+        async function applyChanges(msg) {
+            var ids = changedIds(msg);
+            if (ids === null) return loadPOs();
+            if (ids.length === 0) return;
+            var url = '/api/v2/purchase-orders?fields=' + PO_FIELDS + '&po_ids=' + ids.join(',');
+            if (currentFilter) url += '&match_status=' + currentFilter;
+            if (currentVendor) url += '&vendor=' + encodeURIComponent(currentVendor);
+            try {
+                var resp = await fetch(url);
+                var data = await resp.json();
+                var changed = {};
+                for (var i = 0; i < ids.length; i++) changed[ids[i]] = true;
+                allPOs = allPOs.filter(function(po) { return !changed[po.id]; }).concat(data.purchase_orders);
+                allPOs.sort(function(a, b) { return (b.uploaded_at || '').localeCompare(a.uploaded_at || ''); });
+                showPOs();
+            } catch (e) {
+                console.error('Failed to apply changes:', e);
+            }
+        }
+
         function renderTable(pos) {
             var tbody = document.getElementById('po-tbody');
             if (pos.length === 0) {
@@ -228,6 +256,7 @@ def get_po_list_html():
         }
 
         loadPOs();
+        subscribeChanges(applyChanges, loadPOs);
     </script>
 </body>
 </html>"""
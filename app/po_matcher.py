@@ -3,85 +3,75 @@ VerifyAP - PO Matching Engine
 Purpose: Match packing slip data against purchase orders, detect discrepancies.
 """
 
+from .item_join import compact_lines, join_keys
+from .po_index import describe_candidates
+from .po_inference import lookup_discrepancy, resolve_po
+from .vendor_registry import get_vendor_registry
 
-def match_packing_slip(slip_data, purchase_orders):
+
+def match_packing_slip(slip_data, purchase_orders, compared=None):
     """
     Match a packing slip against stored purchase orders.
     
     Args:
         slip_data: Dict with po_number, vendor, items extracted from packing slip
         purchase_orders: Dict of PO number -> PO data
+        compared: compare_slip_lines result computed ahead of time
+            ({"basis", "discrepancies"}); used when the PO still has the same basis
     
     Returns:
         Dict with status, discrepancies list, and match details
     """
-    po_number = slip_data.get("po_number", "")
+    po_number_read = slip_data.get("po_number", "")
     discrepancies = []
 
-    # Check if PO exists
-    if not po_number or po_number not in purchase_orders:
+    # Check if PO exists (tolerating OCR misreads, app/po_index.py), else
+    # infer it from vendor / date / line items (app/po_inference.py)
+    po_number, po_lookup, candidates, inference = resolve_po(slip_data, purchase_orders)
+    if po_number is None:
         return {
             "status": "REVIEW",
             "has_discrepancy": True,
             "discrepancies": [
                 {
                     "type": "PO Not Found",
-                    "message": "Purchase order '" + str(po_number) + "' not found in database.",
+                    "message": "Purchase order '" + str(po_number_read) + "' not found in database." + describe_candidates(candidates),
                 }
             ],
             "po_found": False,
+            "po_lookup": po_lookup,
+            "po_inference": inference,
         }
 
+    corrected = lookup_discrepancy(po_number_read, po_number, po_lookup)
+    if corrected:
+        discrepancies.append(corrected)
+
     po = purchase_orders[po_number]
     slip_items = slip_data.get("items", [])
     po_items = po.get("items", [])
 
-    # Check vendor match
-    slip_vendor = (slip_data.get("vendor") or "").lower().strip()
-    po_vendor = (po.get("vendor") or "").lower().strip()
-    if slip_vendor and po_vendor and slip_vendor != po_vendor:
-        # Partial match check
-        if slip_vendor not in po_vendor and po_vendor not in slip_vendor:
-            discrepancies.append({
-                "type": "Vendor Mismatch",
-                "message": "Slip vendor '" + slip_data.get("vendor", "") + "' vs PO vendor '" + po.get("vendor", "") + "'",
-            })
+    # Check vendor match (canonical names / learned aliases, app/vendor_registry.py)
+    vendors = get_vendor_registry()
+    slip_vendor = slip_data.get("vendor") or ""
+    po_vendor = po.get("vendor") or ""
+    if slip_vendor.strip() and po_vendor.strip() and not vendors.same_vendor(slip_vendor, po_vendor):
+        discrepancies.append({
+            "type": "Vendor Mismatch",
+            "message": "Slip vendor '" + slip_vendor + "' vs PO vendor '" + po_vendor + "'",
+        })
 
-    # Check item quantities
-    for slip_item in slip_items:
-        slip_desc = (slip_item.get("description") or slip_item.get("item") or "").lower()
-        slip_qty = slip_item.get("quantity", 0)
-        try:
-            slip_qty = float(slip_qty)
-        except (ValueError, TypeError):
-            slip_qty = 0
-
-        matched = False
-        for po_item in po_items:
-            po_desc = (po_item.get("description") or "").lower()
-            po_qty = po_item.get("quantity", 0)
-            try:
-                po_qty = float(po_qty)
-            except (ValueError, TypeError):
-                po_qty = 0
-
-            # Fuzzy description match
-            if po_desc and slip_desc and (po_desc in slip_desc or slip_desc in po_desc):
-                matched = True
-                if slip_qty != po_qty:
-                    discrepancies.append({
-                        "type": "Quantity Mismatch",
-                        "message": "'" + slip_item.get("description", "") + "': received " + str(slip_qty) + ", ordered " + str(po_qty),
-                    })
-                break
-
-        if not matched and slip_desc:
-            discrepancies.append({
-                "type": "Item Not on PO",
-                "message": "'" + slip_item.get("description", "") + "' not found on PO " + po_number,
-            })
+    # Check item quantities (in the match pool for a large slip, app/match_pool.py)
+    basis = line_match_basis(po_number, po_items)
+    if compared is not None and compared.get("basis") == basis:
+        discrepancies.extend(compared["discrepancies"])
+    else:
+        discrepancies.extend(compare_slip_lines(compact_lines(slip_items), compact_lines(po_items, ("description",)), po_number))
 
     has_discrepancy = len(discrepancies) > 0
+    if not has_discrepancy and slip_vendor.strip():
+        # A clean match confirms the slip's vendor name as one of the PO vendor's
+        vendors.learn(slip_vendor, po.get("vendor_id") or vendors.register(po_vendor))
     status = "REVIEW" if has_discrepancy else "APPROVE"
 
     return {
@@ -90,4 +80,49 @@ def match_packing_slip(slip_data, purchase_orders):
         "discrepancies": discrepancies,
         "po_found": True,
         "po_number": po_number,
+        "po_number_read": po_number_read,
+        "po_lookup": po_lookup,
+        "po_inference": inference,
     }
+
+
+def line_match_basis(po_number, po_items, slip_index=None):
+    """What a line comparison was computed against; a precomputed one is reused only if this still holds."""
+    return str(po_number) + "|" + str(len(po_items)) + "|" + str(slip_index)
+
+
+def compare_slip_lines(slip_lines, po_lines, po_number):
+    """
+    Quantity / missing-item discrepancies between a slip's lines and its PO's,
+    both as compact_lines tuples. Pure, so it can run in the match pool.
+    Lines are paired by item number / NDC first (app/item_join.py);
+    description matching only sees the lines left over.
+    """
+    discrepancies = []
+    joined = join_keys([line[0] for line in slip_lines], [line[0] for line in po_lines])
+    joined_po = set(joined.values())
+    leftover_po = [po_line for j, po_line in enumerate(po_lines) if j not in joined_po]
+
+    for i, (_, description, slip_desc, slip_qty, _) in enumerate(slip_lines):
+        po_line = po_lines[joined[i]] if i in joined else None
+        if po_line is None and slip_desc:
+            for candidate in leftover_po:
+                po_desc = candidate[2]
+                # Fuzzy description match
+                if po_desc and (po_desc in slip_desc or slip_desc in po_desc):
+                    po_line = candidate
+                    break
+
+        if po_line is not None:
+            po_qty = po_line[3]
+            if slip_qty != po_qty:
+                discrepancies.append({
+                    "type": "Quantity Mismatch",
+                    "message": "'" + description + "': received " + str(slip_qty) + ", ordered " + str(po_qty),
+                })
+        elif slip_desc:
+            discrepancies.append({
+                "type": "Item Not on PO",
+                "message": "'" + description + "' not found on PO " + po_number,
+            })
+    return discrepancies
@@ -0,0 +1,303 @@
+"""
+VerifyAP - Request Profiler
+Purpose: Opt-in statistical profiler for production. A configurable fraction
+of requests per route (or any request carrying a signed admin header) is
+profiled by a sampler thread that snapshots thread stacks every few
+milliseconds. The N slowest profiles are kept in memory and can be downloaded
+as folded stacks (flamegraph.pl / speedscope) from /api/admin/profiles.
+
+Unprofiled requests cost two dict lookups (the route template is cached per
+method and path) and a random() call. Profiled ones
+pay for the sampler thread only, not per-function tracing, so it is safe to
+leave a low rate enabled. Streaming responses (text/event-stream,
+application/x-ndjson) stop sampling when the response starts and are not
+kept: they last as long as the connection.
+
+Configuration (environment):
+    PROFILE_SAMPLE_RATE=0.01              # Default fraction of requests to profile (0 = off)
+    PROFILE_ROUTE_RATES=/api/v2/discrepancies=0.2,/api/v2/dashboard-stats=0.1
+    PROFILE_KEEP=20                       # Slowest profiles retained
+    PROFILE_INTERVAL_MS=5                 # Stack sampling interval
+    PROFILE_SECRET=...                    # Enables X-VerifyAP-Profile header and downloads (404 without it)
+
+Generate a header value that forces profiling for the next hour:
+    PROFILE_SECRET=... python -m app.profiling --sign 3600
+
+Stacks are sampled from every busy thread, so a profile taken while other
+requests are in flight also contains their work.
+"""
+
+import os
+import sys
+import hmac
+import time
+import heapq
+import random
+import hashlib
+import threading
+import itertools
+from collections import Counter
+from datetime import datetime
+
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+
+
+PROFILE_HEADER = "x-verifyap-profile"
+MAX_STACK_DEPTH = 64
+
+# A thread whose innermost frame is in one of these modules is waiting, not working
+IDLE_MODULES = ("selectors.py", "threading.py", "queue.py")
+
+
+# ---------------------------------------------------------------------------
+# Signed admin header
+# ---------------------------------------------------------------------------
+
+def sign_profile_token(secret, ttl_seconds=3600):
+    """Return '<expiry>.<hmac>' valid for ttl_seconds."""
+    expiry = str(int(time.time() + ttl_seconds))
+    digest = hmac.new(secret.encode(), ("profile:" + expiry).encode(), hashlib.sha256).hexdigest()
+    return expiry + "." + digest
+
+
+def verify_profile_token(secret, token):
+    if not secret or not token or "." not in token:
+        return False
+    expiry, digest = token.split(".", 1)
+    if not expiry.isdigit() or int(expiry) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), ("profile:" + expiry).encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+# ---------------------------------------------------------------------------
+# Stack sampler
+# ---------------------------------------------------------------------------
+
+def _frame_label(code):
+    return code.co_name + " (" + os.path.basename(code.co_filename) + ":" + str(code.co_firstlineno) + ")"
+
+
+class StackSampler:
+    """Samples busy thread stacks on a background thread until stopped."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="verifyap-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                labels = []
+                while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                    labels.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.reverse()
+                self.stacks[";".join(labels)] += 1
+
+
+# ---------------------------------------------------------------------------
+# Profile store (N slowest)
+# ---------------------------------------------------------------------------
+
+class ProfileStore:
+    """Keeps the `keep` slowest profiles in a bounded min-heap keyed by duration."""
+
+    def __init__(self, keep=20):
+        self.keep = keep
+        self.lock = threading.Lock()
+        self.heap = []
+        self.seq = itertools.count()
+        self.profiled = 0
+
+    def add(self, profile):
+        entry = (profile["duration_ms"], next(self.seq), profile)
+        with self.lock:
+            self.profiled += 1
+            if len(self.heap) < self.keep:
+                heapq.heappush(self.heap, entry)
+            elif entry[0] > self.heap[0][0]:
+                heapq.heapreplace(self.heap, entry)
+
+    def list(self):
+        with self.lock:
+            entries = sorted(self.heap, reverse=True)
+        return [{k: v for k, v in p.items() if k != "stacks"} for _, _, p in entries]
+
+    def get(self, profile_id):
+        with self.lock:
+            for _, _, profile in self.heap:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+    def clear(self):
+        with self.lock:
+            self.heap = []
+
+
+def folded(profile):
+    """Brendan Gregg folded-stack text: 'frame;frame;frame count' per line."""
+    return "".join(stack + " " + str(n) + "\n" for stack, n in profile["stacks"].most_common())
+
+
+def top_functions(profile, limit=25):
+    """Self and inclusive sample counts per function, heaviest first."""
+    self_counts = Counter()
+    total_counts = Counter()
+    for stack, n in profile["stacks"].items():
+        frames = stack.split(";")
+        self_counts[frames[-1]] += n
+        for label in set(frames):
+            total_counts[label] += n
+    return [
+        {"function": label, "self_samples": self_counts.get(label, 0), "total_samples": n}
+        for label, n in total_counts.most_common(limit)
+    ]
+
+
+# ---------------------------------------------------------------------------
+# ASGI middleware
+# ---------------------------------------------------------------------------
+
+def _parse_route_rates(text):
+    rates = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            path, rate = part.rsplit("=", 1)
+            rates[path.strip()] = float(rate)
+    return rates
+
+
+ROUTE_CACHE_SIZE = 4096
+# Long-lived responses: a profile would run for the whole connection and its
+# duration would push real slow requests out of the store
+STREAMING_TYPES = (b"text/event-stream", b"application/x-ndjson")
+
+
+class ProfilerMiddleware:
+    """Pure ASGI middleware so unprofiled requests (and streamed bodies) pass straight through."""
+
+    def __init__(self, app, store=None, sample_rate=None, route_rates=None, interval_ms=None, secret=None):
+        self.app = app
+        self.store = store or get_profile_store()
+        self.sample_rate = float(os.environ.get("PROFILE_SAMPLE_RATE", "0")) if sample_rate is None else sample_rate
+        self.route_rates = _parse_route_rates(os.environ.get("PROFILE_ROUTE_RATES")) if route_rates is None else route_rates
+        self.interval = (float(os.environ.get("PROFILE_INTERVAL_MS", "5")) if interval_ms is None else interval_ms) / 1000.0
+        self.secret = os.environ.get("PROFILE_SECRET") if secret is None else secret
+        self.enabled = bool(self.sample_rate or self.route_rates or self.secret)
+        self.route_cache = {}
+
+    def _route_path(self, scope):
+        key = (scope["method"], scope["path"])
+        route_path = self.route_cache.get(key)
+        if route_path is None:
+            route_path = scope["path"]
+            for route in scope["app"].router.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    route_path = getattr(route, "path", scope["path"])
+                    break
+            if len(self.route_cache) >= ROUTE_CACHE_SIZE:
+                # Paths with ids in them never repeat: start over rather than grow
+                self.route_cache.clear()
+            self.route_cache[key] = route_path
+        return route_path
+
+    def _should_profile(self, scope):
+        if self.secret:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER.encode():
+                    if verify_profile_token(self.secret, value.decode("latin-1")):
+                        return True, "header"
+                    break
+        if not (self.sample_rate or self.route_rates):
+            return False, None
+        route = self._route_path(scope)
+        rate = self.route_rates.get(route, self.sample_rate)
+        return rate > 0 and random.random() < rate, "sampled"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+
+        profile_it, reason = self._should_profile(scope)
+        if not profile_it:
+            return await self.app(scope, receive, send)
+
+        status = {"code": None, "streaming": False}
+        sampler = StackSampler(self.interval)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                if content_type.split(b";")[0].strip() in STREAMING_TYPES:
+                    # Not profiled: stop sampling now rather than when the client disconnects
+                    status["streaming"] = True
+                    await run_in_threadpool(sampler.stop)
+            await send(message)
+
+        started_at = datetime.now().isoformat()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if not status["streaming"]:
+                # Joins the sampler thread (up to one interval): not on the event loop
+                await run_in_threadpool(sampler.stop)
+                duration = time.perf_counter() - started
+                self.store.add({
+                    "id": format(int(time.time() * 1000), "x") + format(random.getrandbits(24), "06x"),
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route": self._route_path(scope),
+                    "status": status["code"],
+                    "reason": reason,
+                    "started_at": started_at,
+                    "duration_ms": round(duration * 1000, 3),
+                    "samples": sampler.samples,
+                    "interval_ms": self.interval * 1000,
+                    "stacks": sampler.stacks,
+                })
+
+
+# ---------------------------------------------------------------------------
+# Global store instance
+# ---------------------------------------------------------------------------
+
+_store = None
+
+def get_profile_store():
+    """Return the process-wide profile store. Creates it on first call."""
+    global _store
+    if _store is None:
+        _store = ProfileStore(keep=int(os.environ.get("PROFILE_KEEP", "20")))
+    return _store
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "--sign":
+        secret = os.environ.get("PROFILE_SECRET")
+        if not secret:
+            sys.exit("PROFILE_SECRET is not set")
+        ttl = int(sys.argv[2]) if len(sys.argv) > 2 else 3600
+        print(PROFILE_HEADER + ": " + sign_profile_token(secret, ttl))
+    else:
+        print("usage: python -m app.profiling --sign [ttl_seconds]")
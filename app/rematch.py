@@ -0,0 +1,341 @@
+"""
+VerifyAP - Incremental Re-match
+Purpose: Keep each PO's match result current as packing slips and invoices
+arrive, re-scoring only the PO lines a new or corrected document touches
+instead of re-running run_3way_match over every line.
+
+A re-matched result records on each line where its values came from:
+
+    PO product line        po_line_index, slip_shipments {slip id: qty shipped}, invoice_id
+    PO tax line            po_tax_index, invoice_id
+    bundled / missing_on_po source_id (the slip or invoice it is from)
+
+so applying a document only has to:
+  1. take back what an earlier version of it contributed (and, for an
+     invoice, what the invoice it corrects contributed);
+  2. pair its lines with PO lines (item number join, then find_best_match);
+  3. re-score the PO lines it touched (score_product_line).
+
+Partial deliveries add up: slip_qty_shipped is the total over the PO's
+slips. The newest invoice is the one billed, so a corrected invoice replaces
+the earlier one. When a PO gets its first slip or first invoice the match
+type changes and every PO line is re-scored, which is still only a few
+comparisons per line; the fuzzy pairing is never redone for documents
+already applied.
+
+InMemoryStore queues a PO whenever a slip's or invoice's lines are saved,
+and the "rematch" maintenance task applies the queue once a PO has had no
+new document for REMATCH_QUIET_MS (default 2000). A burst of uploads for one
+PO is therefore applied as one update, recorded as one "rematch" document
+event whose `rematch` field holds the diff.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from .item_join import join_by_item
+from .discrepancy_engine import (
+    assess_match, find_best_match, is_bundled_item, is_tax_line, normalize_description,
+    score_product_line, _to_float, _to_int,
+)
+
+SLIP_FIELDS = ("slip_description", "slip_qty_ordered", "slip_qty_shipped")
+INVOICE_FIELDS = ("inv_description", "inv_quantity", "inv_unit_price", "inv_extension")
+
+
+def _po_lines(po: Dict) -> Tuple[List[Dict], List[Dict]]:
+    """(product lines, tax lines) of a PO, split as run_3way_match splits them."""
+    products, taxes = [], []
+    for line in po.get("line_items") or []:
+        if line.get("is_tax_line") or is_tax_line(line.get("description", "")):
+            taxes.append(line)
+        else:
+            products.append(line)
+    return products, taxes
+
+
+def _document_lines(kind: str, doc: Dict) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """(product, bundled, tax) lines of a slip / invoice, split as run_3way_match splits them."""
+    lines = doc.get("line_items") or []
+    if kind == "slip":
+        products = [l for l in lines if not is_bundled_item(l.get("description", ""))]
+        bundled = [l for l in lines if is_bundled_item(l.get("description", ""))]
+        return products, bundled, []
+    products, bundled, taxes = [], [], []
+    for l in lines:
+        desc = l.get("description", "")
+        tax = is_tax_line(desc)
+        if l.get("is_tax_line") or tax:
+            taxes.append(l)
+        if (l.get("is_zero_cost") or is_bundled_item(desc)) and not tax:
+            bundled.append(l)
+        elif not l.get("is_tax_line") and not tax:
+            products.append(l)
+    return products, bundled, taxes
+
+
+def new_match_lines(po: Dict) -> List[Dict]:
+    """Line details of a PO nothing has been matched against yet."""
+    products, taxes = _po_lines(po)
+    lines = []
+    for i, po_line in enumerate(products):
+        detail = {
+            "po_line_index": i,
+            "po_description": po_line.get("description"),
+            "po_quantity": _to_float(po_line.get("quantity")),
+            "po_unit_price": _to_float(po_line.get("unit_price")),
+            "po_line_total": _to_float(po_line.get("line_total")),
+            "slip_shipments": {},
+        }
+        score_product_line(detail, False, False)
+        lines.append(detail)
+    for i, po_tax in enumerate(taxes):
+        lines.append(_reset_tax(dict(
+            po_tax_index=i,
+            po_description=po_tax.get("description"),
+            po_quantity=_to_float(po_tax.get("quantity")),
+            po_unit_price=_to_float(po_tax.get("unit_price")),
+            po_line_total=_to_float(po_tax.get("line_total")),
+        )))
+    _renumber(lines)
+    return lines
+
+
+def _reset_tax(detail: Dict) -> Dict:
+    for field in INVOICE_FIELDS + ("invoice_id",):
+        detail.pop(field, None)
+    detail["line_status"] = "info_only"
+    detail["discrepancy_type"] = "tax_line"
+    detail["discrepancy_note"] = "Tax line — not expected on packing slip"
+    return detail
+
+
+def _set_slip_totals(detail: Dict):
+    shipped = [q for q in detail["slip_shipments"].values() if q is not None]
+    if detail["slip_shipments"]:
+        detail["slip_qty_shipped"] = sum(shipped) if shipped else None
+    else:
+        for field in SLIP_FIELDS:
+            detail.pop(field, None)
+
+
+def _line_key(detail: Dict) -> tuple:
+    if "po_line_index" in detail:
+        return ("po", detail["po_line_index"])
+    if "po_tax_index" in detail:
+        return ("tax", detail["po_tax_index"])
+    return ("doc", detail.get("source_id"), detail.get("slip_description") or detail.get("inv_description"))
+
+
+def _line_state(detail: Dict) -> str:
+    if detail.get("line_status") == "discrepancy":
+        return "discrepancy:" + str(detail.get("discrepancy_type"))
+    return detail.get("line_status") or ""
+
+
+def _sort_key(detail: Dict) -> tuple:
+    if "po_line_index" in detail:
+        return (0, detail["po_line_index"])
+    if "po_tax_index" in detail:
+        return (1, detail["po_tax_index"])
+    if detail.get("discrepancy_type") == "bundled_zero_cost":
+        return (2, 0)
+    return (3 if detail.get("source") == "slip" else 4, 0)
+
+
+def _renumber(lines: List[Dict]):
+    lines.sort(key=_sort_key)
+    for n, detail in enumerate(lines, 1):
+        detail["line_number"] = n
+
+
+def apply_document(po: Dict, match: Dict, lines: List[Dict], kind: str, doc: Dict,
+                   memory: Optional[Dict[str, str]] = None) -> Set[int]:
+    """
+    Fold one slip / invoice (with its line_items) into a re-matched result,
+    in place. Returns the po_line_index of every PO product line it touched;
+    those still need re-scoring (rematch() does that).
+    """
+    doc_id = doc.get("id")
+    products, bundled, taxes = _document_lines(kind, doc)
+    if kind == "slip":
+        replaced = {doc_id}
+        if doc_id not in match["slip_ids"] and (products or bundled):
+            match["slip_ids"].append(doc_id)
+    else:
+        replaced = {doc_id, match.get("invoice_id")} - {None}
+        match["invoice_id"] = doc_id
+        match["invoice_total"] = _to_float(doc.get("total_amount", 0))
+
+    # 1. Take back what this document (or the invoice it corrects) put in
+    touched = set()
+    kept = []
+    for detail in lines:
+        if detail.get("source_id") in replaced:
+            continue
+        if "po_line_index" in detail:
+            if kind == "slip" and doc_id in detail["slip_shipments"]:
+                del detail["slip_shipments"][doc_id]
+                _set_slip_totals(detail)
+                touched.add(detail["po_line_index"])
+            elif kind == "invoice" and detail.get("invoice_id") in replaced:
+                for field in INVOICE_FIELDS + ("invoice_id",):
+                    detail.pop(field, None)
+                touched.add(detail["po_line_index"])
+        elif "po_tax_index" in detail and kind == "invoice" and detail.get("invoice_id") in replaced:
+            _reset_tax(detail)
+        kept.append(detail)
+    lines[:] = kept
+    if kind == "slip" and not (products or bundled) and doc_id in match["slip_ids"]:
+        match["slip_ids"].remove(doc_id)
+
+    # 2. Pair its product lines with PO lines, item numbers first
+    po_products, _ = _po_lines(po)
+    by_index = {d["po_line_index"]: d for d in lines if "po_line_index" in d}
+    joined = join_by_item(po_products, products)
+    used = set(joined.values())
+    for po_index, po_line in enumerate(po_products):
+        if po_index in joined:
+            line = products[joined[po_index]]
+        else:
+            available = [l for i, l in enumerate(products) if i not in used]
+            result = find_best_match(po_line, available, memory=memory) if available else None
+            if not result:
+                continue
+            line = result[0]
+            used.add(products.index(line))
+        detail = by_index.get(po_index)
+        if detail is None:
+            continue
+        touched.add(po_index)
+        if kind == "slip":
+            detail["slip_shipments"][doc_id] = _to_int(line.get("quantity_shipped"))
+            detail["slip_description"] = line.get("description")
+            detail["slip_qty_ordered"] = _to_int(line.get("quantity_ordered"))
+            _set_slip_totals(detail)
+        else:
+            detail["invoice_id"] = doc_id
+            detail["inv_description"] = line.get("description")
+            detail["inv_quantity"] = _to_float(line.get("quantity"))
+            detail["inv_unit_price"] = _to_float(line.get("unit_price"))
+            detail["inv_extension"] = _to_float(line.get("extension"))
+
+    # 3. Its lines the PO doesn't have, and its bundled items
+    for i, line in enumerate(products):
+        if i in used:
+            continue
+        entry = {
+            "source": kind, "source_id": doc_id,
+            "line_status": "discrepancy",
+            "discrepancy_type": "missing_on_po",
+            "qty_match": False, "price_match": None, "total_match": None,
+        }
+        if kind == "slip":
+            entry.update(slip_description=line.get("description"), slip_qty_shipped=_to_int(line.get("quantity_shipped")),
+                         discrepancy_note="Item on packing slip not found on PO")
+        else:
+            entry.update(inv_description=line.get("description"), inv_quantity=_to_float(line.get("quantity")),
+                         inv_unit_price=_to_float(line.get("unit_price")), inv_extension=_to_float(line.get("extension")),
+                         discrepancy_note="Item on invoice not found on PO")
+        lines.append(entry)
+
+    seen_bundled = {normalize_description(d.get("slip_description") or d.get("inv_description") or "")
+                    for d in lines if d.get("discrepancy_type") == "bundled_zero_cost"}
+    for line in bundled:
+        desc_norm = normalize_description(line.get("description", ""))
+        if desc_norm in seen_bundled:
+            continue
+        seen_bundled.add(desc_norm)
+        entry = {
+            "source": kind, "source_id": doc_id,
+            "line_status": "info_only",
+            "discrepancy_type": "bundled_zero_cost",
+            "discrepancy_note": "Bundled item (zero cost) — not on PO, included with shipment",
+        }
+        if kind == "slip":
+            entry.update(slip_description=line.get("description"), slip_qty_shipped=_to_int(line.get("quantity_shipped")))
+        else:
+            entry.update(inv_description=line.get("description"), inv_quantity=_to_float(line.get("quantity")),
+                         inv_unit_price=0, inv_extension=0)
+        lines.append(entry)
+
+    # 4. Invoice tax lines, by position against the PO's
+    if kind == "invoice":
+        tax_details = sorted((d for d in lines if "po_tax_index" in d), key=lambda d: d["po_tax_index"])
+        for detail, inv_tax in zip(tax_details, taxes):
+            detail["invoice_id"] = doc_id
+            detail["inv_description"] = inv_tax.get("description")
+            detail["inv_quantity"] = _to_float(inv_tax.get("quantity"))
+            detail["inv_unit_price"] = _to_float(inv_tax.get("unit_price"))
+            detail["inv_extension"] = _to_float(inv_tax.get("extension"))
+            po_tax_amt = detail["po_line_total"]
+            inv_tax_amt = detail["inv_extension"]
+            if abs(po_tax_amt - inv_tax_amt) > 0.01:
+                detail["line_status"] = "discrepancy"
+                detail["discrepancy_type"] = "tax_mismatch"
+                detail["discrepancy_note"] = "Tax differs: PO $" + str(po_tax_amt) + " vs Invoice $" + str(inv_tax_amt)
+    return touched
+
+
+def rematch(po: Dict, match: Dict, lines: List[Dict], documents: List[Tuple[str, Dict]],
+            memory: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Apply documents [(kind, doc), ...] in arrival order to a re-matched
+    result (match + lines, updated in place; see new_match_lines), re-score
+    the touched PO lines and the overall assessment, and return the diff:
+
+        {"lines": [{"line_number", "description", "from", "to"}], "lines_rescored": n,
+         "overall_status": [before, after], "confidence": [...], "amount_delta": [...]}
+    """
+    match.setdefault("slip_ids", [])
+    before = {_line_key(d): (_line_state(d), d.get("po_description") or d.get("slip_description") or d.get("inv_description"))
+              for d in lines}
+    had = (bool(match["slip_ids"]), match.get("invoice_id") is not None)
+    overall_before = (match.get("overall_status"), match.get("confidence"), match.get("amount_delta"))
+
+    touched = set()
+    for kind, doc in documents:
+        touched |= apply_document(po, match, lines, kind, doc, memory=memory)
+
+    has_slip, has_invoice = bool(match["slip_ids"]), match.get("invoice_id") is not None
+    if (has_slip, has_invoice) != had:
+        touched = {d["po_line_index"] for d in lines if "po_line_index" in d}
+    for detail in lines:
+        if detail.get("po_line_index") in touched:
+            score_product_line(detail, has_slip, has_invoice)
+    _renumber(lines)
+
+    po_total = _to_float(po.get("total_amount", 0))
+    inv_total = match.get("invoice_total", 0) if has_invoice else 0
+    status, confidence, summary, amount_delta = assess_match(lines, po_total, inv_total, has_invoice)
+    match.update({
+        "match_type": "3way" if has_slip and has_invoice else "2way_po_slip" if has_slip else "2way_po_inv" if has_invoice else "none",
+        "overall_status": status,
+        "confidence": confidence,
+        "total_discrepancies": sum(1 for d in lines if d.get("line_status") == "discrepancy"),
+        "amount_delta": amount_delta,
+        "summary": summary,
+        "slip_id": match["slip_ids"][-1] if match["slip_ids"] else None,
+        "incremental": True,
+    })
+
+    changes = []
+    after_keys = set()
+    for detail in lines:
+        key = _line_key(detail)
+        after_keys.add(key)
+        old = before.get(key, ("", None))[0]
+        new = _line_state(detail)
+        if old != new:
+            changes.append({"line_number": detail["line_number"],
+                            "description": detail.get("po_description") or detail.get("slip_description") or detail.get("inv_description"),
+                            "from": old or None, "to": new})
+    for key, (old, description) in before.items():
+        if key not in after_keys:
+            changes.append({"line_number": None, "description": description, "from": old, "to": None})
+    return {
+        "lines": changes,
+        "lines_rescored": len(touched),
+        "overall_status": [overall_before[0], status],
+        "confidence": [overall_before[1], confidence],
+        "amount_delta": [overall_before[2], amount_delta],
+    }
@@ -0,0 +1,389 @@
+"""
+VerifyAP - Shared State Across Workers
+Purpose: Let `uvicorn --workers N` and multiple Render instances serve the
+same POs, slips, invoices and matches.
+
+Every write (v1 uploads in app/main.py, v2 InMemoryStore save_* / status
+changes) is appended as a named operation to an ordered log that lives
+outside the process. Each worker keeps its own in-memory replica and, before
+handling a request, replays any operations other workers appended since it
+last looked. Operations are applied in log order with pinned ids and
+timestamps (InMemoryStore.deterministic), so every replica converges to the
+same state and reads keep in-memory latency.
+
+Backends (SHARED_STATE_URL):
+    unset                         single process, writes applied directly (default)
+    memory://                     in-process log; lets tests run several "workers" in one process
+    sqlite:///data/shared.db      one host, many workers (WAL mode)
+    redis://host:6379/0           many hosts (Redis stream; needs the `redis` package)
+
+PERSIST_DIR adds snapshots, and without SHARED_STATE_URL a local write-ahead
+log, so state survives restarts (app/persistence.py).
+
+Per-process by design: metrics, the vision rate limiter and profiles.
+"""
+
+import os
+import json
+import uuid
+import sqlite3
+import time
+import threading
+import contextlib
+from datetime import datetime, timezone
+
+from starlette.concurrency import run_in_threadpool
+
+from .persistence import FileLogBackend, SnapshotManager
+
+
+# ---------------------------------------------------------------------------
+# Log backends
+# Each backend stores (cursor, name, payload_json, meta_json) in append order.
+# Cursors are opaque to SharedState; it only passes them back to read_since.
+# exclusive() holds off other writers (threads, workers, hosts) while a worker
+# catches up, applies an op and appends it, so the op lands in the log right
+# after the state it was applied to.
+# ---------------------------------------------------------------------------
+
+class MemoryLogBackend:
+    """Process-local log. Share one instance between SharedState objects in tests."""
+
+    initial_cursor = 0
+
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+
+    def exclusive(self):
+        return self.write_lock
+
+    def append(self, name, payload, meta):
+        with self.lock:
+            self.entries.append((name, payload, meta))
+            return len(self.entries)
+
+    def read_since(self, cursor):
+        with self.lock:
+            tail = self.entries[cursor:]
+        return [(cursor + i + 1, name, payload, meta) for i, (name, payload, meta) in enumerate(tail)]
+
+
+class SQLiteLogBackend:
+    """Op log in a SQLite file shared by all workers on one host."""
+
+    initial_cursor = 0
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS op_log ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, payload TEXT NOT NULL, meta TEXT NOT NULL)"
+        )
+        self.lock = threading.Lock()
+        self.write_lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        # BEGIN IMMEDIATE takes SQLite's write lock: other workers' appends wait
+        with self.write_lock:
+            with self.lock:
+                self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                with self.lock:
+                    self.conn.execute("ROLLBACK")
+                raise
+            with self.lock:
+                self.conn.execute("COMMIT")
+
+    def append(self, name, payload, meta):
+        with self.lock:
+            cur = self.conn.execute("INSERT INTO op_log (name, payload, meta) VALUES (?, ?, ?)", (name, payload, meta))
+            return cur.lastrowid
+
+    def read_since(self, cursor):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT seq, name, payload, meta FROM op_log WHERE seq > ? ORDER BY seq", (cursor,)
+            ).fetchall()
+
+
+class RedisLogBackend:
+    """Op log in a Redis stream, for workers spread over several hosts."""
+
+    initial_cursor = "0-0"
+
+    def __init__(self, url, key="verifyap:oplog"):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+
+    def exclusive(self):
+        return self.client.lock(self.key + ":lock", timeout=30, blocking_timeout=30)
+
+    def append(self, name, payload, meta):
+        entry_id = self.client.xadd(self.key, {"name": name, "payload": payload, "meta": meta})
+        return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+    def read_since(self, cursor):
+        rows = []
+        for entry_id, fields in self.client.xrange(self.key, min="(" + cursor, max="+"):
+            entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+            fields = {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v for k, v in fields.items()}
+            rows.append((entry_id, fields["name"], fields["payload"], fields["meta"]))
+        return rows
+
+
+def backend_from_url(url):
+    """Build a log backend from SHARED_STATE_URL (None / "" means direct mode)."""
+    if not url:
+        return None
+    if url.startswith("memory://"):
+        return MemoryLogBackend()
+    if url.startswith("sqlite:///"):
+        return SQLiteLogBackend(url[len("sqlite:///"):])
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        return RedisLogBackend(url)
+    raise ValueError("Unsupported SHARED_STATE_URL: " + url)
+
+
+# ---------------------------------------------------------------------------
+# Replicated state
+# ---------------------------------------------------------------------------
+
+class SharedState:
+    """
+    Applies named operations to this process's replica, through the shared
+    log when a backend is configured.
+
+    handlers: name -> fn(payload) that mutates local state and returns a
+    JSON-able result. Handlers must be deterministic given the replica state.
+    """
+
+    def __init__(self, backend=None, store=None):
+        self.backend = backend
+        self.store = store
+        self.handlers = {}
+        self.cursor = backend.initial_cursor if backend else None
+        self.applied = 0
+        # Logged ops whose handler raised on this replica: skipped, kept for status()
+        self.failed_ops = []
+        self.failed_count = 0
+        self.worker_id = uuid.uuid4().hex[:12]
+        self.lock = threading.RLock()
+        self.snapshots = None
+        self.state_providers = {}
+        if store is not None:
+            self.register_state("store", store.dump_state, store.load_state)
+
+    @property
+    def replicated(self):
+        return self.backend is not None
+
+    def register(self, name, handler):
+        self.handlers[name] = handler
+
+    def register_state(self, name, dump, load):
+        """
+        dump() -> JSON-able state for snapshots; load(state) puts it back in place.
+        dump() runs with writes paused and must copy anything a later op mutates,
+        because the snapshot is encoded after writes resume.
+        """
+        self.state_providers[name] = (dump, load)
+
+    def dump_state(self):
+        with self.lock:
+            return {name: dump() for name, (dump, _) in self.state_providers.items()}
+
+    def restore(self):
+        """Startup: load the newest snapshot (if any), then replay the log after it."""
+        started = time.perf_counter()
+        snapshot_cursor = None
+        with self.lock:
+            latest = self.snapshots.load_latest() if self.snapshots else None
+            if latest:
+                snapshot_cursor, state = latest
+                for name, (_, load) in self.state_providers.items():
+                    if name in state:
+                        load(state[name])
+                self.cursor = snapshot_cursor
+            applied_before, failed_before = self.applied, self.failed_count
+            self.sync()
+            replayed = self.applied - applied_before
+            failed = self.failed_ops[len(self.failed_ops) - (self.failed_count - failed_before):] if self.failed_count > failed_before else []
+        info = {
+            "snapshot_cursor": snapshot_cursor,
+            "replayed_ops": replayed,
+            "failed_ops": failed,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        if latest or replayed:
+            print("[VerifyAP] Restored state: snapshot at " + str(snapshot_cursor) + " + " + str(replayed)
+                  + " logged ops in " + str(info["seconds"]) + "s")
+        if failed:
+            print("[VerifyAP] Restore skipped " + str(len(failed)) + " logged op(s) that failed to apply (see /api/metrics/summary shared_state)")
+        return info
+
+    def execute(self, name, payload):
+        """
+        Apply an operation everywhere and return this worker's result.
+
+        The op is applied here first, to the same JSON round-trip of the
+        payload the other replicas will see, and only appended once its
+        handler succeeded: an op that raises never reaches the log.
+        """
+        if name not in self.handlers:
+            raise ValueError("Unknown shared-state operation: " + name)
+        meta = {"uid": str(uuid.uuid4()), "now": datetime.now(timezone.utc).isoformat(), "worker": self.worker_id}
+
+        if not self.replicated:
+            with self.lock:
+                return self._apply(name, payload, meta)
+        encoded, encoded_meta = json.dumps(payload), json.dumps(meta)
+        with self.lock, self.backend.exclusive():
+            self.sync()
+            result = self._apply(name, json.loads(encoded), meta)
+            self.cursor = self.backend.append(name, encoded, encoded_meta)
+        if self.snapshots:
+            self.snapshots.note_write()
+        return result
+
+    def sync(self):
+        """Replay operations appended since the last sync. Returns how many were read."""
+        if not self.replicated:
+            return 0
+        read = 0
+        with self.lock:
+            for cursor, name, payload, meta in self.backend.read_since(self.cursor):
+                handler = self.handlers.get(name)
+                if handler is None:
+                    print("[VerifyAP] Skipping unknown shared-state op '" + name + "' at " + str(cursor))
+                else:
+                    try:
+                        self._apply(name, json.loads(payload), json.loads(meta))
+                    except Exception as e:
+                        # Logged before ops were checked on the writer (or a bug):
+                        # skip it rather than fail every later sync and restart
+                        self._failed(cursor, name, e)
+                        if hasattr(self.backend, "quarantine"):
+                            self.backend.quarantine(cursor, name, payload, meta, self.failed_ops[-1]["error"])
+                self.cursor = cursor
+                read += 1
+        return read
+
+    def _failed(self, cursor, name, error):
+        self.failed_count += 1
+        self.failed_ops = (self.failed_ops + [{"cursor": cursor, "op": name, "error": type(error).__name__ + ": " + str(error)}])[-20:]
+        print("[VerifyAP] Skipping shared-state op '" + name + "' at " + str(cursor) + ", it failed to apply: "
+              + type(error).__name__ + ": " + str(error))
+
+    def _apply(self, name, payload, meta):
+        self.applied += 1
+        if self.store is None:
+            return self.handlers[name](payload)
+        with self.store.deterministic(meta["uid"], meta["now"]):
+            return self.handlers[name](payload)
+
+    def status(self):
+        return {
+            "backend": type(self.backend).__name__ if self.backend else "direct",
+            "worker_id": self.worker_id,
+            "cursor": self.cursor,
+            "applied_ops": self.applied,
+            "failed_ops": self.failed_count,
+            "recent_failures": self.failed_ops,
+            "persistence": self.snapshots.status() if self.snapshots else None,
+        }
+
+
+# Methods of InMemoryStore that mutate state and therefore go through the log
+STORE_WRITE_METHODS = (
+    "save_po", "save_po_lines", "save_slip", "save_slip_lines",
+    "save_invoice", "save_invoice_lines", "save_match", "save_match_lines",
+    "update_status", "batch_archive", "rematch_pending",
+    "save_pos_bulk", "save_slips_bulk", "save_invoices_bulk", "save_matches_bulk", "save_lines_bulk",
+)
+BULK_SAVE_KINDS = {"save_pos_bulk": "po", "save_slips_bulk": "slip",
+                   "save_invoices_bulk": "invoice", "save_matches_bulk": "match"}
+
+
+class ReplicatedStore:
+    """
+    get_db() stand-in: reads hit the local InMemoryStore replica, writes are
+    logged and applied on every worker.
+    """
+
+    def __init__(self, shared, store):
+        self._shared = shared
+        self._store = store
+        shared.register("db", self._apply_write)
+
+    def _apply_write(self, payload):
+        return getattr(self._store, payload["method"])(*payload["args"])
+
+    def __getattr__(self, name):
+        if name in STORE_WRITE_METHODS:
+            def write(*args):
+                result = self._shared.execute("db", {"method": name, "args": list(args)})
+                # save_* fill in id / timestamps / status on the caller's dict
+                if name in ("save_po", "save_slip", "save_invoice", "save_match") and isinstance(args[0], dict):
+                    collection = {"save_po": "purchase_orders", "save_slip": "packing_slips",
+                                  "save_invoice": "invoices", "save_match": "match_results"}[name]
+                    args[0].update(getattr(self._store, collection).get(result, {}))
+                elif name in BULK_SAVE_KINDS and isinstance(args[0], list):
+                    collection = getattr(self._store, self._store.BULK_KINDS[BULK_SAVE_KINDS[name]][0])
+                    for record, record_id in zip(args[0], result["ids"]):
+                        if record_id is not None:
+                            record.update(collection.get(record_id, {}))
+                return result
+            return write
+        return getattr(self._store, name)
+
+
+class SharedStateMiddleware:
+    """
+    Pure ASGI middleware: catch up on other workers' writes before each
+    request. The log read is a SQLite / Redis round trip, so it runs in the
+    threadpool; a single-process WAL has no other writers and is skipped.
+    """
+
+    def __init__(self, app, shared):
+        self.app = app
+        self.shared = shared
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.shared.replicated and not getattr(self.shared.backend, "single_writer", False):
+            await run_in_threadpool(self.shared.sync)
+        await self.app(scope, receive, send)
+
+
+def configure_shared_state(store):
+    """
+    Build SharedState around this process's InMemoryStore from SHARED_STATE_URL
+    and PERSIST_DIR. Call restore() once every handler and state provider is
+    registered.
+    """
+    backend = backend_from_url(os.environ.get("SHARED_STATE_URL", ""))
+    persist_dir = os.environ.get("PERSIST_DIR", "")
+    if backend is None and persist_dir:
+        backend = FileLogBackend(os.path.join(persist_dir, "wal"), fsync=os.environ.get("PERSIST_FSYNC", "always"))
+
+    shared = SharedState(backend, store)
+    if persist_dir:
+        shared.snapshots = SnapshotManager(
+            shared,
+            os.path.join(persist_dir, "snapshots"),
+            every=int(os.environ.get("PERSIST_SNAPSHOT_EVERY", "5000")),
+            keep=int(os.environ.get("PERSIST_KEEP_SNAPSHOTS", "2")),
+        )
+    if backend:
+        print("[VerifyAP] Shared state via " + type(backend).__name__ + " (worker " + shared.worker_id + ")")
+    return shared
@@ -142,7 +142,7 @@ def get_sidebar_html(active_page="dashboard"):
     Args:
         active_page: One of 'dashboard', 'purchase_orders', 'deliveries',
                      'invoices', 'po_list', 'discrepancies',
-                     'document_history'
+                     'document_history', 'pipeline_metrics'
     """
 
     # Upload / workflow section
@@ -160,6 +160,11 @@ def get_sidebar_html(active_page="dashboard"):
         {"id": "document_history", "label": "Document History", "icon": "\U0001F552", "href": "/document-history"},
     ]
 
+    # System / operations section
+    system_items = [
+        {"id": "pipeline_metrics", "label": "Pipeline Metrics", "icon": "\u23F1\uFE0F", "href": "/pipeline-metrics"},
+    ]
+
     def build_links(items):
         links = ""
         for item in items:
@@ -199,6 +204,9 @@ def get_sidebar_html(active_page="dashboard"):
         + '<div class="verifyap-sidebar-nav-divider"></div>'
         + '<div class="verifyap-sidebar-nav-label">Upload</div>'
         + build_links(upload_items)
+        + '<div class="verifyap-sidebar-nav-divider"></div>'
+        + '<div class="verifyap-sidebar-nav-label">System</div>'
+        + build_links(system_items)
         + "</nav>"
         + '<div class="verifyap-sidebar-footer">'
         + "VerifyAP v2.0 &middot; Harmony Hello"
@@ -0,0 +1,164 @@
+"""
+VerifyAP - Vendor Registry
+Purpose: Resolve vendor names to one canonical vendor with a dict lookup
+instead of each matcher and filter lower-casing and substring-comparing
+names on its own.
+
+Names are canonicalized once, at ingest:
+
+    "McKesson Corporation"      -> "mckesson"
+    "Merck Sharp & Dohme LLC"   -> "merck sharp and dohme"
+    "The Henry Schein, Inc."    -> "henry schein"
+
+(lower-cased, punctuation dropped, "&" spelled out, trailing legal suffixes
+and a leading "the" removed, word by word rather than by substring, so
+"Costco" keeps its "co"). The registry maps every known key - the vendor's
+own and any alias - to a vendor id, which is the canonical key of the name
+it was first registered under.
+
+Aliases that canonicalization can't see ("GSK" for GlaxoSmithKline) are
+learned from confirmed matches: a clean packing-slip match (app/po_matcher.py)
+or an AP verification of a PO (InMemoryStore.update_status) records the
+document's vendor name as an alias of the PO's vendor.
+
+The registry is process-wide (get_vendor_registry()). Learning happens inside
+the shared-state ops, so every worker learns the same aliases, and main.py
+includes the alias table in snapshots.
+"""
+
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Optional
+
+LEGAL_SUFFIXES = frozenset([
+    "inc", "incorporated", "corp", "corporation", "co", "company", "llc", "llp",
+    "lp", "ltd", "limited", "plc", "pllc", "pc",
+])
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+
+@lru_cache(maxsize=8192)
+def canonical_vendor_key(name: Optional[str]) -> str:
+    """Normalized lookup key for a vendor name ("" for a blank name)."""
+    if not name:
+        return ""
+    tokens = _NON_ALNUM.sub(" ", name.lower().replace("&", " and ")).split()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens = tokens[1:]
+    end = len(tokens)
+    while end > 1 and tokens[end - 1] in LEGAL_SUFFIXES:
+        end -= 1
+    return " ".join(tokens[:end])
+
+
+def _contains_words(a: str, b: str) -> bool:
+    """True if one key appears in the other on word boundaries."""
+    return (" " + a + " ") in (" " + b + " ") or (" " + b + " ") in (" " + a + " ")
+
+
+class VendorRegistry:
+    """Canonical vendors and the alias keys that resolve to them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # canonical key (vendor's own or an alias) -> vendor id
+        self.aliases: Dict[str, str] = {}
+        # vendor id -> display name it was first registered under
+        self.names: Dict[str, str] = {}
+        self.learned = 0
+        # Bumped whenever a key starts resolving differently; vendor= filtered
+        # reads depend on it (app/http_cache.py)
+        self.version = 0
+
+    def register(self, name: Optional[str]) -> Optional[str]:
+        """Vendor id for `name`, adding it as a new vendor if no key resolves it."""
+        key = canonical_vendor_key(name)
+        if not key:
+            return None
+        vendor_id = self.aliases.get(key)
+        if vendor_id is None:
+            with self.lock:
+                vendor_id = self.aliases.setdefault(key, key)
+                self.names.setdefault(vendor_id, name.strip())
+                self.version += 1
+        return vendor_id
+
+    def resolve(self, name: Optional[str]) -> Optional[str]:
+        """Vendor id for `name`, or None if it isn't a known vendor or alias."""
+        return self.aliases.get(canonical_vendor_key(name))
+
+    def learn(self, alias_name: Optional[str], vendor_id: Optional[str]) -> bool:
+        """Record `alias_name` as another name of `vendor_id`. Returns True if it was new."""
+        key = canonical_vendor_key(alias_name)
+        if not key or not vendor_id or self.aliases.get(key) == vendor_id:
+            return False
+        if key in self.names:
+            # A vendor in its own right: re-pointing it would orphan the
+            # vendor_id already stamped on that vendor's POs
+            return False
+        with self.lock:
+            self.aliases[key] = vendor_id
+            self.learned += 1
+            self.version += 1
+        return True
+
+    def same_vendor(self, a: Optional[str], b: Optional[str]) -> bool:
+        """Whether two vendor names refer to the same vendor.
+
+        Resolved ids decide when both names are known; otherwise the
+        canonical keys are compared, allowing one to contain the other
+        ("henry schein" / "henry schein medical").
+        """
+        key_a, key_b = canonical_vendor_key(a), canonical_vendor_key(b)
+        if key_a == key_b:
+            return True
+        if not key_a or not key_b:
+            return False
+        id_a, id_b = self.aliases.get(key_a), self.aliases.get(key_b)
+        if id_a is not None and id_a == id_b:
+            return True
+        return _contains_words(key_a, key_b)
+
+    def matcher(self, query: str):
+        """Predicate over vendor names for a `vendor=` filter.
+
+        A query that resolves to a vendor matches all of that vendor's names
+        (searching "GSK" finds "GlaxoSmithKline LLC"); anything else is a
+        partial match on the name, as the filter box has always done.
+        """
+        vendor_id = self.resolve(query)
+        query_lower = query.lower()
+
+        def matches(name: Optional[str], name_vendor_id: Optional[str] = None) -> bool:
+            if vendor_id is not None:
+                if (name_vendor_id or self.resolve(name)) == vendor_id:
+                    return True
+            return query_lower in (name or "").lower()
+
+        return matches
+
+    def stats(self) -> Dict:
+        return {"vendors": len(self.names), "keys": len(self.aliases), "aliases_learned": self.learned}
+
+    def dump(self) -> Dict:
+        with self.lock:
+            return {"aliases": dict(self.aliases), "names": dict(self.names)}
+
+    def load(self, state: Dict):
+        with self.lock:
+            self.aliases = dict(state.get("aliases", {}))
+            self.names = dict(state.get("names", {}))
+            self.version += 1
+
+
+_registry = None
+
+
+def get_vendor_registry() -> VendorRegistry:
+    """Return the process-wide vendor registry. Creates it on first call."""
+    global _registry
+    if _registry is None:
+        _registry = VendorRegistry()
+    return _registry
@@ -0,0 +1,119 @@
+"""
+VerifyAP - Claude Vision Client Helpers
+Purpose: Shared request building and response parsing for every vision call
+(packing slips, invoices, PO documents — interactive or batched).
+"""
+
+import os
+import json
+import base64
+
+
+VISION_MODEL = "claude-sonnet-4-20250514"
+
+MEDIA_TYPES = {
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "heic": "image/heic",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "tiff": "image/tiff",
+    "tif": "image/tiff",
+    "bmp": "image/bmp",
+}
+
+
+def get_client(max_retries=2):
+    """
+    Return an Anthropic client. ANTHROPIC_BASE_URL points it at a local fake server.
+    Calls made through the vision limiter pass max_retries=0 — the limiter retries.
+    """
+    import anthropic
+
+    return anthropic.Anthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        base_url=os.environ.get("ANTHROPIC_BASE_URL") or None,
+        max_retries=max_retries,
+    )
+
+
+def get_async_client(max_retries=2):
+    """Async variant of get_client(), used for streaming extraction."""
+    import anthropic
+
+    return anthropic.AsyncAnthropic(
+        api_key=os.environ.get("ANTHROPIC_API_KEY"),
+        base_url=os.environ.get("ANTHROPIC_BASE_URL") or None,
+        max_retries=max_retries,
+    )
+
+
+def get_media_type(filename, default="image/jpeg"):
+    """Map an upload filename to the media type Claude expects."""
+    ext = filename.lower().rsplit(".", 1)[-1] if "." in filename else ""
+    return MEDIA_TYPES.get(ext, default)
+
+
+def build_source_block(b64_data, media_type):
+    """Build the image/document content block for a base64 payload."""
+    if media_type == "application/pdf":
+        return {
+            "type": "document",
+            "source": {
+                "type": "base64",
+                "media_type": "application/pdf",
+                "data": b64_data,
+            },
+        }
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": b64_data,
+        },
+    }
+
+
+def build_vision_params(contents, media_type, prompt, max_tokens=2000):
+    """Return the messages.create() keyword arguments for one document."""
+    b64_data = base64.b64encode(contents).decode("utf-8")
+    return {
+        "model": VISION_MODEL,
+        "max_tokens": max_tokens,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    build_source_block(b64_data, media_type),
+                    {"type": "text", "text": prompt},
+                ],
+            }
+        ],
+    }
+
+
+def extract_json_text(response_text):
+    """Strip markdown fencing around the JSON in a vision response."""
+    if "```json" in response_text:
+        return response_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in response_text:
+        return response_text.split("```")[1].split("```")[0].strip()
+    return response_text.strip()
+
+
+async def create_message(params):
+    """Interactive messages.create() through the shared rate limiter / circuit breaker."""
+    from .vision_limiter import get_vision_limiter
+
+    client = get_client(max_retries=0)
+    return await get_vision_limiter().call(
+        lambda: client.messages.with_raw_response.create(**params)
+    )
+
+
+def parse_vision_json(response_text):
+    """Parse the structured JSON out of a vision response."""
+    return json.loads(extract_json_text(response_text))
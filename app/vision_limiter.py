@@ -0,0 +1,355 @@
+"""
+VerifyAP - Vision API Rate Limiter & Circuit Breaker
+Purpose: One shared gate in front of every interactive Claude Vision call so a
+429/529 turns into a short wait instead of a failed upload and a clerk retry.
+
+  - Budgets: request/token remaining + reset times are read from the
+    anthropic-ratelimit-* response headers; callers wait for the reset
+    instead of sending requests that are certain to be throttled.
+  - Concurrency: AIMD — halved on every throttle, +1 after a run of successes.
+  - Retries: full-jitter exponential backoff, never shorter than retry-after.
+  - Circuit breaker: opens after sustained overload. While open, new calls
+    queue (up to VISION_MAX_QUEUE_WAIT seconds) rather than failing, and a
+    single probe is let through after the cooldown.
+"""
+
+import os
+import time
+import random
+import asyncio
+import contextlib
+from datetime import datetime, timezone
+
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+THROTTLE_STATUS = {429, 529}
+
+
+class VisionUnavailableError(Exception):
+    """Raised when a call waited the full queue timeout without the API recovering."""
+
+
+def _status_of(exc):
+    return getattr(exc, "status_code", None)
+
+
+def _is_retryable(exc):
+    import anthropic
+
+    if isinstance(exc, anthropic.APIConnectionError):
+        return True
+    return _status_of(exc) in RETRYABLE_STATUS
+
+
+def _retry_after(headers):
+    """Seconds from a retry-after header, if present."""
+    if not headers:
+        return None
+    value = headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def _seconds_until(reset_value):
+    """Seconds until an RFC 3339 reset timestamp (0 if unparseable or past)."""
+    try:
+        reset = datetime.fromisoformat(reset_value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return 0.0
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Closed → open after `threshold` consecutive failures → half-open after `cooldown`."""
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.open_count = 0
+        self.probe_in_flight = False
+
+    def seconds_until_probe(self):
+        if self.state != "open":
+            return 0.0
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def try_pass(self):
+        """Return True if a call may proceed now."""
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.seconds_until_probe() <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self.open_count += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class VisionLimiter:
+    """Shared client-side limiter for vision calls made from the event loop."""
+
+    def __init__(
+        self,
+        max_concurrency=4,
+        max_retries=4,
+        base_delay=1.0,
+        max_delay=30.0,
+        breaker_threshold=5,
+        breaker_cooldown=30.0,
+        max_queue_wait=120.0,
+        min_tokens=4000,
+    ):
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_queue_wait = max_queue_wait
+        self.min_tokens = min_tokens
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+
+        self.in_flight = 0
+        self.waiting = 0
+        self.success_streak = 0
+        self._cond = None
+
+        # Budgets from the last response headers
+        self.requests_remaining = None
+        self.tokens_remaining = None
+        self.budget_resume_at = 0.0
+
+        self.counters = {
+            "calls": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "queue_timeouts": 0,
+        }
+        self.total_wait_seconds = 0.0
+
+    # -- Gate --------------------------------------------------------------
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _blocked_for(self):
+        """Seconds the next call must wait before it may be sent (0 = go)."""
+        now = time.monotonic()
+        waits = [self.breaker.seconds_until_probe(), self.budget_resume_at - now]
+        if self.in_flight >= self.concurrency_limit:
+            waits.append(0.05)
+        return max(waits)
+
+    async def acquire(self):
+        cond = self._condition()
+        started = time.monotonic()
+        deadline = started + self.max_queue_wait
+        async with cond:
+            self.waiting += 1
+            try:
+                while True:
+                    blocked = self._blocked_for()
+                    if blocked <= 0 and self.breaker.try_pass():
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.counters["queue_timeouts"] += 1
+                        raise VisionUnavailableError(
+                            "Vision API is overloaded; request waited "
+                            + str(int(self.max_queue_wait)) + "s. Please try again shortly."
+                        )
+                    try:
+                        await asyncio.wait_for(cond.wait(), timeout=min(max(blocked, 0.05), remaining))
+                    except asyncio.TimeoutError:
+                        pass
+                self.in_flight += 1
+            finally:
+                self.waiting -= 1
+                self.total_wait_seconds += time.monotonic() - started
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    # -- Outcomes ----------------------------------------------------------
+
+    def record_headers(self, headers):
+        """Update request/token budgets from anthropic-ratelimit-* headers."""
+        if not headers:
+            return
+        now = time.monotonic()
+        req = headers.get("anthropic-ratelimit-requests-remaining")
+        tok = headers.get("anthropic-ratelimit-tokens-remaining")
+        if req is not None:
+            self.requests_remaining = int(req)
+            if self.requests_remaining <= 0:
+                reset = _seconds_until(headers.get("anthropic-ratelimit-requests-reset"))
+                self.budget_resume_at = max(self.budget_resume_at, now + reset)
+        if tok is not None:
+            self.tokens_remaining = int(tok)
+            if self.tokens_remaining < self.min_tokens:
+                reset = _seconds_until(headers.get("anthropic-ratelimit-tokens-reset"))
+                self.budget_resume_at = max(self.budget_resume_at, now + reset)
+
+    def record_success(self, headers=None):
+        self.counters["succeeded"] += 1
+        self.record_headers(headers)
+        self.breaker.record_success()
+        self.success_streak += 1
+        if self.success_streak >= 10 and self.concurrency_limit < self.max_concurrency:
+            self.concurrency_limit += 1
+            self.success_streak = 0
+
+    def record_failure(self, exc):
+        """Record a failed attempt. Returns the backoff delay if it should be retried."""
+        response = getattr(exc, "response", None)
+        headers = getattr(response, "headers", None)
+        self.record_headers(headers)
+
+        if not _is_retryable(exc):
+            # The API answered (e.g. a 400), so it is not overloaded
+            if self.breaker.probe_in_flight:
+                self.breaker.record_success()
+            return None
+
+        self.breaker.record_failure()
+        self.success_streak = 0
+        if _status_of(exc) in THROTTLE_STATUS:
+            self.counters["throttled"] += 1
+            self.concurrency_limit = max(1, self.concurrency_limit // 2)
+
+        retry_after = _retry_after(headers)
+        if retry_after:
+            self.budget_resume_at = max(self.budget_resume_at, time.monotonic() + retry_after)
+        return retry_after or 0.0
+
+    def backoff(self, attempt, floor=0.0):
+        """Full-jitter exponential backoff, never below the server's retry-after."""
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return max(floor, random.uniform(0, cap))
+
+    # -- Call wrappers -----------------------------------------------------
+
+    async def call(self, fn):
+        """
+        Run a blocking SDK call through the limiter, retrying overloads.
+
+        `fn` should use the raw-response API (client.messages.with_raw_response
+        .create) so budget headers can be read; its parsed result is returned.
+        """
+        self.counters["calls"] += 1
+        attempt = 0
+        while True:
+            await self.acquire()
+            try:
+                raw = await asyncio.to_thread(fn)
+            except Exception as e:
+                await self.release()
+                floor = self.record_failure(e)
+                if floor is None or attempt >= self.max_retries:
+                    self.counters["failed"] += 1
+                    raise
+                self.counters["retries"] += 1
+                await asyncio.sleep(self.backoff(attempt, floor))
+                attempt += 1
+                continue
+            await self.release()
+            self.record_success(getattr(raw, "headers", None))
+            return raw.parse() if hasattr(raw, "parse") else raw
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """
+        Hold one limiter slot for a streaming call. The caller records the
+        outcome with record_success()/record_failure() and owns retries.
+        """
+        await self.acquire()
+        try:
+            yield self
+        finally:
+            await self.release()
+
+    # -- Metrics -----------------------------------------------------------
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_open_count": self.breaker.open_count,
+            "consecutive_failures": self.breaker.consecutive_failures,
+            "seconds_until_probe": round(self.breaker.seconds_until_probe(), 2),
+            "concurrency_limit": self.concurrency_limit,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests_remaining": self.requests_remaining,
+            "tokens_remaining": self.tokens_remaining,
+            "budget_wait_seconds": round(max(0.0, self.budget_resume_at - now), 2),
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "counters": dict(self.counters),
+        }
+
+    def gauges(self):
+        """(name, labels, value) triples for the /metrics endpoint."""
+        snap = self.snapshot()
+        states = ("closed", "half_open", "open")
+        rows = [
+            ("verifyap_vision_circuit_state", {"state": s}, 1 if snap["circuit_state"] == s else 0)
+            for s in states
+        ]
+        rows += [
+            ("verifyap_vision_concurrency_limit", {}, snap["concurrency_limit"]),
+            ("verifyap_vision_in_flight", {}, snap["in_flight"]),
+            ("verifyap_vision_waiting", {}, snap["waiting"]),
+            ("verifyap_vision_requests_remaining", {}, snap["requests_remaining"]),
+            ("verifyap_vision_tokens_remaining", {}, snap["tokens_remaining"]),
+            ("verifyap_vision_circuit_opens", {}, snap["circuit_open_count"]),
+        ]
+        rows += [("verifyap_vision_calls", {"outcome": k}, v) for k, v in snap["counters"].items()]
+        return rows
+
+
+# ---------------------------------------------------------------------------
+# Global limiter instance
+# ---------------------------------------------------------------------------
+
+_limiter = None
+
+def get_vision_limiter():
+    """Return the process-wide vision limiter. Creates it on first call."""
+    global _limiter
+    if _limiter is None:
+        _limiter = VisionLimiter(
+            max_concurrency=int(os.environ.get("VISION_MAX_CONCURRENCY", "4")),
+            max_retries=int(os.environ.get("VISION_MAX_RETRIES", "4")),
+            breaker_threshold=int(os.environ.get("VISION_BREAKER_THRESHOLD", "5")),
+            breaker_cooldown=float(os.environ.get("VISION_BREAKER_COOLDOWN", "30")),
+            max_queue_wait=float(os.environ.get("VISION_MAX_QUEUE_WAIT", "120")),
+        )
+    return _limiter
@@ -0,0 +1,172 @@
+"""
+VerifyAP - Streaming Vision Extraction
+Purpose: Parse Claude's JSON output while it is still being generated so the
+upload pages can show the PO lookup and line items before the response ends.
+
+The scanner only understands the shape our prompts ask for — one top-level
+JSON object, optionally wrapped in ``` fences — and emits:
+  ("field", key, value)  when a top-level value is complete
+  ("item", index, item)  when an object inside the top-level "items" array closes
+"""
+
+import json
+import asyncio
+
+from .vision_client import get_async_client
+from .vision_limiter import get_vision_limiter
+
+
+class StreamingJSONScanner:
+    """Incremental scanner over the text of a streamed vision response."""
+
+    def __init__(self, items_key="items"):
+        self.items_key = items_key
+        self.buf = ""
+        self.pos = 0
+        self.started = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.expect = "key"
+        self.key = None
+        self.key_start = None
+        self.value_start = None
+        self.in_items = False
+        self.item_start = None
+        self.item_count = 0
+
+    def feed(self, chunk):
+        """Consume more response text. Returns the events it completed."""
+        self.buf += chunk
+        events = []
+        buf = self.buf
+        i = self.pos
+        n = len(buf)
+
+        while i < n and not self.done:
+            c = buf[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.expect == "key" and self.key_start == self.string_start:
+                        self.key = json.loads(buf[self.key_start:i + 1])
+                        self.expect = "colon"
+                i += 1
+                continue
+
+            if not self.started:
+                if c == "{":
+                    self.started = True
+                    self.depth = 1
+                i += 1
+                continue
+
+            if c in " \t\r\n":
+                i += 1
+                continue
+
+            if c == '"':
+                self.in_string = True
+                self.string_start = i
+                if self.depth == 1:
+                    if self.expect == "key":
+                        self.key_start = i
+                    elif self.expect == "value" and self.value_start is None:
+                        self.value_start = i
+                i += 1
+                continue
+
+            if self.depth == 1:
+                if self.expect == "colon" and c == ":":
+                    self.expect = "value"
+                    self.value_start = None
+                elif c in ",}":
+                    if self.expect == "value" and self.value_start is not None:
+                        events.append(("field", self.key, self._load(buf[self.value_start:i])))
+                    self.expect = "key"
+                    self.key_start = None
+                    if c == "}":
+                        self.depth = 0
+                        self.done = True
+                else:
+                    if self.value_start is None:
+                        self.value_start = i
+                    if c in "{[":
+                        self.depth += 1
+                        self.in_items = c == "[" and self.key == self.items_key
+                i += 1
+                continue
+
+            # Nested value (depth >= 2)
+            if c in "{[":
+                if self.depth == 2 and self.in_items and c == "{":
+                    self.item_start = i
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 2 and self.in_items and c == "}" and self.item_start is not None:
+                    item = self._load(buf[self.item_start:i + 1])
+                    if isinstance(item, dict):
+                        events.append(("item", self.item_count, item))
+                        self.item_count += 1
+                    self.item_start = None
+                if self.depth == 1:
+                    self.in_items = False
+            i += 1
+
+        self.pos = i
+        return events
+
+    @staticmethod
+    def _load(text):
+        try:
+            return json.loads(text.strip())
+        except ValueError:
+            return None
+
+
+async def stream_vision_events(params):
+    """
+    Stream one vision request and yield scanner events as they complete.
+
+    Yields ("field", key, value) / ("item", index, item) tuples, then a final
+    ("text", None, full_response_text) so the caller can parse the whole
+    document with the same fallback path as the non-streaming upload.
+    Overload errors are retried by the shared limiter until the first token
+    has been yielded; after that the error is raised to the caller.
+    """
+    limiter = get_vision_limiter()
+    client = get_async_client(max_retries=0)
+    limiter.counters["calls"] += 1
+    attempt = 0
+
+    while True:
+        scanner = StreamingJSONScanner()
+        parts = []
+        try:
+            async with limiter.slot():
+                async with client.messages.stream(**params) as stream:
+                    async for text in stream.text_stream:
+                        parts.append(text)
+                        for event in scanner.feed(text):
+                            yield event
+                    limiter.record_success(stream.response.headers)
+        except Exception as e:
+            floor = limiter.record_failure(e)
+            if parts or floor is None or attempt >= limiter.max_retries:
+                limiter.counters["failed"] += 1
+                raise
+            limiter.counters["retries"] += 1
+            await asyncio.sleep(limiter.backoff(attempt, floor))
+            attempt += 1
+            continue
+        break
+
+    yield ("text", None, "".join(parts))
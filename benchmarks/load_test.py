@@ -0,0 +1,272 @@
+"""
+VerifyAP - End-to-End Load Test
+Purpose: Fire concurrent packing slip / invoice / PO document uploads plus
+dashboard polling at a running app whose vision calls go to the local fake
+server (fake_anthropic_server.py), then report throughput, tail latency and
+the app's event loop lag.
+
+Usage:
+    # Self-contained: starts the fake vision server and a uvicorn app process
+    python -m benchmarks.load_test --spawn --duration 60 --concurrency 20 \\
+        --fake-latency lognormal:2.5:0.4 --fake-errors 529=0.02
+
+    # Against an app already started with ANTHROPIC_BASE_URL pointing at a fake server
+    python -m benchmarks.load_test --app-url http://127.0.0.1:8000 --stream --output load.json
+
+The PO list is seeded from the same synthetic corpus (--seed / --documents) that
+the fake server answers from, so most uploads match a real PO.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import synthetic
+
+
+UPLOAD_ENDPOINTS = {
+    "packing_slip": ("/api/upload-packing-slip", "loadtest_packing_slip.jpg", "image/jpeg"),
+    "invoice": ("/api/upload-invoice", "loadtest_invoice.jpg", "image/jpeg"),
+    "po": ("/api/upload-po", "loadtest_po.jpg", "image/jpeg"),
+}
+STREAMING = {"packing_slip", "invoice"}
+
+POLL_ENDPOINTS = [
+    "/api/v2/dashboard-stats",
+    "/api/v2/purchase-orders",
+    "/api/v2/discrepancies",
+    "/api/po-stats",
+]
+
+
+class Recorder:
+    """Latency samples and error counts per operation."""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def record(self, op, seconds, ok):
+        self.samples.setdefault(op, []).append(seconds)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+
+    def summary(self, elapsed):
+        rows = []
+        for op in sorted(self.samples):
+            samples = sorted(self.samples[op])
+            rows.append({
+                "operation": op,
+                "requests": len(samples),
+                "errors": self.errors.get(op, 0),
+                "throughput_rps": round(len(samples) / elapsed, 2),
+                "p50_ms": _pct(samples, 0.50),
+                "p95_ms": _pct(samples, 0.95),
+                "p99_ms": _pct(samples, 0.99),
+                "max_ms": round(samples[-1] * 1000, 1),
+            })
+        return rows
+
+
+def _pct(sorted_samples, q):
+    return round(sorted_samples[min(len(sorted_samples) - 1, int(round(q * (len(sorted_samples) - 1))))] * 1000, 1)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        if "=" in part:
+            op, weight = part.split("=", 1)
+            if op.strip() not in UPLOAD_ENDPOINTS:
+                raise ValueError("Unknown upload type in --mix: " + op)
+            mix[op.strip()] = float(weight)
+    return mix
+
+
+async def _upload(client, op, payload, stream, recorder):
+    path, filename, content_type = UPLOAD_ENDPOINTS[op]
+    use_stream = stream and op in STREAMING
+    if use_stream:
+        path += "/stream"
+    started = time.perf_counter()
+    ok = False
+    try:
+        resp = await client.post(path, files={"file": (filename, payload, content_type)})
+        if use_stream:
+            last = [line for line in resp.text.splitlines() if line.strip()][-1:]
+            ok = resp.status_code == 200 and bool(last) and json.loads(last[0]).get("event") == "complete"
+        else:
+            ok = resp.status_code == 200 and resp.json().get("success") is True
+    except (httpx.HTTPError, ValueError):
+        ok = False
+    recorder.record(op + ("_stream" if use_stream else ""), time.perf_counter() - started, ok)
+
+
+async def _uploader(client, deadline, mix, payload, stream, recorder, rng):
+    ops = list(mix)
+    weights = [mix[o] for o in ops]
+    while time.monotonic() < deadline:
+        await _upload(client, rng.choices(ops, weights)[0], payload, stream, recorder)
+
+
+async def _poller(client, deadline, interval, recorder):
+    while time.monotonic() < deadline:
+        for path in POLL_ENDPOINTS:
+            started = time.perf_counter()
+            try:
+                ok = (await client.get(path)).status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            recorder.record("GET " + path, time.perf_counter() - started, ok)
+        await asyncio.sleep(interval)
+
+
+async def seed_purchase_orders(client, documents, seed):
+    corpus = synthetic.generate_corpus(documents, seed=seed)
+    resp = await client.post("/api/upload-po", files={"file": ("loadtest_pos.csv", synthetic.to_po_csv(corpus), "text/csv")})
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def run_load(app_url, duration=30.0, concurrency=10, mix=None, pollers=2, poll_interval=2.0,
+                   stream=False, payload_kb=200, documents=3000, seed=42, seed_pos=True):
+    mix = mix or {"packing_slip": 5, "invoice": 4, "po": 1}
+    rng = random.Random(seed)
+    payload = b"\xff\xd8\xff\xe0" + rng.randbytes(max(0, payload_kb * 1024 - 4))
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency + pollers + 4)
+
+    async with httpx.AsyncClient(base_url=app_url, timeout=300, limits=limits) as client:
+        seeded = await seed_purchase_orders(client, documents, seed) if seed_pos else None
+        started = time.monotonic()
+        deadline = started + duration
+        tasks = [
+            asyncio.create_task(_uploader(client, deadline, mix, payload, stream, recorder, random.Random(seed + n)))
+            for n in range(concurrency)
+        ]
+        tasks += [asyncio.create_task(_poller(client, deadline, poll_interval, recorder)) for _ in range(pollers)]
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+        app_metrics = (await client.get("/api/metrics/summary")).json()
+
+    uploads = sum(len(v) for k, v in recorder.samples.items() if not k.startswith("GET "))
+    return {
+        "config": {
+            "app_url": app_url, "duration_s": duration, "concurrency": concurrency, "mix": mix,
+            "pollers": pollers, "poll_interval_s": poll_interval, "stream": stream,
+            "payload_kb": payload_kb, "documents": documents, "seed": seed,
+        },
+        "seeded": seeded,
+        "elapsed_s": round(elapsed, 2),
+        "upload_throughput_rps": round(uploads / elapsed, 2),
+        "operations": recorder.summary(elapsed),
+        "event_loop_lag": app_metrics.get("event_loop_lag"),
+        "vision_limiter": app_metrics.get("vision_limiter"),
+        "stages": app_metrics.get("stages"),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Self-contained mode: fake vision server + uvicorn subprocess
+# ---------------------------------------------------------------------------
+
+def spawn_app(port, base_url, env_overrides=None):
+    env = dict(os.environ, ANTHROPIC_BASE_URL=base_url, ANTHROPIC_API_KEY=os.environ.get("ANTHROPIC_API_KEY", "loadtest"))
+    env.update(env_overrides or {})
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get("http://127.0.0.1:" + str(port) + "/api/po-stats", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("App did not start on port " + str(port))
+
+
+def print_report(report):
+    print("")
+    print("[VerifyAP] " + str(report["elapsed_s"]) + "s, " + str(report["upload_throughput_rps"]) + " uploads/s")
+    print("  " + "operation".ljust(38) + "reqs".rjust(7) + "err".rjust(6) + "rps".rjust(8)
+          + "p50".rjust(10) + "p95".rjust(10) + "p99".rjust(10) + "max".rjust(10))
+    for row in report["operations"]:
+        print("  " + row["operation"].ljust(38) + str(row["requests"]).rjust(7) + str(row["errors"]).rjust(6)
+              + str(row["throughput_rps"]).rjust(8) + (str(row["p50_ms"]) + "ms").rjust(10)
+              + (str(row["p95_ms"]) + "ms").rjust(10) + (str(row["p99_ms"]) + "ms").rjust(10) + (str(row["max_ms"]) + "ms").rjust(10))
+    lag = report.get("event_loop_lag") or {}
+    print("  event loop lag: p50 " + str(lag.get("p50_ms")) + "ms, p99 " + str(lag.get("p99_ms")) + "ms, max " + str(lag.get("max_ms")) + "ms")
+    if report.get("fake_server"):
+        fake = report["fake_server"]
+        print("  fake vision server: " + str(fake["messages"]) + " calls, errors " + json.dumps(fake["errors"]) + ", max in flight " + str(fake["max_in_flight"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VerifyAP end-to-end load test")
+    parser.add_argument("--app-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--spawn", action="store_true", help="Start the fake vision server and a uvicorn app process")
+    parser.add_argument("--port", type=int, default=8011, help="App port when --spawn is used")
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent uploaders")
+    parser.add_argument("--mix", default="packing_slip=5,invoice=4,po=1")
+    parser.add_argument("--pollers", type=int, default=2, help="Concurrent dashboard pollers")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--stream", action="store_true", help="Use the /stream upload endpoints")
+    parser.add_argument("--payload-kb", type=int, default=200, help="Size of each uploaded file")
+    parser.add_argument("--documents", type=int, default=3000, help="Synthetic corpus size (POs seeded = documents / 3)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--fake-latency", default="lognormal:2.5:0.4", help="With --spawn: fake vision latency spec")
+    parser.add_argument("--fake-errors", default="", help="With --spawn: injected error rates, e.g. 529=0.02")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    fake = proc = None
+    app_url = args.app_url
+    if args.spawn:
+        from fake_anthropic_server import FakeAnthropicServer, SyntheticResponder, parse_error_rates
+        fake = FakeAnthropicServer(responder=SyntheticResponder(args.documents, seed=args.seed), latency=args.fake_latency,
+                                   error_rates=parse_error_rates(args.fake_errors), seed=args.seed).start()
+        proc = spawn_app(args.port, fake.base_url)
+        app_url = "http://127.0.0.1:" + str(args.port)
+        print("[VerifyAP] Fake vision server " + fake.base_url + ", app " + app_url)
+
+    try:
+        report = asyncio.run(run_load(
+            app_url, duration=args.duration, concurrency=args.concurrency, mix=parse_mix(args.mix),
+            pollers=args.pollers, poll_interval=args.poll_interval, stream=args.stream,
+            payload_kb=args.payload_kb, documents=args.documents, seed=args.seed,
+        ))
+        if fake:
+            report["fake_server"] = httpx.get(fake.base_url + "/_fake/stats").json()
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if fake:
+            fake.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print("[VerifyAP] Report written to " + args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
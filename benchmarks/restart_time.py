@@ -0,0 +1,157 @@
+"""
+VerifyAP - Restart Time Benchmark
+Purpose: Measure how long a PERSIST_DIR restart takes to rebuild the store
+from the write-ahead log alone, from a snapshot, and from a snapshot plus a
+log tail, and what the write path costs.
+
+Usage:
+    python -m benchmarks.restart_time                      # 100k documents
+    python -m benchmarks.restart_time --sizes 10k,100k --tail 5000 --output restart.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.database import InMemoryStore
+from app.shared_state import SharedState, ReplicatedStore
+from app.persistence import FileLogBackend, SnapshotManager
+from benchmarks import synthetic
+from benchmarks.run_benchmarks import parse_sizes
+
+
+def write_ops(corpus, seed=42):
+    """The save_* / update_status calls that would have produced the corpus, in upload order."""
+    rng = random.Random(seed + 3)
+    ops = []
+    for po in corpus["pos"]:
+        ops.append(("save_po", [{k: v for k, v in po.items() if k != "line_items"}]))
+        ops.append(("save_po_lines", [po["id"], po["line_items"]]))
+    for slip in corpus["slips"]:
+        ops.append(("save_slip", [{k: v for k, v in slip.items() if k != "line_items"}]))
+        ops.append(("save_slip_lines", [slip["id"], slip["line_items"]]))
+    for inv in corpus["invoices"]:
+        outcome = corpus["expected"][inv["po_id"]]
+        ops.append(("save_invoice", [{k: v for k, v in inv.items() if k != "line_items"}]))
+        ops.append(("save_invoice_lines", [inv["id"], inv["line_items"]]))
+        ops.append(("save_match", [{
+            "po_id": inv["po_id"], "invoice_id": inv["id"], "match_type": "3way",
+            "overall_status": synthetic.EXPECTED_STATUS[outcome],
+            "total_discrepancies": 0 if outcome == "clean" else 1,
+        }]))
+        if rng.random() < 0.1:
+            ops.append(("update_status", ["po", inv["po_id"], "verified"]))
+    return ops
+
+
+def _open(directory, fsync="off"):
+    store = InMemoryStore()
+    shared = SharedState(FileLogBackend(os.path.join(directory, "wal"), fsync=fsync), store)
+    shared.snapshots = SnapshotManager(shared, os.path.join(directory, "snapshots"), every=0)
+    return shared, ReplicatedStore(shared, store), store
+
+
+def _write(db, ops):
+    started = time.perf_counter()
+    for method, args in ops:
+        getattr(db, method)(*args)
+    return time.perf_counter() - started
+
+
+def _restart(directory):
+    """Fresh process state: new store, reopen the WAL, restore."""
+    started = time.perf_counter()
+    shared, _, store = _open(directory)
+    info = shared.restore()
+    seconds = time.perf_counter() - started
+    shared.backend.close()
+    return seconds, info, store
+
+
+def _dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+def bench_size(size, seed=42, tail=5000, fsync_sample=500, log=print):
+    corpus = synthetic.generate_corpus(size, seed=seed)
+    ops = write_ops(corpus, seed)
+    tail = min(tail, len(ops))
+    row = {"documents": size, "ops": len(ops), "tail_ops": tail}
+    workdir = tempfile.mkdtemp(prefix="verifyap-restart-")
+    try:
+        # 1. Log only: replay every op
+        wal_dir = os.path.join(workdir, "wal_only")
+        shared, db, _ = _open(wal_dir)
+        write_s = _write(db, ops)
+        shared.backend.close()
+        row["write_ops_per_s"] = round(len(ops) / write_s)
+        row["wal_bytes"] = _dir_bytes(wal_dir)
+        seconds, info, store = _restart(wal_dir)
+        row["restart_wal_only_s"] = round(seconds, 3)
+        pos = len(store.purchase_orders)
+
+        # 2. Snapshot + tail: the steady state with PERSIST_SNAPSHOT_EVERY ~ tail
+        snap_dir = os.path.join(workdir, "snapshot_tail")
+        shared, db, _ = _open(snap_dir)
+        _write(db, ops[:len(ops) - tail])
+        snap = shared.snapshots.snapshot()
+        _write(db, ops[len(ops) - tail:])
+        shared.backend.close()
+        row["snapshot_bytes"] = snap["bytes"]
+        row["snapshot_writes_paused_ms"] = snap["paused_ms"]
+        row["snapshot_total_ms"] = snap["total_ms"]
+        seconds, info, store = _restart(snap_dir)
+        row["restart_snapshot_plus_tail_s"] = round(seconds, 3)
+        assert len(store.purchase_orders) == pos and info["replayed_ops"] == tail
+
+        # 3. Clean shutdown: snapshot with no tail
+        shared, _, _ = _open(snap_dir)
+        shared.restore()
+        shared.snapshots.snapshot()
+        shared.backend.close()
+        seconds, info, store = _restart(snap_dir)
+        row["restart_snapshot_only_s"] = round(seconds, 3)
+
+        # Durable write cost (fsync per op) on a small sample
+        sync_dir = os.path.join(workdir, "fsync")
+        shared, db, _ = _open(sync_dir, fsync="always")
+        sample = ops[:fsync_sample]
+        row["write_fsync_always_ops_per_s"] = round(len(sample) / _write(db, sample))
+        shared.backend.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    log("[VerifyAP] " + str(size) + " documents (" + str(row["ops"]) + " ops): restart WAL-only "
+        + str(row["restart_wal_only_s"]) + "s, snapshot+" + str(tail) + " ops " + str(row["restart_snapshot_plus_tail_s"])
+        + "s, snapshot-only " + str(row["restart_snapshot_only_s"]) + "s; snapshot " + str(row["snapshot_bytes"] // 1024)
+        + " KiB (writes paused " + str(row["snapshot_writes_paused_ms"]) + "ms), WAL " + str(row["wal_bytes"] // 1024) + " KiB")
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VerifyAP restart-time benchmark")
+    parser.add_argument("--sizes", default="100k", help="Comma-separated document counts, e.g. 10k,100k")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tail", type=int, default=5000, help="Ops logged after the snapshot (PERSIST_SNAPSHOT_EVERY)")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args(argv)
+
+    rows = [bench_size(size, seed=args.seed, tail=args.tail) for size in parse_sizes(args.sizes)]
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"seed": args.seed, "results": rows}, f, indent=2)
+        print("[VerifyAP] Report written to " + args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,601 @@
+"""
+VerifyAP - Benchmark Suite
+Purpose: Time the matching engines, PO importers and InMemoryStore queries
+against seeded synthetic corpora (benchmarks/synthetic.py) at several sizes,
+and write a JSON report that can be diffed against a previous run.
+
+Usage:
+    python -m benchmarks.run_benchmarks                          # 1k, 10k, 100k documents
+    python -m benchmarks.run_benchmarks --sizes 1k,1m --only store
+    python -m benchmarks.run_benchmarks --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json     # exit 1 on regressions
+
+Sizes count documents (one third each POs, packing slips, invoices).
+Benchmarks that are quadratic in the store size (list_pos and the dashboard
+stats built on it) are skipped above --quadratic-limit so a 1M run finishes.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+import importlib.util
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from app.admin_html import handle_csv_upload, handle_tsv_upload, po_records_from_table
+from app.po_matcher import match_packing_slip
+from app.po_index import find_po_number
+from app.po_inference import resolve_po
+from app.invoice_matcher import match_invoice
+from app.discrepancy_engine import run_3way_match
+from app.rematch import new_match_lines, rematch
+from app.match_memory import MatchMemory
+from app.duplicate_index import DuplicateIndex
+from app.photo_index import PhotoIndex
+from app import database
+from app import api_routes
+from benchmarks import synthetic
+
+
+REPORT_VERSION = 1
+DEFAULT_SIZES = "1k,10k,100k"
+DEFAULT_QUADRATIC_LIMIT = 10000
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+BENCHMARKS = []
+
+
+def benchmark(group, name, quadratic=False, warmup=True):
+    """Register fn(ctx) -> op(i). The op is timed once per call."""
+    def register(setup):
+        BENCHMARKS.append({"group": group, "name": name, "setup": setup, "quadratic": quadratic, "warmup": warmup})
+        return setup
+    return register
+
+
+def _load_legacy_po_manager():
+    """The legacy POManager lives in fqhc-3way-match/app (not an importable package name)."""
+    path = os.path.join(ROOT, "fqhc-3way-match", "app", "po_matcher.py")
+    spec = importlib.util.spec_from_file_location("legacy_po_matcher", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.POManager
+
+
+@contextlib.contextmanager
+def _quiet():
+    """POManager.load_from_csv prints a summary line on every load."""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class Context:
+    """Corpus plus every derived shape the benchmarks need, built once per size."""
+
+    def __init__(self, size, seed):
+        self.size = size
+        self.corpus = synthetic.generate_corpus(size, seed=seed)
+        self.pos = self.corpus["pos"]
+        self.slips = self.corpus["slips"]
+        self.invoices = self.corpus["invoices"]
+        self.v1_pos = synthetic.to_v1_purchase_orders(self.corpus)
+        self.v1_slips = [synthetic.to_v1_slip(s) for s in self.slips]
+        self.v1_invoices = [synthetic.to_v1_invoice(i) for i in self.invoices]
+        self.po_csv = synthetic.to_po_csv(self.corpus)
+        self.po_tsv = synthetic.to_po_csv(self.corpus, delimiter="\t")
+
+        self.tmpdir = tempfile.mkdtemp(prefix="verifyap-bench-")
+        self.netsuite_csv_path = os.path.join(self.tmpdir, "open_pos.csv")
+        with open(self.netsuite_csv_path, "w", encoding="utf-8", newline="") as f:
+            f.write(synthetic.to_netsuite_csv(self.corpus))
+
+        self.store = synthetic.populate_store(database.InMemoryStore(), self.corpus)
+        self.match_ids = list(self.store.match_results)
+
+        rng = random.Random(seed + 2)
+        self.picks = [rng.randrange(len(self.pos)) for _ in range(4096)]
+
+    def pick(self, i):
+        return self.picks[i % len(self.picks)]
+
+    def close(self):
+        with contextlib.suppress(OSError):
+            os.remove(self.netsuite_csv_path)
+            os.rmdir(self.tmpdir)
+
+
+# ---------------------------------------------------------------------------
+# Matching engines
+# ---------------------------------------------------------------------------
+
+@benchmark("match", "run_3way_match")
+def _bench_3way(ctx):
+    def op(i):
+        k = ctx.pick(i)
+        run_3way_match(ctx.pos[k], ctx.slips[k], ctx.invoices[k], memory={})
+    return op
+
+
+@benchmark("match", "run_3way_match_text_only")
+def _bench_3way_text_only(ctx):
+    # Documents without item numbers: every line goes through find_best_match
+    def strip(doc):
+        return dict(doc, line_items=[dict(l, item_number="") for l in doc["line_items"]])
+    pos, slips, invoices = [strip(d) for d in ctx.pos], [strip(d) for d in ctx.slips], [strip(d) for d in ctx.invoices]
+
+    def op(i):
+        k = ctx.pick(i)
+        run_3way_match(pos[k], slips[k], invoices[k], memory={})
+    return op
+
+
+@benchmark("match", "rematch_corrected_invoice")
+def _bench_rematch(ctx):
+    # A PO already matched against its slip and invoice receives a corrected
+    # invoice; compare with run_3way_match over the same three documents
+    states = {}
+    for k in set(ctx.picks):
+        match, lines, invoice = {}, new_match_lines(ctx.pos[k]), dict(ctx.invoices[k], id="invoice")
+        rematch(ctx.pos[k], match, lines, [("slip", dict(ctx.slips[k], id="slip")), ("invoice", invoice)], memory={})
+        states[k] = (match, lines, invoice)
+
+    def op(i):
+        k = ctx.pick(i)
+        match, lines, invoice = states[k]
+        rematch(ctx.pos[k], match, lines, [("invoice", invoice)], memory={})
+    return op
+
+
+@benchmark("match", "run_3way_match_remembered")
+def _bench_3way_remembered(ctx):
+    # Pairings AP would have confirmed on earlier shipments from the same vendors
+    memory = MatchMemory()
+    for k in range(min(len(ctx.pos), 2000)):
+        result = run_3way_match(ctx.pos[k], ctx.slips[k], ctx.invoices[k], memory={})
+        memory.learn_from_lines(ctx.pos[k]["vendor_name"], result["line_details"], matched_only=False)
+
+    def op(i):
+        k = ctx.pick(i)
+        run_3way_match(ctx.pos[k], ctx.slips[k], ctx.invoices[k], memory=memory.for_vendor(ctx.pos[k]["vendor_name"]))
+    return op
+
+
+@benchmark("match", "match_packing_slip")
+def _bench_v1_slip(ctx):
+    def op(i):
+        match_packing_slip(ctx.v1_slips[ctx.pick(i)], ctx.v1_pos)
+    return op
+
+
+@benchmark("match", "match_invoice")
+def _bench_v1_invoice(ctx):
+    def op(i):
+        match_invoice(ctx.v1_invoices[ctx.pick(i)], ctx.v1_pos, ctx.v1_slips)
+    return op
+
+
+@benchmark("match", "find_po_number")
+def _bench_find_po_number(ctx):
+    # OCR'd numbers from the slips: prefix variants, confusions, dropped digits
+    return lambda i: find_po_number(ctx.v1_slips[ctx.pick(i)]["po_number"], ctx.v1_pos)
+
+
+@benchmark("match", "resolve_po_by_content")
+def _bench_resolve_po_by_content(ctx):
+    # Slips photographed without a readable PO number
+    slips = [dict(s, po_number=None) for s in ctx.v1_slips]
+    resolve_po(slips[0], ctx.v1_pos)  # builds the content index
+    return lambda i: resolve_po(slips[ctx.pick(i)], ctx.v1_pos)
+
+
+@benchmark("match", "duplicate_invoice_check")
+def _bench_duplicate_check(ctx):
+    # Every invoice already received; each check is a re-upload of one of them
+    index = DuplicateIndex()
+    for i, invoice in enumerate(ctx.v1_invoices):
+        index.add("invoice", invoice, i)
+    return lambda i: index.check("invoice", ctx.v1_invoices[ctx.pick(i)])
+
+
+@benchmark("match", "photo_hash_nearest")
+def _bench_photo_nearest(ctx):
+    # One photo per slip on file; each lookup is a re-shot of one, a few bits off
+    rng = random.Random(7)
+    photos = [rng.getrandbits(64) for _ in ctx.slips]
+    index = PhotoIndex()
+    for i, photo in enumerate(photos):
+        index.add("packing_slip", format(photo, "016x"), i)
+    reshots = [format(photos[ctx.pick(i)] ^ (1 << rng.randrange(64)) ^ (1 << rng.randrange(64)), "016x")
+               for i in range(1000)]
+    return lambda i: index.nearest("packing_slip", reshots[i % len(reshots)])
+
+
+@benchmark("match", "POManager.match_packing_slip")
+def _bench_legacy_slip(ctx):
+    manager = _load_legacy_po_manager()()
+    with _quiet():
+        manager.load_from_csv(ctx.netsuite_csv_path)
+    legacy_slips = [synthetic.to_legacy_slip(s) for s in ctx.slips]
+
+    def op(i):
+        manager.match_packing_slip(legacy_slips[ctx.pick(i)])
+    return op
+
+
+# ---------------------------------------------------------------------------
+# Importers (one op = the whole file)
+# ---------------------------------------------------------------------------
+
+@benchmark("import", "handle_csv_upload", warmup=False)
+def _bench_csv(ctx):
+    return lambda i: handle_csv_upload(ctx.po_csv, {})
+
+
+@benchmark("import", "handle_tsv_upload", warmup=False)
+def _bench_tsv(ctx):
+    return lambda i: handle_tsv_upload(ctx.po_tsv, {})
+
+
+@benchmark("import", "save_pos_bulk", warmup=False)
+def _bench_import_bulk(ctx):
+    # The v2 importer: parse, then one batch into an empty store
+    def op(i):
+        store = database.InMemoryStore()
+        store.cold_storage = None
+        store.save_pos_bulk(po_records_from_table(ctx.po_csv))
+    return op
+
+
+@benchmark("import", "save_po_per_record", warmup=False)
+def _bench_import_per_record(ctx):
+    # Same file through save_po / save_po_lines, for comparison
+    def op(i):
+        store = database.InMemoryStore()
+        store.cold_storage = None
+        for po in po_records_from_table(ctx.po_csv):
+            lines = po.pop("line_items")
+            store.save_po_lines(store.save_po(po), lines)
+    return op
+
+
+@benchmark("import", "POManager.load_from_csv", warmup=False)
+def _bench_legacy_csv(ctx):
+    POManager = _load_legacy_po_manager()
+
+    def op(i):
+        with _quiet():
+            POManager().load_from_csv(ctx.netsuite_csv_path)
+    return op
+
+
+# ---------------------------------------------------------------------------
+# InMemoryStore reads
+# ---------------------------------------------------------------------------
+
+@benchmark("store", "get_po")
+def _bench_get_po(ctx):
+    return lambda i: ctx.store.get_po(ctx.pos[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "get_po_by_number")
+def _bench_get_po_by_number(ctx):
+    return lambda i: ctx.store.get_po_by_number(ctx.pos[ctx.pick(i)]["po_number"])
+
+
+@benchmark("store", "list_pos", quadratic=True, warmup=False)
+def _bench_list_pos(ctx):
+    return lambda i: ctx.store.list_pos()
+
+
+@benchmark("store", "get_slip")
+def _bench_get_slip(ctx):
+    return lambda i: ctx.store.get_slip(ctx.slips[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "get_slips_for_po")
+def _bench_slips_for_po(ctx):
+    return lambda i: ctx.store.get_slips_for_po(ctx.pos[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "get_invoice")
+def _bench_get_invoice(ctx):
+    return lambda i: ctx.store.get_invoice(ctx.invoices[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "get_match")
+def _bench_get_match(ctx):
+    return lambda i: ctx.store.get_match(ctx.match_ids[ctx.pick(i)])
+
+
+@benchmark("store", "get_matches_for_po")
+def _bench_matches_for_po(ctx):
+    return lambda i: ctx.store.get_matches_for_po(ctx.pos[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "list_discrepancies", warmup=False)
+def _bench_list_discrepancies(ctx):
+    return lambda i: ctx.store.list_discrepancies()
+
+
+@benchmark("store", "get_timeline_for_po")
+def _bench_timeline(ctx):
+    return lambda i: ctx.store.get_timeline_for_po(ctx.pos[ctx.pick(i)]["id"])
+
+
+@benchmark("store", "get_all_events", warmup=False)
+def _bench_all_events(ctx):
+    return lambda i: ctx.store.get_all_events()
+
+
+@benchmark("store", "get_recent_events")
+def _bench_recent_events(ctx):
+    return lambda i: ctx.store.get_recent_events(50)
+
+
+@benchmark("store", "get_events_between")
+def _bench_events_between(ctx):
+    # One-day windows starting at a random PO's upload time
+    windows = []
+    for n in ctx.picks:
+        since = ctx.pos[n]["uploaded_at"]
+        windows.append((since, (datetime.fromisoformat(since) + timedelta(days=1)).isoformat()))
+    return lambda i: ctx.store.get_events_between(*windows[i % len(windows)])
+
+
+@benchmark("store", "get_archive_candidates")
+def _bench_archive_candidates(ctx):
+    return lambda i: ctx.store.get_archive_candidates(days=30)
+
+
+# ---------------------------------------------------------------------------
+# API handlers over the populated store
+# ---------------------------------------------------------------------------
+
+@benchmark("api", "dashboard_stats", quadratic=True, warmup=False)
+def _bench_dashboard_stats(ctx):
+    database._db = ctx.store
+    return lambda i: api_routes.dashboard_stats()
+
+
+@benchmark("api", "list_discrepancies", warmup=False)
+def _bench_api_discrepancies(ctx):
+    database._db = ctx.store
+    return lambda i: api_routes.list_discrepancies(severity=None, vendor=None)
+
+
+@benchmark("api", "list_discrepancies_fields", warmup=False)
+def _bench_api_discrepancies_fields(ctx):
+    database._db = ctx.store
+    fields = "match_id,po_number,vendor_name,invoice_number,overall_status,total_discrepancies,amount_delta,discrepancy_lines.discrepancy_type"
+    return lambda i: api_routes.list_discrepancies(severity=None, vendor=None, fields=fields)
+
+
+@benchmark("api", "list_discrepancies_vendor", warmup=False)
+def _bench_api_discrepancies_vendor(ctx):
+    database._db = ctx.store
+    # Spelled differently from the POs: resolved once through the vendor registry, then an id compare per row
+    return lambda i: api_routes.list_discrepancies(severity=None, vendor="McKesson Corp", fields="match_id")
+
+
+# ---------------------------------------------------------------------------
+# InMemoryStore writes (run last: they grow the store)
+# ---------------------------------------------------------------------------
+
+@benchmark("store_write", "save_po")
+def _bench_save_po(ctx):
+    def op(i):
+        po = ctx.pos[ctx.pick(i)]
+        ctx.store.save_po({"po_number": po["po_number"] + "-B" + str(i), "vendor_name": po["vendor_name"], "total_amount": po["total_amount"]})
+    return op
+
+
+@benchmark("store_write", "save_slip")
+def _bench_save_slip(ctx):
+    def op(i):
+        slip = ctx.slips[ctx.pick(i)]
+        ctx.store.save_slip({"po_id": slip["po_id"], "po_number_ocr": slip["po_number_ocr"], "vendor_name": slip["vendor_name"]})
+    return op
+
+
+@benchmark("store_write", "save_invoice")
+def _bench_save_invoice(ctx):
+    def op(i):
+        inv = ctx.invoices[ctx.pick(i)]
+        ctx.store.save_invoice({"po_id": inv["po_id"], "po_number_ocr": inv["po_number_ocr"], "total_amount": inv["total_amount"]})
+    return op
+
+
+@benchmark("store_write", "save_match")
+def _bench_save_match(ctx):
+    def op(i):
+        po = ctx.pos[ctx.pick(i)]
+        ctx.store.save_match({"po_id": po["id"], "match_type": "3way", "overall_status": "approve", "total_discrepancies": 0})
+    return op
+
+
+@benchmark("store_write", "update_status")
+def _bench_update_status(ctx):
+    return lambda i: ctx.store.update_status("slip", ctx.slips[ctx.pick(i)]["id"], "matched")
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def measure(op, budget, max_ops, warmup=True):
+    """Call op(i) until the time budget or max_ops is used up (at least once)."""
+    if warmup:
+        op(0)
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < max_ops and (not samples or time.perf_counter() < deadline):
+        started = time.perf_counter()
+        op(len(samples))
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    last = len(samples) - 1
+    return {
+        "ops": len(samples),
+        "mean_us": round(sum(samples) / len(samples) * 1e6, 2),
+        "p50_us": round(samples[int(round(0.5 * last))] * 1e6, 2),
+        "p95_us": round(samples[int(round(0.95 * last))] * 1e6, 2),
+        "min_us": round(samples[0] * 1e6, 2),
+    }
+
+
+def run_suite(sizes, seed=42, budget=1.0, max_ops=500, groups=None, quadratic_limit=DEFAULT_QUADRATIC_LIMIT, log=print):
+    results = []
+    for size in sizes:
+        started = time.perf_counter()
+        ctx = Context(size, seed)
+        log("[VerifyAP] size=" + str(size) + ": corpus + store ready in " + str(round(time.perf_counter() - started, 2)) + "s")
+        try:
+            for bench in BENCHMARKS:
+                if groups and bench["group"] not in groups:
+                    continue
+                row = {"group": bench["group"], "name": bench["name"], "size": size}
+                if bench["quadratic"] and quadratic_limit and size > quadratic_limit:
+                    row["skipped"] = "quadratic in store size; above --quadratic-limit " + str(quadratic_limit)
+                else:
+                    row.update(measure(bench["setup"](ctx), budget, max_ops, warmup=bench["warmup"]))
+                results.append(row)
+                log(_format_row(row))
+        finally:
+            database._db = None
+            ctx.close()
+    return results
+
+
+def build_report(results, sizes, seed, budget):
+    return {
+        "version": REPORT_VERSION,
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+            "sizes": sizes,
+            "budget_seconds": budget,
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline, current, threshold=0.25, min_us=5.0):
+    """
+    Return (regressions, improvements): rows whose p50 moved by more than
+    `threshold` (fractional). Rows faster than min_us in both runs are
+    ignored as timer noise.
+    """
+    base = {(r["group"], r["name"], r["size"]): r for r in baseline.get("results", []) if "p50_us" in r}
+    regressions, improvements = [], []
+    for row in current.get("results", []):
+        old = base.get((row["group"], row["name"], row["size"]))
+        if not old or "p50_us" not in row:
+            continue
+        if max(old["p50_us"], row["p50_us"]) < min_us:
+            continue
+        ratio = row["p50_us"] / old["p50_us"] if old["p50_us"] else float("inf")
+        entry = {"group": row["group"], "name": row["name"], "size": row["size"],
+                 "baseline_p50_us": old["p50_us"], "current_p50_us": row["p50_us"], "ratio": round(ratio, 3)}
+        if ratio > 1 + threshold:
+            regressions.append(entry)
+        elif ratio < 1 / (1 + threshold):
+            improvements.append(entry)
+    return regressions, improvements
+
+
+def _format_row(row):
+    label = (row["group"] + "." + row["name"]).ljust(40) + str(row["size"]).rjust(9)
+    if "skipped" in row:
+        return "  " + label + "  skipped (" + row["skipped"] + ")"
+    return ("  " + label + "  p50 " + _fmt_us(row["p50_us"]).rjust(10) + "  p95 " + _fmt_us(row["p95_us"]).rjust(10)
+            + "  ops " + str(row["ops"]))
+
+
+def _fmt_us(us):
+    if us >= 1e6:
+        return str(round(us / 1e6, 2)) + " s"
+    if us >= 1e3:
+        return str(round(us / 1e3, 2)) + " ms"
+    return str(round(us, 1)) + " us"
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_sizes(text):
+    sizes = []
+    for part in text.split(","):
+        part = part.strip().lower()
+        if not part:
+            continue
+        multiplier = 1
+        if part.endswith("k"):
+            multiplier, part = 1000, part[:-1]
+        elif part.endswith("m"):
+            multiplier, part = 1000000, part[:-1]
+        sizes.append(int(float(part) * multiplier))
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="VerifyAP matching / store benchmarks")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated document counts, e.g. 1k,10k,1m")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--budget", type=float, default=1.0, help="Seconds per benchmark per size")
+    parser.add_argument("--max-ops", type=int, default=500)
+    parser.add_argument("--only", default="", help="Comma-separated groups: match,import,store,api,store_write")
+    parser.add_argument("--quadratic-limit", type=int, default=DEFAULT_QUADRATIC_LIMIT, help="0 = never skip")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Fractional p50 slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    sizes = parse_sizes(args.sizes)
+    groups = set(g.strip() for g in args.only.split(",") if g.strip()) or None
+    results = run_suite(sizes, seed=args.seed, budget=args.budget, max_ops=args.max_ops,
+                        groups=groups, quadratic_limit=args.quadratic_limit)
+    report = build_report(results, sizes, args.seed, args.budget)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print("[VerifyAP] Report written to " + args.output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions, improvements = compare_reports(baseline, report, args.threshold)
+        for entry in improvements:
+            print("  faster  " + entry["group"] + "." + entry["name"] + " @" + str(entry["size"]) + "  x" + str(entry["ratio"]))
+        for entry in regressions:
+            print("  SLOWER  " + entry["group"] + "." + entry["name"] + " @" + str(entry["size"]) + "  x" + str(entry["ratio"]))
+        if regressions:
+            print("[VerifyAP] " + str(len(regressions)) + " regression(s) beyond " + str(int(args.threshold * 100)) + "%")
+            return 1
+        print("[VerifyAP] No regressions beyond " + str(int(args.threshold * 100)) + "%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
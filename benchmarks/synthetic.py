@@ -0,0 +1,381 @@
+"""
+VerifyAP - Synthetic Document Generator
+Purpose: Seeded generator for realistic FQHC purchase orders, packing slips
+and invoices so the matching engines and store can be benchmarked (and
+tested) without real vendor documents.
+
+What it models:
+  - Pharma / vaccine catalog descriptions with NDCs and pack sizes, worded
+    differently on each document ("M-M-R II 10x1 Dose SDV" vs "MMR II Vaccine")
+  - Federal excise tax lines on vaccine POs and invoices (not on slips)
+  - Zero-cost bundled diluent syringes on slips and invoices (not on POs)
+  - OCR noise on PO numbers and descriptions (0/O, 1/I/l, 5/S, 8/B, drops)
+  - Injected short shipments, over-billing and price variances
+
+Same seed + same size always yields the same corpus.
+
+Usage:
+    from benchmarks.synthetic import generate_corpus, populate_store
+    corpus = generate_corpus(3000, seed=42)
+    store = populate_store(InMemoryStore(), corpus)
+"""
+
+import csv
+import io
+import uuid
+import random
+from datetime import datetime, timedelta, timezone
+
+
+# (canonical description, alternate wording seen on slips/invoices, NDC, unit price, excise per unit, ships with diluent)
+CATALOG = [
+    ("M-M-R II Vaccine 10x1 Dose SDV", "MMR II Measles Mumps Rubella Live 10 Vials", "00006-4681-00", 842.50, 0.75, True),
+    ("ProQuad MMRV Vaccine 10x1 Dose", "Pro-Quad Measles Mumps Rubella Varicella 10 SDV", "00006-4171-00", 2315.00, 0.75, True),
+    ("Varivax Varicella Vaccine 10x1 Dose", "VARIVAX Varicella Virus Vaccine Live 10 Vials", "00006-4827-00", 1649.80, 0.75, True),
+    ("Gardasil 9 HPV Vaccine 10x0.5mL PFS", "Gardasil-9 Human Papillomavirus 9-Valent 10 Syringes", "00006-4121-02", 2698.30, 0.75, False),
+    ("Prevnar 20 Pneumococcal 10x0.5mL PFS", "PREVNAR 20 Pneumococcal Conjugate Vaccine 10 PFS", "00005-2000-10", 2471.60, 0.75, False),
+    ("Pediarix DTaP-HepB-IPV 10x0.5mL PFS", "PEDIARIX Combination Vaccine 10 Prefilled Syringes", "58160-0811-52", 1020.40, 2.25, False),
+    ("Boostrix Tdap Vaccine 10x0.5mL PFS", "BOOSTRIX Tdap 10 Single Dose Syringes", "58160-0842-52", 482.10, 0.75, False),
+    ("Fluzone High-Dose Quadrivalent 10x0.7mL PFS", "FLUZONE HD QUAD 2026-27 10 Syringes", "49281-0126-65", 742.90, 0.75, False),
+    ("RotaTeq Rotavirus Vaccine Oral 10x2mL", "ROTATEQ Oral Solution 10 Tubes", "00006-4047-41", 914.00, 0.75, False),
+    ("Vaxneuvance Pneumococcal 10x0.5mL PFS", "VAXNEUVANCE PCV15 10 Prefilled Syringes", "00006-4329-03", 2064.50, 0.75, False),
+    ("Insulin Glargine U-100 10mL Vial", "Insulin Glargine 100 units/mL 10 mL MDV", "00088-2220-33", 89.35, 0.0, False),
+    ("Amoxicillin 500mg Capsules 500ct", "AMOXICILLIN 500 MG CAP 500 BTL", "65862-0016-05", 38.20, 0.0, False),
+    ("Lisinopril 10mg Tablets 1000ct", "LISINOPRIL 10MG TAB 1000 BOTTLE", "68180-0514-03", 24.75, 0.0, False),
+    ("Metformin HCl 500mg Tablets 1000ct", "METFORMIN 500 MG TABS 1000CT", "00093-1048-10", 19.90, 0.0, False),
+    ("Albuterol HFA Inhaler 90mcg 8.5g", "ALBUTEROL SULFATE HFA 90 MCG INH", "00173-0682-20", 31.60, 0.0, False),
+    ("Tuberculin PPD Tubersol 5TU/0.1mL 1mL", "TUBERSOL PPD 1 mL 10 Tests", "49281-0752-21", 96.45, 0.0, False),
+    ("Nitrile Exam Gloves Large 100ct", "Gloves Nitrile Exam LG Box of 100", "", 9.80, 0.0, False),
+    ("Alcohol Prep Pads Medium 200ct", "Alcohol Prep Pad Sterile 200/Box", "", 4.15, 0.0, False),
+]
+
+DILUENT = ("Sterile Diluent Syringe 0.7mL", "00006-4309-00")
+EXCISE_DESCRIPTION = "Federal Excise Tax"
+
+VENDORS = [
+    ("Merck Sharp & Dohme LLC", "Merck Sharp & Dohme"),
+    ("Sanofi Pasteur Inc.", "Sanofi Pasteur"),
+    ("GlaxoSmithKline LLC", "GSK"),
+    ("Pfizer Inc.", "Pfizer"),
+    ("McKesson Corporation", "McKesson Medical-Surgical"),
+    ("Cardinal Health Inc.", "Cardinal Health"),
+    ("Henry Schein Inc.", "Henry Schein Medical"),
+]
+
+OCR_SUBSTITUTIONS = {
+    "0": "O", "O": "0", "1": "I", "I": "1", "l": "1",
+    "5": "S", "S": "5", "8": "B", "B": "8", "2": "Z",
+}
+
+BASE_DATE = datetime(2026, 1, 5, tzinfo=timezone.utc)
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def ocr_noise(text, rng, rate):
+    """Apply OCR-style character confusions / drops to `text` at `rate` per character."""
+    if not text or rate <= 0:
+        return text
+    out = []
+    for ch in text:
+        roll = rng.random()
+        if roll < rate and ch in OCR_SUBSTITUTIONS:
+            out.append(OCR_SUBSTITUTIONS[ch])
+        elif roll < rate * 0.15 and ch.isalnum():
+            continue
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _noisy_po_number(po_number, rng, noise):
+    """PO numbers as they come back from a photo: prefix variants plus OCR confusions."""
+    digits = po_number[2:]
+    style = rng.random()
+    if style < 0.55:
+        text = po_number
+    elif style < 0.75:
+        text = "PO-" + digits
+    elif style < 0.85:
+        text = "PO# " + digits
+    else:
+        text = digits
+    return ocr_noise(text, rng, noise)
+
+
+def generate_corpus(n_documents, seed=42, noise=0.02, max_lines=6):
+    """
+    Generate about `n_documents` documents (one third POs, one third slips,
+    one third invoices) in the v2 store shape.
+
+    Returns dict with "pos", "slips", "invoices" lists and "expected" mapping
+    po_id -> injected outcome ("clean", "short_ship", "over_bill", "price_variance").
+    """
+    rng = random.Random(seed)
+    n_pos = max(1, n_documents // 3)
+    pos, slips, invoices, expected = [], [], [], {}
+
+    for i in range(n_pos):
+        po_id = _uuid(rng)
+        po_number = "PO" + str(100000 + i)
+        vendor_name, vendor_alias = VENDORS[rng.randrange(len(VENDORS))]
+        order_date = BASE_DATE + timedelta(days=rng.randrange(270), minutes=rng.randrange(1440))
+        products = rng.sample(range(len(CATALOG)), rng.randint(1, max_lines))
+
+        outcome_roll = rng.random()
+        outcome = "clean"
+        if outcome_roll < 0.08:
+            outcome = "short_ship"
+        elif outcome_roll < 0.13:
+            outcome = "over_bill"
+        elif outcome_roll < 0.18:
+            outcome = "price_variance"
+        target = rng.randrange(len(products))
+
+        po_lines, slip_lines, inv_lines = [], [], []
+        excise_total = 0.0
+        po_total = 0.0
+        inv_total = 0.0
+        for n, catalog_index in enumerate(products):
+            desc, alt_desc, ndc, price, excise, diluent = CATALOG[catalog_index]
+            qty = rng.choice((1, 1, 2, 2, 3, 4, 5, 10))
+            line_total = round(qty * price, 2)
+            po_total += line_total
+            excise_total += qty * 10 * excise
+            po_lines.append({
+                "line_number": n + 1,
+                "item_number": ndc or "SUP-" + str(1000 + catalog_index),
+                "description": desc,
+                "quantity": qty,
+                "unit_price": price,
+                "line_total": line_total,
+                "is_tax_line": False,
+            })
+
+            shipped = qty - 1 if outcome == "short_ship" and n == target else qty
+            billed = qty + 1 if outcome == "over_bill" and n == target else qty
+            billed_price = round(price * 1.12, 2) if outcome == "price_variance" and n == target else price
+            slip_desc = alt_desc if rng.random() < 0.5 else desc
+            inv_desc = alt_desc if rng.random() < 0.3 else desc
+
+            slip_lines.append({
+                "item_number": ndc,
+                "description": ocr_noise(slip_desc, rng, noise),
+                "quantity_ordered": qty,
+                "quantity_shipped": shipped,
+            })
+            inv_lines.append({
+                "item_number": ndc,
+                "description": ocr_noise(inv_desc, rng, noise / 2),
+                "quantity": billed,
+                "unit_price": billed_price,
+                "extension": round(billed * billed_price, 2),
+                "is_tax_line": False,
+                "is_zero_cost": False,
+            })
+            inv_total += round(billed * billed_price, 2)
+
+            if diluent:
+                slip_lines.append({"item_number": DILUENT[1], "description": DILUENT[0], "quantity_ordered": 0, "quantity_shipped": qty * 10})
+                inv_lines.append({"item_number": DILUENT[1], "description": DILUENT[0], "quantity": qty * 10, "unit_price": 0, "extension": 0, "is_tax_line": False, "is_zero_cost": True})
+
+        if excise_total:
+            excise_total = round(excise_total, 2)
+            po_lines.append({"line_number": len(po_lines) + 1, "item_number": "", "description": EXCISE_DESCRIPTION, "quantity": 1, "unit_price": excise_total, "line_total": excise_total, "is_tax_line": True})
+            inv_lines.append({"item_number": "", "description": EXCISE_DESCRIPTION, "quantity": 1, "unit_price": excise_total, "extension": excise_total, "is_tax_line": True, "is_zero_cost": False})
+            po_total += excise_total
+            inv_total += excise_total
+
+        pos.append({
+            "id": po_id,
+            "po_number": po_number,
+            "vendor_name": vendor_name,
+            "order_date": order_date.date().isoformat(),
+            "total_amount": round(po_total, 2),
+            "status": "active",
+            "source_type": "csv",
+            "uploaded_at": order_date.isoformat(),
+            "line_items": po_lines,
+        })
+
+        ship_date = order_date + timedelta(days=rng.randint(2, 14))
+        slips.append({
+            "id": _uuid(rng),
+            "po_id": po_id,
+            "po_number_ocr": _noisy_po_number(po_number, rng, noise),
+            "vendor_name": vendor_alias,
+            "ship_date": ship_date.date().isoformat(),
+            "status": "pending",
+            "uploaded_at": ship_date.isoformat(),
+            "line_items": slip_lines,
+        })
+
+        invoice_date = ship_date + timedelta(days=rng.randint(0, 20))
+        invoices.append({
+            "id": _uuid(rng),
+            "po_id": po_id,
+            "invoice_number": "INV-" + str(rng.randrange(10 ** 7, 10 ** 8)),
+            "po_number_ocr": _noisy_po_number(po_number, rng, noise / 2),
+            "vendor_name": vendor_name,
+            "invoice_date": invoice_date.date().isoformat(),
+            "total_amount": round(inv_total, 2),
+            "status": "pending",
+            "uploaded_at": invoice_date.isoformat(),
+            "line_items": inv_lines,
+        })
+        expected[po_id] = outcome
+
+    return {"seed": seed, "pos": pos, "slips": slips, "invoices": invoices, "expected": expected}
+
+
+# ---------------------------------------------------------------------------
+# Converters to the other document shapes in the tree
+# ---------------------------------------------------------------------------
+
+def to_v1_purchase_orders(corpus):
+    """v1 in-memory dict used by match_packing_slip / match_invoice (app/main.py)."""
+    return {
+        po["po_number"]: {
+            "po_number": po["po_number"],
+            "vendor": po["vendor_name"],
+            "items": [
+                {"item_number": l["item_number"], "description": l["description"], "quantity": l["quantity"], "unit_price": l["unit_price"]}
+                for l in po["line_items"]
+            ],
+        }
+        for po in corpus["pos"]
+    }
+
+
+def to_v1_slip(slip):
+    """v1 packing slip as returned by the vision prompt."""
+    return {
+        "po_number": slip["po_number_ocr"],
+        "vendor": slip["vendor_name"],
+        "items": [{"item_number": l["item_number"], "description": l["description"], "quantity": l["quantity_shipped"]} for l in slip["line_items"]],
+    }
+
+
+def to_v1_invoice(invoice):
+    return {
+        "po_number": invoice["po_number_ocr"],
+        "vendor": invoice["vendor_name"],
+        "invoice_number": invoice["invoice_number"],
+        "items": [
+            {"item_number": l["item_number"], "description": l["description"], "quantity": l["quantity"], "unit_price": l["unit_price"]}
+            for l in invoice["line_items"]
+        ],
+    }
+
+
+def to_legacy_slip(slip):
+    """Vision payload shape expected by the legacy POManager.match_packing_slip."""
+    return {
+        "po_number": slip["po_number_ocr"],
+        "vendor_name": slip["vendor_name"],
+        "line_items": [
+            {"item_number": l["item_number"], "description": l["description"], "quantity_received": l["quantity_shipped"], "has_handwritten_notes": False}
+            for l in slip["line_items"]
+        ],
+    }
+
+
+def to_po_csv(corpus, delimiter=","):
+    """CSV / TSV accepted by handle_csv_upload / handle_tsv_upload."""
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=delimiter)
+    writer.writerow(["PO Number", "Vendor", "Item ID", "Item Description", "Quantity", "Unit Price"])
+    for po in corpus["pos"]:
+        for l in po["line_items"]:
+            writer.writerow([po["po_number"], po["vendor_name"], l["item_number"], l["description"], l["quantity"], l["unit_price"]])
+    return buf.getvalue().encode("utf-8")
+
+
+def to_netsuite_csv(corpus):
+    """NetSuite export read by the legacy POManager.load_from_csv."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(["PO Number", "Vendor Name", "Vendor ID", "PO Date", "Expected Delivery", "Status",
+                     "Item ID", "Item Description", "Quantity Ordered", "Unit Price", "Line Total"])
+    for po in corpus["pos"]:
+        for l in po["line_items"]:
+            writer.writerow([po["po_number"], po["vendor_name"], "", po["order_date"], "", "Open",
+                             l["item_number"], l["description"], l["quantity"], l["unit_price"], l["line_total"]])
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Store population
+# ---------------------------------------------------------------------------
+
+EXPECTED_STATUS = {"clean": "approve", "short_ship": "review", "over_bill": "reject", "price_variance": "review"}
+
+
+def populate_store(store, corpus, verified_fraction=0.1):
+    """
+    Load the corpus into an InMemoryStore in the same shape save_* would leave
+    it, plus one match result and document events per PO.
+
+    Writes the dicts directly: going through save_* re-scans every PO per
+    event, which makes seeding large stores quadratic.
+    """
+    rng = random.Random(corpus["seed"] + 1)
+    po_numbers = {}
+    for po in corpus["pos"]:
+        record = {k: v for k, v in po.items() if k != "line_items"}
+        if rng.random() < verified_fraction:
+            record["status"] = "verified"
+            record["verified_at"] = po["uploaded_at"]
+        store.purchase_orders[po["id"]] = record
+        store.po_line_items[po["id"]] = po["line_items"]
+        po_numbers[po["id"]] = po["po_number"]
+        _event(store, rng, po["id"], po["po_number"], "po_uploaded", "po", po["id"], po["uploaded_at"])
+
+    for slip in corpus["slips"]:
+        store.packing_slips[slip["id"]] = {k: v for k, v in slip.items() if k != "line_items"}
+        store.slip_line_items[slip["id"]] = slip["line_items"]
+        _event(store, rng, slip["po_id"], slip["po_number_ocr"], "slip_uploaded", "slip", slip["id"], slip["uploaded_at"])
+
+    slips_by_po = {s["po_id"]: s["id"] for s in corpus["slips"]}
+    for inv in corpus["invoices"]:
+        store.invoices[inv["id"]] = {k: v for k, v in inv.items() if k != "line_items"}
+        store.invoice_line_items[inv["id"]] = inv["line_items"]
+        _event(store, rng, inv["po_id"], inv["po_number_ocr"], "invoice_uploaded", "invoice", inv["id"], inv["uploaded_at"])
+
+        outcome = corpus["expected"][inv["po_id"]]
+        match_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+        store.match_results[match_id] = {
+            "id": match_id,
+            "po_id": inv["po_id"],
+            "slip_id": slips_by_po.get(inv["po_id"]),
+            "invoice_id": inv["id"],
+            "match_type": "3way",
+            "overall_status": EXPECTED_STATUS[outcome],
+            "confidence": 98.0 if outcome == "clean" else 70.0,
+            "total_discrepancies": 0 if outcome == "clean" else 1,
+            "amount_delta": round(inv["total_amount"] - store.purchase_orders[inv["po_id"]]["total_amount"], 2),
+            "summary": outcome,
+            "created_at": inv["uploaded_at"],
+        }
+        store.match_line_details[match_id] = [] if outcome == "clean" else [
+            {"line_number": 1, "line_status": "discrepancy", "discrepancy_type": outcome}
+        ]
+        _event(store, rng, inv["po_id"], po_numbers[inv["po_id"]], "match_3way", "match", match_id, inv["uploaded_at"])
+
+    return store
+
+
+def _event(store, rng, po_id, po_number, event_type, entity_type, entity_id, created_at):
+    store.document_events.append({
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "po_id": po_id,
+        "po_number": po_number,
+        "event_type": event_type,
+        "event_source": "user",
+        "actor": "system",
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "created_at": created_at,
+    })
@@ -0,0 +1,499 @@
+"""
+Fake Anthropic API Server
+Local stand-in for POST /v1/messages (plain and streaming) and the Message
+Batches endpoints, so uploads and batch extraction can be exercised and
+load-tested without network access or an API key.
+
+Responses can be canned (default), replayed from recorded extraction JSON
+files (--recordings DIR) or generated from the synthetic benchmark corpus
+(--synthetic N). Latency follows a configurable distribution and errors
+(429 / 529 / 500) can be injected at fixed rates.
+
+Usage:
+    python fake_anthropic_server.py --port 8765
+    python fake_anthropic_server.py --latency lognormal:3.0:0.4 --errors 529=0.02,429=0.01 --synthetic 3000
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 uvicorn app.main:app
+
+In tests:
+    with FakeAnthropicServer() as server:
+        client = anthropic.Anthropic(api_key="test", base_url=server.base_url)
+"""
+
+import os
+import re
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import itertools
+import threading
+from datetime import datetime, timezone, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+CANNED_PACKING_SLIP = {
+    "po_number": "PO-2024-001",
+    "vendor": "Medical Supply Co",
+    "date": "2024-01-20",
+    "items": [
+        {"description": "Exam Gloves, Nitrile, Medium", "quantity": 100, "item_number": "GLV-NIT-M"},
+    ],
+    "tracking_number": "1Z999AA10123456784",
+    "notes": None,
+}
+
+CANNED_INVOICE = {
+    "invoice_number": "INV-2024-0150",
+    "po_number": "PO-2024-001",
+    "vendor": "Medical Supply Co",
+    "invoice_date": "2024-01-22",
+    "items": [
+        {"description": "Exam Gloves, Nitrile, Medium", "quantity": 100, "unit_price": 0.12, "total": 12.0},
+    ],
+    "subtotal": 12.0,
+    "tax": 0,
+    "shipping": 0,
+    "total": 12.0,
+    "payment_terms": "Net 30",
+    "notes": None,
+}
+
+CANNED_PO = {
+    "po_number": "PO-2024-001",
+    "vendor": "Medical Supply Co",
+    "date": "2024-01-15",
+    "ship_to": "Main Clinic",
+    "total": 12.0,
+    "items": [
+        {"description": "Exam Gloves, Nitrile, Medium", "quantity": 100, "unit_price": 0.12},
+    ],
+}
+
+
+def detect_kind(params):
+    """Which document the request is extracting: "invoice", "po" or "packing_slip"."""
+    prompt = ""
+    for block in params.get("messages", [{}])[-1].get("content", []):
+        if isinstance(block, dict) and block.get("type") == "text":
+            prompt = block.get("text", "")
+    if "vendor invoice" in prompt:
+        return "invoice"
+    if "purchase order document" in prompt:
+        return "po"
+    return "packing_slip"
+
+
+def _fenced(payload):
+    return "```json\n" + json.dumps(payload, indent=2) + "\n```"
+
+
+def canned_extraction(params):
+    """Default responder: pick a canned payload based on which prompt was sent."""
+    kind = detect_kind(params)
+    payload = {"invoice": CANNED_INVOICE, "po": CANNED_PO}.get(kind, CANNED_PACKING_SLIP)
+    return _fenced(payload)
+
+
+class RecordedResponder:
+    """
+    Replays recorded extraction payloads from a directory of JSON files.
+    Files are matched to the request by name prefix: invoice*.json, po*.json,
+    anything else is treated as a packing slip. Falls back to canned payloads.
+    """
+
+    def __init__(self, directory):
+        self.payloads = {"invoice": [], "po": [], "packing_slip": []}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            kind = "invoice" if name.startswith("invoice") else "po" if name.startswith("po") else "packing_slip"
+            with open(os.path.join(directory, name)) as f:
+                self.payloads[kind].append(f.read())
+        self.counters = {kind: itertools.count() for kind in self.payloads}
+
+    def __call__(self, params):
+        kind = detect_kind(params)
+        recorded = self.payloads[kind]
+        if not recorded:
+            return canned_extraction(params)
+        return recorded[next(self.counters[kind]) % len(recorded)]
+
+
+class SyntheticResponder:
+    """
+    Extraction payloads drawn from the seeded benchmark corpus, so packing
+    slips and invoices reference POs that a load test seeded with the same
+    seed / size has imported (with the corpus' OCR noise on PO numbers).
+    """
+
+    def __init__(self, n_documents=3000, seed=42):
+        from benchmarks.synthetic import generate_corpus
+        self.corpus = generate_corpus(n_documents, seed=seed)
+        self.counters = {"invoice": itertools.count(), "po": itertools.count(), "packing_slip": itertools.count()}
+
+    def __call__(self, params):
+        kind = detect_kind(params)
+        i = next(self.counters[kind])
+        if kind == "invoice":
+            inv = self.corpus["invoices"][i % len(self.corpus["invoices"])]
+            products = [l for l in inv["line_items"] if not l["is_tax_line"]]
+            tax = sum(l["extension"] for l in inv["line_items"] if l["is_tax_line"])
+            return _fenced({
+                "invoice_number": inv["invoice_number"],
+                "po_number": inv["po_number_ocr"],
+                "vendor": inv["vendor_name"],
+                "invoice_date": inv["invoice_date"],
+                "items": [{"description": l["description"], "quantity": l["quantity"], "unit_price": l["unit_price"], "total": l["extension"]} for l in products],
+                "subtotal": round(inv["total_amount"] - tax, 2),
+                "tax": round(tax, 2),
+                "shipping": 0,
+                "total": inv["total_amount"],
+                "payment_terms": "Net 30",
+                "notes": None,
+            })
+        if kind == "po":
+            po = self.corpus["pos"][i % len(self.corpus["pos"])]
+            return _fenced({
+                "po_number": po["po_number"] + "-D" + str(i // len(self.corpus["pos"])),
+                "vendor": po["vendor_name"],
+                "date": po["order_date"],
+                "ship_to": "Main Clinic",
+                "total": po["total_amount"],
+                "items": [{"description": l["description"], "quantity": l["quantity"], "unit_price": l["unit_price"]} for l in po["line_items"]],
+            })
+        slip = self.corpus["slips"][i % len(self.corpus["slips"])]
+        return _fenced({
+            "po_number": slip["po_number_ocr"],
+            "vendor": slip["vendor_name"],
+            "date": slip["ship_date"],
+            "items": [{"description": l["description"], "quantity": l["quantity_shipped"], "item_number": l["item_number"]} for l in slip["line_items"]],
+            "tracking_number": "1Z" + slip["id"][:16].upper().replace("-", ""),
+            "notes": None,
+        })
+
+
+# ---------------------------------------------------------------------------
+# Latency / error injection
+# ---------------------------------------------------------------------------
+
+class LatencyModel:
+    """
+    Per-request latency in seconds, parsed from a spec string:
+        fixed:1.5               always 1.5s
+        uniform:0.5:3.0         uniform between 0.5s and 3.0s
+        lognormal:2.5:0.4       median 2.5s, sigma 0.4 (long right tail, like real vision calls)
+    """
+
+    def __init__(self, spec="fixed:0"):
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.args = [float(p) for p in parts[1:]]
+        if self.kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError("Unknown latency distribution: " + spec)
+        self.spec = spec
+
+    def sample(self, rng):
+        if self.kind == "fixed":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return rng.uniform(self.args[0], self.args[1])
+        return rng.lognormvariate(math.log(self.args[0]), self.args[1])
+
+
+ERROR_TYPES = {
+    429: "rate_limit_error",
+    500: "api_error",
+    503: "api_error",
+    529: "overloaded_error",
+}
+
+
+def parse_error_rates(text):
+    """ "529=0.02,429=0.01" -> {529: 0.02, 429: 0.01}"""
+    rates = {}
+    for part in (text or "").split(","):
+        if "=" in part:
+            status, rate = part.split("=", 1)
+            rates[int(status)] = float(rate)
+    return rates
+
+
+def _iso(dt):
+    return dt.isoformat().replace("+00:00", "Z")
+
+
+def _message(model, text):
+    return {
+        "id": "msg_" + uuid.uuid4().hex[:24],
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [{"type": "text", "text": text}],
+        "stop_reason": "end_turn",
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1500, "output_tokens": max(1, len(text) // 4)},
+    }
+
+
+class FakeAnthropicServer:
+    """Threaded HTTP server imitating the Messages and Message Batches APIs."""
+
+    def __init__(self, host="127.0.0.1", port=0, responder=None, processing_delay=0.0,
+                 latency=None, error_rates=None, stream_chunk_chars=40, seed=None):
+        """
+        Args:
+            responder: callable(params) -> response text (defaults to canned JSON)
+            processing_delay: seconds a batch stays "in_progress" after creation
+            latency: LatencyModel or spec string for POST /v1/messages
+            error_rates: {status: fraction} of /v1/messages requests that fail
+            stream_chunk_chars: characters per text_delta event when streaming
+        """
+        self.responder = responder or canned_extraction
+        self.processing_delay = processing_delay
+        self.latency = latency if isinstance(latency, LatencyModel) else LatencyModel(latency or "fixed:0")
+        self.error_rates = error_rates or {}
+        self.stream_chunk_chars = stream_chunk_chars
+        self.rng = random.Random(seed)
+        self.batches = {}
+        self.stats = {"messages": 0, "streamed": 0, "errors": {}, "in_flight": 0, "max_in_flight": 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return "http://" + host + ":" + str(port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # -- Batch state -------------------------------------------------------
+
+    def _create_batch(self, requests):
+        now = datetime.now(timezone.utc)
+        batch_id = "msgbatch_" + uuid.uuid4().hex[:24]
+        with self.lock:
+            self.batches[batch_id] = {
+                "requests": requests,
+                "created": now,
+                "ready_at": time.monotonic() + self.processing_delay,
+                "canceled": False,
+            }
+        return self._batch_object(batch_id)
+
+    def _batch_object(self, batch_id):
+        batch = self.batches[batch_id]
+        ended = batch["canceled"] or time.monotonic() >= batch["ready_at"]
+        count = len(batch["requests"])
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else count,
+                "succeeded": count if ended and not batch["canceled"] else 0,
+                "errored": 0,
+                "canceled": count if batch["canceled"] else 0,
+                "expired": 0,
+            },
+            "created_at": _iso(batch["created"]),
+            "expires_at": _iso(batch["created"] + timedelta(hours=24)),
+            "ended_at": _iso(datetime.now(timezone.utc)) if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": self.base_url + "/v1/messages/batches/" + batch_id + "/results" if ended else None,
+        }
+
+    def _batch_results(self, batch_id):
+        batch = self.batches[batch_id]
+        lines = []
+        for req in batch["requests"]:
+            if batch["canceled"]:
+                result = {"type": "canceled"}
+            else:
+                params = req.get("params", {})
+                text = self.responder(params)
+                result = {"type": "succeeded", "message": _message(params.get("model", ""), text)}
+            lines.append(json.dumps({"custom_id": req.get("custom_id"), "result": result}))
+        return "\n".join(lines) + "\n"
+
+    # -- Messages ------------------------------------------------------------
+
+    def _plan_message(self):
+        """Decide (error_status or None, latency) for one /v1/messages call."""
+        with self.lock:
+            roll = self.rng.random()
+            latency = self.latency.sample(self.rng)
+            self.stats["messages"] += 1
+        for status, rate in self.error_rates.items():
+            if roll < rate:
+                with self.lock:
+                    key = str(status)
+                    self.stats["errors"][key] = self.stats["errors"].get(key, 0) + 1
+                return status, latency
+            roll -= rate
+        return None, latency
+
+    def _track(self, delta):
+        with self.lock:
+            self.stats["in_flight"] += delta
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def _stream_events(self, params, text):
+        """Server-sent events in the order the Messages streaming API emits them."""
+        message = _message(params.get("model", ""), "")
+        message["content"] = []
+        message["stop_reason"] = None
+        message["usage"] = {"input_tokens": 1500, "output_tokens": 1}
+        yield "message_start", {"type": "message_start", "message": message}
+        yield "content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}
+        step = max(1, self.stream_chunk_chars)
+        for i in range(0, len(text), step):
+            yield "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text[i:i + step]}}
+        yield "content_block_stop", {"type": "content_block_stop", "index": 0}
+        yield "message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": max(1, len(text) // 4)}}
+        yield "message_stop", {"type": "message_stop"}
+
+    # -- HTTP --------------------------------------------------------------
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json", headers=None):
+                data = body.encode("utf-8") if isinstance(body, str) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _messages(self):
+                params = self._read_json()
+                error, latency = server._plan_message()
+                if error:
+                    # Overload / rate-limit errors come back quickly in practice
+                    time.sleep(min(latency, 0.05))
+                    headers = {"retry-after": "1"} if error == 429 else {}
+                    self._send(error, {"type": "error", "error": {"type": ERROR_TYPES.get(error, "api_error"), "message": "Injected " + str(error)}}, headers=headers)
+                    return
+
+                server._track(1)
+                try:
+                    text = server.responder(params)
+                    headers = {
+                        "request-id": "req_" + uuid.uuid4().hex[:24],
+                        "anthropic-ratelimit-requests-remaining": "4000",
+                        "anthropic-ratelimit-tokens-remaining": "400000",
+                    }
+                    if not params.get("stream"):
+                        time.sleep(latency)
+                        self._send(200, _message(params.get("model", ""), text), headers=headers)
+                        return
+
+                    with server.lock:
+                        server.stats["streamed"] += 1
+                    events = list(server._stream_events(params, text))
+                    # ~30% of the latency before the first token, the rest spread over the deltas
+                    time.sleep(latency * 0.3)
+                    gap = latency * 0.7 / max(1, len(events) - 1)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Cache-Control", "no-cache")
+                    for name, value in headers.items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    for n, (event, data) in enumerate(events):
+                        if n:
+                            time.sleep(gap)
+                        self.wfile.write(("event: " + event + "\ndata: " + json.dumps(data) + "\n\n").encode("utf-8"))
+                        self.wfile.flush()
+                finally:
+                    server._track(-1)
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _not_found(self):
+                self._send(404, {"type": "error", "error": {"type": "not_found_error", "message": "Not found"}})
+
+            def do_POST(self):
+                path = self.path.split("?")[0]
+                if path == "/v1/messages":
+                    self._messages()
+                    return
+                if path == "/v1/messages/batches":
+                    self._send(200, server._create_batch(self._read_json().get("requests", [])))
+                    return
+                m = re.fullmatch(r"/v1/messages/batches/([\w-]+)/cancel", path)
+                if m and m.group(1) in server.batches:
+                    server.batches[m.group(1)]["canceled"] = True
+                    self._send(200, server._batch_object(m.group(1)))
+                    return
+                self._not_found()
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/_fake/stats":
+                    with server.lock:
+                        self._send(200, dict(server.stats, errors=dict(server.stats["errors"]), latency=server.latency.spec))
+                    return
+                m = re.fullmatch(r"/v1/messages/batches/([\w-]+)(/results)?", path)
+                if not m or m.group(1) not in server.batches:
+                    self._not_found()
+                    return
+                if m.group(2):
+                    self._send(200, server._batch_results(m.group(1)), content_type="application/binary")
+                else:
+                    self._send(200, server._batch_object(m.group(1)))
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Anthropic API server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--processing-delay", type=float, default=5.0, help="Seconds each batch stays in_progress")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:S | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--errors", default="", help="Injected error rates, e.g. 529=0.02,429=0.01")
+    parser.add_argument("--recordings", help="Directory of recorded extraction JSON files to replay")
+    parser.add_argument("--synthetic", type=int, default=0, help="Answer from a synthetic corpus of N documents")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    responder = None
+    if args.recordings:
+        responder = RecordedResponder(args.recordings)
+    elif args.synthetic:
+        responder = SyntheticResponder(args.synthetic, seed=args.seed)
+
+    fake = FakeAnthropicServer(args.host, args.port, responder=responder, processing_delay=args.processing_delay,
+                               latency=args.latency, error_rates=parse_error_rates(args.errors), seed=args.seed)
+    print("Fake Anthropic API listening on " + fake.base_url + " (latency " + args.latency + ")")
+    try:
+        fake.httpd.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -4,11 +4,65 @@ Handles CSV loading, PO lookup, and quantity matching logic
 """
 
 import csv
+import re
 from typing import Dict, List, Optional
 from dataclasses import dataclass, asdict
 from decimal import Decimal
 
 
+LEGAL_SUFFIXES = {'inc', 'incorporated', 'corp', 'corporation', 'co', 'company',
+                  'llc', 'llp', 'lp', 'ltd', 'limited', 'plc', 'pllc', 'pc'}
+
+
+def vendor_key_for(vendor_name: str) -> str:
+    """
+    Canonical vendor key: lowercase, punctuation dropped, '&' spelled out,
+    trailing legal suffixes (whole words only) and a leading 'the' removed
+    """
+    tokens = re.sub(r'[^a-z0-9]+', ' ', (vendor_name or '').lower().replace('&', ' and ')).split()
+    if len(tokens) > 1 and tokens[0] == 'the':
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in LEGAL_SUFFIXES:
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+PO_NUMBER_CONFUSABLES = str.maketrans({'O': '0', 'Q': '0', 'D': '0', 'I': '1', 'L': '1',
+                                       'S': '5', 'B': '8', 'Z': '2', 'G': '6'})
+
+
+def po_number_key_for(po_number: str) -> str:
+    """
+    PO number lookup key: uppercase letters and digits only, a leading
+    'PO' dropped, OCR look-alikes folded (O -> 0, I/L -> 1, S -> 5, ...)
+    """
+    key = re.sub(r'[^A-Z0-9]+', '', (po_number or '').upper())
+    for prefix in ('PONUMBER', 'PONO', 'PO', 'P0'):
+        if key.startswith(prefix) and len(key) > len(prefix):
+            key = key[len(prefix):]
+            break
+    return key.translate(PO_NUMBER_CONFUSABLES)
+
+
+NDC_LAYOUTS = {(4, 4, 2): (5, 4, 2), (5, 3, 2): (5, 4, 2), (5, 4, 1): (5, 4, 2), (5, 4, 2): (5, 4, 2)}
+
+
+def item_key_for(item_number: str) -> str:
+    """
+    Item number join key: hyphenated NDCs (4-4-2, 5-3-2, 5-4-1) padded to
+    11-digit 5-4-2, anything else uppercase letters and digits only
+    """
+    text = str(item_number or '').strip().upper()
+    if text.startswith('NDC'):
+        text = text[3:].lstrip(' :#')
+    parts = re.split(r'[\s\-]+', text)
+    if len(parts) == 3 and all(p.isdigit() for p in parts):
+        layout = NDC_LAYOUTS.get(tuple(len(p) for p in parts))
+        if layout:
+            return ''.join(p.zfill(width) for p, width in zip(parts, layout))
+    return re.sub(r'[^A-Z0-9]+', '', text)
+
+
 @dataclass
 class POLineItem:
     """Represents a single line item in a PO"""
@@ -67,7 +121,8 @@ class POManager:
     
     def __init__(self):
         self.po_dict: Dict[str, PurchaseOrder] = {}
-        self.vendor_index: Dict[str, List[str]] = {}  # vendor_name -> list of PO numbers
+        self.vendor_index: Dict[str, List[str]] = {}  # canonical vendor key -> list of PO numbers
+        self.po_number_index: Dict[str, str] = {}  # OCR-folded PO number key -> PO number
     
     def load_from_csv(self, csv_path: str):
         """
@@ -117,11 +172,13 @@ class POManager:
             po = PurchaseOrder(**po_data)
             self.po_dict[po_number] = po
             
+            self.po_number_index.setdefault(po_number_key_for(po_number), po_number)
+            
             # Build vendor index for faster lookups
-            vendor_name = po.vendor_name.lower()
-            if vendor_name not in self.vendor_index:
-                self.vendor_index[vendor_name] = []
-            self.vendor_index[vendor_name].append(po_number)
+            vendor_key = vendor_key_for(po.vendor_name)
+            if vendor_key not in self.vendor_index:
+                self.vendor_index[vendor_key] = []
+            self.vendor_index[vendor_key].append(po_number)
         
         print(f"✓ Loaded {len(self.po_dict)} POs with {sum(len(po.line_items) for po in self.po_dict.values())} total line items")
     
@@ -134,23 +191,19 @@ class POManager:
     def _normalize_po_number(self, po_number: str) -> str:
         """
         Normalize PO number for matching
-        Handles variations like: PO12345, PO-12345, 12345
+        Handles variations like: PO12345, PO-12345, 12345, P0 12345, PO-I2345
         """
         if not po_number:
             return ""
         
-        # Remove common prefixes and special characters
-        normalized = po_number.upper().strip()
-        normalized = normalized.replace('PO-', '').replace('PO', '').replace('#', '').replace(' ', '')
-        
-        # Check if this normalized version exists
-        if normalized in self.po_dict:
-            return normalized
+        if po_number in self.po_dict:
+            return po_number
         
-        # Check with PO prefix
-        with_prefix = f"PO{normalized}"
-        if with_prefix in self.po_dict:
-            return with_prefix
+        # Compare keys with prefixes, punctuation and OCR confusions folded away
+        # ("P0-1OO123" and "PO100123" are both "100123")
+        match = self.po_number_index.get(po_number_key_for(po_number))
+        if match:
+            return match
         
         # Return original if no match found
         return po_number.strip()
@@ -192,15 +245,29 @@ class POManager:
         matched_items = []
         unmatched_items = []
         
+        # Item ID / NDC on both sides pairs lines directly; description
+        # matching is only needed for the rest
+        po_items_by_key: Dict[str, List[POLineItem]] = {}
+        for po_item in po.line_items:
+            key = item_key_for(po_item.item_id)
+            if key:
+                po_items_by_key.setdefault(key, []).append(po_item)
+        joined_ids = set()
+        
         for received_item in items_received:
             item_desc = received_item.get('description', '').lower()
             qty_received = float(received_item.get('quantity_received', 0))
+            waiting = po_items_by_key.get(item_key_for(received_item.get('item_number', '')))
+            joined = waiting.pop(0) if waiting else None
+            if joined is not None:
+                joined_ids.add(id(joined))
             
             # Try to find matching line item in PO
             matched = False
-            for po_item in po.line_items:
-                # Fuzzy match on description or item ID
-                if (self._fuzzy_item_match(item_desc, po_item.description.lower()) or 
+            for po_item in ([joined] if joined is not None else po.line_items):
+                # Joined on item number, else fuzzy match on description or item ID
+                if (po_item is joined or
+                    self._fuzzy_item_match(item_desc, po_item.description.lower()) or 
                     item_desc in po_item.item_id.lower()):
                     
                     matched = True
@@ -245,6 +312,8 @@ class POManager:
         # Check for items in PO that weren't received
         received_descriptions = {item.get('description', '').lower() for item in items_received}
         for po_item in po.line_items:
+            if id(po_item) in joined_ids:
+                continue
             found_in_shipment = any(
                 self._fuzzy_item_match(desc, po_item.description.lower()) 
                 for desc in received_descriptions
@@ -277,17 +346,11 @@ class POManager:
         if vendor1 == vendor2:
             return True
         
-        # Remove common suffixes
-        suffixes = ['inc', 'inc.', 'corp', 'corp.', 'corporation', 'llc', 'ltd', 'ltd.', 'co.', 'company']
-        clean1 = vendor1.lower()
-        clean2 = vendor2.lower()
-        
-        for suffix in suffixes:
-            clean1 = clean1.replace(suffix, '').strip()
-            clean2 = clean2.replace(suffix, '').strip()
-        
-        # Check if one contains the other
-        return clean1 in clean2 or clean2 in clean1
+        # Compare canonical keys ("McKesson Corp" and "McKesson Corporation"
+        # are both "mckesson"); one may contain the other on word boundaries
+        key1 = ' ' + vendor_key_for(vendor1) + ' '
+        key2 = ' ' + vendor_key_for(vendor2) + ' '
+        return key1 in key2 or key2 in key1
     
     def _fuzzy_item_match(self, item1: str, item2: str, threshold: float = 0.6) -> bool:
         """
@@ -320,7 +383,7 @@ class POManager:
     
     def get_vendor_pos(self, vendor_name: str) -> List[PurchaseOrder]:
         """Get all POs for a specific vendor"""
-        vendor_key = vendor_name.lower()
+        vendor_key = vendor_key_for(vendor_name)
         po_numbers = self.vendor_index.get(vendor_key, [])
         return [self.po_dict[po_num] for po_num in po_numbers]
     
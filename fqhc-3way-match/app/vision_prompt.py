@@ -27,6 +27,7 @@ Extract the following information and return it as valid JSON:
 
 3. **Line Items**: Extract ALL items listed with their quantities. For each item, extract:
    - `description`: Item name/description (be generous with partial reads)
+   - `item_number`: Item/SKU/catalog number or NDC if printed on the line (empty string if none)
    - `quantity_received`: The quantity number (may be handwritten or printed)
    - `has_handwritten_notes`: true if there are ANY handwritten marks, checkmarks, circles, or annotations on or near this line item
    - `handwritten_notes`: If handwritten marks exist, describe them (e.g., "checkmark", "circled", "underlined", "note: partial shipment", "damaged")
@@ -63,12 +64,14 @@ Return ONLY valid JSON in this exact structure:
   "line_items": [
     {
       "description": "Nitrile Gloves, Large, Box of 100",
+      "item_number": "GLV-NIT-L",
       "quantity_received": 5,
       "has_handwritten_notes": true,
       "handwritten_notes": "checkmark and circled quantity"
     },
     {
       "description": "Gauze Pads 4x4",
+      "item_number": "",
       "quantity_received": 10,
       "has_handwritten_notes": false,
       "handwritten_notes": null
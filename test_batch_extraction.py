@@ -0,0 +1,106 @@
+"""
+Test Script for Batch Extraction
+Runs the queue → batch → poll → match path against the local fake batch server.
+"""
+
+import anthropic
+
+from fake_anthropic_server import FakeAnthropicServer
+from app.batch_extraction import BatchExtractionQueue
+from app.po_matcher import match_packing_slip
+from app.invoice_matcher import match_invoice
+
+
+def _make_queue(server, purchase_orders, packing_slips, invoices):
+    def store_slip(data):
+        result = match_packing_slip(data, purchase_orders)
+        packing_slips.append(data)
+        return {"success": True, "match": result}
+
+    def store_invoice(data):
+        result = match_invoice(data, purchase_orders, packing_slips)
+        invoices.append(data)
+        return {"success": True, "match": result}
+
+    return BatchExtractionQueue(
+        appliers={"packing_slip": store_slip, "invoice": store_invoice},
+        client_factory=lambda: anthropic.Anthropic(api_key="test", base_url=server.base_url),
+    )
+
+
+def test_batch_round_trip():
+    """Queued slip + invoice come back matched against the PO."""
+    purchase_orders = {
+        "PO-2024-001": {
+            "po_number": "PO-2024-001",
+            "vendor": "Medical Supply Co",
+            "items": [{"description": "Exam Gloves, Nitrile, Medium", "quantity": "100", "unit_price": "0.12"}],
+        }
+    }
+    packing_slips, invoices = [], []
+
+    with FakeAnthropicServer() as server:
+        queue = _make_queue(server, purchase_orders, packing_slips, invoices)
+        queue.enqueue("packing_slip", b"fake-image", "slip.jpg")
+        queue.enqueue("invoice", b"%PDF-fake", "invoice.pdf")
+        assert len(queue.pending) == 2
+
+        batch_id = queue.submit()
+        assert queue.pending == []
+
+        status = queue.poll(batch_id)
+
+    assert status["applied"] is True
+    assert status["succeeded"] == 2
+    assert len(packing_slips) == 1 and len(invoices) == 1
+
+    results = {d["kind"]: d["result"] for d in status["documents"]}
+    assert results["packing_slip"]["match"]["status"] == "APPROVE"
+    assert results["invoice"]["match"]["status"] == "APPROVE"
+
+
+def test_batch_waits_for_processing():
+    """Results are not applied while the batch is still in progress."""
+    packing_slips = []
+    with FakeAnthropicServer(processing_delay=60) as server:
+        queue = _make_queue(server, {}, packing_slips, [])
+        queue.enqueue("packing_slip", b"fake-image", "slip.png")
+        batch_id = queue.submit()
+        status = queue.poll(batch_id)
+
+    assert status["processing_status"] == "in_progress"
+    assert status["applied"] is False
+    assert packing_slips == []
+
+
+def test_unknown_kind_rejected():
+    queue = BatchExtractionQueue(appliers={})
+    try:
+        queue.enqueue("receipt", b"x", "x.jpg")
+    except ValueError:
+        return
+    raise AssertionError("Unknown kind should raise ValueError")
+
+
+def test_failed_submit_keeps_the_queue():
+    def unreachable():
+        raise ConnectionError("API unreachable")
+
+    queue = BatchExtractionQueue(appliers={}, client_factory=unreachable)
+    first = queue.enqueue("packing_slip", b"fake-image", "slip.jpg")
+    try:
+        queue.submit()
+    except ConnectionError:
+        pass
+    else:
+        raise AssertionError("submit should raise when the batch isn't created")
+    assert [d["custom_id"] for d in queue.list_batches()["pending"]] == [first]
+    assert queue.batches == {}
+
+
+if __name__ == "__main__":
+    test_batch_round_trip()
+    test_batch_waits_for_processing()
+    test_unknown_kind_rejected()
+    test_failed_submit_keeps_the_queue()
+    print("✅ Batch extraction tests PASSED")
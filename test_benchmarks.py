@@ -0,0 +1,50 @@
+"""
+Test Script for the Synthetic Generator and Benchmark Runner
+Keeps the benchmark suite runnable: tiny corpus, tiny time budget.
+"""
+
+from app.database import InMemoryStore
+from benchmarks import synthetic
+from benchmarks.run_benchmarks import run_suite, build_report, compare_reports, parse_sizes, BENCHMARKS
+
+
+def test_corpus_is_deterministic():
+    a = synthetic.generate_corpus(300, seed=7)
+    b = synthetic.generate_corpus(300, seed=7)
+    assert a == b
+    assert len(a["pos"]) == len(a["slips"]) == len(a["invoices"]) == 100
+    assert synthetic.generate_corpus(300, seed=8)["pos"] != a["pos"]
+
+    lines = [l for po in a["pos"] for l in po["line_items"]]
+    assert any(l["is_tax_line"] for l in lines)
+    slip_lines = [l["description"] for s in a["slips"] for l in s["line_items"]]
+    assert synthetic.DILUENT[0] in slip_lines
+
+    store = synthetic.populate_store(InMemoryStore(), a)
+    assert len(store.purchase_orders) == 100
+    assert len(store.match_results) == 100
+    assert store.list_discrepancies()
+
+
+def test_suite_runs_and_compares():
+    results = run_suite([60], seed=1, budget=0.001, max_ops=2, quadratic_limit=30, log=lambda line: None)
+    assert len(results) == len(BENCHMARKS)
+    skipped = [r["name"] for r in results if "skipped" in r]
+    assert "list_pos" in skipped and "dashboard_stats" in skipped
+
+    report = build_report(results, [60], 1, 0.001)
+    slower = {"results": [dict(r, p50_us=r["p50_us"] * 3 + 100) if "p50_us" in r else r for r in results]}
+    regressions, _ = compare_reports(report, slower, threshold=0.25)
+    assert len(regressions) == len(results) - len(skipped)
+    assert compare_reports(report, report)[0] == []
+
+
+def test_parse_sizes():
+    assert parse_sizes("1k, 10k,1m,250") == [1000, 10000, 1000000, 250]
+
+
+if __name__ == "__main__":
+    test_corpus_is_deterministic()
+    test_suite_runs_and_compares()
+    test_parse_sizes()
+    print("✅ Benchmark suite tests PASSED")
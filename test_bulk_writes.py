@@ -0,0 +1,152 @@
+"""
+Test Script for Bulk Store Writes
+A batch of POs / documents is checked, saved and recorded as one event.
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database
+from app.admin_html import po_records_from_table
+from app.api_routes import router
+from app.database import InMemoryStore
+from app.shared_state import MemoryLogBackend, SharedState, ReplicatedStore
+
+
+CSV = (b"PO Number,Vendor,Item ID,Item Description,Quantity,Unit Price\n"
+       b"PO-B1,Medline,M-1,Nitrile Exam Gloves,10,9.80\n"
+       b"PO-B1,Medline,M-2,Gauze Sponges 4x4,5,\"1,204.50\"\n"
+       b"PO-B2,McKesson,K-1,Alcohol Prep Pads,20,2.15\n")
+
+
+def _store():
+    store = InMemoryStore()
+    store.cold_storage = None
+    return store
+
+
+def test_pos_bulk_checks_the_batch_and_logs_one_event():
+    store = _store()
+    changes = []
+    store.change_listeners.append(lambda po_id, event: changes.append((po_id, event)))
+    existing = store.save_po({"po_number": "PO-B0"})
+    changes.clear()
+
+    pos = po_records_from_table(CSV) + [{"po_number": "PO-B0"}, {"vendor_name": "Cardinal"}, {"po_number": "PO-B2"}]
+    assert pos[0]["total_amount"] == 6120.5 and pos[0]["line_items"][1]["unit_price"] == 1204.5
+    version = store.version
+    result = store.save_pos_bulk(pos)
+    assert [r["error"] for r in result["rejected"]] == ["missing po_number", "po_number repeated in batch"]
+    b1, b2 = result["ids"][:2]
+    assert result["ids"][2:] == [existing, None, None]
+    assert result["unchanged"] == [{"index": 2, "id": existing}] and result["updated"] == []
+
+    assert store.get_po_by_number("PO-B1")["id"] == b1 and store.get_po_by_number("PO-B0")["id"] == existing
+    assert [l["item_number"] for l in store.get_po(b1)["line_items"]] == ["M-1", "M-2"]
+    assert store.get_po(b2)["batch_id"] == result["batch_id"] and store.get_po(b2)["vendor_id"]
+    # One event and one version for the batch; listeners still hear about each PO
+    events = store.get_recent_events(event_type="bulk_import")
+    assert len(events) == 1
+    assert events[0]["batch"] == {"saved": 2, "rejected": 2, "po_count": 2, "updated": 0, "unchanged": 1}
+    # Each new PO still has its own timeline entry, tied to the batch
+    assert [(e["event_type"], e["batch_id"]) for e in store.get_timeline_for_po(b2)] == [("po_uploaded", result["batch_id"])]
+    assert store.version == version + 1 and store.po_version(b1) == store.po_version(b2) == store.version
+    assert [c[0] for c in changes] == [b1, b2, None] and changes[-1][1]["entity_id"] == result["batch_id"]
+
+
+def test_document_bulk_feeds_duplicates_and_one_rematch_round():
+    store = _store()
+    po_ids = store.save_pos_bulk(po_records_from_table(CSV))["ids"]
+    slips = store.save_slips_bulk([
+        {"po_id": po_ids[0], "po_number_ocr": "PO-B1", "vendor_name": "Medline", "slip_number": "PS-1",
+         "line_items": [{"item_number": "M-1", "description": "Nitrile Exam Gloves", "quantity_shipped": 10}]},
+        {"po_id": po_ids[1], "po_number_ocr": "PO-B2", "vendor_name": "McKesson", "slip_number": "PS-2"},
+        {"po_id": "no-such-po"},
+    ])
+    assert slips["rejected"] == [{"index": 2, "error": "unknown po_id"}]
+    assert store.save_lines_bulk("slip", {slips["ids"][1]: [{"item_number": "K-1", "quantity_shipped": 20}],
+                                          "no-such-slip": []}) == 1
+    assert sorted(store.pending_rematch) == sorted(po_ids)
+    invoices = store.save_invoices_bulk([
+        {"po_id": po_ids[1], "vendor_name": "McKesson", "invoice_number": "INV-7", "total_amount": 43.0},
+        {"po_id": po_ids[1], "vendor_name": "McKesson", "invoice_number": "INV-7", "total_amount": 43.0},
+    ])
+    assert store.get_invoice(invoices["ids"][1])["duplicate_of"] == invoices["ids"][0]
+
+    changes = []
+    store.change_listeners.append(lambda po_id, event: changes.append((po_id, event)))
+    version = store.version
+    assert store.rematch_pending(store.rematch_due("9999")) == 2
+    assert store.version == version + 1 and len([c for c in changes if c[1]]) == 2
+    assert [e["event_type"] for e in store.get_timeline_for_po(po_ids[1])] == \
+        ["po_uploaded", "slip_uploaded", "invoice_uploaded", "invoice_uploaded", "rematch"]
+    assert store.get_matches_for_po(po_ids[0])[0]["slip_ids"] == [slips["ids"][0]]
+
+
+def test_bulk_writes_replicate_and_fill_in_the_callers_records():
+    backend = MemoryLogBackend()
+    store_a, store_b = _store(), _store()
+    a, b = SharedState(backend, store_a), SharedState(backend, store_b)
+    db_a, db_b = ReplicatedStore(a, store_a), ReplicatedStore(b, store_b)
+
+    pos = po_records_from_table(CSV)
+    result = db_a.save_pos_bulk(pos)
+    assert pos[0]["id"] == result["ids"][0] and pos[0]["status"] == "active"
+    b.sync()
+    assert db_b.get_po(result["ids"][1])["line_items"] == db_a.get_po(result["ids"][1])["line_items"]
+    assert db_b.get_all_events()[0]["id"] == db_a.get_all_events()[0]["id"]
+    # The second worker already has PO-B1: a re-import changes nothing there either
+    assert db_b.save_pos_bulk([{"po_number": "PO-B1"}])["unchanged"] == [{"index": 0, "id": result["ids"][0]}]
+    a.sync()
+    assert len(store_a.purchase_orders) == len(store_b.purchase_orders) == 2
+
+
+def test_cumulative_reimport_skips_unchanged_and_updates_changed_pos():
+    store = _store()
+    first = store.save_pos_bulk(po_records_from_table(CSV))
+    b1, b2 = first["ids"]
+    store.save_slips_bulk([{"po_id": b1, "po_number_ocr": "PO-B1", "slip_number": "PS-1",
+                            "line_items": [{"item_number": "M-1", "description": "Nitrile Exam Gloves", "quantity_shipped": 10}]}])
+    store.rematch_pending(store.rematch_due("9999"))
+    old_match = store.get_matches_for_po(b1)[0]["id"]
+
+    # Next day's export: the same two POs, PO-B1 with a changed quantity, plus a new one
+    export = CSV.replace(b"M-2,Gauze Sponges 4x4,5", b"M-2,Gauze Sponges 4x4,8") + b"PO-B3,Cardinal,C-1,Tourniquets,50,0.40\n"
+    again = store.save_pos_bulk(po_records_from_table(export))
+    assert again["rejected"] == []
+    assert again["ids"][:2] == [b1, b2] and again["ids"][2] not in (b1, b2)
+    assert again["updated"] == [{"index": 0, "id": b1}] and again["unchanged"] == [{"index": 1, "id": b2}]
+    assert store.get_po(b1)["line_items"][1]["quantity"] == 8 and len(store.purchase_orders) == 3
+    assert [e["event_type"] for e in store.get_timeline_for_po(b1)][-1] == "po_updated"
+
+    # The re-matched result is rebuilt against the new lines
+    assert b1 in store.pending_rematch
+    store.rematch_pending(store.rematch_due("9999"))
+    matches = store.get_matches_for_po(b1)
+    assert len(matches) == 1 and matches[0]["id"] != old_match
+
+
+def test_import_route_reports_unreadable_files_as_bad_requests():
+    database._db = _store()
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    ok = client.post("/api/v2/purchase-orders/import", files={"file": ("pos.csv", CSV)})
+    assert ok.status_code == 200 and ok.json()["imported"] == 2 and ok.json()["line_items"] == 3
+    again = client.post("/api/v2/purchase-orders/import", files={"file": ("pos.csv", CSV)})
+    assert again.json()["imported"] == 0 and again.json()["unchanged"] == 2
+
+    # A field past the csv module's size limit, and a file that isn't UTF-8
+    oversized = CSV + b'PO-B9,Medline,M-9,"' + b"x" * 200000 + b'",1,1.00\n'
+    assert client.post("/api/v2/purchase-orders/import", files={"file": ("pos.csv", oversized)}).status_code == 400
+    assert client.post("/api/v2/purchase-orders/import", files={"file": ("pos.csv", b"\xff\xfe")}).status_code == 400
+
+
+if __name__ == "__main__":
+    test_pos_bulk_checks_the_batch_and_logs_one_event()
+    test_document_bulk_feeds_duplicates_and_one_rematch_round()
+    test_bulk_writes_replicate_and_fill_in_the_callers_records()
+    test_cumulative_reimport_skips_unchanged_and_updates_changed_pos()
+    test_import_route_reports_unreadable_files_as_bad_requests()
+    print("✅ Bulk store write tests PASSED")
@@ -0,0 +1,83 @@
+"""
+Test Script for the Live Change Feed
+Writes are coalesced per PO; reconnecting clients resume or are told to reload.
+"""
+
+import json
+import asyncio
+
+from app.database import InMemoryStore
+from app.change_feed import ChangeFeed, parse_event_id
+
+
+def _store_with_feed(**kwargs):
+    store = InMemoryStore()
+    store.cold_storage = None
+    feed = ChangeFeed(**kwargs)
+    store.change_listeners.append(feed.on_change)
+    return store, feed
+
+
+def test_writes_coalesce_into_one_message():
+    store, feed = _store_with_feed()
+    queue = feed.subscribe()
+    po_id = store.save_po({"po_number": "PO-1", "vendor_name": "Medline"})
+    store.save_po_lines(po_id, [{"item_number": "A"}])
+    # The slip's OCR'd number is wrong, but it is linked to the PO
+    store.save_slip({"po_id": po_id, "po_number_ocr": "P0-1"})
+    store.update_status("po", po_id, "verified")
+
+    message = feed.flush()
+    assert message["po_ids"] == [po_id]
+    assert [e["event_type"] for e in message["events"]] == ["po_uploaded", "slip_uploaded"]
+    assert queue.get_nowait() is message
+    assert feed.flush() is None
+
+
+def test_resume_and_reload():
+    store, feed = _store_with_feed(max_pending=3)
+    for n in range(3):
+        store.save_po({"po_number": "PO-" + str(n)})
+        feed.flush()
+
+    resumed = feed.subscribe(last_seq=1)
+    assert [resumed.get_nowait()["seq"] for _ in range(2)] == [2, 3]
+    assert feed.subscribe(last_seq=3).empty()
+    assert feed.subscribe(*parse_event_id(feed.epoch + "-3")).empty()
+    # An id from before a restart, or from another worker, can't be resumed
+    assert feed.subscribe(last_seq=7).get_nowait() == {"seq": 3, "reload": True}
+    assert feed.subscribe(*parse_event_id("0badf00d-2")).get_nowait()["reload"] is True
+
+    # A bulk import overflows the pending set: one reload instead of thousands of ids
+    for n in range(10):
+        store.save_po({"po_number": "BULK-" + str(n)})
+    assert feed.flush() == {"seq": 4, "reload": True}
+    assert resumed.get_nowait()["reload"] is True
+
+
+def test_stream_formats_sse():
+    store, feed = _store_with_feed()
+
+    async def first_message():
+        body = feed.stream()
+        assert await body.__anext__() == "retry: 3000\n\n"
+        pending = asyncio.ensure_future(body.__anext__())
+        await asyncio.sleep(0)
+        store.save_po({"po_number": "PO-9"})
+        feed.flush()
+        chunk = await pending
+        await body.aclose()
+        return chunk
+
+    chunk = asyncio.run(first_message())
+    lines = chunk.strip().split("\n")
+    assert lines[0] == "id: " + feed.epoch + "-1" and lines[1] == "event: changes"
+    assert json.loads(lines[2][len("data: "):])["events"][0]["po_number"] == "PO-9"
+    assert not feed.subscribers
+
+
+if __name__ == "__main__":
+    test_writes_coalesce_into_one_message()
+    test_resume_and_reload()
+    test_stream_formats_sse()
+    print("✅ Change feed tests PASSED")
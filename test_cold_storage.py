@@ -0,0 +1,136 @@
+"""
+Test Script for Cold Storage Tiering
+Archiving moves a PO bundle to disk; reads by id still find every document.
+"""
+
+import os
+import tempfile
+
+from app.database import InMemoryStore
+from app.cold_storage import ColdBundleUnavailable, ColdStorage
+from app.shared_state import MemoryLogBackend, SharedState, ReplicatedStore
+
+
+def _store_with_bundle(directory):
+    store = InMemoryStore()
+    store.cold_storage = ColdStorage(directory, cache_size=2)
+    po_id = store.save_po({"po_number": "PO-7001", "vendor_name": "Henry Schein", "total_amount": 120.0})
+    store.save_po_lines(po_id, [{"line_number": 1, "item_number": "HS-1", "qty_ordered": 4}])
+    slip_id = store.save_slip({"po_id": po_id, "po_number_ocr": "PO-7001"})
+    store.save_slip_lines(slip_id, [{"item_number": "HS-1", "qty_shipped": 4}])
+    inv_id = store.save_invoice({"po_id": po_id, "po_number_ocr": "PO-7001", "invoice_number": "INV-1"})
+    match_id = store.save_match({"po_id": po_id, "invoice_id": inv_id, "match_type": "3way",
+                                 "overall_status": "review", "total_discrepancies": 1})
+    store.save_match_lines(match_id, [{"line_number": 1, "line_status": "discrepancy"}])
+    other = store.save_po({"po_number": "PO-7002", "vendor_name": "McKesson"})
+    return store, po_id, slip_id, inv_id, match_id, other
+
+
+def test_archive_moves_bundle_out_of_hot_dicts():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, po_id, slip_id, inv_id, match_id, other = _store_with_bundle(tmp)
+        assert len(store.list_discrepancies()) == 1
+        assert store.batch_archive([po_id]) == 1
+
+        assert po_id not in store.purchase_orders
+        assert not store.packing_slips and not store.invoices and not store.match_results
+        assert store.list_discrepancies() == []
+        assert [p["id"] for p in store.list_pos(status="archived")] == [po_id]
+        assert store.list_pos(status="archived")[0]["slip_count"] == 1
+        assert len(store.list_pos()) == 2
+
+        # Reads by id rehydrate from disk
+        po = store.get_po(po_id)
+        assert po["status"] == "archived" and po["line_items"][0]["item_number"] == "HS-1"
+        assert store.get_slip(slip_id)["line_items"][0]["qty_shipped"] == 4
+        assert store.get_invoice(inv_id)["invoice_number"] == "INV-1"
+        assert store.get_match(match_id)["line_details"][0]["line_status"] == "discrepancy"
+        assert [s["id"] for s in store.get_slips_for_po(po_id)] == [slip_id]
+        assert [m["id"] for m in store.get_matches_for_po(po_id)] == [match_id]
+        assert [e["event_type"] for e in store.get_timeline_for_po(po_id)] == \
+            ["po_uploaded", "slip_uploaded", "invoice_uploaded", "match_3way"]
+        assert store.get_timeline_for_po(other)[0]["event_type"] == "po_uploaded"
+
+
+def test_unarchive_and_snapshot_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        store, po_id, slip_id, inv_id, match_id, _ = _store_with_bundle(tmp)
+        store.update_status("po", po_id, "archived")
+
+        replica = InMemoryStore()
+        replica.cold_storage = ColdStorage(tmp)
+        replica.load_state(store.dump_state())
+        assert replica.get_invoice(inv_id)["invoice_number"] == "INV-1"
+
+        store.update_status("po", po_id, "verified")
+        assert store.purchase_orders[po_id]["status"] == "verified"
+        assert store.cold_index == {} and slip_id in store.packing_slips
+        assert len(store.list_discrepancies()) == 1
+        assert len(store.get_timeline_for_po(po_id)) == 4
+        # The snapshot taken while archived still reads the bundle
+        assert replica.get_invoice(inv_id)["invoice_number"] == "INV-1"
+
+
+def test_unarchive_replicates_to_a_worker_that_syncs_later():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = MemoryLogBackend()
+        store_a, store_b = InMemoryStore(), InMemoryStore()
+        store_a.cold_storage, store_b.cold_storage = ColdStorage(tmp), ColdStorage(tmp)
+        a, b = SharedState(backend, store_a), SharedState(backend, store_b)
+        db_a, db_b = ReplicatedStore(a, store_a), ReplicatedStore(b, store_b)
+        po_id = db_a.save_po({"po_number": "PO-7003", "vendor_name": "Henry Schein"})
+        db_a.save_po_lines(po_id, [{"line_number": 1, "item_number": "HS-1", "qty_ordered": 4}])
+        db_a.update_status("po", po_id, "archived")
+        b.sync()
+        assert po_id in store_b.cold_index
+        db_a.update_status("po", po_id, "verified")
+        # Worker B applies the un-archive after worker A already did
+        b.sync()
+        assert store_b.purchase_orders[po_id]["status"] == "verified"
+        assert db_b.get_po(po_id)["line_items"][0]["item_number"] == "HS-1"
+
+
+def test_unreadable_bundle_leaves_the_po_archived():
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = MemoryLogBackend()
+        store, po_id, slip_id, _, _, _ = _store_with_bundle(tmp)
+        shared = SharedState(backend, store)
+        db = ReplicatedStore(shared, store)
+        db.update_status("po", po_id, "archived")
+        os.remove(store.cold_storage.path(po_id))
+        store.cold_storage.forget(po_id)
+        logged = len(backend.entries)
+
+        try:
+            db.update_status("po", po_id, "verified")
+            assert False, "expected ColdBundleUnavailable"
+        except ColdBundleUnavailable:
+            pass
+        # Still listed as archived, its documents still owned by it, and nothing logged
+        assert [p["id"] for p in store.list_pos(status="archived")] == [po_id]
+        assert store._cold_owner[slip_id] == po_id and po_id not in store.purchase_orders
+        assert len(backend.entries) == logged
+
+
+def test_cold_storage_defaults_under_persist_dir():
+    saved = {k: os.environ.pop(k, None) for k in ("PERSIST_DIR", "COLD_STORAGE_DIR")}
+    try:
+        assert ColdStorage.from_env() is None
+        os.environ["PERSIST_DIR"] = "/var/data"
+        assert ColdStorage.from_env().directory == os.path.join("/var/data", "cold_storage")
+        os.environ["COLD_STORAGE_DIR"] = ""
+        assert ColdStorage.from_env() is None
+    finally:
+        for k, v in saved.items():
+            os.environ.pop(k, None)
+            if v is not None:
+                os.environ[k] = v
+
+
+if __name__ == "__main__":
+    test_archive_moves_bundle_out_of_hot_dicts()
+    test_unarchive_and_snapshot_round_trip()
+    test_unarchive_replicates_to_a_worker_that_syncs_later()
+    test_unreadable_bundle_leaves_the_po_archived()
+    test_cold_storage_defaults_under_persist_dir()
+    print("✅ Cold storage tests PASSED")
@@ -0,0 +1,126 @@
+"""
+Test Script for Duplicate Invoice / Packing Slip Detection
+"""
+
+from app import main
+from app.database import InMemoryStore
+from app.discrepancy_engine import run_3way_match
+from app.duplicate_index import DuplicateIndex, content_hash
+
+
+INVOICE = {"invoice_number": "INV-2026-0150", "vendor": "Medline Industries, Inc.", "po_number": "PO-DUP-1",
+           "invoice_date": "2026-03-09", "total": 98.0,
+           "items": [{"description": "Nitrile Exam Gloves", "quantity": 10, "unit_price": 9.8}]}
+
+
+def test_keys_survive_rescans_and_flag_near_duplicates():
+    index = DuplicateIndex()
+    index.add("invoice", INVOICE, "inv-1")
+    # Same paper scanned again: OCR misreads in the number, vendor in capitals
+    rescan = dict(INVOICE, invoice_number="lNV 2026-O150", vendor="MEDLINE INDUSTRIES INC", total="98.00")
+    assert index.check("invoice", rescan) == {"duplicate_of": "inv-1", "near_duplicates": []}
+    # Corrected total under the same number, and a re-numbered copy
+    assert index.check("invoice", dict(INVOICE, total=99.5))["near_duplicates"] == ["inv-1"]
+    assert index.check("invoice", dict(INVOICE, invoice_number="INV-2026-0151"))["near_duplicates"] == ["inv-1"]
+    assert index.check("invoice", dict(INVOICE, vendor="Henry Schein")) == {"duplicate_of": None, "near_duplicates": []}
+
+    slip = {"po_number": "PO-DUP-1", "tracking_number": "1Z999AA1", "items": [{"description": "Gloves", "quantity": 10}]}
+    index.add("packing_slip", slip, "slip-1")
+    assert index.check("packing_slip", dict(slip, po_number="P0 DUP-1"))["duplicate_of"] == "slip-1"
+    assert index.check("packing_slip", dict(slip, tracking_number=None))["near_duplicates"] == ["slip-1"]
+    assert index.check("packing_slip", dict(slip, tracking_number="1Z999AA2", items=[])) == {"duplicate_of": None, "near_duplicates": []}
+
+
+def test_v1_ingest_rejects_the_second_copy_and_skips_known_uploads():
+    main.purchase_orders.clear()
+    main.packing_slips.clear()
+    main.invoices.clear()
+    main.match_results.clear()
+    main._rebuild_duplicate_index()
+    main.purchase_orders["PO-DUP-1"] = {"po_number": "PO-DUP-1", "vendor": "Medline", "items": [
+        {"description": "Nitrile Exam Gloves", "quantity": 10, "unit_price": 9.8}]}
+
+    pdf = b"%PDF-invoice-0150"
+    digest = content_hash(pdf)
+    assert main._known_upload("invoice", pdf, "application/pdf") == (None, {"content_sha256": digest})
+    first = main._apply_invoice(dict(INVOICE, content_sha256=digest))["match"]
+    assert first["status"] == "REVIEW" and "duplicate_of" not in first  # no packing slip yet
+
+    second = main._apply_invoice(dict(INVOICE, invoice_number="INV 2026 0150"))["match"]
+    assert second["status"] == "REJECT" and second["duplicate_of"] == 0
+    assert second["discrepancies"][-1]["type"] == "Duplicate Invoice"
+
+    # The same file again: the earlier result, without a vision call or a third invoice
+    known, _ = main._known_upload("invoice", pdf, "application/pdf")
+    assert known["duplicate"] and known["match"] is first
+    assert main._known_upload("packing_slip", pdf, "application/pdf")[0] is None
+    assert len(main.invoices) == 2
+
+    # Rebuilt with the rest of the v1 state on restore
+    main._load_v1_state(main._dump_v1_state())
+    assert main._known_upload("invoice", pdf, "application/pdf")[0]["data"]["invoice_number"] == "INV-2026-0150"
+    main.purchase_orders.clear()
+    main.invoices.clear()
+    main.match_results.clear()
+    main._rebuild_duplicate_index()
+
+
+def test_store_flags_duplicates_on_save():
+    store = InMemoryStore()
+    store.cold_storage = None
+    first = store.save_invoice({"invoice_number": "INV-9", "vendor_name": "Sanofi Pasteur Inc.",
+                                "invoice_date": "2026-04-01", "total_amount": 742.9})
+    again = store.save_invoice({"invoice_number": "INV-9", "vendor_name": "Sanofi Pasteur",
+                                "invoice_date": "2026-04-01", "total_amount": 742.9})
+    assert store.get_invoice(again)["duplicate_of"] == first
+    # Saving an existing record again is an update, not a duplicate
+    store.save_invoice(store.invoices[first])
+    assert "duplicate_of" not in store.invoices[first]
+
+    restored = InMemoryStore()
+    restored.load_state(store.dump_state())
+    third = restored.save_invoice({"invoice_number": "INV-9", "vendor_name": "Sanofi Pasteur",
+                                   "invoice_date": "2026-04-02", "total_amount": 742.9})
+    assert restored.invoices[third]["near_duplicates"] == [first, again]
+
+
+def test_store_holds_matches_with_duplicates_and_forgets_archived_ones():
+    store = InMemoryStore()
+    store.cold_storage = None
+    po_id = store.save_po({"po_number": "PO-DUP-2", "vendor_name": "Medline", "total_amount": 98.0})
+    store.save_po_lines(po_id, [{"line_number": 1, "description": "Nitrile Exam Gloves",
+                                 "quantity": 10, "unit_price": 9.8, "line_total": 98.0}])
+    invoice = {"po_id": po_id, "invoice_number": "INV-77", "vendor_name": "Medline",
+               "invoice_date": "2026-04-01", "total_amount": 98.0}
+    lines = [{"description": "Nitrile Exam Gloves", "quantity": 10, "unit_price": 9.8, "extension": 98.0}]
+    first = store.save_invoice(dict(invoice))
+    store.save_invoice_lines(first, lines)
+    store.rematch_pending([po_id])
+    assert store.get_matches_for_po(po_id)[0]["overall_status"] == "approve"
+
+    again = store.save_invoice(dict(invoice))
+    store.save_invoice_lines(again, lines)
+    store.rematch_pending([po_id])
+    match = store.get_matches_for_po(po_id)[0]
+    assert match["overall_status"] == "reject" and match["duplicates"][0]["duplicate_of"] == first
+    assert store.get_timeline_for_po(po_id)[-1]["rematch"]["overall_status"] == ["approve", "reject"]
+
+    # The full match holds it too
+    full = run_3way_match(store.get_po(po_id), None, store.get_invoice(again), memory={})
+    assert full["overall_status"] == "reject" and full["summary"].startswith("Same vendor, invoice number")
+
+    # Archived: a later copy no longer points at it; un-archived: it does again
+    store.update_status("po", po_id, "archived")
+    restored = InMemoryStore()
+    restored.load_state(store.dump_state())
+    assert "duplicate_of" not in restored.invoices[restored.save_invoice(dict(invoice, po_id=None))]
+    store.update_status("po", po_id, "verified")
+    assert store.invoices[store.save_invoice(dict(invoice, po_id=None))]["duplicate_of"] == first
+
+
+if __name__ == "__main__":
+    test_keys_survive_rescans_and_flag_near_duplicates()
+    test_v1_ingest_rejects_the_second_copy_and_skips_known_uploads()
+    test_store_flags_duplicates_on_save()
+    test_store_holds_matches_with_duplicates_and_forgets_archived_ones()
+    print("✅ Duplicate detection tests PASSED")
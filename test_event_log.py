@@ -0,0 +1,94 @@
+"""
+Test Script for the Segmented Event Log
+Checks ordering, index-backed queries and offloading against a brute-force list.
+"""
+
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from app.event_log import EventLog
+
+BASE = datetime(2026, 3, 1, tzinfo=timezone.utc)
+TYPES = ("po_uploaded", "slip_uploaded", "invoice_uploaded", "match_3way")
+
+
+def _events(n, seed=7):
+    rng = random.Random(seed)
+    events = []
+    for i in range(n):
+        created = BASE + timedelta(minutes=rng.randrange(60 * 24 * 40))
+        events.append({
+            "id": "e" + str(i), "po_id": "po" + str(rng.randrange(20)), "po_number": "PO-" + str(i),
+            "event_type": rng.choice(TYPES), "event_source": "user", "actor": "system",
+            "entity_type": "po", "entity_id": "x" + str(i), "created_at": created.isoformat(),
+        })
+    return events
+
+
+def _ids(events):
+    return [e["id"] for e in events]
+
+
+def _brute(events, since=None, until=None, po_id=None, event_type=None):
+    rows = sorted(events, key=lambda e: e["created_at"])
+    return [e for e in rows if (since is None or e["created_at"] >= since) and (until is None or e["created_at"] < until)
+            and (po_id is None or e["po_id"] == po_id) and (event_type is None or e["event_type"] == event_type)]
+
+
+def _check_queries(log, events):
+    assert len(log) == len(events)
+    assert _ids(log.timeline("po3")) == _ids(_brute(events, po_id="po3"))
+    assert _ids(log.recent(10)) == _ids(_brute(events)[::-1][:10])
+    assert _ids(log.recent(5, event_type="match_3way")) == _ids(_brute(events, event_type="match_3way")[::-1][:5])
+    since = (BASE + timedelta(days=3, hours=5)).isoformat()
+    until = (BASE + timedelta(days=9, hours=1)).isoformat()
+    assert _ids(log.between(since, until)) == _ids(_brute(events, since, until))
+    assert _ids(log.between(since, until, po_id="po4", event_type="slip_uploaded")) == \
+        _ids(_brute(events, since, until, po_id="po4", event_type="slip_uploaded"))
+
+
+def test_out_of_order_appends_stay_sorted():
+    events = _events(2000)
+    log = EventLog(segment_hours=24)
+    for e in events:
+        log.append(e)
+    _check_queries(log, events)
+    assert log.stats()["segments"] == 40
+
+
+def test_old_segments_offload_and_still_answer():
+    events = sorted(_events(2000), key=lambda e: e["created_at"])
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(segment_hours=24, hot_segments=7, archive_dir=tmp)
+        for e in events:
+            log.append(e)
+        stats = log.stats()
+        assert stats["hot_segments"] == 7 and stats["cold_segments"] == 33
+        _check_queries(log, events)
+
+        # A late event in an offloaded window brings that segment back
+        late = dict(events[0], id="late", created_at=(BASE + timedelta(hours=1)).isoformat())
+        log.append(late)
+        assert log.stats()["cold_segments"] == 32
+        _check_queries(log, events + [late])
+
+
+def test_dump_and_load_round_trip():
+    events = _events(500)
+    log = EventLog()
+    for e in events:
+        log.append(e)
+    restored = EventLog()
+    restored.load(log.dump())
+    _check_queries(restored, events)
+    legacy = EventLog()
+    legacy.load(events)
+    assert legacy.dump() == log.dump()
+
+
+if __name__ == "__main__":
+    test_out_of_order_appends_stay_sorted()
+    test_old_segments_offload_and_still_answer()
+    test_dump_and_load_round_trip()
+    print("✅ Event log tests PASSED")
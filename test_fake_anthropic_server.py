@@ -0,0 +1,61 @@
+"""
+Test Script for the Fake Vision Server
+Checks /v1/messages (plain and streaming) and error injection through the real SDK.
+"""
+
+import random
+
+import anthropic
+
+from fake_anthropic_server import FakeAnthropicServer, SyntheticResponder, LatencyModel, parse_error_rates
+from app.vision_client import parse_vision_json
+from app.vision_stream import StreamingJSONScanner
+
+
+INVOICE_PROMPT = [{"role": "user", "content": [{"type": "text", "text": "Extract this vendor invoice"}]}]
+
+
+def test_messages_create_and_stream():
+    with FakeAnthropicServer(responder=SyntheticResponder(30, seed=3)) as server:
+        client = anthropic.Anthropic(api_key="test", base_url=server.base_url)
+        message = client.messages.create(model="m", max_tokens=100, messages=INVOICE_PROMPT)
+        invoice = parse_vision_json(message.content[0].text)
+        assert invoice["invoice_number"].startswith("INV-")
+        assert invoice["items"]
+
+        scanner = StreamingJSONScanner()
+        events = []
+        with client.messages.stream(model="m", max_tokens=100, messages=INVOICE_PROMPT) as stream:
+            for text in stream.text_stream:
+                events += scanner.feed(text)
+        assert ("field", "invoice_number", parse_vision_json(stream.get_final_message().content[0].text)["invoice_number"]) in events
+        assert any(kind == "item" for kind, _, _ in events)
+        assert server.stats["streamed"] == 1
+
+
+def test_error_injection():
+    with FakeAnthropicServer(error_rates={529: 1.0}) as server:
+        client = anthropic.Anthropic(api_key="test", base_url=server.base_url, max_retries=0)
+        try:
+            client.messages.create(model="m", max_tokens=10, messages=INVOICE_PROMPT)
+        except anthropic.APIStatusError as e:
+            assert e.status_code == 529
+        else:
+            raise AssertionError("Expected an injected 529")
+        assert server.stats["errors"] == {"529": 1}
+
+
+def test_latency_and_error_specs():
+    rng = random.Random(1)
+    assert LatencyModel("fixed:1.5").sample(rng) == 1.5
+    assert 0.5 <= LatencyModel("uniform:0.5:3").sample(rng) <= 3
+    samples = sorted(LatencyModel("lognormal:2.0:0.4").sample(rng) for _ in range(2001))
+    assert 1.7 < samples[1000] < 2.3
+    assert parse_error_rates("529=0.02, 429=0.01") == {529: 0.02, 429: 0.01}
+
+
+if __name__ == "__main__":
+    test_messages_create_and_stream()
+    test_error_injection()
+    test_latency_and_error_specs()
+    print("✅ Fake vision server tests PASSED")
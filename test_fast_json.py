@@ -0,0 +1,61 @@
+"""
+Test Script for Fast JSON Responses and ?fields= Projection
+"""
+
+import json
+from decimal import Decimal
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database
+from app.api_routes import router
+from app.fast_json import dumps, parse_fields, project
+
+
+def test_parse_and_project():
+    tree = parse_fields("id, po.number,po.vendor,lines.qty,,")
+    assert tree == {"id": {}, "po": {"number": {}, "vendor": {}}, "lines": {"qty": {}}}
+    # A bare field wins over a narrower path to it
+    assert parse_fields("po,po.number") == {"po": {}}
+    assert parse_fields("po.number,po") == {"po": {}}
+    assert parse_fields("") is None
+
+    record = {"id": 1, "extra": True, "po": {"number": "PO-1", "vendor": "Owens", "total": 3},
+              "lines": [{"qty": 2, "sku": "A"}, {"qty": 5, "sku": "B"}]}
+    assert project(record, tree) == {"id": 1, "po": {"number": "PO-1", "vendor": "Owens"}, "lines": [{"qty": 2}, {"qty": 5}]}
+    assert project(record, None) is record
+    assert json.loads(dumps({"total": Decimal("1.50"), 1: "x"})) == {"total": "1.50", "1": "x"}
+
+
+def test_endpoints_honour_fields():
+    store = database.InMemoryStore()
+    store.cold_storage = None
+    database._db = store
+    po_id = store.save_po({"po_number": "PO-9", "vendor_name": "Medline", "total_amount": 50.0})
+    inv_id = store.save_invoice({"po_id": po_id, "invoice_number": "INV-9"})
+    match_id = store.save_match({"po_id": po_id, "invoice_id": inv_id, "overall_status": "review", "total_discrepancies": 1})
+    store.save_match_lines(match_id, [{"line_number": 1, "line_status": "discrepancy", "discrepancy_type": "price_mismatch"}])
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    full = client.get("/api/v2/discrepancies").json()["discrepancies"][0]
+    assert full["match_id"] == match_id and full["discrepancy_lines"][0]["po_unit_price"] is None
+    slim = client.get("/api/v2/discrepancies?fields=match_id,discrepancy_lines.discrepancy_type").json()
+    assert slim == {"count": 1, "discrepancies": [{"match_id": match_id, "discrepancy_lines": [{"discrepancy_type": "price_mismatch"}]}]}
+
+    pos = client.get("/api/v2/purchase-orders?fields=id,match_status").json()["purchase_orders"]
+    assert pos == [{"id": po_id, "match_status": "review"}]
+
+    detail = client.get("/api/v2/purchase-orders/" + po_id + "?fields=purchase_order.po_number,invoices.invoice_number")
+    assert detail.headers["content-type"] == "application/json"
+    assert detail.json() == {"purchase_order": {"po_number": "PO-9"}, "invoices": [{"invoice_number": "INV-9"}]}
+    assert client.get("/api/v2/purchase-orders/missing").status_code == 404
+
+
+if __name__ == "__main__":
+    test_parse_and_project()
+    test_endpoints_honour_fields()
+    print("✅ Fast JSON tests PASSED")
@@ -0,0 +1,81 @@
+"""
+Test Script for Store-Version ETags and the /api/v2 Response Cache
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import database
+from app.api_routes import router
+from app.http_cache import ConditionalGetMiddleware
+from app.vendor_registry import get_vendor_registry
+
+
+def _client():
+    store = database.InMemoryStore()
+    store.cold_storage = None
+    database._db = store
+    app = FastAPI()
+    app.include_router(router)
+    app.add_middleware(ConditionalGetMiddleware, get_db=database.get_db, size=16)
+    return store, TestClient(app)
+
+
+def test_unchanged_list_is_304_then_cached():
+    store, client = _client()
+    store.save_po({"po_number": "PO-1", "vendor_name": "Medline"})
+    calls = []
+    original = store.list_pos
+    store.list_pos = lambda *a, **kw: calls.append(1) or original(*a, **kw)
+
+    first = client.get("/api/v2/purchase-orders")
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.headers["cache-control"] == "no-cache"
+
+    revalidated = client.get("/api/v2/purchase-orders", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304 and revalidated.content == b""
+    assert client.get("/api/v2/purchase-orders").json() == first.json()
+    assert len(calls) == 1
+
+    store.save_po({"po_number": "PO-2"})
+    changed = client.get("/api/v2/purchase-orders", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["count"] == 2 and len(calls) == 2
+
+
+def test_detail_etag_follows_its_own_po():
+    store, client = _client()
+    po_a = store.save_po({"po_number": "PO-A"})
+    slip = store.save_slip({"po_number_ocr": "PO-A"})
+    store.save_match({"po_id": po_a, "slip_id": slip, "overall_status": "approve"})
+    etag = client.get("/api/v2/purchase-orders/" + po_a).headers["etag"]
+
+    store.save_po({"po_number": "PO-B"})
+    assert client.get("/api/v2/purchase-orders/" + po_a, headers={"If-None-Match": etag}).status_code == 304
+
+    # The slip carries no po_id of its own; the match links it to PO-A
+    store.update_status("slip", slip, "verified")
+    assert client.get("/api/v2/purchase-orders/" + po_a, headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/v2/purchase-orders/missing").status_code == 404
+
+
+def test_vendor_filter_follows_the_registry():
+    store, client = _client()
+    store.save_po({"po_number": "PO-GSK", "vendor_name": "GlaxoSmithKline LLC"})
+    first = client.get("/api/v2/purchase-orders", params={"vendor": "GSK Vaccines"})
+    assert first.json()["count"] == 0
+
+    # Learned from another worker's snapshot: no store write, but "GSK
+    # Vaccines" now resolves to the PO's vendor
+    vendor_id = get_vendor_registry().resolve("GlaxoSmithKline LLC")
+    get_vendor_registry().learn("GSK Vaccines", vendor_id)
+    again = client.get("/api/v2/purchase-orders", params={"vendor": "GSK Vaccines"},
+                       headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 200 and again.json()["count"] == 1
+
+
+if __name__ == "__main__":
+    test_unchanged_list_is_304_then_cached()
+    test_detail_etag_follows_its_own_po()
+    test_vendor_filter_follows_the_registry()
+    print("✅ HTTP cache tests PASSED")
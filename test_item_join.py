@@ -0,0 +1,67 @@
+"""
+Test Script for the Item Number Join
+Lines carrying the same SKU / NDC pair up before description matching.
+"""
+
+from app.discrepancy_engine import run_3way_match
+from app.item_join import join_by_item, normalize_item_number
+from app.invoice_matcher import match_invoice
+from app.po_matcher import match_packing_slip
+
+
+def test_ndc_layouts_share_one_key():
+    assert normalize_item_number("0006-4681-00") == normalize_item_number("00006-4681-00") == "00006468100"
+    assert normalize_item_number("NDC 49281-752-21") == "49281075221"
+    assert normalize_item_number("58160-0842-5") == "58160084205"
+    assert normalize_item_number("glv-nit-m") == "GLVNITM"
+    assert normalize_item_number(None) == ""
+
+    po_lines = [{"item_number": "A-1"}, {"item_number": ""}, {"item_number": "A-1"}]
+    slip_lines = [{"item_number": "a1"}, {"item_number": "B-2"}, {"item_number": "A1"}]
+    assert join_by_item(po_lines, slip_lines) == {0: 0, 2: 2}
+
+
+def test_run_3way_match_joins_on_item_number_first():
+    po = {"total_amount": 1685.0, "line_items": [
+        {"item_number": "00006-4681-00", "description": "M-M-R II Vaccine 10x1 Dose SDV", "quantity": 2, "unit_price": 842.5, "line_total": 1685.0},
+        {"item_number": "", "description": "Alcohol Prep Pads Medium 200ct", "quantity": 1, "unit_price": 0, "line_total": 0},
+    ]}
+    slip = {"line_items": [
+        {"item_number": "0006-4681-00", "description": "MEASLES MUMPS RUBELLA LIVE 10 PK", "quantity_shipped": 2},
+        {"item_number": "", "description": "Alcohol Prep Pads Medium 200ct", "quantity_shipped": 1},
+    ]}
+    result = run_3way_match(po, slip, None, memory={})
+    assert result["overall_status"] == "approve"
+    assert result["line_details"][0]["slip_description"] == "MEASLES MUMPS RUBELLA LIVE 10 PK"
+    assert result["details_json"]["lines_joined_by_item"] == 1
+
+    # Without the number the wording alone doesn't pair the MMR line
+    slip["line_items"][0]["item_number"] = ""
+    assert run_3way_match(po, slip, None, memory={})["overall_status"] != "approve"
+
+
+def test_v1_matchers_join_on_item_number_first():
+    purchase_orders = {"PO-1": {"po_number": "PO-1", "vendor": "Merck", "items": [
+        {"item_number": "00006-4827-00", "description": "Varivax Varicella Vaccine 10x1 Dose", "quantity": 3, "unit_price": 1649.8},
+        {"item_number": "00006-4681-00", "description": "M-M-R II Vaccine", "quantity": 2, "unit_price": 842.5},
+    ]}}
+    slip = {"po_number": "PO-1", "vendor": "Merck", "items": [
+        {"item_number": "0006-4827-00", "description": "VARIVAX Live 10 Vials", "quantity": 3},
+        # Worded differently from the PO and one short
+        {"item_number": "0006-4681-00", "description": "M-M-R II Vaccine 10 pk", "quantity": 1},
+    ]}
+    result = match_packing_slip(slip, purchase_orders)
+    assert [d["type"] for d in result["discrepancies"]] == ["Quantity Mismatch"]
+    slip["match_result"] = result
+
+    invoice = {"po_number": "PO-1", "items": [
+        {"item_number": "00006-4827-00", "description": "Varicella Virus Vaccine", "quantity": 3, "unit_price": 1649.8},
+    ]}
+    assert match_invoice(invoice, purchase_orders, [slip])["status"] == "APPROVE"
+
+
+if __name__ == "__main__":
+    test_ndc_layouts_share_one_key()
+    test_run_3way_match_joins_on_item_number_first()
+    test_v1_matchers_join_on_item_number_first()
+    print("✅ Item join tests PASSED")
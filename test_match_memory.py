@@ -0,0 +1,80 @@
+"""
+Test Script for the Learned Match Memory
+"""
+
+from app.database import InMemoryStore
+from app.discrepancy_engine import find_best_match, run_3way_match
+from app.match_memory import MatchMemory, get_match_memory
+
+
+PO = {"vendor_name": "Merck Sharp & Dohme LLC", "total_amount": 1685.0, "line_items": [
+    {"description": "M-M-R II Vaccine 10x1 Dose SDV", "quantity": 2, "unit_price": 842.5, "line_total": 1685.0},
+]}
+SLIP = {"line_items": [{"description": "MEASLES MUMPS RUBELLA LIVE 10 PK", "quantity_shipped": 2}]}
+
+
+def test_remembered_pairing_skips_fuzzy_scoring():
+    # The slip wording shares nothing the fuzzy scorer can use
+    assert run_3way_match(PO, SLIP, None, memory={})["overall_status"] != "approve"
+
+    memory = MatchMemory()
+    learned = memory.learn_from_lines("Merck Sharp & Dohme", [{
+        "po_description": "M-M-R II Vaccine 10x1 Dose SDV",
+        "slip_description": "Measles Mumps Rubella Live 10 PK",
+        "line_status": "discrepancy",
+    }], matched_only=False)
+    assert learned == 1
+    # Same vendor under another name resolves to the same table
+    table = memory.for_vendor("Merck Sharp & Dohme LLC")
+    assert table == {"measles mumps rubella live 10 pk": "m m r ii vaccine 10x1 dose sdv"}
+    assert run_3way_match(PO, SLIP, None, memory=table)["overall_status"] == "approve"
+    assert memory.for_vendor("Sanofi Pasteur") == {}
+
+    restored = MatchMemory()
+    restored.load(memory.dump())
+    assert restored.for_vendor("Merck Sharp & Dohme LLC") == table
+
+
+def test_find_best_match_prefers_memory_then_identical_text():
+    target = {"description": "Varivax Varicella Vaccine 10x1 Dose"}
+    candidates = [{"description": "ProQuad MMRV 10 SDV"}, {"description": "VZV LIVE 10 VIALS"}]
+    assert find_best_match(target, candidates, memory={"vzv live 10 vials": "varivax varicella vaccine 10x1 dose"})[0] is candidates[1]
+    identical = candidates + [{"description": "VARIVAX  Varicella Vaccine 10x1 Dose"}]
+    assert find_best_match(target, identical) == (identical[2], 1.0)
+
+
+def test_store_learns_from_approved_and_verified_matches():
+    store = InMemoryStore()
+    store.cold_storage = None
+    memory = get_match_memory()
+    po_id = store.save_po({"po_number": "PO-MEM-1", "vendor_name": "Sanofi Pasteur Inc."})
+    approved = store.save_match({"po_id": po_id, "overall_status": "approve"})
+    store.save_match_lines(approved, [{"po_description": "Fluzone High-Dose Quadrivalent 10x0.7mL PFS",
+                                       "inv_description": "FLUZONE HD QUAD 10 SYRINGES", "line_status": "match"}])
+    assert memory.for_vendor("Sanofi Pasteur")["fluzone hd quad 10 syringes"].startswith("fluzone high dose")
+
+    review = store.save_match({"po_id": po_id, "overall_status": "review"})
+    store.save_match_lines(review, [
+        {"po_description": "Tubersol PPD 5TU/0.1mL 1mL", "slip_description": "TUBERSOL 1 ML 10 TESTS",
+         "line_status": "discrepancy", "discrepancy_type": "price_mismatch"},
+        {"po_description": "Adacel Tdap 10x0.5mL SDV", "slip_description": "IPOL POLIO 10 DOSE VIAL",
+         "line_status": "discrepancy", "discrepancy_type": "qty_mismatch"},
+        {"po_description": "Menquadfi 5x0.5mL SDV", "inv_description": "MENACTRA 5 VIALS",
+         "line_status": "discrepancy", "discrepancy_type": "missing_on_slip"},
+    ])
+    store.save_match({"po_id": "other-po", "overall_status": "review"})
+    assert "tubersol 1 ml 10 tests" not in memory.for_vendor("Sanofi Pasteur")
+    # AP verifying the PO confirms the pairings of its matches, but not lines
+    # the engine couldn't pair or whose quantities disagree
+    store.update_status("po", po_id, "verified")
+    learned = memory.for_vendor("Sanofi Pasteur")
+    assert learned["tubersol 1 ml 10 tests"] == "tubersol ppd 5tu 0.1ml 1ml"
+    assert "ipol polio 10 dose vial" not in learned and "menactra 5 vials" not in learned
+    assert {m["id"] for m in store.get_matches_for_po(po_id)} == {approved, review}
+
+
+if __name__ == "__main__":
+    test_remembered_pairing_skips_fuzzy_scoring()
+    test_find_best_match_prefers_memory_then_identical_text()
+    test_store_learns_from_approved_and_verified_matches()
+    print("✅ Match memory tests PASSED")
@@ -0,0 +1,120 @@
+"""
+Test Script for the Match Worker Pool
+Large slips and invoices are compared in worker processes, with the same result as inline.
+"""
+
+import asyncio
+import threading
+
+from app import main
+from app.invoice_matcher import match_invoice
+from app.match_pool import MatchPool, MatchPoolUnavailable
+from app.po_matcher import match_packing_slip
+
+
+def _po(lines):
+    return {"po_number": "PO-MP-1", "vendor": "Henry Schein", "items": [
+        {"item_number": "ITM-" + str(i), "description": "Supply item " + str(i), "quantity": 10, "unit_price": 2.5 + i}
+        for i in range(lines)]}
+
+
+def _document(lines, qty_key="quantity"):
+    items = [{"item_number": "ITM-" + str(i), "description": "Supply item " + str(i), qty_key: 10, "unit_price": 2.5 + i}
+             for i in range(lines)]
+    items[3][qty_key] = 12
+    items[5]["unit_price"] = 99.0
+    return {"po_number": "PO-MP-1", "vendor": "Henry Schein", "items": items}
+
+
+def test_pool_gives_the_same_result_as_inline():
+    pos = {"PO-MP-1": _po(80)}
+    slip = _document(80)
+    slip["match_result"] = match_packing_slip(slip, pos)
+    invoice = _document(80)
+    pool = MatchPool(workers=1, min_lines=100)
+    try:
+        slip_compared = asyncio.run(pool.prematch("packing_slip", _document(80), pos, []))
+        invoice_compared = asyncio.run(pool.prematch("invoice", invoice, pos, [slip]))
+    finally:
+        pool.shutdown()
+    assert slip_compared["basis"] == "PO-MP-1|80|None" and invoice_compared["basis"] == "PO-MP-1|80|0"
+    assert match_packing_slip(_document(80), pos, slip_compared) == match_packing_slip(_document(80), pos)
+    pooled = match_invoice(invoice, pos, [slip], invoice_compared)
+    assert pooled == match_invoice(invoice, pos, [slip]) and pooled["status"] == "REJECT"
+    assert pool.stats()["submitted"] == 2
+
+    # A small document stays inline
+    assert asyncio.run(pool.prematch("invoice", _document(10), {"PO-MP-1": _po(10)}, [])) is None
+    assert pool.stats()["inline"] == 1 and not pool.stats()["running"]
+
+
+def test_stale_result_is_recomputed():
+    pos = {"PO-MP-1": _po(20)}
+    stale = {"basis": "PO-MP-1|20|None", "discrepancies": [], "severity": "APPROVE"}
+    # A packing slip arrived for the PO after the invoice was compared
+    slip = _document(20)
+    slip["match_result"] = match_packing_slip(slip, pos)
+    result = match_invoice(_document(20), pos, [slip], stale)
+    assert result == match_invoice(_document(20), pos, [slip]) and result["has_discrepancy"]
+
+
+def test_disabled_or_slow_pool_falls_back_inline():
+    pos = {"PO-MP-1": _po(200)}
+    disabled = MatchPool(workers=0, min_lines=1)
+    assert asyncio.run(disabled.prematch("packing_slip", _document(200), pos, [])) is None
+    assert disabled.stats()["inline"] == 1
+
+    slow = MatchPool(workers=1, min_lines=1, timeout_s=0.0)
+    slow.start()
+    workers = list(slow.executor._processes.values())
+    try:
+        try:
+            asyncio.run(slow.prematch("packing_slip", _document(200), pos, []))
+            assert False, "expected MatchPoolUnavailable"
+        except MatchPoolUnavailable:
+            pass
+        # The busy workers are killed, not left running beside the next pool
+        assert not slow.stats()["running"]
+        for process in workers:
+            process.join(5)
+            assert not process.is_alive()
+    finally:
+        slow.shutdown()
+    assert slow.stats()["timeouts"] == 1
+
+    # The upload path: a document the pool gave up on is matched off the event loop
+    class GaveUp:
+        async def prematch(self, *args):
+            raise MatchPoolUnavailable("timed out")
+
+    threads = []
+    original = main.get_match_pool
+    main.get_match_pool = lambda: GaveUp()
+    try:
+        loop_thread = threading.get_ident()
+        result = asyncio.run(main._match_and_store("packing_slip", {}, lambda data: threads.append(threading.get_ident()) or "stored"))
+    finally:
+        main.get_match_pool = original
+    assert result == "stored" and threads and threads[0] != loop_thread
+
+    # The upload path: nothing attached, the store op matches inline
+    data = _document(200, "quantity_shipped")
+    original = main.get_match_pool
+    main.get_match_pool = lambda: disabled
+    main.purchase_orders["PO-MP-1"] = pos["PO-MP-1"]
+    try:
+        asyncio.run(main._prematch("packing_slip", data))
+        assert "line_match" not in data
+        assert main._apply_packing_slip(data)["match"]["has_discrepancy"]
+    finally:
+        main.get_match_pool = original
+        del main.purchase_orders["PO-MP-1"]
+        main.packing_slips.clear()
+        main._rebuild_duplicate_index()
+
+
+if __name__ == "__main__":
+    test_pool_gives_the_same_result_as_inline()
+    test_stale_result_is_recomputed()
+    test_disabled_or_slow_pool_falls_back_inline()
+    print("✅ Match pool tests PASSED")
@@ -0,0 +1,43 @@
+"""
+Test Script for Pipeline Metrics
+Checks stage percentiles and the Prometheus text exposition.
+"""
+
+from app.metrics import MetricsRegistry, LATENCY_BUCKETS
+
+
+def test_stage_percentiles():
+    registry = MetricsRegistry()
+    for ms in range(1, 101):
+        registry.observe("verifyap_stage_seconds", {"pipeline": "invoice", "stage": "vision"}, ms / 1000.0)
+
+    rows = registry.stage_summary()
+    assert len(rows) == 1
+    row = rows[0]
+    assert row["count"] == 100
+    assert row["p50_ms"] in (50.0, 51.0)
+    assert row["p95_ms"] in (95.0, 96.0)
+    assert row["p99_ms"] in (99.0, 100.0)
+
+
+def test_prometheus_exposition():
+    registry = MetricsRegistry()
+    registry.describe("verifyap_stage_seconds", "Stage latency")
+    registry.observe("verifyap_stage_seconds", {"pipeline": "po_csv", "stage": "import"}, 0.003)
+    registry.inc("verifyap_cache_requests_total", {"cache": "prompt_cache", "result": "hit"})
+    registry.register_gauges(lambda: [("verifyap_vision_in_flight", {}, 2)])
+
+    text = registry.render_prometheus()
+    assert "# TYPE verifyap_stage_seconds histogram" in text
+    assert 'verifyap_stage_seconds_bucket{pipeline="po_csv",stage="import",le="+Inf"} 1' in text
+    assert 'verifyap_stage_seconds_bucket{pipeline="po_csv",stage="import",le="0.0025"} 0' in text
+    assert 'verifyap_stage_seconds_bucket{pipeline="po_csv",stage="import",le="0.005"} 1' in text
+    assert 'verifyap_cache_requests_total{cache="prompt_cache",result="hit"} 1' in text
+    assert "verifyap_vision_in_flight 2" in text
+    assert len(LATENCY_BUCKETS) > 0
+
+
+if __name__ == "__main__":
+    test_stage_percentiles()
+    test_prometheus_exposition()
+    print("✅ Metrics tests PASSED")
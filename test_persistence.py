@@ -0,0 +1,110 @@
+"""
+Test Script for Snapshot + WAL Persistence
+A restarted store must come back identical from the log, a snapshot, or both.
+"""
+
+import os
+import tempfile
+
+from app.database import InMemoryStore
+from app.shared_state import SharedState, ReplicatedStore
+from app.persistence import FileLogBackend, SnapshotManager
+
+
+def _open(directory):
+    store = InMemoryStore()
+    shared = SharedState(FileLogBackend(os.path.join(directory, "wal"), fsync="off"), store)
+    shared.snapshots = SnapshotManager(shared, os.path.join(directory, "snapshots"), every=0)
+    return shared, ReplicatedStore(shared, store), store
+
+
+def _write_pos(db, start, count):
+    ids = []
+    for n in range(start, start + count):
+        po_id = db.save_po({"po_number": "PO-" + str(n), "vendor_name": "Cardinal"})
+        db.save_po_lines(po_id, [{"item_number": "A" + str(n), "qty_ordered": n}])
+        ids.append(po_id)
+    return ids
+
+
+def test_restart_replays_wal():
+    with tempfile.TemporaryDirectory() as tmp:
+        shared, db, store = _open(tmp)
+        ids = _write_pos(db, 1, 5)
+        db.update_status("po", ids[0], "verified")
+        before = store.dump_state()
+        shared.backend.close()
+
+        shared, db, restored = _open(tmp)
+        info = shared.restore()
+        assert info["snapshot_cursor"] is None and info["replayed_ops"] == 11
+        assert restored.dump_state() == before
+        assert restored.get_po_by_number("PO-3")["line_items"][0]["qty_ordered"] == 3
+
+
+def test_restart_from_snapshot_plus_tail_drops_old_segments():
+    with tempfile.TemporaryDirectory() as tmp:
+        shared, db, store = _open(tmp)
+        _write_pos(db, 1, 4)
+        snap = shared.snapshots.snapshot()
+        _write_pos(db, 5, 2)
+        before = store.dump_state()
+        shared.backend.close()
+
+        assert snap["cursor"] == 8 and snap["wal_segments_dropped"] == 1
+        assert [first for first, _ in shared.backend.segments()] == [9]
+
+        shared, db, restored = _open(tmp)
+        info = shared.restore()
+        assert info["snapshot_cursor"] == 8 and info["replayed_ops"] == 4
+        assert restored.dump_state() == before
+        # Writes after the restart continue the sequence
+        db.save_po({"po_number": "PO-99"})
+        assert shared.cursor == 13
+
+
+def test_torn_last_entry_is_dropped():
+    with tempfile.TemporaryDirectory() as tmp:
+        shared, db, _ = _open(tmp)
+        _write_pos(db, 1, 2)
+        shared.backend.close()
+        path = shared.backend.segments()[-1][1]
+        with open(path, "a") as f:
+            f.write('5\tdb\t{"uid": "')
+
+        shared, db, restored = _open(tmp)
+        assert shared.restore()["replayed_ops"] == 4
+        assert len(restored.purchase_orders) == 2
+        db.save_po({"po_number": "PO-3"})
+        assert shared.cursor == 5
+
+
+def test_restart_skips_and_quarantines_an_op_that_fails():
+    with tempfile.TemporaryDirectory() as tmp:
+        shared, db, _ = _open(tmp)
+        _write_pos(db, 1, 1)
+        # An op logged by an earlier version that can't be applied
+        shared.backend.append("db", '{"method": "save_slip_lines", "args": ["s1", "not lines", 3]}',
+                              '{"uid": "5d1b5a3e-8a3c-4d55-9e1c-2f2d4a3b6c7d", "now": "2026-01-01T00:00:00+00:00"}')
+        shared.backend.close()
+
+        shared, db, restored = _open(tmp)
+        info = shared.restore()
+        assert info["replayed_ops"] == 3 and [f["cursor"] for f in info["failed_ops"]] == [3]
+        assert len(restored.purchase_orders) == 1
+        with open(os.path.join(tmp, "wal", "quarantine.log")) as f:
+            assert f.read().startswith("3\tdb\t")
+        # Writes carry on after it, and the next restart skips it again
+        db.save_po({"po_number": "PO-2"})
+        assert shared.cursor == 4
+        shared.backend.close()
+        shared, db, restored = _open(tmp)
+        assert len(shared.restore()["failed_ops"]) == 1 and len(restored.purchase_orders) == 2
+
+
+if __name__ == "__main__":
+    test_restart_replays_wal()
+    test_restart_from_snapshot_plus_tail_drops_old_segments()
+    test_torn_last_entry_is_dropped()
+    test_restart_skips_and_quarantines_an_op_that_fails()
+    print("✅ Persistence tests PASSED")
@@ -0,0 +1,126 @@
+"""
+Test Script for Near-Duplicate Photo Detection
+Re-shot photos of an extracted document offer its extraction for reuse.
+"""
+
+import math
+import random
+
+from app import main
+from app.photo_index import PhotoIndex, phash_pixels
+
+
+def _page(seed, noise=0):
+    """32x32 grayscale stand-in for a photographed page: a few dark blocks on white."""
+    rng = random.Random(seed)
+    blocks = [(rng.randrange(28), rng.randrange(28), rng.randrange(2, 10)) for _ in range(6)]
+    jitter = random.Random(seed * 1000 + noise)
+    pixels = []
+    for y in range(32):
+        for x in range(32):
+            dark = any(bx <= x < bx + size and by <= y < by + 3 for bx, by, size in blocks)
+            value = (40 if dark else 230) + 20 * math.sin(y / 10.0) + (jitter.uniform(-noise, noise) if noise else 0)
+            pixels.append(int(max(0, min(255, value))))
+    return pixels
+
+
+def _form(seed):
+    """A slip on a fixed vendor form: header bar, logo, table rules; only the line text differs."""
+    rng = random.Random(seed)
+    text = [(rng.randrange(4, 20), 14 + 3 * row) for row in range(5)]
+    return [40 if (y < 4 or (x < 6 and y < 10) or y in (12, 30)
+                   or any(4 <= x < 4 + width and y == row_y for width, row_y in text)) else 230
+            for y in range(32) for x in range(32)]
+
+
+def test_phash_keeps_reshots_close_and_other_pages_far():
+    original = phash_pixels(_page(1))
+    reshot = phash_pixels(_page(1, noise=25))
+    brighter = phash_pixels([min(255, p + 15) for p in _page(1)])
+    assert (original ^ reshot).bit_count() <= 10
+    assert (original ^ brighter).bit_count() <= 4
+    for seed in range(2, 7):
+        assert (original ^ phash_pixels(_page(seed))).bit_count() > 10
+
+
+def test_index_finds_the_nearest_photo_within_distance():
+    index = PhotoIndex()
+    index.max_distance = 10
+    base = 0x0123456789ABCDEF
+    index.add("invoice", format(base, "016x"), "inv-1")
+    index.add("invoice", format(base ^ 0b111, "016x"), "inv-2")
+    index.add("invoice", None, "inv-3")  # a PDF: nothing indexed
+
+    # Ten bits off, spread so every 16-bit chunk differs: still found
+    spread = base ^ sum(1 << b for b in (0, 1, 2, 16, 17, 32, 33, 48, 49, 50))
+    assert index.nearest("invoice", format(spread, "016x")) == ("inv-2", 7)
+    assert index.nearest("invoice", format(base ^ 0b1, "016x")) == ("inv-1", 1)
+    assert index.nearest("invoice", format(base ^ (0xFFF << 20), "016x")) is None
+    assert index.nearest("packing_slip", format(base, "016x")) is None
+    assert index.stats()["photos"] == 2 and index.stats()["hit_rate"] == 0.5
+
+
+def test_v1_upload_asks_before_reusing_a_similar_photo():
+    main.packing_slips.clear()
+    main.match_results.clear()
+    main._rebuild_duplicate_index()
+    main.purchase_orders["PO-PH-1"] = {"po_number": "PO-PH-1", "vendor": "Medline", "items": [
+        {"description": "Nitrile Exam Gloves", "quantity": 10, "unit_price": 9.8}]}
+    photo = 0xF0F0F0F00F0F0F0F
+    main._apply_packing_slip({"po_number": "PO-PH-1", "vendor": "Medline", "photo_hash": format(photo, "016x"),
+                              "items": [{"description": "Nitrile Exam Gloves", "quantity": 10}]})
+
+    def upload(bits, similar=None):
+        original = main.photo_hash
+        main.photo_hash = lambda contents, media_type: format(photo ^ bits, "016x")
+        try:
+            return main._known_upload("packing_slip", b"jpeg-" + str(bits).encode(), "image/jpeg", similar)
+        finally:
+            main.photo_hash = original
+
+    known, fingerprints = upload(0b11)
+    assert known["needs_confirmation"] and not known["success"] and known["similar_photo"] == {"distance": 2}
+    assert known["data"]["po_number"] == "PO-PH-1" and fingerprints["photo_hash"] == format(photo ^ 0b11, "016x")
+
+    looser = 0b1111111
+    assert upload(looser)[0]["needs_confirmation"]
+    assert upload(looser, "reuse")[0]["success"]
+    assert upload(looser, "extract")[0] is None
+    assert upload(0xFFFF)[0] is None
+
+    # Rebuilt with the rest of the v1 state on restore
+    main._load_v1_state(main._dump_v1_state())
+    assert upload(0b1)[0]["similar_photo"] == {"distance": 1}
+    del main.purchase_orders["PO-PH-1"]
+    main.packing_slips.clear()
+    main.match_results.clear()
+    main._rebuild_duplicate_index()
+
+
+def test_two_slips_on_the_same_form_are_not_reused_silently():
+    first, second = phash_pixels(_form(1)), phash_pixels(_form(2))
+    # Different line items, yet as close as a re-shot photo of one slip
+    assert (first ^ second).bit_count() <= 4
+
+    main.packing_slips.clear()
+    main._rebuild_duplicate_index()
+    main._apply_packing_slip({"po_number": "PO-PH-2", "vendor": "Medline", "photo_hash": format(first, "016x"),
+                              "items": [{"description": "Nitrile Exam Gloves", "quantity": 10}]})
+    original = main.photo_hash
+    main.photo_hash = lambda contents, media_type: format(second, "016x")
+    try:
+        known, _ = main._known_upload("packing_slip", b"second-slip", "image/jpeg")
+    finally:
+        main.photo_hash = original
+        main.packing_slips.clear()
+        main.match_results.clear()
+        main._rebuild_duplicate_index()
+    assert known["needs_confirmation"] and not known["success"]
+
+
+if __name__ == "__main__":
+    test_phash_keeps_reshots_close_and_other_pages_far()
+    test_index_finds_the_nearest_photo_within_distance()
+    test_v1_upload_asks_before_reusing_a_similar_photo()
+    test_two_slips_on_the_same_form_are_not_reused_silently()
+    print("✅ Photo index tests PASSED")
@@ -0,0 +1,74 @@
+"""
+Test Script for the OCR-Tolerant PO Number Index
+"""
+
+from app.po_index import POIndex, find_po_number, po_number_key
+from app.po_matcher import match_packing_slip
+from app.invoice_matcher import match_invoice
+
+
+def test_keys_fold_prefixes_and_confusables():
+    assert po_number_key("PO-100123") == po_number_key("po 1OO123") == po_number_key("P0#100l23") == "100123"
+    assert po_number_key("PO No. 4S8B") == "4588"
+    assert po_number_key("") == ""
+
+    index = POIndex(["PO-50000", "PO-71234", "PO-71294"])
+    assert index.candidates("PO 5OOOO") == (["PO-50000"], "normalized")
+    # One dropped / extra / swapped digit away
+    assert index.candidates("PO-5000") == (["PO-50000"], "fuzzy")
+    assert index.candidates("PO-500001") == (["PO-50000"], "fuzzy")
+    assert index.candidates("PO-05000") == (["PO-50000"], "fuzzy")
+    assert sorted(index.candidates("PO-71204")[0]) == ["PO-71234", "PO-71294"]
+    assert index.candidates("PO-99") == ([], "none")
+
+
+def test_lookup_follows_the_purchase_orders_dict():
+    purchase_orders = {"PO100000": {}, "PO100010": {}}
+    assert find_po_number("PO100000", purchase_orders)[:2] == ("PO100000", "exact")
+    assert find_po_number("P0-1OOO1O", purchase_orders)[:2] == ("PO100010", "normalized")
+    assert find_po_number("PO100001", purchase_orders)[:2] == (None, "ambiguous")
+
+    purchase_orders["PO-777"] = {}
+    assert find_po_number("PO 7T7", purchase_orders)[:2] == ("PO-777", "fuzzy")
+
+
+def test_matchers_resolve_misread_numbers():
+    purchase_orders = {"PO100123": {"po_number": "PO100123", "vendor": "Medline",
+                                    "items": [{"description": "Gauze", "quantity": 5, "unit_price": 2}]}}
+    slip = {"po_number": "P0-1OO123", "vendor": "Medline", "items": [{"description": "gauze", "quantity": 5}]}
+    slip_result = match_packing_slip(slip, purchase_orders)
+    assert slip_result["status"] == "APPROVE" and slip_result["po_number"] == "PO100123"
+    assert slip_result["po_lookup"] == "normalized"
+    slip["match_result"] = slip_result
+
+    invoice = {"po_number": "PO 100I23", "items": [{"description": "Gauze", "quantity": 5, "unit_price": 2}]}
+    invoice_result = match_invoice(invoice, purchase_orders, [slip])
+    assert invoice_result["has_packing_slip"] and invoice_result["status"] == "APPROVE"
+
+    missing = match_packing_slip({"po_number": "PO-999", "items": []}, purchase_orders)
+    assert missing["discrepancies"][0]["type"] == "PO Not Found"
+
+
+def test_fuzzy_number_links_but_goes_to_review():
+    purchase_orders = {"PO-1001": {"po_number": "PO-1001", "vendor": "Medline",
+                                   "items": [{"description": "Gauze", "quantity": 5, "unit_price": 2}]}}
+    slip = {"po_number": "PO-1007", "vendor": "Medline", "items": [{"description": "gauze", "quantity": 5}]}
+    slip_result = match_packing_slip(slip, purchase_orders)
+    assert slip_result["po_number"] == "PO-1001" and slip_result["po_lookup"] == "fuzzy"
+    assert slip_result["status"] == "REVIEW"
+    assert slip_result["discrepancies"] == [{"type": "PO Number Corrected",
+                                             "message": "PO number corrected from 'PO-1007' to 'PO-1001'. Confirm the PO."}]
+    slip["match_result"] = slip_result
+
+    invoice = {"po_number": "PO-1007", "items": [{"description": "Gauze", "quantity": 5, "unit_price": 2}]}
+    invoice_result = match_invoice(invoice, purchase_orders, [slip])
+    assert invoice_result["status"] == "REVIEW" and invoice_result["has_packing_slip"]
+    assert [d["type"] for d in invoice_result["discrepancies"]] == ["PO Number Corrected"]
+
+
+if __name__ == "__main__":
+    test_keys_fold_prefixes_and_confusables()
+    test_lookup_follows_the_purchase_orders_dict()
+    test_matchers_resolve_misread_numbers()
+    test_fuzzy_number_links_but_goes_to_review()
+    print("✅ PO index tests PASSED")
@@ -0,0 +1,84 @@
+"""
+Test Script for Content-Based PO Inference
+Slips without a readable PO number are linked by vendor, date and line items.
+"""
+
+from app.po_inference import ContentIndex, line_features, resolve_po
+from app.po_matcher import match_packing_slip
+
+
+def _book():
+    return {
+        "PO-1": {"po_number": "PO-1", "vendor": "Merck Sharp & Dohme LLC", "date": "2026-03-02", "items": [
+            {"item_number": "00006-4681-00", "description": "M-M-R II Vaccine 10x1 Dose SDV", "quantity": 2},
+            {"description": "Varivax Varicella Vaccine 10x1 Dose", "quantity": 3},
+        ]},
+        "PO-2": {"po_number": "PO-2", "vendor": "Merck Sharp & Dohme LLC", "date": "2026-03-04", "items": [
+            {"description": "Varivax Varicella Vaccine 10x1 Dose", "quantity": 3},
+        ]},
+        "PO-3": {"po_number": "PO-3", "vendor": "Medline Industries", "date": "2026-03-02", "items": [
+            {"description": "Nitrile Exam Gloves Large 100ct", "quantity": 10},
+        ]},
+        "PO-4": {"po_number": "PO-4", "vendor": "Medline Industries", "date": "2025-06-01", "items": [
+            {"description": "Nitrile Exam Gloves Large 100ct", "quantity": 10},
+        ]},
+    }
+
+
+def test_line_features():
+    features = line_features({"item_number": "GLV-NIT-M", "description": "Gloves Nitrile, box of 100", "quantity": 4.0})
+    assert {"i:GLVNITM", "t:gloves", "t:nitrile", "q:nitrile=4", "q:GLVNITM=4"} <= features
+    assert "t:box" not in features and "t:100" not in features
+
+
+def test_infers_po_from_lines_vendor_and_date():
+    book = _book()
+    slip = {"po_number": None, "vendor": "Merck Sharp & Dohme", "date": "2026-03-06", "items": [
+        {"item_number": "00006-4681-00", "description": "MMR II Measles Mumps Rubella Live 10 Vials", "quantity": 2},
+        {"description": "VARIVAX Varicella Virus Vaccine Live 10 Vials", "quantity": 3},
+    ]}
+    po_number, how, _, inference = resolve_po(slip, book)
+    assert (po_number, how) == ("PO-1", "inferred") and inference["confident"]
+
+    result = match_packing_slip(slip, book)
+    assert result["po_found"] and result["po_number"] == "PO-1" and result["po_lookup"] == "inferred"
+    assert "PO Inferred" not in [d["type"] for d in result["discrepancies"]]
+
+    # Gloves: PO-4 is outside the date window, so PO-3 is the only fit
+    gloves = {"vendor": "Medline", "date": "2026-03-09", "items": [{"description": "Gloves Nitrile Exam LG", "quantity": 10}]}
+    assert resolve_po(gloves, book)[:2] == ("PO-3", "inferred")
+    # Without a date the two gloves POs tie: nothing is linked, both are offered
+    undated = dict(gloves, date=None)
+    po_number, how, candidates, _ = resolve_po(undated, book)
+    assert po_number is None and sorted(candidates) == ["PO-3", "PO-4"]
+
+
+def test_ambiguous_number_is_settled_by_content():
+    book = {"PO100000": {"vendor": "Medline", "items": [{"description": "Alcohol Prep Pads", "quantity": 5}]},
+            "PO100010": {"vendor": "Medline", "items": [{"description": "Nitrile Exam Gloves", "quantity": 2}]}}
+    slip = {"po_number": "PO100001", "vendor": "Medline", "items": [{"description": "Nitrile Gloves", "quantity": 2}]}
+    assert resolve_po(slip, book)[:2] == ("PO100010", "inferred")
+    assert match_packing_slip(slip, book)["discrepancies"][0]["type"] == "PO Inferred"
+
+    index = ContentIndex(book)
+    book["PO100010"]["items"].append({"description": "Tubersol PPD", "quantity": 1})
+    index.refresh("PO100010", book["PO100010"])
+    assert "t:tubersol" in index.po_features["PO100010"]
+
+
+def test_number_read_cleanly_is_not_relinked_silently():
+    book = _book()
+    slip = {"po_number": "PO-88", "vendor": "Medline", "date": "2026-03-09",
+            "items": [{"description": "Nitrile Exam Gloves Large 100ct", "quantity": 10}]}
+    result = match_packing_slip(slip, book)
+    assert result["po_number"] == "PO-3" and result["po_lookup"] == "inferred"
+    assert result["status"] == "REVIEW" and len(result["discrepancies"]) == 1
+    assert result["discrepancies"][0]["message"].startswith("PO number 'PO-88' not found; linked to PO PO-3")
+
+
+if __name__ == "__main__":
+    test_line_features()
+    test_infers_po_from_lines_vendor_and_date()
+    test_ambiguous_number_is_settled_by_content()
+    test_number_read_cleanly_is_not_relinked_silently()
+    print("✅ PO inference tests PASSED")
@@ -0,0 +1,136 @@
+"""
+Test Script for the Request Profiler
+Runs a tiny FastAPI app through ProfilerMiddleware in-process.
+"""
+
+import os
+import time
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.profiling import (
+    ProfilerMiddleware, ProfileStore, sign_profile_token, verify_profile_token,
+    folded, top_functions, PROFILE_HEADER,
+)
+
+
+def busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += 1
+    return total
+
+
+def _client(store, **kwargs):
+    app = FastAPI()
+
+    @app.get("/slow/{n}")
+    def slow(n: int):
+        busy_work(n / 1000.0)
+        return {"n": n}
+
+    @app.get("/fast")
+    def fast():
+        return {"ok": True}
+
+    app.add_middleware(ProfilerMiddleware, store=store, interval_ms=1, **kwargs)
+    return TestClient(app)
+
+
+def test_route_rates_and_slowest_kept():
+    store = ProfileStore(keep=2)
+    client = _client(store, sample_rate=0.0, route_rates={"/slow/{n}": 1.0}, secret="")
+    for n in (30, 60, 10):
+        assert client.get("/slow/" + str(n)).status_code == 200
+    client.get("/fast")
+
+    profiles = store.list()
+    assert store.profiled == 3
+    assert [p["path"] for p in profiles] == ["/slow/60", "/slow/30"]
+    assert profiles[0]["route"] == "/slow/{n}"
+    assert profiles[0]["status"] == 200
+
+    slowest = store.get(profiles[0]["id"])
+    assert slowest["samples"] > 0
+    assert "busy_work" in folded(slowest)
+    assert any(row["function"].startswith("busy_work") for row in top_functions(slowest))
+
+
+def test_signed_header_forces_profile():
+    store = ProfileStore()
+    client = _client(store, sample_rate=0.0, route_rates={}, secret="s3cret")
+    client.get("/fast", headers={PROFILE_HEADER: "123.bogus"})
+    assert store.profiled == 0
+    client.get("/fast", headers={PROFILE_HEADER: sign_profile_token("s3cret", 60)})
+    assert store.profiled == 1
+    assert store.list()[0]["reason"] == "header"
+
+
+def test_token_expiry():
+    assert verify_profile_token("k", sign_profile_token("k", 60))
+    assert not verify_profile_token("k", sign_profile_token("k", -1))
+    assert not verify_profile_token("other", sign_profile_token("k", 60))
+
+
+def test_route_template_is_cached_per_path():
+    app = FastAPI()
+
+    @app.get("/items/{n}")
+    def item(n: int):
+        return {"n": n}
+
+    middleware = ProfilerMiddleware(app, store=ProfileStore(), sample_rate=0.0, route_rates={}, secret="")
+    scope = {"type": "http", "method": "GET", "path": "/items/7", "root_path": "", "app": app}
+    assert middleware._route_path(scope) == "/items/{n}"
+    app.router.routes.clear()
+    assert middleware._route_path(scope) == "/items/{n}"
+    assert middleware._route_path(dict(scope, path="/items/8")) == "/items/8"
+
+
+def test_streaming_responses_are_not_profiled():
+    app = FastAPI()
+
+    @app.get("/stream")
+    def stream():
+        def chunks():
+            for n in range(3):
+                busy_work(0.01)
+                yield '{"n": ' + str(n) + '}\n'
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    store = ProfileStore()
+    app.add_middleware(ProfilerMiddleware, store=store, interval_ms=1, sample_rate=1.0, route_rates={}, secret="")
+    client = TestClient(app)
+    assert client.get("/stream").text.count("\n") == 3
+    assert store.list() == []
+    assert client.get("/docs").status_code == 200 and len(store.list()) == 1
+
+
+def test_profiles_are_not_served_without_a_secret():
+    from app import main
+
+    client = TestClient(main.app)
+    saved = os.environ.pop("PROFILE_SECRET", None)
+    try:
+        assert client.get("/api/admin/profiles").status_code == 404
+        os.environ["PROFILE_SECRET"] = "s3cret"
+        assert client.get("/api/admin/profiles").status_code == 403
+        headers = {PROFILE_HEADER: sign_profile_token("s3cret", 60)}
+        assert client.get("/api/admin/profiles", headers=headers).status_code == 200
+    finally:
+        os.environ.pop("PROFILE_SECRET", None)
+        if saved is not None:
+            os.environ["PROFILE_SECRET"] = saved
+
+
+if __name__ == "__main__":
+    test_route_rates_and_slowest_kept()
+    test_signed_header_forces_profile()
+    test_token_expiry()
+    test_route_template_is_cached_per_path()
+    test_streaming_responses_are_not_profiled()
+    test_profiles_are_not_served_without_a_secret()
+    print("✅ Profiler tests PASSED")
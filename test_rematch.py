@@ -0,0 +1,111 @@
+"""
+Test Script for the Incremental Re-match
+Partial deliveries and corrected invoices update the PO's match line by line.
+"""
+
+from app.database import InMemoryStore
+from app.discrepancy_engine import run_3way_match
+from app.rematch import new_match_lines, rematch
+
+
+PO = {"vendor_name": "Merck", "total_amount": 5249.4, "line_items": [
+    {"item_number": "00006-4827-00", "description": "Varivax Varicella Vaccine 10x1 Dose", "quantity": 2, "unit_price": 1649.8, "line_total": 3299.6},
+    {"item_number": "00006-4681-00", "description": "M-M-R II Vaccine 10x1 Dose SDV", "quantity": 2, "unit_price": 842.5, "line_total": 1685.0},
+    {"item_number": "", "description": "Federal Excise Tax", "quantity": 1, "unit_price": 264.8, "line_total": 264.8, "is_tax_line": True},
+]}
+
+
+def _slip(slip_id, varivax, mmr=None):
+    lines = [{"item_number": "0006-4827-00", "description": "VARIVAX 10 Vials", "quantity_shipped": varivax}]
+    if mmr is not None:
+        lines.append({"item_number": "0006-4681-00", "description": "MMR II 10 PK", "quantity_shipped": mmr})
+    return {"id": slip_id, "line_items": lines}
+
+
+def _invoice(inv_id, mmr_price):
+    return {"id": inv_id, "total_amount": round(3299.6 + 2 * mmr_price + 264.8, 2), "line_items": [
+        {"item_number": "00006-4827-00", "description": "Varicella Virus Vaccine", "quantity": 2, "unit_price": 1649.8, "extension": 3299.6},
+        {"item_number": "00006-4681-00", "description": "Measles Mumps Rubella", "quantity": 2, "unit_price": mmr_price, "extension": round(2 * mmr_price, 2)},
+        {"description": "Federal Excise Tax", "quantity": 1, "unit_price": 264.8, "extension": 264.8},
+    ]}
+
+
+def test_partial_deliveries_add_up_and_corrected_invoice_replaces():
+    match, lines = {}, new_match_lines(PO)
+    diff = rematch(PO, match, lines, [("slip", _slip("s1", 1, 2))], memory={})
+    assert match["match_type"] == "2way_po_slip" and lines[0]["discrepancy_type"] == "qty_mismatch"
+    assert diff["overall_status"] == [None, "review"]
+
+    # Second partial delivery: only the Varivax line is touched
+    diff = rematch(PO, match, lines, [("slip", _slip("s2", 1))], memory={})
+    assert lines[0]["slip_qty_shipped"] == 2 and lines[0]["slip_shipments"] == {"s1": 1, "s2": 1}
+    assert diff["lines_rescored"] == 1
+    assert diff["lines"] == [{"line_number": 1, "description": "Varivax Varicella Vaccine 10x1 Dose",
+                              "from": "discrepancy:qty_mismatch", "to": "match"}]
+    assert match["overall_status"] == "approve" and match["slip_ids"] == ["s1", "s2"]
+
+    # Overbilled MMR, then the corrected invoice replaces it
+    rematch(PO, match, lines, [("invoice", _invoice("i1", 850.0))], memory={})
+    assert match["overall_status"] == "review" and lines[1]["discrepancy_type"] == "price_mismatch"
+    diff = rematch(PO, match, lines, [("invoice", _invoice("i2", 842.5))], memory={})
+    assert match["overall_status"] == "approve" and match["invoice_id"] == "i2" and match["amount_delta"] == 0
+    assert diff["amount_delta"] == [15.0, 0] and diff["lines_rescored"] == 2
+    assert all(d.get("invoice_id") in (None, "i2") for d in lines)
+
+
+def test_same_result_as_a_full_match():
+    slip = {"id": "s", "line_items": [
+        {"item_number": "", "description": "Varivax Varicella Vaccine 10 Vials", "quantity_shipped": 2},
+        {"item_number": "", "description": "Sterile Diluent Syringe", "quantity_shipped": 2},
+        {"item_number": "", "description": "Alcohol Prep Pads", "quantity_shipped": 1},
+    ]}
+    invoice = _invoice("i", 842.5)
+    full = run_3way_match(PO, slip, invoice, memory={})
+    # Applied in either order, or invoice corrected with itself, same lines and verdict
+    for documents in ([("slip", slip), ("invoice", invoice)],
+                      [("invoice", invoice), ("slip", slip), ("invoice", invoice)]):
+        match, lines = {}, new_match_lines(PO)
+        rematch(PO, match, lines, documents, memory={})
+        assert [(d["line_number"], d["line_status"], d.get("discrepancy_type")) for d in lines] == \
+               [(d["line_number"], d["line_status"], d.get("discrepancy_type")) for d in full["line_details"]]
+        for field in ("match_type", "overall_status", "confidence", "total_discrepancies", "amount_delta"):
+            assert match[field] == full[field], field
+
+
+def test_store_coalesces_a_burst_into_one_rematch_event():
+    store = InMemoryStore()
+    store.cold_storage = None
+    po_id = store.save_po({"po_number": "PO-RM-1", "vendor_name": "Merck", "total_amount": PO["total_amount"]})
+    store.save_po_lines(po_id, PO["line_items"])
+    for slip_id, varivax, mmr in (("s1", 1, 2), ("s2", 1, None)):
+        store.save_slip({"id": slip_id, "po_id": po_id, "po_number_ocr": "PO-RM-1"})
+        store.save_slip_lines(slip_id, _slip(slip_id, varivax, mmr)["line_items"])
+    assert list(store.pending_rematch) == [po_id]
+    assert store.rematch_due("0000") == [] and store.rematch_due("9999") == [po_id]
+
+    assert store.rematch_pending([po_id]) == 1 and store.rematch_pending([po_id]) == 0
+    match = store.get_matches_for_po(po_id)[0]
+    assert match["overall_status"] == "approve" and match["slip_ids"] == ["s1", "s2"]
+    events = [e for e in store.get_timeline_for_po(po_id) if e["event_type"] == "rematch"]
+    assert len(events) == 1 and events[0]["rematch"]["overall_status"] == [None, "approve"]
+
+    # Restored from a snapshot, the next document updates the same result
+    restored = InMemoryStore()
+    restored.cold_storage = None
+    restored.load_state(store.dump_state())
+    inv = _invoice("i1", 850.0)
+    restored.save_invoice({"id": "i1", "po_id": po_id, "total_amount": inv["total_amount"]})
+    restored.save_invoice_lines("i1", inv["line_items"])
+    restored.rematch_pending(restored.rematch_due("9999"))
+    updated = restored.get_matches_for_po(po_id)
+    assert len(updated) == 1 and updated[0]["id"] == match["id"]
+    assert updated[0]["overall_status"] == "review" and updated[0]["match_type"] == "3way"
+    # The earlier snapshot's copy is untouched
+    assert store.match_results[match["id"]]["overall_status"] == "approve"
+
+
+if __name__ == "__main__":
+    test_partial_deliveries_add_up_and_corrected_invoice_replaces()
+    test_same_result_as_a_full_match()
+    test_store_coalesces_a_burst_into_one_rematch_event()
+    print("✅ Incremental re-match tests PASSED")
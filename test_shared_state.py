@@ -0,0 +1,96 @@
+"""
+Test Script for Shared State
+Two replicas on one op log must converge to identical state, ids and timestamps.
+"""
+
+import os
+import tempfile
+
+from app.admin_html import handle_csv_upload
+from app.database import InMemoryStore
+from app.shared_state import MemoryLogBackend, SQLiteLogBackend, SharedState, ReplicatedStore
+
+
+def _worker(backend):
+    store = InMemoryStore()
+    shared = SharedState(backend, store)
+    purchase_orders = {}
+    shared.register("po_table", lambda payload: handle_csv_upload(payload["contents"].encode("latin-1"), purchase_orders))
+    return shared, ReplicatedStore(shared, store), purchase_orders
+
+
+def _check_replication(backend):
+    a, db_a, pos_a = _worker(backend)
+    b, db_b, pos_b = _worker(backend)
+
+    po = {"po_number": "PO-1001", "vendor_name": "McKesson"}
+    po_id = db_a.save_po(po)
+    db_a.save_po_lines(po_id, [{"item_number": "A1", "qty_ordered": 10}])
+    assert po["id"] == po_id and po["status"] == "active"
+
+    assert db_b.get_po(po_id) is None
+    b.sync()
+    replica = db_b.get_po(po_id)
+    assert replica["po_number"] == "PO-1001"
+    assert replica["uploaded_at"] == db_a.get_po(po_id)["uploaded_at"]
+    assert replica["line_items"] == [{"item_number": "A1", "qty_ordered": 10}]
+    assert db_b.get_all_events()[0]["id"] == db_a.get_all_events()[0]["id"]
+
+    # A write on the other worker catches up first, then flows back
+    db_b.update_status("po", po_id, "verified")
+    a.sync()
+    assert db_a.get_po(po_id)["status"] == "verified"
+    assert db_a.get_po(po_id)["verified_at"] == db_b.get_po(po_id)["verified_at"]
+
+    result = a.execute("po_table", {"contents": "PO Number,Item,Qty\nPO-2002,Gauze,5\n"})
+    assert result["success"] is True
+    b.sync()
+    assert pos_b.keys() == pos_a.keys() == {"PO-2002"}
+
+
+def test_memory_backend_replicates():
+    _check_replication(MemoryLogBackend())
+
+
+def test_sqlite_backend_replicates():
+    with tempfile.TemporaryDirectory() as tmp:
+        _check_replication(SQLiteLogBackend(os.path.join(tmp, "shared.db")))
+
+
+def test_failing_op_is_not_logged_and_an_old_one_is_skipped():
+    backend = MemoryLogBackend()
+    a, db_a, pos_a = _worker(backend)
+    b, db_b, pos_b = _worker(backend)
+    a.register("boom", lambda payload: payload["items"][0]["description"])
+    b.register("boom", lambda payload: payload["items"][0]["description"])
+
+    try:
+        a.execute("boom", {"items": ["Gloves"]})
+        assert False, "the handler error should reach the caller"
+    except TypeError:
+        pass
+    assert backend.entries == [] and a.failed_count == 0
+
+    # An op that made it into the log anyway (written by an older version)
+    backend.append("boom", '{"items": ["Gloves"]}', '{"uid": "5d1b5a3e-8a3c-4d55-9e1c-2f2d4a3b6c7d", "now": "2026-01-01T00:00:00+00:00"}')
+    po_id = db_a.save_po({"po_number": "PO-3003"})
+    assert a.failed_count == 1 and a.cursor == 2
+    b.sync()
+    assert b.failed_count == 1 and b.cursor == 2 and db_b.get_po(po_id)["po_number"] == "PO-3003"
+    assert b.status()["recent_failures"][0]["op"] == "boom"
+
+
+def test_direct_mode_applies_immediately():
+    store = InMemoryStore()
+    shared = SharedState(None, store)
+    shared.register("echo", lambda payload: payload["value"] * 2)
+    assert shared.execute("echo", {"value": 21}) == 42
+    assert shared.sync() == 0
+
+
+if __name__ == "__main__":
+    test_memory_backend_replicates()
+    test_sqlite_backend_replicates()
+    test_failing_op_is_not_logged_and_an_old_one_is_skipped()
+    test_direct_mode_applies_immediately()
+    print("✅ Shared state tests PASSED")
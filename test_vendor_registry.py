@@ -0,0 +1,81 @@
+"""
+Test Script for the Canonical Vendor Registry
+"""
+
+import json
+
+from app import database
+from app.vendor_registry import VendorRegistry, canonical_vendor_key, get_vendor_registry
+from app.po_matcher import match_packing_slip
+from app.api_routes import list_discrepancies, list_purchase_orders
+
+
+def test_canonical_keys_and_aliases():
+    assert canonical_vendor_key("McKesson Corp") == canonical_vendor_key("McKESSON CORPORATION") == "mckesson"
+    assert canonical_vendor_key("Merck Sharp & Dohme LLC") == "merck sharp and dohme"
+    assert canonical_vendor_key("The Henry Schein, Inc.") == "henry schein"
+    # Suffixes are whole words: the old substring strip turned this into "st"
+    assert canonical_vendor_key("Costco") == "costco"
+
+    vendors = VendorRegistry()
+    gsk = vendors.register("GlaxoSmithKline LLC")
+    assert vendors.resolve("GlaxoSmithKline") == gsk
+    assert vendors.resolve("GSK") is None and not vendors.same_vendor("GSK", "GlaxoSmithKline LLC")
+    assert vendors.same_vendor("Henry Schein Medical", "Henry Schein Inc.")
+    assert not vendors.same_vendor("Cardinal Health", "Medline Industries")
+
+    assert vendors.learn("GSK", gsk)
+    assert vendors.resolve("gsk") == gsk and vendors.same_vendor("GSK", "GlaxoSmithKline LLC")
+    assert not vendors.learn("GSK", gsk)
+    # A registered vendor is never re-pointed at another one
+    vendors.register("Medline Industries")
+    assert not vendors.learn("Medline Industries", gsk)
+
+    restored = VendorRegistry()
+    restored.load(vendors.dump())
+    assert restored.resolve("GSK") == gsk
+
+
+def test_clean_slip_match_learns_alias():
+    vendors = get_vendor_registry()
+    purchase_orders = {"PO-77": {"po_number": "PO-77", "vendor": "Owens & Minor Inc.",
+                                 "vendor_id": vendors.register("Owens & Minor Inc."),
+                                 "items": [{"description": "Nitrile Gloves", "quantity": 10}]}}
+    slip = {"po_number": "PO-77", "vendor": "Owens and Minor Distribution",
+            "items": [{"description": "nitrile gloves", "quantity": 10}]}
+    assert match_packing_slip(slip, purchase_orders)["status"] == "APPROVE"
+    assert vendors.resolve("Owens and Minor Distribution") == "owens and minor"
+
+    mismatch = dict(slip, vendor="Cardinal Health")
+    assert match_packing_slip(mismatch, purchase_orders)["discrepancies"][0]["type"] == "Vendor Mismatch"
+
+
+def test_verification_learns_alias_for_vendor_filter():
+    store = database.InMemoryStore()
+    store.cold_storage = None
+    database._db = store
+    po_id = store.save_po({"po_number": "PO-1", "vendor_name": "Sanofi Pasteur Inc."})
+    store.save_po({"po_number": "PO-2", "vendor_name": "Medline Industries"})
+    slip_id = store.save_slip({"po_id": po_id, "vendor_name": "SP Vaccines"})
+    store.save_match({"po_id": po_id, "slip_id": slip_id, "overall_status": "review", "total_discrepancies": 1})
+
+    def po_numbers(vendor):
+        return [p["po_number"] for p in _json(list_purchase_orders(status=None, match_status=None, vendor=vendor))["purchase_orders"]]
+
+    assert po_numbers("sanofi pasteur") == ["PO-1"]
+    assert po_numbers("SP Vaccines") == []
+    store.update_status("po", po_id, "verified")
+    assert po_numbers("SP Vaccines") == ["PO-1"]
+    assert po_numbers("medl") == ["PO-2"]
+    assert _json(list_discrepancies(severity=None, vendor="SP Vaccines"))["count"] == 1
+
+
+def _json(response):
+    return json.loads(response.body)
+
+
+if __name__ == "__main__":
+    test_canonical_keys_and_aliases()
+    test_clean_slip_match_learns_alias()
+    test_verification_learns_alias_for_vendor_filter()
+    print("✅ Vendor registry tests PASSED")
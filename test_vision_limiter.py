@@ -0,0 +1,129 @@
+"""
+Test Script for the Vision Rate Limiter
+Simulates 429/529 responses without touching the network.
+"""
+
+import asyncio
+
+import anthropic
+import httpx
+
+from app.vision_limiter import VisionLimiter, VisionUnavailableError
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return anthropic.APIStatusError("status " + str(status), response=response, body=None)
+
+
+class FakeRaw:
+    def __init__(self, headers=None):
+        self.headers = headers or {}
+
+    def parse(self):
+        return "parsed"
+
+
+def _limiter(**kwargs):
+    defaults = dict(base_delay=0.001, max_delay=0.01, breaker_cooldown=0.05, max_queue_wait=2.0)
+    defaults.update(kwargs)
+    return VisionLimiter(**defaults)
+
+
+def test_retries_through_overload():
+    """Two 529s then success: caller gets the result, concurrency backs off."""
+    limiter = _limiter(max_concurrency=4)
+    outcomes = [_status_error(529), _status_error(429, {"retry-after": "0"}), FakeRaw()]
+
+    def fn():
+        result = outcomes.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert asyncio.run(limiter.call(fn)) == "parsed"
+    snap = limiter.snapshot()
+    assert snap["counters"]["retries"] == 2
+    assert snap["counters"]["throttled"] == 2
+    assert snap["concurrency_limit"] == 1
+    assert snap["circuit_state"] == "closed"
+
+
+def test_non_retryable_error_raises_immediately():
+    limiter = _limiter()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise _status_error(400)
+
+    try:
+        asyncio.run(limiter.call(fn))
+    except anthropic.APIStatusError:
+        pass
+    else:
+        raise AssertionError("400 should not be retried")
+    assert len(calls) == 1
+
+
+def test_breaker_opens_then_recovers():
+    """Sustained failures open the breaker; the next call waits for the probe."""
+    limiter = _limiter(max_retries=0, breaker_threshold=2)
+
+    def fail():
+        raise _status_error(529)
+
+    async def scenario():
+        for _ in range(2):
+            try:
+                await limiter.call(fail)
+            except anthropic.APIStatusError:
+                pass
+        assert limiter.breaker.state == "open"
+        # Queued behind the open breaker, then let through as the probe
+        return await limiter.call(lambda: FakeRaw())
+
+    assert asyncio.run(scenario()) == "parsed"
+    assert limiter.breaker.state == "closed"
+    assert limiter.breaker.open_count == 1
+
+
+def test_queue_timeout_when_breaker_stays_open():
+    limiter = _limiter(max_retries=0, breaker_threshold=1, breaker_cooldown=10, max_queue_wait=0.1)
+
+    async def scenario():
+        try:
+            await limiter.call(lambda: (_ for _ in ()).throw(_status_error(529)))
+        except anthropic.APIStatusError:
+            pass
+        await limiter.call(lambda: FakeRaw())
+
+    try:
+        asyncio.run(scenario())
+    except VisionUnavailableError:
+        pass
+    else:
+        raise AssertionError("Expected VisionUnavailableError")
+    assert limiter.snapshot()["counters"]["queue_timeouts"] == 1
+
+
+def test_budget_headers_recorded():
+    limiter = _limiter()
+    limiter.record_headers({
+        "anthropic-ratelimit-requests-remaining": "12",
+        "anthropic-ratelimit-tokens-remaining": "80000",
+    })
+    snap = limiter.snapshot()
+    assert snap["requests_remaining"] == 12
+    assert snap["tokens_remaining"] == 80000
+    assert snap["budget_wait_seconds"] == 0
+
+
+if __name__ == "__main__":
+    test_retries_through_overload()
+    test_non_retryable_error_raises_immediately()
+    test_breaker_opens_then_recovers()
+    test_queue_timeout_when_breaker_stays_open()
+    test_budget_headers_recorded()
+    print("✅ Vision limiter tests PASSED")
@@ -0,0 +1,63 @@
+"""
+Test Script for Streaming Vision Extraction
+Feeds a fenced vision response to the incremental scanner in small chunks.
+"""
+
+import json
+
+from app.vision_stream import StreamingJSONScanner
+
+
+SLIP_RESPONSE = "```json\n" + json.dumps({
+    "po_number": "PO-2024-001",
+    "vendor": "Medical Supply Co \"East\"",
+    "date": None,
+    "items": [
+        {"description": "Exam Gloves, Nitrile {M}", "quantity": 100, "item_number": "GLV-NIT-M"},
+        {"description": "Gauze Pads 4x4", "quantity": 20, "item_number": None},
+    ],
+    "tracking_number": "1Z999AA10123456784",
+    "notes": None,
+}, indent=4) + "\n```"
+
+
+def _scan(text, chunk_size):
+    scanner = StreamingJSONScanner()
+    events = []
+    for i in range(0, len(text), chunk_size):
+        events.extend(scanner.feed(text[i:i + chunk_size]))
+    return scanner, events
+
+
+def test_fields_and_items_in_order():
+    """po_number arrives before any line item; every item is emitted once."""
+    for chunk_size in (1, 7, 64, len(SLIP_RESPONSE)):
+        scanner, events = _scan(SLIP_RESPONSE, chunk_size)
+        kinds = [(e[0], e[1]) for e in events]
+
+        assert scanner.done
+        assert kinds.index(("field", "po_number")) < kinds.index(("item", 0))
+        items = [e[2] for e in events if e[0] == "item"]
+        assert [i["quantity"] for i in items] == [100, 20]
+        assert items[0]["description"] == "Exam Gloves, Nitrile {M}"
+
+        fields = {e[1]: e[2] for e in events if e[0] == "field"}
+        assert fields["vendor"] == 'Medical Supply Co "East"'
+        assert fields["date"] is None
+        assert fields["notes"] is None
+        assert len(fields["items"]) == 2
+
+
+def test_items_emitted_before_response_ends():
+    """A closed line item is available while the rest is still streaming."""
+    cut = SLIP_RESPONSE.index("Gauze")
+    scanner = StreamingJSONScanner()
+    events = scanner.feed(SLIP_RESPONSE[:cut])
+    assert ("item", 0) in [(e[0], e[1]) for e in events]
+    assert not scanner.done
+
+
+if __name__ == "__main__":
+    test_fields_and_items_in_order()
+    test_items_emitted_before_response_ends()
+    print("✅ Streaming scanner tests PASSED")